@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark the /query database path: connect-per-request vs the shared pool
+Runs the token check + query record statements against DATABASE_URL
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import asyncpg
+
+from src.core.db import acquire, close_db_pool, init_db_pool
+from src.routes.query import check_and_update_token_limit, record_query
+
+BENCH_USER_ID = "bench-pool-user"
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _request_path(conn: asyncpg.Connection) -> None:
+    await check_and_update_token_limit(conn, BENCH_USER_ID, 100)
+    await record_query(conn, BENCH_USER_ID, "bench", "bench", 0, 0.0, "bench/bench")
+
+
+async def _run(label, one_request, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed():
+        async with semaphore:
+            start = time.perf_counter()
+            await one_request()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(timed() for _ in range(requests)))
+    print(
+        f"{label:<22} p50={statistics.median(latencies):7.2f}ms "
+        f"p99={_percentile(latencies, 99):7.2f}ms n={len(latencies)}"
+    )
+
+
+async def main(requests: int = 500, concurrency: int = 20):
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        print("❌ DATABASE_URL environment variable not set!")
+        sys.exit(1)
+
+    setup = await asyncpg.connect(db_url)
+    try:
+        await setup.execute(
+            """
+            INSERT INTO users (user_id, email, password_hash, created_at, tokens_used_today, last_token_reset)
+            VALUES ($1, 'bench@pool.edu', 'x', NOW(), 0, CURRENT_DATE)
+            ON CONFLICT (user_id) DO UPDATE SET tokens_used_today = 0
+            """,
+            BENCH_USER_ID,
+        )
+    finally:
+        await setup.close()
+
+    async def connect_per_request():
+        conn = await asyncpg.connect(db_url)
+        try:
+            await _request_path(conn)
+        finally:
+            await conn.close()
+
+    async def pooled():
+        async with acquire() as conn:
+            await _request_path(conn)
+
+    await init_db_pool(db_url)
+    try:
+        await _run("connect-per-request", connect_per_request, requests, concurrency)
+        await _run("shared pool", pooled, requests, concurrency)
+    finally:
+        await close_db_pool()
+        cleanup = await asyncpg.connect(db_url)
+        try:
+            await cleanup.execute("DELETE FROM queries WHERE user_id = $1", BENCH_USER_ID)
+            await cleanup.execute("DELETE FROM users WHERE user_id = $1", BENCH_USER_ID)
+        finally:
+            await cleanup.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -12,6 +12,7 @@ from typing import Dict, Any, Optional, List
 from fastapi import HTTPException
 from datetime import datetime
 
+from src.adapters.sec_snapshots import get_snapshot_store
 from src.config.settings import get_settings
 from src.utils.resiliency import cache
 
@@ -24,6 +25,7 @@ class SECFactsAdapter:
         self.base_url = "https://data.sec.gov"
         self.session = None
         self._session_loop = None
+        self.snapshots = get_snapshot_store()
         
         # Dynamic ticker lookup - supports ALL SEC-filing companies (10,123+)
         # No hardcoded mapping needed - uses src.jobs.symbol_map.cik_for_ticker()
@@ -134,6 +136,12 @@ class SECFactsAdapter:
             self._session_loop = current_loop
 
         return self.session
+
+    async def _get_company_facts_json(self, cik: str) -> Optional[Dict[str, Any]]:
+        """Load the companyfacts payload for a CIK via the shared snapshot store"""
+        session = await self._get_session()
+        url = f"{self.base_url}/api/xbrl/companyfacts/CIK{cik}.json"
+        return await self.snapshots.get(cik, session, url)
     
     async def get_facts_from_same_filing(
         self,
@@ -185,7 +193,7 @@ class SECFactsAdapter:
             logger.error("Failed to get facts from same filing", ticker=ticker, concepts=concepts, error=str(e))
             return {}
 
-    @cache(ttl=900, source_version="sec_facts")  # 15 minutes cache
+    @cache(ttl=900, source_version="sec_facts", stale_ttl=3600)  # 15 minutes fresh, 1h stale-while-revalidate
     async def get_fact(
         self,
         ticker: str,
@@ -212,97 +220,91 @@ class SECFactsAdapter:
                 logger.warning("No XBRL concepts found", concept=concept)
                 return None
 
-            session = await self._get_session()
-
-            # Fetch company facts
-            url = f"{self.base_url}/api/xbrl/companyfacts/CIK{cik}.json"
+            # Fetch company facts (served from the local snapshot store when fresh)
             logger.info("Fetching company facts", ticker=ticker, cik=cik)
+            data = await self._get_company_facts_json(cik)
+            if data is None:
+                return None
 
-            async with session.get(url) as response:
-                if response.status != 200:
-                    logger.error("Failed to fetch company facts", status=response.status)
-                    return None
-
-                data = await response.json()
-                facts = data.get("facts", {})
+            facts = data.get("facts", {})
 
-                # Try both US-GAAP and IFRS taxonomies
-                taxonomies = ["us-gaap", "ifrs-full"]
+            # Try both US-GAAP and IFRS taxonomies
+            taxonomies = ["us-gaap", "ifrs-full"]
 
-                # If looking for latest data (not specific accession), find the NEWEST available concept
-                # This handles schema drift where companies switch to newer XBRL tags
-                if not accession and period in {"latest", "most_recent", "recent", None}:
-                    candidates = []
+            # If looking for latest data (not specific accession), find the NEWEST available concept
+            # This handles schema drift where companies switch to newer XBRL tags
+            if not accession and period in {"latest", "most_recent", "recent", None}:
+                candidates = []
 
-                    for taxonomy in taxonomies:
-                        if taxonomy not in facts:
-                            continue
-                        taxonomy_data = facts[taxonomy]
-
-                        for xbrl_concept in xbrl_concepts:
-                            if xbrl_concept in taxonomy_data:
-                                concept_data = taxonomy_data[xbrl_concept]
-                                fact = self._find_fact_for_period(concept_data, None, freq, None)
-
-                                if fact and fact.get("fp") != "FY" if freq == "Q" else True:
-                                    candidates.append({
-                                        "fact": fact,
-                                        "xbrl_concept": xbrl_concept,
-                                        "taxonomy": taxonomy,
-                                        "end_date": fact.get("end", "")
-                                    })
-
-                    # Pick the candidate with the most recent end date
-                    if candidates:
-                        best = max(candidates, key=lambda x: x["end_date"])
-                        logger.info("Selected newest concept",
-                                  ticker=ticker, concept=concept,
-                                  xbrl_concept=best["xbrl_concept"],
-                                  end_date=best["end_date"],
-                                  total_candidates=len(candidates))
-
-                        return await self._build_fact_response(
-                            best["fact"], ticker, concept, best["xbrl_concept"], best["taxonomy"]
-                        )
-
-                # Original logic for specific periods or when accession is specified
                 for taxonomy in taxonomies:
                     if taxonomy not in facts:
                         continue
-
                     taxonomy_data = facts[taxonomy]
 
-                    # Find matching facts in this taxonomy
                     for xbrl_concept in xbrl_concepts:
                         if xbrl_concept in taxonomy_data:
                             concept_data = taxonomy_data[xbrl_concept]
-                            normalized_period = period if period not in {"latest", "most_recent", "recent"} else None
-                            fact = self._find_fact_for_period(concept_data, normalized_period, freq, accession)
-
-                            if fact:
-                                # Check if we're returning annual data when quarterly was requested
-                                fact_fp = fact.get("fp", "")
-                                if freq == "Q" and fact_fp == "FY":
-                                    logger.warning("No quarterly data available, found annual data instead",
-                                                 ticker=ticker, concept=concept, period=period, fact_fp=fact_fp)
-                                    continue  # Skip annual data when quarterly was requested
-
-                                # Validate the financial data (temporarily disabled - validation has bug)
-                                value = fact.get("val", 0)
-                                # if not self._validate_financial_data(ticker, concept, value, period or "", freq):
-                                #     logger.warning("Financial data validation failed",
-                                #                  ticker=ticker, concept=concept, value=value, period=period)
-                                #     continue  # Try next concept
-
-                                logger.info("Fact retrieved",
-                                          ticker=ticker, concept=concept,
-                                          taxonomy=taxonomy, xbrl_concept=xbrl_concept,
-                                          value=value, period=period, accession=fact.get("accn"))
-
-                                return await self._build_fact_response(fact, ticker, concept, xbrl_concept, taxonomy)
-
-                logger.warning("No facts found", ticker=ticker, concept=concept, taxonomies=taxonomies)
-                return None
+                            fact = self._find_fact_for_period(concept_data, None, freq, None)
+
+                            if fact and fact.get("fp") != "FY" if freq == "Q" else True:
+                                candidates.append({
+                                    "fact": fact,
+                                    "xbrl_concept": xbrl_concept,
+                                    "taxonomy": taxonomy,
+                                    "end_date": fact.get("end", "")
+                                })
+
+                # Pick the candidate with the most recent end date
+                if candidates:
+                    best = max(candidates, key=lambda x: x["end_date"])
+                    logger.info("Selected newest concept",
+                              ticker=ticker, concept=concept,
+                              xbrl_concept=best["xbrl_concept"],
+                              end_date=best["end_date"],
+                              total_candidates=len(candidates))
+
+                    return await self._build_fact_response(
+                        best["fact"], ticker, concept, best["xbrl_concept"], best["taxonomy"]
+                    )
+
+            # Original logic for specific periods or when accession is specified
+            for taxonomy in taxonomies:
+                if taxonomy not in facts:
+                    continue
+
+                taxonomy_data = facts[taxonomy]
+
+                # Find matching facts in this taxonomy
+                for xbrl_concept in xbrl_concepts:
+                    if xbrl_concept in taxonomy_data:
+                        concept_data = taxonomy_data[xbrl_concept]
+                        normalized_period = period if period not in {"latest", "most_recent", "recent"} else None
+                        fact = self._find_fact_for_period(concept_data, normalized_period, freq, accession)
+
+                        if fact:
+                            # Check if we're returning annual data when quarterly was requested
+                            fact_fp = fact.get("fp", "")
+                            if freq == "Q" and fact_fp == "FY":
+                                logger.warning("No quarterly data available, found annual data instead",
+                                             ticker=ticker, concept=concept, period=period, fact_fp=fact_fp)
+                                continue  # Skip annual data when quarterly was requested
+
+                            # Validate the financial data (temporarily disabled - validation has bug)
+                            value = fact.get("val", 0)
+                            # if not self._validate_financial_data(ticker, concept, value, period or "", freq):
+                            #     logger.warning("Financial data validation failed",
+                            #                  ticker=ticker, concept=concept, value=value, period=period)
+                            #     continue  # Try next concept
+
+                            logger.info("Fact retrieved",
+                                      ticker=ticker, concept=concept,
+                                      taxonomy=taxonomy, xbrl_concept=xbrl_concept,
+                                      value=value, period=period, accession=fact.get("accn"))
+
+                            return await self._build_fact_response(fact, ticker, concept, xbrl_concept, taxonomy)
+
+            logger.warning("No facts found", ticker=ticker, concept=concept, taxonomies=taxonomies)
+            return None
 
         except ValueError as e:
             # Re-raise ValueError from strict mode
@@ -322,21 +324,10 @@ class SECFactsAdapter:
                 logger.warning("Unknown ticker when fetching company facts", ticker=ticker)
                 return None
 
-            session = await self._get_session()
-            url = f"{self.base_url}/api/xbrl/companyfacts/CIK{cik}.json"
             logger.info("Fetching full company facts", ticker=ticker, cik=cik)
-
-            async with session.get(url) as response:
-                if response.status != 200:
-                    logger.error(
-                        "Failed to fetch company facts",
-                        ticker=ticker,
-                        cik=cik,
-                        status=response.status
-                    )
-                    return None
-
-                data = await response.json()
+            data = await self._get_company_facts_json(cik)
+            if data is None:
+                return None
 
             normalized: Dict[str, Any] = {
                 "cik": cik,
@@ -854,7 +845,7 @@ class SECFactsAdapter:
             "citation": citation
         }
     
-    @cache(ttl=900, source_version="sec_series")  # 15 minutes cache
+    @cache(ttl=900, source_version="sec_series", stale_ttl=3600)  # 15 minutes fresh, 1h stale-while-revalidate
     async def get_series(
         self,
         ticker: str,
@@ -874,13 +865,10 @@ class SECFactsAdapter:
                 logger.warning("Unknown ticker", ticker=ticker)
                 return []
             
-            session = await self._get_session()
-            url = f"{self.base_url}/api/xbrl/companyfacts/CIK{cik}.json"
-            async with session.get(url) as response:
-                if response.status != 200:
-                    logger.error("Failed to fetch company facts for series", status=response.status)
-                    return []
-                data = await response.json()
+            # Same snapshot get_fact just used, so this does not hit the network again
+            data = await self._get_company_facts_json(cik)
+            if data is None:
+                return []
         except Exception as e:
             logger.error("Failed to fetch series data", ticker=ticker, concept=concept, error=str(e))
             return []
@@ -0,0 +1,197 @@
+"""
+SEC Companyfacts Snapshot Store
+Local, revalidated cache of companyfacts/CIK*.json shared by the SEC adapters
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import aiohttp
+import structlog
+
+from src.config.settings import get_settings
+from src.core.paths import SEC_COMPANYFACTS_DIR
+
+logger = structlog.get_logger(__name__)
+
+
+class CompanyFactsSnapshotStore:
+    """Compressed on-disk snapshots of companyfacts payloads keyed by CIK
+
+    A snapshot younger than ``max_age`` seconds is served without touching the
+    network. Older snapshots are revalidated with ETag/Last-Modified; a 304
+    only refreshes the metadata. Concurrent requests for the same CIK share a
+    single in-flight fetch, and the most recently used payloads are kept parsed
+    in memory so one request can reuse them across several lookups.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        *,
+        max_age: Optional[int] = None,
+        memory_entries: Optional[int] = None,
+    ):
+        settings = get_settings()
+        self.directory = Path(directory or settings.sec_snapshot_dir or SEC_COMPANYFACTS_DIR)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_age = settings.sec_snapshot_max_age if max_age is None else max_age
+        self.memory_entries = settings.sec_snapshot_memory_entries if memory_entries is None else memory_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "revalidated": 0, "fetched": 0, "stale_served": 0}
+
+    def _body_path(self, cik: str) -> Path:
+        return self.directory / f"CIK{cik}.json.gz"
+
+    def _meta_path(self, cik: str) -> Path:
+        return self.directory / f"CIK{cik}.meta.json"
+
+    def _read_meta(self, cik: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(cik), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_body(self, cik: str) -> Optional[Dict[str, Any]]:
+        try:
+            with gzip.open(self._body_path(cik), "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def _write_atomic(self, path: Path, payload: bytes) -> None:
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def _write_snapshot(self, cik: str, body: bytes, meta: Dict[str, Any]) -> None:
+        self._write_atomic(self._body_path(cik), gzip.compress(body, compresslevel=6))
+        self._write_meta(cik, meta)
+
+    def _write_meta(self, cik: str, meta: Dict[str, Any]) -> None:
+        self._write_atomic(self._meta_path(cik), json.dumps(meta).encode("utf-8"))
+
+    def _remember(self, cik: str, data: Dict[str, Any], fetched_at: float) -> None:
+        self._memory[cik] = {"data": data, "fetched_at": fetched_at}
+        self._memory.move_to_end(cik)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _is_fresh(self, fetched_at: Optional[float]) -> bool:
+        return fetched_at is not None and time.time() - fetched_at < self.max_age
+
+    async def get(self, cik: str, session: aiohttp.ClientSession, url: str) -> Optional[Dict[str, Any]]:
+        """Return the companyfacts payload for ``cik``, fetching only when needed"""
+        cached = self._memory.get(cik)
+        if cached and self._is_fresh(cached["fetched_at"]):
+            self._memory.move_to_end(cik)
+            self.stats["memory_hits"] += 1
+            return cached["data"]
+
+        meta = self._read_meta(cik)
+        if meta and self._is_fresh(meta.get("fetched_at")):
+            data = cached["data"] if cached else await asyncio.to_thread(self._read_body, cik)
+            if data is not None:
+                self.stats["disk_hits"] += 1
+                self._remember(cik, data, meta["fetched_at"])
+                return data
+
+        task = self._inflight.get(cik)
+        if task is None:
+            # A detached task: cancelling the caller that started it leaves the other waiters served
+            task = asyncio.ensure_future(self._revalidate(cik, session, url, meta))
+            self._inflight[cik] = task
+            task.add_done_callback(lambda done: self._finish(cik, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, cik: str, task: asyncio.Task) -> None:
+        if self._inflight.get(cik) is task:
+            del self._inflight[cik]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; waiters re-raise it themselves
+
+    async def _revalidate(
+        self,
+        cik: str,
+        session: aiohttp.ClientSession,
+        url: str,
+        meta: Optional[Dict[str, Any]],
+    ) -> Optional[Dict[str, Any]]:
+        headers: Dict[str, str] = {}
+        if meta and self._body_path(cik).exists():
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and meta:
+                    data = await asyncio.to_thread(self._read_body, cik)
+                    if data is not None:
+                        meta["fetched_at"] = time.time()
+                        await asyncio.to_thread(self._write_meta, cik, meta)
+                        self.stats["revalidated"] += 1
+                        self._remember(cik, data, meta["fetched_at"])
+                        logger.debug("Companyfacts snapshot revalidated", cik=cik)
+                        return data
+
+                if response.status != 200:
+                    return await self._serve_stale(cik, meta, status=response.status)
+
+                body = await response.read()
+                new_meta = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched_at": time.time(),
+                    "size": len(body),
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # SEC unreachable or slow: an old snapshot beats no data
+            return await self._serve_stale(cik, meta, error=str(e) or type(e).__name__)
+
+        # Companyfacts bodies run to several MB; parse off the event loop
+        data = await asyncio.to_thread(json.loads, body)
+        await asyncio.to_thread(self._write_snapshot, cik, body, new_meta)
+        self.stats["fetched"] += 1
+        self._remember(cik, data, new_meta["fetched_at"])
+        logger.info("Companyfacts snapshot stored", cik=cik, bytes=len(body))
+        return data
+
+    async def _serve_stale(self, cik: str, meta: Optional[Dict[str, Any]], **reason: Any) -> Optional[Dict[str, Any]]:
+        stale = await asyncio.to_thread(self._read_body, cik) if meta else None
+        if stale is not None:
+            self.stats["stale_served"] += 1
+            logger.warning("Serving stale companyfacts snapshot", cik=cik, **reason)
+            return stale
+        logger.error("Failed to fetch company facts", cik=cik, **reason)
+        return None
+
+    def invalidate(self, cik: str) -> None:
+        """Drop the snapshot for ``cik`` from memory and disk"""
+        self._memory.pop(cik, None)
+        for path in (self._body_path(cik), self._meta_path(cik)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+_snapshot_store: Optional[CompanyFactsSnapshotStore] = None
+
+
+def get_snapshot_store() -> CompanyFactsSnapshotStore:
+    """Get global companyfacts snapshot store"""
+    global _snapshot_store
+    if _snapshot_store is None:
+        _snapshot_store = CompanyFactsSnapshotStore()
+    return _snapshot_store
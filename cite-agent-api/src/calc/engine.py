@@ -1,15 +1,17 @@
 """
 FinSight Calculations Engine
-Safe expression evaluation with provenance tracking
+Compiled expression evaluation with provenance tracking
 """
 
 import re
+import numpy as np
 import structlog
 from typing import Any, Dict, List, Optional, Union, Tuple, Set
-from datetime import datetime
+from datetime import date, datetime
 from dataclasses import dataclass
 from enum import Enum
 
+from src.calc.expressions import ExpressionError, compile_expression
 from src.services.data_validator import DataValidator, ValidationResult
 
 logger = structlog.get_logger(__name__)
@@ -54,6 +56,69 @@ class CalculationResult:
     metadata: Dict[str, Any]
     validation: Optional[ValidationResult] = None
 
+class _SeriesWindow:
+    """Period-shift helpers over an end-date-aligned series
+
+    A shift by ``n`` periods looks up the row whose end date is ``n`` periods
+    earlier (within a tolerance), so gaps in the filing history yield NaN
+    instead of silently comparing non-adjacent periods.
+    """
+
+    STEP_DAYS = {"Q": 91.3125, "A": 365.25}
+    TOLERANCE_DAYS = {"Q": 20.0, "A": 30.0}
+
+    def __init__(self, ordinals: np.ndarray, freq: str):
+        self.ordinals = ordinals
+        self.freq = freq if freq in self.STEP_DAYS else "Q"
+        self.periods_per_year = 4 if self.freq == "Q" else 1
+
+    def shift(self, values: np.ndarray, periods: int) -> np.ndarray:
+        """Value from ``periods`` periods earlier, matched by end date rather than position"""
+        if periods <= 0:
+            return values.copy()
+        ordinals = self.ordinals
+        if ordinals.size < 2:
+            return np.full_like(values, np.nan)
+
+        target = ordinals - periods * self.STEP_DAYS[self.freq]
+        right = np.clip(np.searchsorted(ordinals, target), 1, ordinals.size - 1)
+        left = right - 1
+        nearest = np.where(np.abs(ordinals[left] - target) <= np.abs(ordinals[right] - target), left, right)
+        valid = np.abs(ordinals[nearest] - target) <= self.TOLERANCE_DAYS[self.freq]
+        return np.where(valid, values[nearest], np.nan)
+
+    def rolling_sum(self, values: np.ndarray, periods: int) -> np.ndarray:
+        total = values.copy()
+        for lag in range(1, periods):
+            total = total + self.shift(values, lag)
+        return total
+
+    def apply(self, func_name: str, columns: Dict[str, np.ndarray], args: Tuple[str, ...]) -> np.ndarray:
+        """Vectorized counterpart of the scalar KPI functions"""
+        if not args or args[0] not in columns:
+            raise ValueError(f"{func_name}() requires a known input as its first argument")
+        values = columns[args[0]]
+        count = int(float(args[1])) if len(args) > 1 else None
+
+        if func_name == "avg":
+            periods = count or 2
+            return self.rolling_sum(values, periods) / periods
+        if func_name == "ttm":
+            return self.rolling_sum(values, 4) if self.freq == "Q" else values
+        if func_name == "yoy":
+            return values / self.shift(values, self.periods_per_year) - 1
+        if func_name == "qoq":
+            if self.freq != "Q":
+                return np.full_like(values, np.nan)
+            return values / self.shift(values, 1) - 1
+        if func_name == "cagr":
+            years = count or 1
+            return (values / self.shift(values, years * self.periods_per_year)) ** (1 / years) - 1
+        if func_name == "per_share":
+            shares = columns.get("sharesDiluted")
+            return values / shares if shares is not None else np.full_like(values, np.nan)
+        raise ValueError(f"Unknown function: {func_name}")
+
 class CalculationEngine:
     """Engine for evaluating financial expressions with provenance"""
     
@@ -344,6 +409,156 @@ class CalculationEngine:
             )
             raise
     
+    async def calculate_series(
+        self,
+        ticker: str,
+        metric: str,
+        freq: str = "Q",
+        limit: int = 12,
+        ttm: bool = False,
+        segment: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Calculate a metric for every available period in one pass
+        
+        Each input's full history is resolved once, aligned on period end
+        dates and the compiled expression is evaluated over NumPy arrays.
+        Windowed functions (avg/ttm/yoy/qoq/cagr) and ``ttm=True`` use prior
+        periods from the same arrays and yield no value where the window has
+        a gap.
+        
+        Args:
+            ticker: Company ticker symbol
+            metric: Metric name from KPI registry
+            freq: Frequency ("Q" for quarterly, "A" for annual)
+            limit: Number of most recent periods to return
+            ttm: Sum duration inputs over trailing four quarters
+            segment: Business segment filter (optional)
+            
+        Returns:
+            Dict with the formula, output type and a newest-first list of points,
+            each with its value, input values, citations and quality flags
+        """
+        metric_def = self.kpi_registry.get_metric(metric)
+        if not metric_def:
+            raise ValueError(f"Unknown metric: {metric}")
+        
+        compiled = compile_expression(metric_def.get("expr", ""))
+        input_defs = self.kpi_registry.get_metric_inputs(metric)
+        optional = compiled.optional_inputs
+        required = [name for name in compiled.inputs if name not in optional]
+        
+        undefined = [name for name in required if name not in input_defs]
+        if undefined:
+            raise ValueError(f"Missing input definitions for metric '{metric}': {', '.join(undefined)}")
+        
+        # Resolve every input's history once (inputs are cached per company)
+        facts_by_input: Dict[str, Dict[str, Fact]] = {}
+        for name in compiled.inputs:
+            if name in input_defs:
+                facts_by_input[name] = await self._resolve_input_series(ticker, input_defs[name], freq, segment)
+        
+        # Align on end dates where every required input has a value
+        anchor_inputs = required or list(facts_by_input)
+        end_sets = [set(facts_by_input.get(name, {})) for name in anchor_inputs]
+        ends = sorted(set.intersection(*end_sets)) if end_sets else []
+        if not ends:
+            return self._series_payload(ticker, metric, freq, ttm, metric_def, [])
+        
+        ordinals = np.array([date.fromisoformat(end[:10]).toordinal() for end in ends], dtype=np.float64)
+        window = _SeriesWindow(ordinals, freq)
+        
+        columns: Dict[str, np.ndarray] = {}
+        for name, facts in facts_by_input.items():
+            column = np.array([facts[end].value if end in facts else np.nan for end in ends], dtype=np.float64)
+            if name in optional:
+                column = np.nan_to_num(column, nan=0.0)
+            if ttm and freq == "Q" and input_defs[name].get("type", "duration") == "duration":
+                column = window.rolling_sum(column, 4)
+            columns[name] = column
+        for name in optional:
+            columns.setdefault(name, np.zeros(len(ends)))
+        
+        def call(func_name: str, args: Tuple[str, ...]) -> np.ndarray:
+            return window.apply(func_name, columns, args)
+        
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            values = np.broadcast_to(np.asarray(compiled.evaluate(columns, call), dtype=np.float64), (len(ends),))
+        
+        output_type = OutputType(metric_def.get("output", "value"))
+        points: List[Dict[str, Any]] = []
+        for i in range(len(ends) - 1, -1, -1):
+            if len(points) >= limit:
+                break
+            if not np.isfinite(values[i]):
+                continue
+            
+            point_inputs = {
+                name: facts[ends[i]] for name, facts in facts_by_input.items() if ends[i] in facts
+            }
+            flags = self._collect_quality_flags(point_inputs, metric_def)
+            flags.extend(f"OPTIONAL_INPUT_DEFAULTED:{name}" for name in sorted(optional) if name not in point_inputs)
+            if ttm and freq == "Q":
+                flags.append("TTM")
+            
+            period_fact = next(iter(point_inputs.values()), None)
+            points.append({
+                "period": period_fact.period if period_fact else ends[i],
+                "end_date": ends[i],
+                "value": self._format_value(float(values[i]), output_type),
+                "inputs": {name: float(columns[name][i]) for name in columns if np.isfinite(columns[name][i])},
+                "citations": self._build_citations(point_inputs),
+                "quality_flags": flags,
+            })
+        
+        return self._series_payload(ticker, metric, freq, ttm, metric_def, points)
+    
+    def _series_payload(
+        self,
+        ticker: str,
+        metric: str,
+        freq: str,
+        ttm: bool,
+        metric_def: Dict[str, Any],
+        points: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        return {
+            "ticker": ticker,
+            "metric": metric,
+            "freq": freq,
+            "ttm": ttm,
+            "formula": metric_def.get("expr", ""),
+            "output_type": metric_def.get("output", "value"),
+            "series": points,
+        }
+    
+    async def _resolve_input_series(
+        self,
+        ticker: str,
+        input_def: Dict[str, Any],
+        freq: str,
+        segment: Optional[str]
+    ) -> Dict[str, Fact]:
+        """Resolve an input's full history keyed by end date, preferred concept first"""
+        get_period_series = getattr(self.facts_store, "get_period_series", None)
+        if get_period_series is None:
+            raise ValueError("Series calculation requires a facts store with get_period_series")
+        
+        concepts = list(input_def.get("concepts", []))
+        prefer_concept = input_def.get("prefer")
+        if prefer_concept in concepts:
+            concepts.remove(prefer_concept)
+            concepts.insert(0, prefer_concept)
+        
+        # Later concepts only fill periods the preferred ones lack (tag changes over time)
+        facts: Dict[str, Fact] = {}
+        for concept in concepts:
+            for store_fact in await get_period_series(ticker, concept, freq, segment):
+                end = getattr(store_fact, "end_date", None)
+                if end and end not in facts:
+                    facts[end] = self._convert_store_fact(store_fact)
+        return facts
+    
     async def _resolve_inputs(
         self,
         ticker: str,
@@ -596,71 +811,20 @@ class CalculationEngine:
         )
     
     async def _evaluate_expression(self, expr: str, inputs: Dict[str, Fact]) -> float:
-        """Safely evaluate a mathematical expression"""
+        """Evaluate a compiled KPI expression over the resolved input values"""
         try:
-            # Replace input names with values
-            expression = expr
-
-            # Replace optional placeholders (variable?) first
-            def replace_optional(match: re.Match) -> str:
-                name = match.group(1)
-                if name in inputs:
-                    return str(inputs[name].value)
-                return "0"
-
-            expression = re.sub(r'([A-Za-z_][A-Za-z0-9_]*)\?', replace_optional, expression)
-
-            # Resolve function calls (e.g., avg, ttm) before replacing variable names so
-            # handlers receive the original concept identifiers rather than numeric values.
-            expression = await self._replace_functions(expression, inputs)
-
-            for input_name, fact in inputs.items():
-                value = fact.value
-                # Replace variable names in expression
-                pattern = r'\b' + re.escape(input_name) + r'\b'
-                expression = re.sub(pattern, str(value), expression)
-            
-            # Validate expression contains only safe operations
-            if not self._is_safe_expression(expression):
-                raise ValueError(f"Unsafe expression: {expression}")
-            
-            # Evaluate safely
-            result = eval(expression, {"__builtins__": {}}, {})
-            
-            return float(result)
-            
+            compiled = compile_expression(expr)
+            values = {name: fact.value for name, fact in inputs.items()}
+
+            def call(func_name: str, args: Tuple[str, ...]) -> float:
+                return self.functions[func_name](inputs, list(args))
+
+            return float(compiled.evaluate(values, call))
+
         except Exception as e:
             logger.error("Expression evaluation failed", expr=expr, error=str(e))
             raise ValueError(f"Failed to evaluate expression '{expr}': {str(e)}")
     
-    async def _replace_functions(self, expr: str, inputs: Dict[str, Fact]) -> str:
-        """Replace function calls in expression with computed values"""
-        # Find function calls
-        function_pattern = r'(\w+)\s*\(([^)]+)\)'
-        
-        def replace_function(match):
-            func_name = match.group(1)
-            args_str = match.group(2)
-            
-            if func_name in self.functions:
-                # Parse arguments
-                args = [arg.strip() for arg in args_str.split(',')]
-                
-                # Get function result
-                result = self.functions[func_name](inputs, args)
-                return str(result)
-            else:
-                # Unknown function, leave as is
-                return match.group(0)
-        
-        return re.sub(function_pattern, replace_function, expr)
-    
-    def _is_safe_expression(self, expr: str) -> bool:
-        """Check if expression contains only safe mathematical operations"""
-        # Allow only numbers, operators, parentheses, and basic math
-        safe_pattern = r'^[0-9+\-*/().\s]+$'
-        return bool(re.match(safe_pattern, expr))
-    
     def _avg_function(self, inputs: Dict[str, Fact], args: List[str]) -> float:
         """Calculate average of concept over N periods"""
         if len(args) != 2:
@@ -882,6 +1046,10 @@ class CalculationEngine:
         """Identify optional inputs marked with '?' in an expression"""
         if not expr:
             return set()
+        try:
+            return set(compile_expression(expr).optional_inputs)
+        except ExpressionError:
+            pass
         return {
             match.group(1)
             for match in re.finditer(r'([A-Za-z_][A-Za-z0-9_]*)\?', expr)
@@ -889,6 +1057,11 @@ class CalculationEngine:
     
     def _parse_expression_inputs(self, expr: str) -> List[str]:
         """Parse expression to find input variable names"""
+        try:
+            return list(compile_expression(expr).inputs)
+        except ExpressionError:
+            pass
+
         # Simple regex to find variable names (words that aren't functions)
         variables = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', expr)
         
@@ -0,0 +1,231 @@
+"""
+FinSight KPI Expressions
+Parse-once compiler for KPI formulas into closures evaluated over floats
+"""
+
+import operator
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+# Functions understood by CalculationEngine (see `functions` in config/kpi.yml)
+KNOWN_FUNCTIONS: FrozenSet[str] = frozenset({"avg", "ttm", "yoy", "qoq", "cagr", "per_share"})
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:"
+    r"(?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)"
+    r"|(?P<name>[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<op>\*\*|[-+*/(),?])"
+    r")"
+)
+
+# (values, call) -> float; ``call(name, args)`` evaluates a registry function
+Evaluator = Callable[[Mapping[str, float], Optional[Callable[[str, Tuple[str, ...]], float]]], float]
+
+
+class ExpressionError(ValueError):
+    """Raised when a KPI expression cannot be parsed or evaluated"""
+
+
+@dataclass(frozen=True)
+class CompiledExpression:
+    """A parsed KPI expression, reusable for every period and request"""
+    source: str
+    inputs: Tuple[str, ...]            # identifiers read from the inputs, in first-use order
+    optional_inputs: FrozenSet[str]    # identifiers written as ``name?`` (default to 0)
+    functions: Tuple[str, ...]         # registry functions called by the expression
+    _evaluate: Evaluator
+
+    def evaluate(
+        self,
+        values: Mapping[str, float],
+        call: Optional[Callable[[str, Tuple[str, ...]], float]] = None,
+    ) -> float:
+        """Evaluate against resolved input values
+
+        Args:
+            values: Input name -> value (floats, or NumPy arrays for a whole series)
+            call: Handler for function calls, given the function name and its raw arguments
+        """
+        try:
+            return self._evaluate(values, call)
+        except ExpressionError:
+            raise
+        except ZeroDivisionError as e:
+            raise ExpressionError(f"Failed to evaluate expression '{self.source}': {e}") from e
+
+
+def _tokenize(source: str) -> List[Tuple[str, str]]:
+    tokens: List[Tuple[str, str]] = []
+    pos = 0
+    source = source.rstrip()
+    while pos < len(source):
+        match = _TOKEN_RE.match(source, pos)
+        if match is None or match.end() == pos:
+            raise ExpressionError(f"Unexpected character {source[pos:].lstrip()[:1]!r} in expression '{source}'")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing evaluation closures
+
+    Grammar (Python precedence):
+        expr    := term (('+' | '-') term)*
+        term    := unary (('*' | '/') unary)*
+        unary   := ('-' | '+') unary | power
+        power   := atom ('**' unary)?
+        atom    := number | name '?'? | name '(' args ')' | '(' expr ')'
+    """
+
+    def __init__(self, source: str, functions: FrozenSet[str]):
+        self.source = source
+        self.tokens = _tokenize(source)
+        self.pos = 0
+        self.known_functions = functions
+        self.inputs: Dict[str, None] = {}
+        self.optional: Dict[str, None] = {}
+        self.functions: Dict[str, None] = {}
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _accept(self, value: str) -> bool:
+        token = self._peek()
+        if token is not None and token[0] == "op" and token[1] == value:
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, value: str) -> None:
+        if not self._accept(value):
+            found = self._peek()
+            found_text = repr(found[1]) if found else "end of input"
+            raise ExpressionError(f"Expected '{value}' but found {found_text} in expression '{self.source}'")
+
+    def parse(self) -> Evaluator:
+        if not self.tokens:
+            raise ExpressionError("Empty expression")
+        node = self._expr()
+        if self._peek() is not None:
+            raise ExpressionError(f"Unexpected {self._peek()[1]!r} in expression '{self.source}'")
+        return node
+
+    def _expr(self) -> Evaluator:
+        node = self._term()
+        while True:
+            if self._accept("+"):
+                node = _binary(node, self._term(), operator.add)
+            elif self._accept("-"):
+                node = _binary(node, self._term(), operator.sub)
+            else:
+                return node
+
+    def _term(self) -> Evaluator:
+        node = self._unary()
+        while True:
+            if self._accept("*"):
+                node = _binary(node, self._unary(), operator.mul)
+            elif self._accept("/"):
+                node = _binary(node, self._unary(), operator.truediv)
+            else:
+                return node
+
+    def _unary(self) -> Evaluator:
+        if self._accept("-"):
+            operand = self._unary()
+            return lambda values, call: -operand(values, call)
+        if self._accept("+"):
+            return self._unary()
+        return self._power()
+
+    def _power(self) -> Evaluator:
+        base = self._atom()
+        if self._accept("**"):
+            return _binary(base, self._unary(), operator.pow)
+        return base
+
+    def _atom(self) -> Evaluator:
+        token = self._peek()
+        if token is None:
+            raise ExpressionError(f"Unexpected end of expression '{self.source}'")
+        kind, text = token
+        self.pos += 1
+
+        if kind == "number":
+            constant = float(text)
+            return lambda values, call: constant
+
+        if kind == "name":
+            if self._accept("("):
+                return self._call(text)
+            self.inputs.setdefault(text)
+            if self._accept("?"):
+                self.optional.setdefault(text)
+                return lambda values, call: values.get(text, 0.0)
+            return _required(text, self.source)
+
+        if kind == "op" and text == "(":
+            node = self._expr()
+            self._expect(")")
+            return node
+
+        raise ExpressionError(f"Unexpected {text!r} in expression '{self.source}'")
+
+    def _call(self, name: str) -> Evaluator:
+        if name not in self.known_functions:
+            raise ExpressionError(f"Unknown function '{name}' in expression '{self.source}'")
+        self.functions.setdefault(name)
+
+        # Arguments are passed through unevaluated: a concept name and optional literals
+        args: List[str] = []
+        while not self._accept(")"):
+            if args:
+                self._expect(",")
+            token = self._peek()
+            if token is None or token[0] not in ("name", "number"):
+                raise ExpressionError(f"Invalid argument to {name}() in expression '{self.source}'")
+            self.pos += 1
+            if token[0] == "name":
+                self.inputs.setdefault(token[1])
+            args.append(token[1])
+
+        frozen_args = tuple(args)
+
+        def evaluate_call(values, call):
+            if call is None:
+                raise ExpressionError(f"No handler for function '{name}' in expression '{self.source}'")
+            return call(name, frozen_args)
+
+        return evaluate_call
+
+
+def _binary(left: Evaluator, right: Evaluator, op: Callable) -> Evaluator:
+    return lambda values, call: op(left(values, call), right(values, call))
+
+
+def _required(name: str, source: str) -> Evaluator:
+    def evaluate_input(values, call):
+        try:
+            return values[name]
+        except KeyError:
+            raise ExpressionError(f"Missing input '{name}' for expression '{source}'") from None
+
+    return evaluate_input
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str, functions: FrozenSet[str] = KNOWN_FUNCTIONS) -> CompiledExpression:
+    """Parse ``source`` once; repeated calls with the same text return the cached result"""
+    parser = _Parser(source.strip(), functions)
+    evaluator = parser.parse()
+    return CompiledExpression(
+        source=source,
+        inputs=tuple(parser.inputs),
+        optional_inputs=frozenset(parser.optional),
+        functions=tuple(parser.functions),
+        _evaluate=evaluator,
+    )
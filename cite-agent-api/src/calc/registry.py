@@ -8,6 +8,8 @@ import structlog
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 
+from src.calc.expressions import CompiledExpression, ExpressionError, compile_expression
+
 
 def _resolve_default_config(config_path: Optional[str]) -> Path:
     """Resolve configuration path relative to project root when needed."""
@@ -39,6 +41,8 @@ class KPIRegistry:
         self.functions = {}
         self.output_types = {}
         self.overrides = {}
+        self.compiled: Dict[str, CompiledExpression] = {}
+        self.compile_errors: Dict[str, str] = {}
         
         self._load_config()
     
@@ -67,18 +71,58 @@ class KPIRegistry:
             # Load overrides
             self.overrides = config.get("overrides", {})
             
+            # Parse every metric expression once, up front
+            self._compile_metrics()
+            
             logger.info(
                 "KPI registry loaded",
                 inputs_count=len(self.inputs),
                 metrics_count=len(self.metrics),
                 functions_count=len(self.functions),
-                overrides_count=len(self.overrides)
+                overrides_count=len(self.overrides),
+                compile_errors=len(self.compile_errors)
             )
             
         except Exception as e:
             logger.error("Failed to load KPI config", error=str(e))
             raise
     
+    def _compile_metrics(self):
+        """Compile metric and issuer-override expressions into cached evaluators"""
+        self.compiled = {}
+        self.compile_errors = {}
+        
+        for name, metric_def in self.metrics.items():
+            compiled = self._try_compile(name, metric_def.get("expr", ""))
+            if compiled is not None:
+                self.compiled[name] = compiled
+        
+        # Warm the shared expression cache for issuer overrides too
+        for cik, issuer in self.overrides.items():
+            for name, metric_def in (issuer or {}).get("metrics", {}).items():
+                if metric_def.get("expr"):
+                    self._try_compile(f"{cik}:{name}", metric_def["expr"])
+    
+    def _try_compile(self, key: str, expr: Any) -> Optional[CompiledExpression]:
+        try:
+            return compile_expression(str(expr))
+        except ExpressionError as e:
+            self.compile_errors[key] = str(e)
+            logger.debug("KPI expression not compiled", metric=key, error=str(e))
+            return None
+    
+    def get_compiled(self, metric_name: str, cik: Optional[str] = None) -> Optional[CompiledExpression]:
+        """Get the compiled expression for a metric (issuer overrides applied)"""
+        metric_def = self.get_metric(metric_name, cik)
+        if not metric_def:
+            return None
+        if not cik or metric_def.get("expr") == self.metrics[metric_name].get("expr"):
+            return self.compiled.get(metric_name)
+        try:
+            return compile_expression(str(metric_def.get("expr", "")))
+        except ExpressionError:
+            return None
+    
     def get_input(self, input_name: str) -> Optional[Dict[str, Any]]:
         """Get input definition by name"""
         return self.inputs.get(input_name)
@@ -113,9 +157,12 @@ class KPIRegistry:
         if not metric_def:
             return {}
         
-        # Parse expression to find required inputs
-        expr = metric_def.get("expr", "")
-        required_inputs = self._parse_expression_inputs(expr)
+        # Inputs come from the compiled expression; fall back to a token scan
+        compiled = self.compiled.get(metric_name)
+        if compiled is not None:
+            required_inputs = list(compiled.inputs)
+        else:
+            required_inputs = self._parse_expression_inputs(metric_def.get("expr", ""))
         
         # Get input definitions
         inputs = {}
@@ -210,6 +257,12 @@ class KPIRegistry:
             if not self._is_valid_syntax(expr):
                 result["errors"].append("Invalid expression syntax")
                 result["valid"] = False
+            else:
+                try:
+                    compile_expression(expr)
+                except ExpressionError as e:
+                    result["errors"].append(str(e))
+                    result["valid"] = False
             
         except Exception as e:
             result["errors"].append(f"Parse error: {str(e)}")
@@ -274,6 +327,8 @@ class KPIRegistry:
             "functions_count": len(self.functions),
             "output_types_count": len(self.output_types),
             "overrides_count": len(self.overrides),
+            "compiled_count": len(self.compiled),
+            "compile_errors": dict(self.compile_errors),
             "config_path": str(self.config_path),
             "last_modified": self.config_path.stat().st_mtime if self.config_path.exists() else None
         }
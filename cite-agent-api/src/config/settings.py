@@ -33,6 +33,11 @@ class Settings(BaseSettings):
     # Database
     database_url: str = Field(default="", description="Database connection URL")
     redis_url: str = Field(default="redis://localhost:6379", description="Redis connection URL")
+    db_pool_min_size: int = Field(default=2, description="Connections kept open in the asyncpg pool")
+    db_pool_max_size: int = Field(default=10, description="Upper bound of the asyncpg pool")
+    db_pool_max_inactive_lifetime: float = Field(default=300.0, description="Seconds before idle pooled connections are closed")
+    db_statement_cache_size: int = Field(default=256, description="Per-connection prepared statement cache size")
+    db_command_timeout: float = Field(default=30.0, description="Default query timeout in seconds")
     
     # App Configuration
     environment: str = Field(default="development", description="Environment (development, staging, production)")
@@ -42,6 +47,10 @@ class Settings(BaseSettings):
     # Rate Limiting
     rate_limit_per_hour: int = Field(default=100, description="Rate limit per hour")
     rate_limit_burst: int = Field(default=10, description="Rate limit burst")
+    rate_limit_backend: str = Field(default="memory", description="Limiter counter store (memory, redis)")
+    rate_limit_buckets: int = Field(default=10, description="Sub-buckets per sliding rate-limit window")
+    rate_limit_sweep_seconds: float = Field(default=60.0, description="Interval between idle-key sweeps of the in-process limiter")
+    rate_limit_max_keys: int = Field(default=100000, description="Upper bound of keys tracked by the in-process limiter")
     
     # Monitoring
     sentry_dsn: str = Field(default="", description="Sentry DSN for error tracking")
@@ -62,14 +71,36 @@ class Settings(BaseSettings):
     max_tokens: int = Field(default=1000, description="Maximum tokens for LLM responses")
     temperature: float = Field(default=0.7, description="LLM temperature")
     
+    # Upstream LLM HTTP clients
+    llm_http_max_connections: int = Field(default=20, description="Connections per LLM provider client pool")
+    llm_http_max_keepalive: int = Field(default=10, description="Idle keep-alive connections kept per LLM provider")
+    llm_http_keepalive_expiry: float = Field(default=60.0, description="Seconds an idle LLM connection is kept open")
+    llm_http2: bool = Field(default=True, description="Negotiate HTTP/2 with LLM providers when h2 is installed")
+    llm_hedge_requests: bool = Field(default=False, description="Fire the next LLM provider when the current one exceeds its latency budget")
+    llm_hedge_delay_ms: float = Field(default=2500.0, description="Latency budget before hedging when a provider has no latency history")
+    
     # Search Configuration
     default_search_limit: int = Field(default=10, description="Default search result limit")
     max_search_limit: int = Field(default=100, description="Maximum search result limit")
+    search_latency_budget: float = Field(default=6.0, description="Seconds a multi-source paper search waits before returning what it has")
+    search_http_connections: int = Field(default=50, description="Connections in the shared scholarly-API session pool")
+    offline_corpus_dir: str = Field(default="", description="Directory of the offline paper index (defaults to data/offline_corpus)")
+    offline_corpus_max_papers: int = Field(default=200000, description="Papers the offline corpus holds before it stops adding new ones")
+    citation_verify_ttl: int = Field(default=86400, description="Seconds a reachable citation URL stays verified in the cache")
+    citation_verify_negative_ttl: int = Field(default=600, description="Seconds a broken citation URL is remembered before it is checked again")
+    citation_verify_per_host: int = Field(default=4, description="Concurrent verification requests per host")
+    citation_verify_cache_entries: int = Field(default=10000, description="Citation URLs kept in the verification cache")
+    citation_verify_allow_private: bool = Field(default=False, description="Let citation verification reach private, loopback and link-local addresses")
     
     # Cache Configuration
     cache_ttl: int = Field(default=3600, description="Cache TTL in seconds")
     enable_caching: bool = Field(default=True, description="Enable caching")
     
+    # SEC companyfacts snapshot cache
+    sec_snapshot_dir: str = Field(default="", description="Directory for companyfacts snapshots (defaults to data/sec/companyfacts)")
+    sec_snapshot_max_age: int = Field(default=21600, description="Seconds a companyfacts snapshot is served without revalidation")
+    sec_snapshot_memory_entries: int = Field(default=8, description="Parsed companyfacts snapshots kept in memory")
+    
     # FinSight Configuration
     finsight_strict: bool = Field(default=True, description="Enable strict mode (no mocks)")
     
@@ -0,0 +1,136 @@
+"""
+Shared asyncpg connection pool
+Created in the app lifespan and handed to routes through a FastAPI dependency
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import asyncpg
+import structlog
+
+from src.config.settings import get_settings
+
+logger = structlog.get_logger(__name__)
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+# Saturation counters, reported by pool_stats()
+_stats: Dict[str, float] = {
+    "acquired": 0,
+    "waiting": 0,
+    "max_waiting": 0,
+    "acquire_wait_seconds_total": 0.0,
+    "acquire_wait_seconds_max": 0.0,
+}
+
+
+def _database_url() -> str:
+    return os.getenv("DATABASE_URL") or get_settings().database_url or "postgresql://localhost/nocturnal_archive"
+
+
+async def init_db_pool(dsn: Optional[str] = None) -> Optional[asyncpg.Pool]:
+    """Create the shared pool (idempotent); returns None when Postgres is unreachable"""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+
+    async with _pool_lock:
+        if _pool is not None:
+            return _pool
+
+        settings = get_settings()
+        try:
+            _pool = await asyncpg.create_pool(
+                dsn or _database_url(),
+                min_size=settings.db_pool_min_size,
+                max_size=settings.db_pool_max_size,
+                max_inactive_connection_lifetime=settings.db_pool_max_inactive_lifetime,
+                statement_cache_size=settings.db_statement_cache_size,
+                command_timeout=settings.db_command_timeout,
+            )
+            logger.info(
+                "Database pool created",
+                min_size=settings.db_pool_min_size,
+                max_size=settings.db_pool_max_size,
+            )
+        except Exception as e:
+            logger.warning("Database pool unavailable", error=str(e))
+            _pool = None
+        return _pool
+
+
+async def close_db_pool() -> None:
+    """Close the shared pool on shutdown"""
+    global _pool, _pool_lock
+    pool, _pool, _pool_lock = _pool, None, None
+    if pool is not None:
+        await pool.close()
+        logger.info("Database pool closed")
+
+
+async def get_db_pool() -> asyncpg.Pool:
+    """Return the shared pool, creating it lazily outside the lifespan"""
+    pool = _pool or await init_db_pool()
+    if pool is None:
+        raise RuntimeError("Database pool is not available")
+    return pool
+
+
+@asynccontextmanager
+async def acquire(pool: Optional[asyncpg.Pool] = None) -> AsyncIterator[asyncpg.Connection]:
+    """Borrow a pooled connection, recording how long the caller waited"""
+    pool = pool or await get_db_pool()
+
+    _stats["waiting"] += 1
+    _stats["max_waiting"] = max(_stats["max_waiting"], _stats["waiting"])
+    start = time.perf_counter()
+    try:
+        conn = await pool.acquire()
+    finally:
+        _stats["waiting"] -= 1
+    waited = time.perf_counter() - start
+    _stats["acquired"] += 1
+    _stats["acquire_wait_seconds_total"] += waited
+    _stats["acquire_wait_seconds_max"] = max(_stats["acquire_wait_seconds_max"], waited)
+
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+async def get_db_connection() -> AsyncIterator[asyncpg.Connection]:
+    """FastAPI dependency yielding a pooled connection for the request"""
+    async with acquire() as conn:
+        yield conn
+
+
+def pool_stats() -> Dict[str, float]:
+    """Pool size and saturation figures for monitoring"""
+    stats = dict(_stats)
+    if _pool is None:
+        stats.update({"available": False})
+        return stats
+
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    max_size = _pool.get_max_size()
+    stats.update({
+        "available": True,
+        "size": size,
+        "idle": idle,
+        "in_use": size - idle,
+        "min_size": _pool.get_min_size(),
+        "max_size": max_size,
+        "saturation": (size - idle) / max_size if max_size else 0.0,
+        "acquire_wait_seconds_avg": (
+            stats["acquire_wait_seconds_total"] / stats["acquired"] if stats["acquired"] else 0.0
+        ),
+    })
+    return stats
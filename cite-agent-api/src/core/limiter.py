@@ -0,0 +1,347 @@
+"""
+Shared rate limiter engine
+Bucketed sliding-window counters with an in-process store and an atomic Redis Lua store
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import structlog
+
+from src.config.settings import get_settings
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """``limit`` requests per sliding ``window`` seconds, counted in ``buckets`` sub-windows
+
+    Memory per key is bounded by ``buckets`` counters; the window slides one
+    bucket (``window / buckets`` seconds) at a time.
+    """
+    limit: int
+    window: float
+    buckets: int = 10
+
+    @property
+    def width(self) -> float:
+        return self.window / self.buckets
+
+    def bucket(self, now: float) -> int:
+        return int(now // self.width)
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Outcome of one limiter check, reported for the most restrictive window"""
+    allowed: bool
+    limit: int
+    used: int
+    remaining: int
+    window: float
+    reset: float        # epoch seconds at which the oldest counted bucket leaves the window
+    retry_after: float  # seconds until the request would be admitted (0 when allowed)
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(int(math.ceil(self.reset))),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, int(math.ceil(self.retry_after))))
+        return headers
+
+
+def _summarize(rule: RateLimit, counts: Dict[int, int], now: float, cost: int, allowed: bool) -> RateLimitResult:
+    """Describe one window from its live bucket counts (after recording the hit, if admitted)"""
+    used = sum(counts.values())
+    ordered = sorted(counts.items())
+    reset = (ordered[0][0] + rule.buckets) * rule.width if ordered else now + rule.window
+
+    retry_after = 0.0
+    if not allowed and used + cost > rule.limit:
+        retry_after = rule.window
+        freed = 0
+        for bucket, count in ordered:
+            freed += count
+            if used - freed + cost <= rule.limit:
+                retry_after = max(0.0, (bucket + rule.buckets) * rule.width - now)
+                break
+
+    return RateLimitResult(
+        allowed=allowed,
+        limit=rule.limit,
+        used=used,
+        remaining=max(0, rule.limit - used),
+        window=rule.window,
+        reset=reset,
+        retry_after=retry_after,
+    )
+
+
+def _most_restrictive(results: List[RateLimitResult]) -> RateLimitResult:
+    if not results[0].allowed:
+        return max(results, key=lambda r: r.retry_after)
+    return min(results, key=lambda r: r.remaining)
+
+
+def _window_key(key: str, rule: RateLimit) -> str:
+    return f"{key}|{rule.window:g}"
+
+
+class _Window:
+    __slots__ = ("counts", "expires_at")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.expires_at = 0.0
+
+
+class LocalLimiterBackend:
+    """In-process counters, safe to share between threads
+
+    Each (key, window) pair holds at most ``buckets`` counters. Keys whose
+    buckets have all left their window are swept every ``sweep_interval``
+    seconds, and the least recently used keys are dropped beyond ``max_keys``.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0, max_keys: int = 100000):
+        self.sweep_interval = sweep_interval
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._stats = {"allowed": 0, "denied": 0, "evicted_idle": 0, "evicted_lru": 0, "sweeps": 0}
+
+    def hit(self, key: str, rules: Sequence[RateLimit], cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        """Count one request against every rule; nothing is recorded unless all of them admit it"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+
+            windows = [self._window(_window_key(key, rule), rule, now) for rule in rules]
+            allowed = all(sum(w.counts.values()) + cost <= rule.limit for w, rule in zip(windows, rules))
+            if allowed:
+                for window, rule in zip(windows, rules):
+                    current = rule.bucket(now)
+                    window.counts[current] = window.counts.get(current, 0) + cost
+                    window.expires_at = (current + rule.buckets) * rule.width
+                self._stats["allowed"] += 1
+            else:
+                self._stats["denied"] += 1
+
+            results = [_summarize(rule, w.counts, now, cost, allowed) for w, rule in zip(windows, rules)]
+            self._trim()
+        return _most_restrictive(results)
+
+    def peek(self, key: str, rules: Sequence[RateLimit], now: Optional[float] = None) -> RateLimitResult:
+        """Report usage without counting a request"""
+        now = time.time() if now is None else now
+        results = []
+        with self._lock:
+            for rule in rules:
+                window = self._windows.get(_window_key(key, rule))
+                counts = self._live(window, rule, now) if window is not None else {}
+                results.append(_summarize(rule, counts, now, 0, True))
+        return _most_restrictive(results)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._windows.clear()
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop idle keys now; returns how many were evicted"""
+        with self._lock:
+            return self._sweep(time.time() if now is None else now)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._stats, "keys": len(self._windows), "max_keys": self.max_keys}
+
+    def _window(self, window_key: str, rule: RateLimit, now: float) -> _Window:
+        window = self._windows.get(window_key)
+        if window is None:
+            window = self._windows[window_key] = _Window()
+        else:
+            self._windows.move_to_end(window_key)
+            self._live(window, rule, now)
+        return window
+
+    @staticmethod
+    def _live(window: _Window, rule: RateLimit, now: float) -> Dict[int, int]:
+        oldest = rule.bucket(now) - rule.buckets
+        stale = [bucket for bucket in window.counts if bucket <= oldest]
+        for bucket in stale:
+            del window.counts[bucket]
+        return window.counts
+
+    def _sweep(self, now: float) -> int:
+        idle = [k for k, window in self._windows.items() if window.expires_at <= now]
+        for window_key in idle:
+            del self._windows[window_key]
+        self._last_sweep = now
+        self._stats["sweeps"] += 1
+        self._stats["evicted_idle"] += len(idle)
+        return len(idle)
+
+    def _trim(self) -> None:
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+            self._stats["evicted_lru"] += 1
+
+
+# KEYS[i]: one hash per (key, window), field = bucket index, value = count
+# ARGV: now, cost, then (limit, width, buckets) for each key
+# Returns {allowed, {current, bucket, count, ...} per key}, counts taken before this hit
+HIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local allowed = 1
+local windows = {}
+for i, key in ipairs(KEYS) do
+  local limit = tonumber(ARGV[3 * i])
+  local width = tonumber(ARGV[3 * i + 1])
+  local buckets = tonumber(ARGV[3 * i + 2])
+  local current = math.floor(now / width)
+  local fields = redis.call('HGETALL', key)
+  local live = {current}
+  local used = 0
+  for j = 1, #fields, 2 do
+    local bucket = tonumber(fields[j])
+    if bucket <= current - buckets then
+      redis.call('HDEL', key, fields[j])
+    else
+      local count = tonumber(fields[j + 1])
+      used = used + count
+      table.insert(live, bucket)
+      table.insert(live, count)
+    end
+  end
+  if used + cost > limit then
+    allowed = 0
+  end
+  windows[i] = live
+end
+if allowed == 1 then
+  for i, key in ipairs(KEYS) do
+    local width = tonumber(ARGV[3 * i + 1])
+    local buckets = tonumber(ARGV[3 * i + 2])
+    redis.call('HINCRBY', key, string.format('%d', windows[i][1]), cost)
+    redis.call('PEXPIRE', key, math.ceil(width * buckets * 1000))
+  end
+end
+return {allowed, unpack(windows)}
+"""
+
+
+class RedisLimiterBackend:
+    """Counters in Redis, checked and updated atomically by one Lua script per request"""
+
+    def __init__(self, client, prefix: str = "ratelimit"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(HIT_SCRIPT)
+
+    async def hit(self, key: str, rules: Sequence[RateLimit], cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        keys = [f"{self.prefix}:{_window_key(key, rule)}" for rule in rules]
+        args: List[object] = [repr(now), cost]
+        for rule in rules:
+            args.extend([rule.limit, repr(rule.width), rule.buckets])
+
+        reply = await self._script(keys=keys, args=args)
+        allowed = bool(int(reply[0]))
+        results = []
+        for rule, live in zip(rules, reply[1:]):
+            current, flat = int(live[0]), [int(v) for v in live[1:]]
+            counts = dict(zip(flat[0::2], flat[1::2]))
+            if allowed:
+                counts[current] = counts.get(current, 0) + cost
+            results.append(_summarize(rule, counts, now, cost, allowed))
+        return _most_restrictive(results)
+
+
+class Limiter:
+    """Async front door used by the rate-limit middlewares
+
+    Uses Redis when configured; while Redis is failing, requests are counted
+    in-process and Redis is retried after ``retry_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        redis_backend: Optional[RedisLimiterBackend] = None,
+        local: Optional[LocalLimiterBackend] = None,
+        retry_interval: float = 30.0,
+    ):
+        self.redis = redis_backend
+        self.local = local or get_local_limiter()
+        self.retry_interval = retry_interval
+        self._redis_down_until = 0.0
+
+    @property
+    def backend(self) -> str:
+        if self.redis is None:
+            return "memory"
+        return "memory" if time.time() < self._redis_down_until else "redis"
+
+    async def hit(self, key: str, rules: Sequence[RateLimit], cost: int = 1) -> RateLimitResult:
+        if self.redis is not None and time.time() >= self._redis_down_until:
+            try:
+                return await self.redis.hit(key, rules, cost)
+            except Exception as e:
+                self._redis_down_until = time.time() + self.retry_interval
+                logger.warning("Redis rate limiter unavailable, counting in-process", error=str(e))
+        return self.local.hit(key, rules, cost)
+
+
+_local_limiter: Optional[LocalLimiterBackend] = None
+_limiter: Optional[Limiter] = None
+_singleton_lock = threading.Lock()
+
+
+def get_local_limiter() -> LocalLimiterBackend:
+    """Process-wide in-process counter store"""
+    global _local_limiter
+    if _local_limiter is None:
+        with _singleton_lock:
+            if _local_limiter is None:
+                settings = get_settings()
+                _local_limiter = LocalLimiterBackend(
+                    sweep_interval=settings.rate_limit_sweep_seconds,
+                    max_keys=settings.rate_limit_max_keys,
+                )
+    return _local_limiter
+
+
+def get_limiter() -> Limiter:
+    """Process-wide limiter, backed by Redis when ``rate_limit_backend`` is ``redis``"""
+    global _limiter
+    if _limiter is None:
+        settings = get_settings()
+        redis_backend = None
+        if settings.rate_limit_backend == "redis":
+            import redis.asyncio as redis
+
+            redis_backend = RedisLimiterBackend(redis.from_url(settings.redis_url))
+        _limiter = Limiter(redis_backend)
+    return _limiter
+
+
+def default_rule(limit: int, window: float) -> RateLimit:
+    """A rule using the configured bucket count"""
+    return RateLimit(limit, window, get_settings().rate_limit_buckets)
+
+
+def limiter_stats() -> Dict[str, float]:
+    """Counters of the in-process store plus the active backend"""
+    stats = get_local_limiter().stats()
+    stats["backend"] = _limiter.backend if _limiter is not None else get_settings().rate_limit_backend
+    return stats
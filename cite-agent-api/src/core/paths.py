@@ -11,6 +11,10 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 SYMBOL_MAP_JSON = DATA_DIR / "company_tickers.json"
 SYMBOL_MAP_PARQUET = DATA_DIR / "symbol_map.parquet"
 
+# Offline paper corpus (seed papers and the on-disk search index)
+OFFLINE_PAPERS_JSON = DATA_DIR / "offline_papers.json"
+OFFLINE_CORPUS_DIR = DATA_DIR / "offline_corpus"
+
 # SEC filings directory
 SEC_DIR = DATA_DIR / "sec"
 SEC_DIR.mkdir(parents=True, exist_ok=True)
@@ -18,3 +22,6 @@ SEC_DIR.mkdir(parents=True, exist_ok=True)
 # SEC facts and documents
 SEC_FACTS_PARQUET = SEC_DIR / "facts.parquet"
 SEC_SECTIONS_PARQUET = SEC_DIR / "sections.parquet"
+
+# Cached companyfacts snapshots (one gzip file per CIK)
+SEC_COMPANYFACTS_DIR = SEC_DIR / "companyfacts"
@@ -2,18 +2,20 @@
 Simple in-process rate limiting for pilot/demo use
 """
 
-import time
-import threading
-from collections import defaultdict
-from typing import Dict, List
+import math
+from typing import Dict
 from fastapi import Request, HTTPException, status
-from fastapi.responses import JSONResponse
+
+from src.core.limiter import default_rule, get_local_limiter
 
 # Configuration
 WINDOW = 60      # seconds
 LIMIT = 120      # max requests per key per WINDOW
-_hits: Dict[str, List[float]] = defaultdict(list)
-_lock = threading.Lock()  # Thread safety for concurrent requests
+
+
+def _key(api_key: str) -> str:
+    return f"pilot:{api_key}"
+
 
 def rate_limit(request: Request):
     """
@@ -32,56 +34,22 @@ def rate_limit(request: Request):
     
     key = api_key or f"anon:{request.client.host if request.client else 'unknown'}"
     
-    now = time.time()
-    
-    # Thread-safe access to rate limit data
-    with _lock:
-        q = _hits[key]
-        
-        # Clean old entries outside the window
-        while q and now - q[0] > WINDOW:
-            q.pop(0)
-        
-        # Check if limit exceeded
-        if len(q) >= LIMIT:
-            retry_after = int(WINDOW - (now - q[0])) if q else WINDOW
-            remaining = LIMIT - len(q)
-            
-            # Create error response with proper headers
-            error_response = JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={
-                    "error": "rate_limited",
-                    "message": f"Rate limit exceeded. Maximum {LIMIT} requests per {WINDOW} seconds.",
-                    "retry_after": retry_after
-                }
-            )
-            
-            # Add rate limit headers to error response
-            error_response.headers["X-RateLimit-Limit"] = str(LIMIT)
-            error_response.headers["X-RateLimit-Remaining"] = str(remaining)
-            error_response.headers["X-RateLimit-Reset"] = str(int(q[0] + WINDOW) if q else int(now + WINDOW))
-            error_response.headers["Retry-After"] = str(retry_after)
-            
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail={
-                    "error": "rate_limited",
-                    "message": f"Rate limit exceeded. Maximum {LIMIT} requests per {WINDOW} seconds.",
-                    "retry_after": retry_after
-                }
-            )
-        
-        # Record this request
-        q.append(now)
+    result = get_local_limiter().hit(_key(key), (default_rule(LIMIT, WINDOW),))
     
-    # Add rate limit headers to response
-    remaining = LIMIT - len(q)
-    reset_time = int(q[0] + WINDOW) if q else int(now + WINDOW)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "error": "rate_limited",
+                "message": f"Rate limit exceeded. Maximum {LIMIT} requests per {WINDOW} seconds.",
+                "retry_after": int(math.ceil(result.retry_after))
+            },
+            headers=result.headers()
+        )
     
     # Store in request state for middleware to add headers
-    request.state.rate_limit_remaining = remaining
-    request.state.rate_limit_reset = reset_time
+    request.state.rate_limit_remaining = result.remaining
+    request.state.rate_limit_reset = int(result.reset)
 
 def get_rate_limit_stats(key: str) -> Dict[str, int]:
     """
@@ -93,24 +61,16 @@ def get_rate_limit_stats(key: str) -> Dict[str, int]:
     Returns:
         Dictionary with rate limit stats
     """
-    now = time.time()
+    result = get_local_limiter().peek(_key(key), (default_rule(LIMIT, WINDOW),))
     
-    with _lock:
-        q = _hits[key]
-        
-        # Clean old entries
-        while q and now - q[0] > WINDOW:
-            q.pop(0)
-        
-        return {
-            "requests_in_window": len(q),
-            "limit": LIMIT,
-            "remaining": LIMIT - len(q),
-            "window_seconds": WINDOW,
-            "reset_at": int(q[0] + WINDOW) if q else int(now + WINDOW)
-        }
+    return {
+        "requests_in_window": result.used,
+        "limit": LIMIT,
+        "remaining": result.remaining,
+        "window_seconds": WINDOW,
+        "reset_at": int(result.reset)
+    }
 
 def clear_rate_limits():
     """Clear all rate limit data (useful for testing)"""
-    global _hits
-    _hits.clear()
+    get_local_limiter().clear()
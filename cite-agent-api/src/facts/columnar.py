@@ -0,0 +1,251 @@
+"""
+Columnar Facts Storage
+Array-backed columns and cached lookup indexes for XBRL facts
+"""
+
+import json
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MISSING = -1
+
+# Expected duration ranges (in days) used to drop YTD/cumulative values
+DURATION_BOUNDS = {
+    "Q": (60, 120),   # Quarterly: ~90 days
+    "A": (300, 400),  # Annual: ~365 days
+}
+
+
+def _derived_url(cik: str, accession: str) -> str:
+    return f"https://www.sec.gov/Archives/edgar/data/{cik}/{accession}"
+
+
+class Interner:
+    """Maps hashable values to dense integer ids"""
+
+    def __init__(self):
+        self._ids: Dict[Hashable, int] = {}
+        self.values: List[Any] = []
+
+    def intern(self, value: Optional[Hashable]) -> int:
+        if value is None:
+            return MISSING
+        idx = self._ids.get(value)
+        if idx is None:
+            idx = len(self.values)
+            self._ids[value] = idx
+            self.values.append(value)
+        return idx
+
+    def lookup(self, idx: int) -> Any:
+        return None if idx == MISSING else self.values[idx]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class FactPools:
+    """Interning tables shared by every column set of a store"""
+
+    def __init__(self):
+        self.strings = Interner()
+        self.flags = Interner()
+        self._dimension_ids = Interner()
+        self._dimensions: List[Dict[str, str]] = []
+        self._ordinals: Dict[str, int] = {}
+
+    def intern_dimensions(self, dimensions: Optional[Dict[str, str]]) -> int:
+        dimensions = dimensions or {}
+        key = json.dumps(dimensions, sort_keys=True, default=str)
+        idx = self._dimension_ids.intern(key)
+        if idx == len(self._dimensions):
+            self._dimensions.append(dict(dimensions))
+        return idx
+
+    def dimensions(self, idx: int) -> Dict[str, str]:
+        return dict(self._dimensions[idx])
+
+    def dimension_ids_for_segment(self, segment: str) -> List[int]:
+        return [
+            idx for idx, dims in enumerate(self._dimensions)
+            if dims.get("BusinessSegment") == segment
+        ]
+
+    def ordinal(self, value: Optional[str]) -> int:
+        """Return the proleptic ordinal of a YYYY-MM-DD string, or MISSING"""
+        if not value:
+            return MISSING
+        ordinal = self._ordinals.get(value)
+        if ordinal is None:
+            try:
+                ordinal = datetime.strptime(value, "%Y-%m-%d").toordinal()
+            except (ValueError, TypeError):
+                ordinal = MISSING
+            self._ordinals[value] = ordinal
+        return ordinal
+
+
+@dataclass
+class ConceptIndex:
+    """Precomputed row orderings for one (frequency, segment) selection"""
+    rows: np.ndarray                     # matching rows in insertion order
+    by_period: np.ndarray                # rows sorted by period label, newest first
+    latest: np.ndarray                   # duration-filtered rows sorted by end date, newest first
+    newest: Optional[int] = None         # row with the greatest (end date, period)
+    period_rows: Dict[str, int] = field(default_factory=dict)
+
+
+class ConceptColumns:
+    """Facts for a single (company, concept) pair stored as parallel arrays"""
+
+    _INT_COLUMNS = (
+        "start", "end", "period", "start_label", "end_label", "unit", "accession",
+        "fragment", "url", "dimensions", "flags", "company", "cik",
+    )
+
+    def __init__(self, pools: FactPools, concept: str):
+        self.pools = pools
+        self.concept = concept
+        self.value = np.empty(0, dtype=np.float64)
+        self.instant = np.empty(0, dtype=np.bool_)
+        self.quarterly = np.empty(0, dtype=np.bool_)
+        for name in self._INT_COLUMNS:
+            setattr(self, name, np.empty(0, dtype=np.int32))
+        self._indexes: Dict[Tuple[Optional[str], Optional[str]], ConceptIndex] = {}
+
+    def __len__(self) -> int:
+        return int(self.value.shape[0])
+
+    def extend(self, facts: Iterable[Any]) -> None:
+        """Append Fact-like objects, interning their string fields"""
+        pools = self.pools
+        strings = pools.strings
+        values = array("d")
+        instant: List[bool] = []
+        quarterly: List[bool] = []
+        ints = {name: array("i") for name in self._INT_COLUMNS}
+
+        for fact in facts:
+            period = fact.period or ""
+            accession = fact.accession or ""
+            values.append(float(fact.value))
+            instant.append(getattr(fact.period_type, "value", fact.period_type) == "instant")
+            quarterly.append("Q" in period)
+            ints["start"].append(pools.ordinal(fact.start_date))
+            ints["end"].append(pools.ordinal(fact.end_date))
+            ints["period"].append(strings.intern(period))
+            ints["start_label"].append(strings.intern(fact.start_date))
+            ints["end_label"].append(strings.intern(fact.end_date))
+            ints["unit"].append(strings.intern(fact.unit))
+            ints["accession"].append(strings.intern(accession))
+            ints["fragment"].append(strings.intern(fact.fragment_id))
+            ints["url"].append(
+                MISSING if fact.url == _derived_url(fact.cik, accession) else strings.intern(fact.url)
+            )
+            ints["dimensions"].append(pools.intern_dimensions(fact.dimensions))
+            ints["flags"].append(pools.flags.intern(tuple(fact.quality_flags or ())))
+            ints["company"].append(strings.intern(fact.company_name))
+            ints["cik"].append(strings.intern(fact.cik))
+
+        if not values:
+            return
+
+        self.value = np.concatenate([self.value, np.frombuffer(values, dtype=np.float64)])
+        self.instant = np.concatenate([self.instant, np.array(instant, dtype=np.bool_)])
+        self.quarterly = np.concatenate([self.quarterly, np.array(quarterly, dtype=np.bool_)])
+        for name, column in ints.items():
+            current = getattr(self, name)
+            setattr(self, name, np.concatenate([current, np.frombuffer(column, dtype=np.int32)]))
+        self._indexes.clear()
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """Materialize one row as keyword arguments for a Fact"""
+        lookup = self.pools.strings.lookup
+        cik = lookup(int(self.cik[row])) or ""
+        accession = lookup(int(self.accession[row])) or ""
+        url_id = int(self.url[row])
+        return {
+            "concept": self.concept,
+            "value": float(self.value[row]),
+            "unit": lookup(int(self.unit[row])),
+            "period": lookup(int(self.period[row])),
+            "period_type": "instant" if self.instant[row] else "duration",
+            "accession": accession,
+            "fragment_id": lookup(int(self.fragment[row])),
+            "url": _derived_url(cik, accession) if url_id == MISSING else lookup(url_id),
+            "dimensions": self.pools.dimensions(int(self.dimensions[row])),
+            "quality_flags": list(self.pools.flags.lookup(int(self.flags[row])) or ()),
+            "company_name": lookup(int(self.company[row])),
+            "cik": cik,
+            "start_date": lookup(int(self.start_label[row])),
+            "end_date": lookup(int(self.end_label[row])),
+        }
+
+    def index(self, freq: Optional[str] = None, segment: Optional[str] = None) -> ConceptIndex:
+        """Return (building on first use) the lookup index for a selection"""
+        key = (freq, segment or None)
+        cached = self._indexes.get(key)
+        if cached is None:
+            cached = self._build_index(freq, segment)
+            self._indexes[key] = cached
+        return cached
+
+    def _build_index(self, freq: Optional[str], segment: Optional[str]) -> ConceptIndex:
+        mask = np.ones(len(self), dtype=np.bool_)
+        if segment:
+            mask &= np.isin(self.dimensions, self.pools.dimension_ids_for_segment(segment))
+        if freq == "Q":
+            mask &= self.quarterly
+        elif freq == "A":
+            mask &= ~self.quarterly
+        rows = np.flatnonzero(mask)
+
+        labels = self.pools.strings.values
+        periods = [labels[p] for p in self.period.tolist()]
+        ends = [labels[e] if e != MISSING else None for e in self.end_label.tolist()]
+        row_list = rows.tolist()
+
+        by_period = sorted(row_list, key=lambda r: periods[r], reverse=True)
+        latest = sorted(
+            self._filter_by_duration(rows, freq).tolist(),
+            key=lambda r: ends[r] or periods[r],
+            reverse=True,
+        )
+        newest = max(row_list, key=lambda r: (ends[r] or "", periods[r] or ""), default=None)
+
+        period_rows: Dict[str, int] = {}
+        for row in latest:
+            period_rows.setdefault(periods[row], row)
+
+        return ConceptIndex(
+            rows=rows,
+            by_period=np.asarray(by_period, dtype=np.int64),
+            latest=np.asarray(latest, dtype=np.int64),
+            newest=newest,
+            period_rows=period_rows,
+        )
+
+    def _filter_by_duration(self, rows: np.ndarray, freq: Optional[str]) -> np.ndarray:
+        """Prefer rows whose duration matches the frequency, else the shortest ones"""
+        bounds = DURATION_BOUNDS.get(freq or "")
+        if bounds is None or rows.size == 0:
+            return rows
+
+        start = self.start[rows]
+        end = self.end[rows]
+        has_duration = (start != MISSING) & (end != MISSING)
+        if not has_duration.any():
+            return rows
+
+        duration = end - start
+        min_days, max_days = bounds
+        in_range = has_duration & (duration >= min_days) & (duration <= max_days)
+        if in_range.any():
+            return rows[in_range]
+
+        shortest = duration[has_duration].min()
+        return rows[has_duration & (duration == shortest)]
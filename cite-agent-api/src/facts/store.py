@@ -5,13 +5,15 @@ Normalizes and indexes XBRL facts for efficient retrieval
 
 import asyncio
 import structlog
-from typing import Dict, List, Optional, Any, Tuple
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Any, Sequence, Tuple
 from datetime import datetime, date, timezone
 from dataclasses import dataclass
 from enum import Enum
 import json
 
 from src.config.settings import get_settings
+from src.facts.columnar import MISSING, ConceptColumns, FactPools
 try:
     from src.facts.test_data import TEST_COMPANY_DATA, TEST_COMPANY_BY_CIK
 except ModuleNotFoundError:  # pragma: no cover - optional during runtime packaging
@@ -42,13 +44,115 @@ class Fact:
     start_date: Optional[str] = None  # Start date for duration facts (YYYY-MM-DD)
     end_date: Optional[str] = None    # End date (YYYY-MM-DD)
 
+class _CompanyConceptsView(MutableMapping):
+    """concept -> facts for one company, materialized from columns on access"""
+
+    def __init__(self, store: "FactsStore", cik: str):
+        self._store = store
+        self._cik = cik
+
+    def __getitem__(self, concept: str) -> List[Fact]:
+        columns = self._store._concept_columns(self._cik, concept)
+        if columns is None:
+            raise KeyError(concept)
+        return self._store._materialize(columns)
+
+    def __setitem__(self, concept: str, facts: Sequence[Fact]) -> None:
+        self._store._set_concept_facts(self._cik, concept, facts)
+
+    def __delitem__(self, concept: str) -> None:
+        if self._store._concept_columns(self._cik, concept) is None:
+            raise KeyError(concept)
+        self._store._drop_concept_facts(self._cik, concept)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._store._columns.get(self._cik, {})))
+
+    def __len__(self) -> int:
+        return len(self._store._columns.get(self._cik, {}))
+
+
+class _CompanyFactsView(MutableMapping):
+    """cik -> concept -> facts; assignments replace a company's columns"""
+
+    def __init__(self, store: "FactsStore"):
+        self._store = store
+
+    def __getitem__(self, cik: str) -> _CompanyConceptsView:
+        if cik not in self._store._columns:
+            raise KeyError(cik)
+        return _CompanyConceptsView(self._store, cik)
+
+    def __setitem__(self, cik: str, concepts: Dict[str, Sequence[Fact]]) -> None:
+        self._store._clear_company_facts(cik)
+        self._store._columns[cik] = {}
+        for concept, facts in concepts.items():
+            self._store._set_concept_facts(cik, concept, facts)
+
+    def __delitem__(self, cik: str) -> None:
+        if cik not in self._store._columns:
+            raise KeyError(cik)
+        self._store._clear_company_facts(cik)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._store._columns))
+
+    def __len__(self) -> int:
+        return len(self._store._columns)
+
+
+class _ConceptFactsView(MutableMapping):
+    """concept -> facts across companies, backed by the per-concept CIK index"""
+
+    def __init__(self, store: "FactsStore"):
+        self._store = store
+
+    def __getitem__(self, concept: str) -> List[Fact]:
+        ciks = self._store._concept_ciks.get(concept)
+        if not ciks:
+            raise KeyError(concept)
+        facts: List[Fact] = []
+        for cik in ciks:
+            facts.extend(self._store._materialize(self._store._columns[cik][concept]))
+        return facts
+
+    def __setitem__(self, concept: str, facts: Sequence[Fact]) -> None:
+        for cik in list(self._store._concept_ciks.get(concept, ())):
+            self._store._drop_concept_facts(cik, concept)
+        by_cik: Dict[str, List[Fact]] = {}
+        for fact in facts:
+            by_cik.setdefault(fact.cik, []).append(fact)
+        for cik, company_facts in by_cik.items():
+            self._store._set_concept_facts(cik, concept, company_facts)
+
+    def __delitem__(self, concept: str) -> None:
+        ciks = self._store._concept_ciks.get(concept)
+        if not ciks:
+            raise KeyError(concept)
+        for cik in list(ciks):
+            self._store._drop_concept_facts(cik, concept)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._store._concept_ciks))
+
+    def __len__(self) -> int:
+        return len(self._store._concept_ciks)
+
+
 class FactsStore:
-    """Store for financial facts with indexing and retrieval"""
+    """Store for financial facts with indexing and retrieval
+
+    Facts are held in array-backed ``ConceptColumns`` per (cik, concept) with
+    interned strings; ``Fact`` objects are only materialized for results.
+    ``facts_by_company`` and ``facts_by_concept`` remain available as
+    dict-style views over the columns.
+    """
     
     def __init__(self):
         self.settings = get_settings()
-        self.facts_by_company: Dict[str, Dict[str, List[Fact]]] = {}
-        self.facts_by_concept: Dict[str, List[Fact]] = {}
+        self._pools = FactPools()
+        self._columns: Dict[str, Dict[str, ConceptColumns]] = {}
+        self._concept_ciks: Dict[str, Dict[str, None]] = {}
         self.company_metadata: Dict[str, Dict[str, Any]] = {}
         self._ticker_to_cik: Dict[str, str] = {}
 
@@ -103,8 +207,7 @@ class FactsStore:
             }
             
             # Initialize company facts storage
-            if cik not in self.facts_by_company:
-                self.facts_by_company[cik] = {}
+            company_columns = self._columns.setdefault(cik, {})
 
             # Ensure ticker mappings are recorded
             for ticker in company_data.get("tickers", []):
@@ -119,21 +222,19 @@ class FactsStore:
                     continue
                 
                 # Initialize concept storage
-                if concept not in self.facts_by_company[cik]:
-                    self.facts_by_company[cik][concept] = []
+                columns = company_columns.get(concept)
+                if columns is None:
+                    columns = company_columns[concept] = ConceptColumns(self._pools, concept)
+                    self._concept_ciks.setdefault(concept, {})[cik] = None
                 
-                # Store facts for this concept
+                # Facts are built one concept at a time and packed into columns
+                facts = []
                 for fact_data in concept_facts:
                     fact = self._create_fact_from_data(fact_data, concept, cik, company_name)
                     if fact:
-                        self.facts_by_company[cik][concept].append(fact)
-                        
-                        # Also store by concept for cross-company queries
-                        if concept not in self.facts_by_concept:
-                            self.facts_by_concept[concept] = []
-                        self.facts_by_concept[concept].append(fact)
-                        
-                        facts_stored += 1
+                        facts.append(fact)
+                columns.extend(facts)
+                facts_stored += len(facts)
             
             logger.info(
                 "Company facts stored",
@@ -146,65 +247,6 @@ class FactsStore:
             logger.error("Failed to store company facts", error=str(e))
             raise
     
-    def _filter_facts_by_duration(self, facts: List[Fact], freq: str) -> List[Fact]:
-        """Filter facts to match expected duration for frequency
-
-        Args:
-            facts: List of Fact objects
-            freq: "Q" for quarterly, "A" for annual
-
-        Returns:
-            Filtered list preferring facts with appropriate duration
-        """
-        if not facts:
-            return facts
-
-        # Define expected duration ranges (in days)
-        if freq == "Q":
-            min_days, max_days = 60, 120  # Quarterly: ~90 days
-        elif freq == "A":
-            min_days, max_days = 300, 400  # Annual: ~365 days
-        else:
-            return facts
-
-        # Calculate durations for all facts
-        facts_with_duration = []
-        facts_without_duration = []
-
-        for fact in facts:
-            if fact.start_date and fact.end_date:
-                try:
-                    start = datetime.strptime(fact.start_date, "%Y-%m-%d")
-                    end = datetime.strptime(fact.end_date, "%Y-%m-%d")
-                    duration = (end - start).days
-                    facts_with_duration.append((fact, duration))
-                except (ValueError, TypeError):
-                    facts_without_duration.append(fact)
-            else:
-                facts_without_duration.append(fact)
-
-        # If NO facts have duration data, can't filter
-        if not facts_with_duration:
-            logger.warning("No facts with duration data, cannot filter by period length")
-            return facts
-
-        # First try to find facts within expected duration range
-        filtered = [
-            fact for fact, duration in facts_with_duration
-            if min_days <= duration <= max_days
-        ]
-
-        if filtered:
-            logger.info(f"Filtered to {len(filtered)} facts with correct duration ({min_days}-{max_days} days)")
-            return filtered
-
-        # If no facts in expected range, prefer shortest duration (most specific)
-        logger.warning(f"No facts in expected range {min_days}-{max_days} days, using shortest duration")
-        facts_with_duration.sort(key=lambda x: x[1])
-        shortest_duration = facts_with_duration[0][1]
-
-        return [fact for fact, dur in facts_with_duration if dur == shortest_duration]
-
     def _create_fact_from_data(
         self,
         fact_data: Dict[str, Any],
@@ -291,54 +333,37 @@ class FactsStore:
                 return None
             
             # Get facts for company and concept (with lazy loading from SEC if not cached)
-            company_facts = self.facts_by_company.get(cik, {})
-            concept_facts = company_facts.get(concept, [])
+            columns = self._concept_columns(cik, concept)
 
             # If no facts found in cache, try lazy-loading from SEC Facts API
-            if not concept_facts:
+            if not columns:
                 logger.info("Facts not cached, lazy-loading from SEC", ticker=ticker, cik=cik, concept=concept)
                 await self._lazy_load_company_facts(ticker, cik)
 
                 # Try again after lazy-loading
-                company_facts = self.facts_by_company.get(cik, {})
-                concept_facts = company_facts.get(concept, [])
+                columns = self._concept_columns(cik, concept)
 
-                if not concept_facts:
+                if not columns:
                     logger.warning("No facts found even after lazy-loading", ticker=ticker, concept=concept)
                     return None
             
-            # Filter by segment if specified
-            if segment:
-                concept_facts = [f for f in concept_facts if f.dimensions.get("BusinessSegment") == segment]
-            
-            # Filter by frequency
-            if freq == "Q":
-                concept_facts = [f for f in concept_facts if "Q" in f.period]
-            elif freq == "A":
-                concept_facts = [f for f in concept_facts if "Q" not in f.period]
+            # Segment/frequency selection and orderings are cached per columns
+            index = columns.index(freq, segment)
 
-            if self._concept_data_stale(concept_facts):
+            if index.newest is not None and self._concept_data_stale([self._fact_at(columns, index.newest)]):
                 logger.warning(
                     "Stale financial data detected, attempting refresh",
                     ticker=ticker,
                     concept=concept,
-                    latest_period=concept_facts[0].period if concept_facts else None
+                    latest_period=self._pools.strings.lookup(int(columns.period[index.newest]))
                 )
 
                 await self._lazy_load_company_facts(ticker, cik, force_refresh=True)
 
-                company_facts = self.facts_by_company.get(cik, {})
-                concept_facts = company_facts.get(concept, [])
-
-                if segment:
-                    concept_facts = [f for f in concept_facts if f.dimensions.get("BusinessSegment") == segment]
+                columns = self._concept_columns(cik, concept)
+                index = columns.index(freq, segment) if columns else None
 
-                if freq == "Q":
-                    concept_facts = [f for f in concept_facts if "Q" in f.period]
-                elif freq == "A":
-                    concept_facts = [f for f in concept_facts if "Q" not in f.period]
-
-                if not concept_facts:
+                if index is None or index.newest is None:
                     logger.warning(
                         "No facts available after refresh",
                         ticker=ticker,
@@ -347,42 +372,33 @@ class FactsStore:
                     )
                     return None
 
-                if self._concept_data_stale(concept_facts):
+                if self._concept_data_stale([self._fact_at(columns, index.newest)]):
                     logger.warning(
                         "Financial data remains stale after refresh",
                         ticker=ticker,
                         concept=concept,
-                        latest_period=concept_facts[0].period if concept_facts else None
+                        latest_period=self._pools.strings.lookup(int(columns.period[index.newest]))
                     )
 
-            if not concept_facts:
+            if not index.rows.size:
                 logger.warning("No facts found for frequency", ticker=ticker, concept=concept, freq=freq)
                 return None
 
-            # Filter by duration to avoid YTD/cumulative values
-            concept_facts = self._filter_facts_by_duration(concept_facts, freq)
-
-            if not concept_facts:
+            # Duration filtering (avoids YTD/cumulative values) is part of the index
+            if not index.latest.size:
                 logger.warning("No facts found after duration filtering", ticker=ticker, concept=concept, freq=freq)
                 return None
 
-            # Sort by actual end date (most recent first), fallback to period label if no date
-            concept_facts.sort(key=lambda x: x.end_date or x.period, reverse=True)
-            
-            # Get fact for specific period
+            # Get fact for specific period (index.latest is most recent first)
             if period == "latest":
-                fact = concept_facts[0]
+                row = int(index.latest[0])
             else:
-                # Find exact period match
-                fact = None
-                for f in concept_facts:
-                    if f.period == period:
-                        fact = f
-                        break
-                
-                if not fact:
+                row = index.period_rows.get(period)
+                if row is None:
                     logger.warning("Period not found", ticker=ticker, concept=concept, period=period)
                     return None
+
+            fact = self._fact_at(columns, row)
             
             # Handle TTM if requested
             if ttm and fact.period_type == PeriodType.DURATION:
@@ -422,28 +438,64 @@ class FactsStore:
                 return []
             
             # Get facts for company and concept
-            company_facts = self.facts_by_company.get(cik, {})
-            concept_facts = company_facts.get(concept, [])
+            columns = self._concept_columns(cik, concept)
+            if not columns:
+                return []
+            
+            # Rows are pre-sorted by period (most recent first)
+            index = columns.index(freq, segment)
+            return self._materialize(columns, index.by_period[:limit])
+            
+        except Exception as e:
+            logger.error("Failed to get facts series", ticker=ticker, concept=concept, error=str(e))
+            return []
+    
+    async def get_period_series(
+        self,
+        ticker: str,
+        concept: str,
+        freq: str = "Q",
+        segment: Optional[str] = None
+    ) -> List[Fact]:
+        """
+        Get one duration-filtered fact per period end date, newest first
+        
+        Unlike get_facts_series this drops YTD/cumulative values and duplicate
+        filings of the same period, so series from different concepts can be
+        aligned on end dates.
+        
+        Args:
+            ticker: Company ticker symbol
+            concept: XBRL concept
+            freq: Frequency filter
+            segment: Business segment filter
             
-            if not concept_facts:
+        Returns:
+            List of Fact objects sorted by end date (most recent first)
+        """
+        try:
+            cik = await self._resolve_ticker_to_cik(ticker)
+            if not cik:
                 return []
             
-            # Filter by segment if specified
-            if segment:
-                concept_facts = [f for f in concept_facts if f.dimensions.get("BusinessSegment") == segment]
+            # Load the company once; a missing concept is not a reason to refetch
+            if cik not in self._columns:
+                await self._lazy_load_company_facts(ticker, cik)
             
-            # Filter by frequency
-            if freq == "Q":
-                concept_facts = [f for f in concept_facts if "Q" in f.period]
-            elif freq == "A":
-                concept_facts = [f for f in concept_facts if "Q" not in f.period]
+            columns = self._concept_columns(cik, concept)
+            if not columns:
+                return []
             
-            # Sort by period (most recent first) and limit
-            concept_facts.sort(key=lambda x: x.period, reverse=True)
-            return concept_facts[:limit]
+            index = columns.index(freq, segment)
+            rows_by_end: Dict[int, int] = {}
+            for row in index.latest.tolist():
+                end = int(columns.end[row])
+                if end != MISSING:
+                    rows_by_end.setdefault(end, row)
+            return self._materialize(columns, list(rows_by_end.values()))
             
         except Exception as e:
-            logger.error("Failed to get facts series", ticker=ticker, concept=concept, error=str(e))
+            logger.error("Failed to get period series", ticker=ticker, concept=concept, error=str(e))
             return []
     
     async def _resolve_ticker_to_cik(self, ticker: str) -> Optional[str]:
@@ -513,36 +565,31 @@ class FactsStore:
         """Calculate trailing twelve months for a duration concept"""
         try:
             # Get last 4 quarters
-            company_facts = self.facts_by_company.get(cik, {})
-            concept_facts = company_facts.get(concept, [])
+            columns = self._concept_columns(cik, concept)
+            quarterly_rows = columns.index("Q", segment).by_period if columns else []
             
-            if segment:
-                concept_facts = [f for f in concept_facts if f.dimensions.get("BusinessSegment") == segment]
-            
-            # Filter for quarterly data
-            quarterly_facts = [f for f in concept_facts if "Q" in f.period]
-            quarterly_facts.sort(key=lambda x: x.period, reverse=True)
-            
-            if len(quarterly_facts) < 4:
+            if len(quarterly_rows) < 4:
                 logger.warning("Insufficient quarterly data for TTM", cik=cik, concept=concept)
                 return None
             
             # Sum last 4 quarters
-            ttm_value = sum(f.value for f in quarterly_facts[:4])
+            last_four = quarterly_rows[:4]
+            ttm_value = float(columns.value[last_four].sum())
+            latest = self._fact_at(columns, int(last_four[0]))
             
             # Create TTM fact
             ttm_fact = Fact(
                 concept=concept,
                 value=ttm_value,
-                unit=quarterly_facts[0].unit,
+                unit=latest.unit,
                 period=f"TTM-{end_period}",
                 period_type=PeriodType.DURATION,
                 accession="TTM-CALCULATED",
                 fragment_id=None,
                 url="",
-                dimensions=quarterly_facts[0].dimensions,
+                dimensions=latest.dimensions,
                 quality_flags=["ttm_calculated"],
-                company_name=quarterly_facts[0].company_name,
+                company_name=latest.company_name,
                 cik=cik
             )
             
@@ -559,19 +606,55 @@ class FactsStore:
             return self.company_metadata.get(cik)
         return None
 
+    @property
+    def facts_by_company(self) -> _CompanyFactsView:
+        """Dict-style view: cik -> concept -> list of Fact"""
+        return _CompanyFactsView(self)
+
+    @property
+    def facts_by_concept(self) -> _ConceptFactsView:
+        """Dict-style view: concept -> list of Fact across companies"""
+        return _ConceptFactsView(self)
+
+    def _concept_columns(self, cik: str, concept: str) -> Optional[ConceptColumns]:
+        return self._columns.get(cik, {}).get(concept)
+
+    def _fact_at(self, columns: ConceptColumns, row: int) -> Fact:
+        record = columns.record(row)
+        record["period_type"] = PeriodType(record["period_type"])
+        return Fact(**record)
+
+    def _materialize(self, columns: ConceptColumns, rows: Optional[Sequence[int]] = None) -> List[Fact]:
+        if rows is None:
+            rows = range(len(columns))
+        return [self._fact_at(columns, int(row)) for row in rows]
+
+    def _set_concept_facts(self, cik: str, concept: str, facts: Sequence[Fact]) -> None:
+        """Replace the facts stored for one (cik, concept) pair"""
+        columns = ConceptColumns(self._pools, concept)
+        columns.extend(facts)
+        self._columns.setdefault(cik, {})[concept] = columns
+        self._concept_ciks.setdefault(concept, {})[cik] = None
+
+    def _drop_concept_facts(self, cik: str, concept: str) -> None:
+        self._columns.get(cik, {}).pop(concept, None)
+        ciks = self._concept_ciks.get(concept)
+        if ciks is not None:
+            ciks.pop(cik, None)
+            if not ciks:
+                self._concept_ciks.pop(concept, None)
+
     def _clear_company_facts(self, cik: str) -> None:
         """Remove cached facts for a company before refreshing."""
 
-        company_facts = self.facts_by_company.pop(cik, {})
-        if not company_facts:
-            return
-
-        for concept, facts in list(self.facts_by_concept.items()):
-            filtered = [fact for fact in facts if fact.cik != cik]
-            if filtered:
-                self.facts_by_concept[concept] = filtered
-            else:
-                self.facts_by_concept.pop(concept, None)
+        company_columns = self._columns.pop(cik, {})
+        for concept in company_columns:
+            ciks = self._concept_ciks.get(concept)
+            if ciks is None:
+                continue
+            ciks.pop(cik, None)
+            if not ciks:
+                self._concept_ciks.pop(concept, None)
 
     def _concept_data_stale(self, facts: List[Fact], max_age_years: int = 3) -> bool:
         """Return True when the newest fact in the list is older than `max_age_years`."""
@@ -674,22 +757,23 @@ class FactsStore:
     def get_store_stats(self) -> Dict[str, Any]:
         """Get statistics about the facts store"""
         total_facts = sum(
-            len(concept_facts)
-            for company_facts in self.facts_by_company.values()
-            for concept_facts in company_facts.values()
+            len(columns)
+            for company_columns in self._columns.values()
+            for columns in company_columns.values()
         )
         
         return {
-            "companies_count": len(self.facts_by_company),
-            "concepts_count": len(self.facts_by_concept),
+            "companies_count": len(self._columns),
+            "concepts_count": len(self._concept_ciks),
             "total_facts": total_facts,
             "companies": list(self.company_metadata.keys())
         }
     
     def clear_store(self):
         """Clear all stored facts"""
-        self.facts_by_company.clear()
-        self.facts_by_concept.clear()
+        self._columns.clear()
+        self._concept_ciks.clear()
+        self._pools = FactPools()
         self.company_metadata.clear()
         logger.info("Facts store cleared")
 
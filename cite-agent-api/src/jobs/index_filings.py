@@ -4,7 +4,7 @@ Index SEC filings into the RAG vector database
 from typing import List, Dict, Any
 from datetime import datetime
 from src.jobs.filings_etl import run
-from src.rag.index import upsert_docs
+from src.rag.index import upsert_docs_batched
 from src.jobs.symbol_map import cik_for_ticker
 
 
@@ -51,7 +51,13 @@ def index_ticker(ticker: str, limit: int = 1) -> Dict[str, Any]:
         
         # Index documents into vector database
         print(f"Step 3: Indexing {len(documents)} documents")
-        chunks_indexed = upsert_docs(documents)
+        upsert_stats = upsert_docs_batched(
+            documents,
+            progress=lambda stats: print(
+                f"  batch {stats.batches}: {stats.chunks} chunks "
+                f"({stats.unchanged} unchanged, {stats.chunks_per_second:.1f} chunks/s)"
+            ),
+        )
         
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
@@ -62,7 +68,9 @@ def index_ticker(ticker: str, limit: int = 1) -> Dict[str, Any]:
             "ticker": ticker.upper(),
             "status": "success",
             "documents_indexed": len(documents),
-            "chunks_indexed": chunks_indexed,
+            "chunks_indexed": upsert_stats.written,
+            "chunks_unchanged": upsert_stats.unchanged,
+            "chunks_per_second": round(upsert_stats.chunks_per_second, 1),
             "duration": duration,
             "cik": cik,
             "sections": [doc.get("section", "") for doc in documents]
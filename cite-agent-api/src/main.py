@@ -3,6 +3,7 @@ Nocturnal Archive API - Main FastAPI application
 """
 
 import logging
+import os
 import time
 from contextlib import asynccontextmanager
 from importlib import import_module
@@ -31,6 +32,12 @@ from src.middleware.request_id import RequestIdMiddleware
 from src.middleware.pilot_guards import PilotGuardsMiddleware
 from src.middleware.admin_auth import AdminAuthMiddleware
 from src.utils.resiliency import init_redis
+from src.core.db import close_db_pool, init_db_pool
+from src.services.analytics import analytics_service
+from src.services.llm_providers import close_provider_manager
+from src.services.citation_verifier import close_verifier
+from src.services.offline_corpus import close_offline_corpus
+from src.services.paper_search import close_search_session
 from src import errors
 
 
@@ -98,13 +105,19 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Startup
     logger.info("Starting Nocturnal Archive API", version="1.0.0")
     
-    # Initialize services here if needed
-    # await initialize_services()
+    # Shared Postgres pool; without a configured database it is created lazily on first use
+    if os.getenv("DATABASE_URL") or settings.database_url:
+        await init_db_pool()
     
     yield
     
     # Shutdown
     logger.info("Shutting down Nocturnal Archive API")
+    await close_db_pool()
+    await close_provider_manager()
+    await close_search_session()
+    close_offline_corpus()
+    await close_verifier()
 
 
 # Create FastAPI app
@@ -151,11 +164,22 @@ Instrumentator().instrument(app).expose(app, include_in_schema=False)
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    """Add processing time to response headers"""
+    """Add processing time to response headers and feed request analytics"""
     start_time = time.time()
     response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+
+    # Label by route template so per-endpoint sketches stay bounded
+    route = request.scope.get("route")
+    key_info = getattr(request.state, "key_info", None) or {}
+    analytics_service.record_http(
+        getattr(route, "path", "unmatched"),
+        request.method,
+        response.status_code,
+        process_time * 1000,
+        user_id=key_info.get("owner"),
+    )
     return response
 
 
@@ -226,6 +250,7 @@ _routers = {
         "search",
         "format",
         "synthesize",
+        "citations",
         "analytics",
         "diagnostics",
         "finance",
@@ -264,6 +289,7 @@ _include("simple_health", prefix="/api/health", tags=["System"])
 _include("search", prefix="/api", tags=["Search"])
 _include("format", prefix="/api", tags=["Format"])
 _include("synthesize", prefix="/api", tags=["Synthesis"])
+_include("citations", prefix="/api", tags=["Citations"])
 _include("analytics", prefix="/api", tags=["Analytics"])
 _include("diagnostics", prefix="/v1/diag", tags=["Diagnostics"])
 
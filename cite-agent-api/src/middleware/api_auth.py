@@ -73,6 +73,7 @@ class APIKeyAuthMiddleware(BaseHTTPMiddleware):
             "/api/search",
             "/api/synthesize", 
             "/api/format",
+            "/api/citations",
             "/v1/finance"
         ]
     
@@ -2,13 +2,13 @@
 Rate limiting middleware
 """
 
-import time
 import structlog
-from fastapi import Request, HTTPException
+from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
-from typing import Dict, Tuple
+from typing import Optional, Tuple
 
 from src.config.settings import get_settings
+from src.core.limiter import RateLimitResult, default_rule, get_limiter
 
 logger = structlog.get_logger(__name__)
 
@@ -22,8 +22,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         self.requests_per_hour = requests_per_hour
         self.burst_limit = burst_limit
         self.per_ip_limit = per_ip_limit  # Global per-IP fuse
-        self.requests: Dict[str, list] = {}
-        self.ip_requests: Dict[str, list] = {}
+        self.limiter = get_limiter()
         self.endpoint_limits = {
             "/api/search": {"per_minute": 30, "per_hour": 900},
             "/v1/finance": {"per_minute": 60, "per_hour": 1800},
@@ -39,7 +38,8 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         client_ip = request.client.host if request.client else "unknown"
         
         # Check rate limits
-        if not self._check_rate_limit(client_id, client_ip, request.url.path):
+        result = await self._check_rate_limit(client_id, client_ip, request.url.path)
+        if result is not None and not result.allowed:
             logger.warning(
                 "Rate limit exceeded",
                 client_id=client_id,
@@ -54,7 +54,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                     "message": "Too many requests. Please try again later.",
                     "trace_id": getattr(request.state, "trace_id", None)
                 },
-                headers={"Retry-After": "5"}
+                headers=result.headers()
             )
         
         # Process request
@@ -79,66 +79,22 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                 return limits["per_hour"], limits["per_minute"]
         return self.requests_per_hour, self.burst_limit
 
-    def _check_rate_limit(self, client_id: str, client_ip: str, path: str) -> bool:
-        """Check if client has exceeded rate limits"""
+    async def _check_rate_limit(self, client_id: str, client_ip: str, path: str) -> Optional[RateLimitResult]:
+        """Check if client has exceeded rate limits; returns the limiter verdict (None when bypassed)"""
         
-        current_time = time.time()
         hourly_limit, per_minute_limit = self._resolve_limits(path)
 
         if self.settings.environment == "test":
-            return True
+            return None
         
         # Check per-IP global fuse first
-        if not self._check_ip_limit(client_ip, current_time):
-            return False
-        
-        # Initialize client requests if not exists
-        if client_id not in self.requests:
-            self.requests[client_id] = []
-        
-        # Clean old requests (older than 1 hour)
-        hour_ago = current_time - 3600
-        self.requests[client_id] = [
-            req_time for req_time in self.requests[client_id] 
-            if req_time > hour_ago
-        ]
-        
-        # Check hourly limit (5 req/s = 18,000 per hour)
-        if len(self.requests[client_id]) >= hourly_limit:
-            return False
-        
-        # Check burst limit (requests in last minute)
-        minute_ago = current_time - 60
-        recent_requests = [
-            req_time for req_time in self.requests[client_id]
-            if req_time > minute_ago
-        ]
-        
-        if len(recent_requests) >= per_minute_limit:
-            return False
-        
-        # Add current request
-        self.requests[client_id].append(current_time)
-        return True
-    
-    def _check_ip_limit(self, client_ip: str, current_time: float) -> bool:
-        """Check per-IP global fuse"""
-        
-        # Initialize IP requests if not exists
-        if client_ip not in self.ip_requests:
-            self.ip_requests[client_ip] = []
-        
-        # Clean old requests (older than 1 minute)
-        minute_ago = current_time - 60
-        self.ip_requests[client_ip] = [
-            req_time for req_time in self.ip_requests[client_ip]
-            if req_time > minute_ago
-        ]
-        
-        # Check per-IP limit (50 req/s)
-        if len(self.ip_requests[client_ip]) >= self.per_ip_limit:
-            return False
-        
-        # Add current request
-        self.ip_requests[client_ip].append(current_time)
-        return True
+        fuse = await self.limiter.hit(f"mw:fuse:{client_ip}", (default_rule(self.per_ip_limit, 60),))
+        if not fuse.allowed:
+            return fuse
+        
+        # Hourly and burst (last minute) windows are checked together; a rejected
+        # request is not counted against either of them
+        return await self.limiter.hit(
+            f"mw:{client_id}",
+            (default_rule(hourly_limit, 3600), default_rule(per_minute_limit, 60)),
+        )
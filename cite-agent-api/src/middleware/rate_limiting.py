@@ -2,14 +2,15 @@
 Production-ready rate limiting middleware with Redis backend
 """
 
-import time
-import asyncio
-from typing import Dict, Optional, Tuple
+import math
+from typing import Dict, Tuple
 import structlog
-from fastapi import Request, HTTPException, status
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
 import redis.asyncio as redis
 
+from src.core.limiter import Limiter, RedisLimiterBackend, default_rule
+
 logger = structlog.get_logger(__name__)
 
 class RateLimiter:
@@ -17,6 +18,9 @@ class RateLimiter:
     
     def __init__(self, redis_client: redis.Redis):
         self.redis = redis_client
+        # The in-memory Redis fallback cannot run Lua; count in-process instead
+        backend = RedisLimiterBackend(redis_client) if hasattr(redis_client, "register_script") else None
+        self.limiter = Limiter(backend)
         
         # Rate limit configurations
         self.limits = {
@@ -57,42 +61,23 @@ class RateLimiter:
         else:
             return "default"
     
-    async def _get_rate_limit_key(self, client_id: str, endpoint_type: str) -> str:
-        """Generate Redis key for rate limiting"""
-        window = self.limits[endpoint_type]["window"]
-        current_window = int(time.time() // window)
-        return f"rate_limit:{endpoint_type}:{client_id}:{current_window}"
-    
     async def _check_rate_limit(self, client_id: str, endpoint_type: str) -> Tuple[bool, Dict[str, int]]:
         """Check if client is within rate limits"""
-        key = await self._get_rate_limit_key(client_id, endpoint_type)
         limit_config = self.limits[endpoint_type]
-        
-        # Use Redis pipeline for atomic operations
-        pipe = self.redis.pipeline()
-        pipe.incr(key)
-        pipe.expire(key, limit_config["window"])
-        results = await pipe.execute()
-        
-        current_count = results[0]
-        max_requests = limit_config["requests"]
-        
-        # Calculate remaining requests
-        remaining = max(0, max_requests - current_count)
-        reset_time = int(time.time() // limit_config["window"]) * limit_config["window"] + limit_config["window"]
+        result = await self.limiter.hit(
+            f"{endpoint_type}:{client_id}",
+            (default_rule(limit_config["requests"], limit_config["window"]),),
+        )
         
         rate_limit_info = {
-            "limit": max_requests,
-            "remaining": remaining,
-            "reset": reset_time,
-            "window": limit_config["window"]
+            "limit": result.limit,
+            "remaining": result.remaining,
+            "reset": int(math.ceil(result.reset)),
+            "window": limit_config["window"],
+            "retry_after": int(math.ceil(result.retry_after))
         }
         
-        # Check if limit exceeded
-        if current_count > max_requests:
-            return False, rate_limit_info
-        
-        return True, rate_limit_info
+        return result.allowed, rate_limit_info
     
     async def check_rate_limit(self, request: Request) -> Tuple[bool, Dict[str, int]]:
         """Check rate limit for a request"""
@@ -110,9 +95,8 @@ class RateLimiter:
             "X-RateLimit-Window": str(rate_limit_info["window"])
         }
         # Add Retry-After if exhausted
-        if rate_limit_info.get("remaining", 0) == 0:
-            retry_after = max(0, int(rate_limit_info["reset"] - int(time.time())))
-            headers["Retry-After"] = str(retry_after)
+        if rate_limit_info.get("retry_after", 0) > 0:
+            headers["Retry-After"] = str(rate_limit_info["retry_after"])
         return headers
 
 # Global rate limiter instance
@@ -168,14 +152,9 @@ def rate_limit(endpoint_type: str):
     async def decorator(request: Request, call_next):
         limiter = await get_rate_limiter()
         
-        # Override endpoint type for this specific request
-        original_path = request.url.path
-        request.url.path = f"/{endpoint_type}/override"
-        
-        allowed, rate_limit_info = await limiter.check_rate_limit(request)
-        
-        # Restore original path
-        request.url.path = original_path
+        allowed, rate_limit_info = await limiter._check_rate_limit(
+            limiter._get_client_id(request), endpoint_type
+        )
         
         if not allowed:
             headers = await limiter.get_rate_limit_headers(rate_limit_info)
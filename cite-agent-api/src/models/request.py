@@ -3,7 +3,7 @@ Request models
 """
 
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class SearchFilters(BaseModel):
@@ -92,3 +92,15 @@ class SynthesizeRequest(BaseModel):
             if not any(k in p for k in ['abstract', 'title']):
                 raise ValueError("Each paper must include at least 'abstract' or 'title'")
         return v
+
+
+class CitationVerifyRequest(BaseModel):
+    """Bulk citation verification request model"""
+    text: str = Field("", max_length=200000, description="Synthesis or answer whose citations are verified")
+    urls: List[str] = Field(default_factory=list, max_length=200, description="Additional URLs to verify, e.g. a reference list")
+
+    @model_validator(mode="after")
+    def require_citations(self) -> "CitationVerifyRequest":
+        if not self.text.strip() and not self.urls:
+            raise ValueError("Provide text or urls to verify")
+        return self
@@ -4,12 +4,17 @@ Embeddings service with graceful fallback when sentence transformers are unavail
 import hashlib
 import math
 import os
-from typing import List, Optional, TYPE_CHECKING, Union
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, TYPE_CHECKING, Union
 if TYPE_CHECKING:
     from sentence_transformers import SentenceTransformer as SentenceTransformerType
 else:  # pragma: no cover - typing fallback
     SentenceTransformerType = object
 
+import numpy as np
 import structlog
 
 try:
@@ -17,12 +22,18 @@ try:
 except ImportError:  # pragma: no cover - exercised when dependency missing
     SentenceTransformer = None  # type: ignore[assignment]
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
 logger = structlog.get_logger(__name__)
 
 
 # Global model cache
 _model = None
 _FALLBACK_DIM = 128
+_FALLBACK_MODEL_NAME = f"sha256-fallback-{_FALLBACK_DIM}"
 
 
 def get_embedding_model() -> Optional[SentenceTransformerType]:
@@ -71,10 +82,247 @@ def _fallback_embed(text: str) -> List[float]:
     return [v / norm for v in floats]
 
 
+class DiskEmbeddingStore:
+    """Append-only float32 vector file, memory-mapped for reads
+
+    Vectors live in ``embeddings-{dim}.f32`` and their content keys, one per
+    line in row order, in ``embeddings-{dim}.keys``. Vectors are written
+    before keys so a torn append never exposes a row that is not on disk.
+    Appends hold a flock on ``embeddings-{dim}.lock``, pick up rows other
+    processes added first and number new rows from the vector file's size.
+    """
+
+    def __init__(self, directory: Union[str, Path], dim: int):
+        self.dim = dim
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.directory / f"embeddings-{dim}.f32"
+        self._keys_path = self.directory / f"embeddings-{dim}.keys"
+        self._lock_path = self.directory / f"embeddings-{dim}.lock"
+        self._row_bytes = dim * 4
+        self._rows: Dict[str, int] = {}
+        self._count = 0
+        self._keys_bytes = 0
+        self._mmap: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        with self._locked():
+            self._load_keys()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive across threads and, through flock on a sidecar file, across processes"""
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def _size(path: Path) -> int:
+        return path.stat().st_size if path.exists() else 0
+
+    def _load_keys(self) -> None:
+        """Read the whole key index (under the lock)"""
+        keys: List[str] = []
+        if self._keys_path.exists():
+            with open(self._keys_path, "r", encoding="ascii") as f:
+                keys = [line.strip() for line in f if line.strip()]
+        size = self._size(self._vectors_path)
+
+        # Drop whatever a torn append left behind so later rows stay aligned
+        rows = min(len(keys), size // self._row_bytes)
+        if rows != len(keys) or size != rows * self._row_bytes:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(rows * self._row_bytes)
+            with open(self._keys_path, "w", encoding="ascii") as f:
+                f.write("".join(f"{key}\n" for key in keys[:rows]))
+        self._count = rows
+        self._rows = {key: row for row, key in enumerate(keys[:rows])}
+        self._keys_bytes = self._size(self._keys_path)
+        self._mmap = None
+
+    def _sync(self) -> None:
+        """Index rows other processes appended since the last look (under the lock)"""
+        size = self._size(self._keys_path)
+        if size > self._keys_bytes:
+            with open(self._keys_path, "rb") as f:
+                f.seek(self._keys_bytes)
+                data = f.read(size - self._keys_bytes)
+            for line in data.splitlines(keepends=True):
+                if not line.endswith(b"\n"):
+                    break
+                self._keys_bytes += len(line)
+                key = line.strip().decode("ascii")
+                if key:
+                    self._rows.setdefault(key, self._count)
+                    self._count += 1
+            self._mmap = None
+        if self._keys_bytes != size or self._size(self._vectors_path) != self._count * self._row_bytes:
+            # A writer died mid-append
+            self._load_keys()
+
+    def _vectors(self) -> Optional[np.memmap]:
+        if self._mmap is None and self._rows:
+            self._mmap = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim)
+            )
+        return self._mmap
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            vectors = self._vectors()
+            if vectors is None or row >= vectors.shape[0]:
+                return None
+            return np.array(vectors[row])
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        with self._locked():
+            self._sync()
+            new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._rows]
+            if not new:
+                return
+            block = np.ascontiguousarray([vector for _, vector in new], dtype=np.float32)
+            with open(self._vectors_path, "ab") as f:
+                # Rows are numbered from the file, not from what this process last wrote
+                start = f.seek(0, os.SEEK_END) // self._row_bytes
+                f.write(block.tobytes())
+            lines = "".join(f"{key}\n" for key, _ in new).encode("ascii")
+            with open(self._keys_path, "ab") as f:
+                f.write(lines)
+            self._keys_bytes += len(lines)
+            for offset, (key, _) in enumerate(new):
+                self._rows[key] = start + offset
+            self._count = start + len(new)
+            self._mmap = None
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: in-memory LRU over an optional disk store"""
+
+    def __init__(self, max_entries: int = 10000, directory: Optional[Union[str, Path]] = None):
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory else None
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._disk: Dict[int, DiskEmbeddingStore] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _disk_store(self, dim: int) -> Optional[DiskEmbeddingStore]:
+        if self.directory is None:
+            return None
+        store = self._disk.get(dim)
+        if store is None:
+            store = DiskEmbeddingStore(self.directory, dim)
+            self._disk[dim] = store
+        return store
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return vector
+            for store in self._disk.values():
+                vector = store.get(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                    return vector
+            self.stats["misses"] += 1
+            return None
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        if not len(keys):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+            store = self._disk_store(vectors.shape[1])
+            if store is not None:
+                try:
+                    store.put_many(keys, vectors)
+                except OSError as e:
+                    logger.warning("Embedding disk cache write failed", error=str(e))
+
+    def open_disk_stores(self) -> None:
+        """Attach every ``embeddings-*.f32`` store already present in the directory"""
+        if self.directory is None or not self.directory.exists():
+            return
+        for path in self.directory.glob("embeddings-*.f32"):
+            try:
+                self._disk_store(int(path.stem.split("-", 1)[1]))
+            except ValueError:
+                continue
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def snapshot(self) -> Dict[str, Union[int, float, str, None]]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "disk_entries": sum(len(store) for store in self._disk.values()),
+            "directory": str(self.directory) if self.directory else None,
+        }
+
+
+_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get global embedding cache (RAG_EMBED_CACHE_SIZE / RAG_EMBED_CACHE_DIR)"""
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(
+            max_entries=int(os.getenv("RAG_EMBED_CACHE_SIZE", "10000")),
+            directory=os.getenv("RAG_EMBED_CACHE_DIR") or None,
+        )
+        _cache.open_disk_stores()
+    return _cache
+
+
+def get_embedding_cache_stats() -> Dict[str, Union[int, float, str, None]]:
+    """Hit/miss counters and sizes of the embedding cache"""
+    return get_embedding_cache().snapshot()
+
+
+def _model_name(model: Optional[SentenceTransformerType]) -> str:
+    if model is None:
+        return _FALLBACK_MODEL_NAME
+    return os.getenv("RAG_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
 def embed(texts: Union[str, List[str]]) -> List[List[float]]:
     """
     Generate embeddings for text(s)
     
+    Vectors are looked up by SHA-256 of model name + text; only cache misses
+    (deduplicated) are sent to the model in a single batch.
+    
     Args:
         texts: Single text string or list of text strings
         
@@ -87,11 +335,30 @@ def embed(texts: Union[str, List[str]]) -> List[List[float]]:
     if isinstance(texts, str):
         texts = [texts]
 
-    if model is None:
-        return [_fallback_embed(text) for text in texts]
+    cache = get_embedding_cache()
+    model_name = _model_name(model)
+    keys = [cache.key(model_name, text) for text in texts]
+
+    vectors: List[Optional[np.ndarray]] = []
+    misses: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        vector = None if key in misses else cache.get(key)
+        if vector is None:
+            misses.setdefault(key, text)
+        vectors.append(vector)
+
+    if misses:
+        miss_keys = list(misses)
+        miss_texts = [misses[key] for key in miss_keys]
+        if model is None:
+            computed = np.asarray([_fallback_embed(text) for text in miss_texts], dtype=np.float32)
+        else:
+            computed = np.asarray(model.encode(miss_texts, normalize_embeddings=True), dtype=np.float32)
+        cache.put_many(miss_keys, computed)
+        fresh = dict(zip(miss_keys, computed))
+        vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
 
-    embeddings = model.encode(texts, normalize_embeddings=True)
-    return embeddings.tolist()
+    return [vector.tolist() for vector in vectors]
 
 
 def get_embedding_dimensions() -> int:
@@ -0,0 +1,472 @@
+"""
+Embedded vector store for RAG
+IVF index over a memory-mapped float32 matrix, used when pgvector is unavailable
+"""
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Protocol, Sequence, Union, runtime_checkable
+
+import numpy as np
+import structlog
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = structlog.get_logger(__name__)
+
+META_FIELDS = ("id", "title", "url", "date", "ticker", "cik", "section", "text", "content_hash")
+
+
+@runtime_checkable
+class VectorStore(Protocol):
+    """Backend interface targeted by rag.index"""
+
+    def stored_hashes(self, ids: Sequence[str]) -> Dict[str, Optional[str]]:
+        ...
+
+    def write(self, rows: Sequence[Dict], embeddings: Sequence[Sequence[float]]) -> int:
+        ...
+
+    def query(
+        self,
+        query_embedding: Sequence[float],
+        limit: int,
+        cutoff: Optional[str] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        ...
+
+    def stats(self) -> Dict:
+        ...
+
+    def clear(self, ticker: Optional[str] = None) -> int:
+        ...
+
+
+def _date_ordinal(value: Union[str, date, None]) -> int:
+    if value is None or value == "":
+        return -1
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return -1
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class LocalVectorStore:
+    """Single-node vector store: append-only files plus an in-memory IVF index
+
+    Vectors are appended (unit-normalized) to ``vectors.f32`` and read through
+    ``np.memmap``; chunk metadata is appended to ``meta.jsonl``. Re-upserting
+    an id appends a new row and tombstones the old one. Below
+    ``ivf_min_rows`` live rows search is exact; above it a k-means IVF index
+    is trained lazily and ``nprobe`` lists are scanned, falling back to an
+    exact scan of the filtered rows when a filter leaves too few candidates.
+    Writes hold a flock on ``index.lock``, replay rows and deletions other
+    processes appended first and number new rows from the vector file's size;
+    queries replay that meta tail too, so every process sees the same index.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        *,
+        nprobe: int = 8,
+        ivf_min_rows: int = 4096,
+        train_sample: int = 50000,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self.train_sample = train_sample
+        self._vectors_path = self.directory / "vectors.f32"
+        self._meta_path = self.directory / "meta.jsonl"
+        self._lock_path = self.directory / "index.lock"
+        self._lock = threading.RLock()
+        with self._locked():
+            self._load()
+
+    # -- persistence -------------------------------------------------------
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive across threads and, through flock on a sidecar file, across processes"""
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def _size(path: Path) -> int:
+        return path.stat().st_size if path.exists() else 0
+
+    def _reset(self) -> None:
+        self.dim: Optional[int] = None
+        self._meta: List[Dict] = []
+        self._meta_bytes = 0
+        self._alive = np.empty(0, dtype=np.bool_)
+        self._tickers = np.empty(0, dtype=np.int32)
+        self._dates = np.empty(0, dtype=np.int32)
+        self._ticker_ids: Dict[str, int] = {}
+        self._rows_by_id: Dict[str, int] = {}
+        self._mmap: Optional[np.memmap] = None
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists: Optional[List[np.ndarray]] = None
+        self._trained_rows = 0
+
+    def _load(self) -> None:
+        """Rebuild the whole index from disk (under the lock)"""
+        self._reset()
+        if not self._meta_path.exists():
+            if self._vectors_path.exists():
+                # Vectors written before a crash, with no metadata to describe them
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(0)
+            return
+        lines: List[str] = []
+        positions: List[Optional[int]] = []  # record index per line, None for deletions
+        records: List[Dict] = []
+        deletes: List[Dict] = []
+        torn = False
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    torn = True
+                    break
+                lines.append(line)
+                if record.get("deleted"):
+                    deletes.append({"row": len(records), **record})
+                    positions.append(None)
+                else:
+                    positions.append(len(records))
+                    records.append(record)
+                    if self.dim is None:
+                        self.dim = int(record["dim"])
+
+        row_bytes = 4 * (self.dim or 0)
+        size = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+        complete = min(len(records), size // row_bytes) if row_bytes else 0
+
+        # Trim whatever a torn append left behind so later rows stay aligned
+        if torn or complete < len(records) or size != complete * row_bytes:
+            kept = [line for line, pos in zip(lines, positions) if pos is None or pos < complete]
+            with open(self._meta_path, "w", encoding="utf-8") as f:
+                f.write("".join(kept))
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(complete * row_bytes)
+
+        self._append_rows(records[:complete])
+        self._meta_bytes = self._size(self._meta_path)
+
+        # Replay deletions in order: each applies to rows that existed before it
+        for delete in deletes:
+            self._tombstone(
+                np.flatnonzero(self._alive[: min(delete["row"], complete)]),
+                ticker=delete.get("ticker"),
+            )
+
+    def _sync(self) -> None:
+        """Replay rows and deletions other processes appended since the last look (under the lock)"""
+        size = self._size(self._meta_path)
+        if size > self._meta_bytes:
+            with open(self._meta_path, "rb") as f:
+                f.seek(self._meta_bytes)
+                data = f.read(size - self._meta_bytes)
+            records: List[Dict] = []
+            for line in data.splitlines(keepends=True):
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._meta_bytes += len(line)
+                if record.get("deleted"):
+                    self._ingest(records)
+                    records = []
+                    self._tombstone(np.flatnonzero(self._alive), ticker=record.get("ticker"))
+                else:
+                    if self.dim is None:
+                        self.dim = int(record["dim"])
+                    records.append(record)
+            self._ingest(records)
+        row_bytes = 4 * (self.dim or 0)
+        if self._meta_bytes != size or self._size(self._vectors_path) != len(self._meta) * row_bytes:
+            # A writer died mid-append
+            self._load()
+
+    def _refresh(self) -> None:
+        """Pick up other processes' appends before reading"""
+        if self._size(self._meta_path) != self._meta_bytes:
+            with self._locked():
+                self._sync()
+
+    def _ingest(self, records: List[Dict]) -> None:
+        start = len(self._meta)
+        self._append_rows(records)
+        if records and self._centroids is not None:
+            self._assign(start)
+
+    def _vectors(self) -> np.ndarray:
+        if self._mmap is None or self._mmap.shape[0] != len(self._meta):
+            if not self._meta:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            self._mmap = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._meta), self.dim)
+            )
+        return self._mmap
+
+    def _ticker_id(self, ticker: str) -> int:
+        idx = self._ticker_ids.get(ticker)
+        if idx is None:
+            idx = len(self._ticker_ids)
+            self._ticker_ids[ticker] = idx
+        return idx
+
+    def _append_rows(self, records: List[Dict]) -> None:
+        if not records:
+            return
+        start = len(self._meta)
+        alive = np.ones(len(records), dtype=np.bool_)
+        for offset, record in enumerate(records):
+            # Re-upserted ids keep only their newest row
+            previous = self._rows_by_id.get(record["id"])
+            if previous is not None:
+                if previous < start:
+                    self._alive[previous] = False
+                else:
+                    alive[previous - start] = False
+            self._rows_by_id[record["id"]] = start + offset
+            self._meta.append(record)
+
+        self._alive = np.concatenate([self._alive, alive])
+        self._tickers = np.concatenate([
+            self._tickers,
+            np.array([self._ticker_id(r.get("ticker") or "") for r in records], dtype=np.int32),
+        ])
+        self._dates = np.concatenate([
+            self._dates,
+            np.array([_date_ordinal(r.get("date")) for r in records], dtype=np.int32),
+        ])
+
+    def _tombstone(self, rows: np.ndarray, ticker: Optional[str] = None) -> int:
+        if ticker is not None:
+            ticker_id = self._ticker_ids.get(ticker)
+            rows = rows[self._tickers[rows] == ticker_id] if ticker_id is not None else rows[:0]
+        self._alive[rows] = False
+        for row in rows.tolist():
+            doc_id = self._meta[row]["id"]
+            if self._rows_by_id.get(doc_id) == row:
+                del self._rows_by_id[doc_id]
+        return int(rows.size)
+
+    # -- VectorStore -------------------------------------------------------
+
+    def stored_hashes(self, ids: Sequence[str]) -> Dict[str, Optional[str]]:
+        self._refresh()
+        with self._lock:
+            return {
+                doc_id: self._meta[row].get("content_hash")
+                for doc_id in ids
+                if (row := self._rows_by_id.get(doc_id)) is not None
+            }
+
+    def write(self, rows: Sequence[Dict], embeddings: Sequence[Sequence[float]]) -> int:
+        if not rows:
+            return 0
+        matrix = _unit(np.asarray(embeddings, dtype=np.float32))
+        with self._locked():
+            self._sync()
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index ({self.dim})")
+
+            records = []
+            for row in rows:
+                record = {name: row.get(name) for name in META_FIELDS}
+                record["date"] = str(record["date"]) if record["date"] is not None else None
+                record["dim"] = self.dim
+                records.append(record)
+
+            with open(self._vectors_path, "ab") as f:
+                # Rows are numbered from the file, not from what this process last saw
+                start = f.seek(0, os.SEEK_END) // (4 * self.dim)
+                if start != len(self._meta):
+                    raise RuntimeError(f"Vector file holds {start} rows but the index has {len(self._meta)}")
+                f.write(np.ascontiguousarray(matrix).tobytes())
+            data = "".join(json.dumps(record, default=str) + "\n" for record in records).encode("utf-8")
+            with open(self._meta_path, "ab") as f:
+                f.write(data)
+            self._meta_bytes += len(data)
+            self._ingest(records)
+            return len(records)
+
+    def query(
+        self,
+        query_embedding: Sequence[float],
+        limit: int,
+        cutoff: Optional[str] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        self._refresh()
+        with self._lock:
+            if not self._meta or limit <= 0:
+                return []
+            query = _unit(np.asarray(query_embedding, dtype=np.float32))
+            vectors = self._vectors()
+
+            candidates = self._probe(query, limit, cutoff, tickers)
+            if candidates is None:
+                candidates = np.flatnonzero(self._match(None, cutoff, tickers))
+            if candidates.size == 0:
+                return []
+
+            scores = vectors[candidates] @ query
+            top = min(limit, candidates.size)
+            order = np.argpartition(-scores, top - 1)[:top]
+            order = order[np.argsort(-scores[order], kind="stable")]
+
+            results = []
+            for i in order.tolist():
+                row = int(candidates[i])
+                record = {name: self._meta[row].get(name) for name in META_FIELDS if name != "content_hash"}
+                record["embedding"] = np.array(vectors[row])
+                record["score"] = float(scores[i])
+                results.append(record)
+            return results
+
+    def stats(self) -> Dict:
+        self._refresh()
+        with self._lock:
+            live = [self._meta[row] for row in np.flatnonzero(self._alive).tolist()]
+            tickers = Counter(r.get("ticker") for r in live if r.get("ticker"))
+            sections = Counter(r.get("section") for r in live if r.get("section"))
+            dates = sorted(r["date"][:10] for r in live if r.get("date"))
+            return {
+                "total_documents": len(live),
+                "ticker_counts": [{"ticker": t, "count": c} for t, c in tickers.most_common(10)],
+                "date_range": {
+                    "earliest": dates[0] if dates else None,
+                    "latest": dates[-1] if dates else None,
+                },
+                "section_counts": [{"section": s, "count": c} for s, c in sections.most_common(10)],
+                "backend": "local",
+                "index": {
+                    "rows": len(self._meta),
+                    "lists": 0 if self._centroids is None else int(self._centroids.shape[0]),
+                    "nprobe": self.nprobe,
+                },
+            }
+
+    def clear(self, ticker: Optional[str] = None) -> int:
+        with self._locked():
+            self._sync()
+            deleted = self._tombstone(np.flatnonzero(self._alive), ticker=ticker)
+            data = (json.dumps({"deleted": True, "ticker": ticker}) + "\n").encode("utf-8")
+            with open(self._meta_path, "ab") as f:
+                f.write(data)
+            self._meta_bytes += len(data)
+            return deleted
+
+    # -- filtering and IVF -------------------------------------------------
+
+    def _match(self, rows: Optional[np.ndarray], cutoff: Optional[str], tickers: Optional[List[str]]) -> np.ndarray:
+        """Boolean mask of ``rows`` (all rows when None) that are live and pass the filters"""
+        select = slice(None) if rows is None else rows
+        mask = self._alive[select]
+        if tickers:
+            ids = [self._ticker_ids[t] for t in tickers if t in self._ticker_ids]
+            mask = mask & np.isin(self._tickers[select], ids)
+        if cutoff:
+            dates = self._dates[select]
+            mask = mask & (dates != -1) & (dates <= _date_ordinal(cutoff))
+        return mask
+
+    def _probe(
+        self,
+        query: np.ndarray,
+        limit: int,
+        cutoff: Optional[str],
+        tickers: Optional[List[str]],
+    ) -> Optional[np.ndarray]:
+        """Rows from the ``nprobe`` closest lists, or None when too few survive the filter"""
+        self._ensure_index()
+        if self._centroids is None:
+            return None
+        nprobe = min(self.nprobe, self._centroids.shape[0])
+        closest = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        lists = self._inverted_lists()
+        candidates = np.concatenate([lists[i] for i in closest.tolist()])
+        candidates = candidates[self._match(candidates, cutoff, tickers)]
+        if candidates.size < limit:
+            return None
+        return candidates
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        if self._lists is None:
+            order = np.argsort(self._assignments, kind="stable")
+            bounds = np.searchsorted(self._assignments[order], np.arange(self._centroids.shape[0] + 1))
+            self._lists = [order[bounds[i]: bounds[i + 1]] for i in range(self._centroids.shape[0])]
+        return self._lists
+
+    def _ensure_index(self) -> None:
+        live = int(self._alive.sum())
+        if live < self.ivf_min_rows:
+            return
+        if self._centroids is not None and live < 2 * self._trained_rows:
+            return
+        self._train()
+
+    def _train(self, iterations: int = 10) -> None:
+        live_rows = np.flatnonzero(self._alive)
+        nlist = max(1, int(np.sqrt(live_rows.size)))
+        rng = np.random.default_rng(0)
+        sample = live_rows
+        if sample.size > self.train_sample:
+            sample = np.sort(rng.choice(live_rows, self.train_sample, replace=False))
+
+        data = np.asarray(self._vectors()[sample])
+        centroids = data[rng.choice(data.shape[0], nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            sums[empty] = centroids[empty]
+            centroids = _unit(sums)
+
+        self._centroids = centroids
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._assign(0)
+        self._trained_rows = live_rows.size
+        logger.info("Local vector index trained", rows=int(live_rows.size), lists=nlist)
+
+    def _assign(self, start: int, block: int = 65536) -> None:
+        vectors = self._vectors()
+        parts = [self._assignments[:start]]
+        for offset in range(start, vectors.shape[0], block):
+            chunk = np.asarray(vectors[offset: offset + block])
+            parts.append(np.argmax(chunk @ self._centroids.T, axis=1).astype(np.int32))
+        self._assignments = np.concatenate(parts)
+        self._lists = None
@@ -121,3 +121,18 @@ async def admin_stats(admin_key: Optional[str] = Header(None)):
     finally:
         await db.close()
 
+
+@router.get("/llm-routing")
+async def llm_routing_scoreboard(admin_key: Optional[str] = Header(None)):
+    """Live health of every LLM provider key, best routing candidates first"""
+    
+    if admin_key != ADMIN_KEY:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    from src.services.llm_providers import get_provider_manager
+    
+    manager = get_provider_manager()
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "providers": manager.scoreboard(),
+    }
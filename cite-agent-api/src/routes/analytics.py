@@ -7,6 +7,9 @@ from uuid import uuid4
 
 import structlog
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.services.analytics import analytics_service
 
 router = APIRouter(prefix="/analytics")
 logger = structlog.get_logger(__name__)
@@ -23,21 +26,27 @@ def _trace_id(prefix: str) -> str:
 @router.get("/metrics")
 async def metrics_summary() -> dict:
     trace_id = _trace_id("metrics")
+    summary = analytics_service.get_metrics_summary()
+    p50, p95, p99 = analytics_service.overall_latency().quantiles((0.5, 0.95, 0.99))
     payload = {
         "summary": {
-            "requests": 0,
-            "latency_ms_p50": 0.0,
-            "latency_ms_p95": 0.0,
+            "requests": summary["summary"]["total_requests"],
+            "latency_ms_p50": p50,
+            "latency_ms_p95": p95,
         },
         "response_times": {
-            "p50": 0.0,
-            "p95": 0.0,
-            "p99": 0.0,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "by_endpoint": summary["response_times"],
         },
+        "provider_latency": summary["provider_latency"],
         "error_rates": {
-            "total": 0,
-            "last_24h": 0,
+            "total": summary["summary"]["total_errors"],
+            "last_minute": analytics_service.error_rate.total(),
+            "by_key": summary["error_rates"],
         },
+        "top_users": summary["top_users"],
         "generated_at": _now_iso(),
         "trace_id": trace_id,
     }
@@ -50,8 +59,8 @@ async def real_time_metrics() -> dict:
     trace_id = _trace_id("analytics-rt")
     payload = {
         "timestamp": _now_iso(),
-        "requests_per_minute": 0,
-        "active_sessions": 0,
+        "requests_per_minute": analytics_service.request_rate.total(),
+        "active_sessions": analytics_service.active_users.count(),
         "trace_id": trace_id,
     }
     logger.debug("analytics_realtime", trace_id=trace_id)
@@ -67,6 +76,7 @@ async def performance_metrics() -> dict:
             "memory_mb": 0.0,
             "queue_depth": 0,
         },
+        "upstream_latency": analytics_service.get_metrics_summary()["provider_latency"],
         "inspected_at": _now_iso(),
         "trace_id": trace_id,
     }
@@ -78,9 +88,21 @@ async def performance_metrics() -> dict:
 async def error_metrics() -> dict:
     trace_id = _trace_id("analytics-errors")
     payload = {
-        "errors": [],
+        "errors": [
+            {"key": key, **stats}
+            for key, stats in analytics_service.get_metrics_summary()["error_rates"].items()
+        ],
         "generated_at": _now_iso(),
         "trace_id": trace_id,
     }
     logger.debug("analytics_errors", trace_id=trace_id)
     return payload
+
+
+@router.get("/prometheus", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Latency summaries, request/error counters and rates in Prometheus text format."""
+    return PlainTextResponse(
+        analytics_service.export_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -14,6 +14,8 @@ import base64
 from jose import JWTError, jwt
 import secrets
 
+from src.core.db import get_db_connection
+
 logger = structlog.get_logger(__name__)
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -40,11 +42,6 @@ def verify_password_hash(password: str, stored_hash: str) -> bool:
     except:
         return False
 
-# Database connection
-async def get_db():
-    """Get database connection"""
-    db_url = os.getenv("DATABASE_URL", "postgresql://localhost/nocturnal_archive")
-    return await asyncpg.connect(db_url)
 
 # Request/Response Models
 class RegisterRequest(BaseModel):
@@ -98,6 +95,25 @@ async def verify_token(token: str) -> Optional[dict]:
     except JWTError:
         return None
 
+async def bearer_token(authorization: Optional[str] = Header(None)) -> str:
+    """Token from the Authorization header; rejects before a pool connection is taken"""
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing or invalid authorization header"
+        )
+    return authorization.split(" ")[1]
+
+async def token_payload(token: str = Depends(bearer_token)) -> dict:
+    """Verified JWT payload of the bearer token"""
+    payload = await verify_token(token)
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+    return payload
+
 # Routes
 def is_academic_email(email: str) -> bool:
     """Validate that email is from an academic domain"""
@@ -115,7 +131,7 @@ def is_academic_email(email: str) -> bool:
     return any(part in academic_markers for part in parts)
 
 @router.post("/register", response_model=AuthResponse, status_code=status.HTTP_201_CREATED)
-async def register(request: RegisterRequest):
+async def register(request: RegisterRequest, conn: asyncpg.Connection = Depends(get_db_connection)):
     """
     Register a new user with email and password
     Requires academic email domain (.edu, .ac.uk, etc.)
@@ -127,271 +143,227 @@ async def register(request: RegisterRequest):
             detail="Registration requires an academic email address (e.g., .edu, .ac.uk)"
         )
 
-    conn = await get_db()
+    # Check if email already exists
+    existing = await conn.fetchrow(
+        "SELECT user_id FROM users WHERE email = $1",
+        request.email
+    )
 
-    try:
-        # Check if email already exists
-        existing = await conn.fetchrow(
-            "SELECT user_id FROM users WHERE email = $1",
-            request.email
-        )
-
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Email already registered"
-            )
-        
-        # Hash password
-        password_hash = get_password_hash(request.password)
-        
-        # Create user
-        user_id = secrets.token_urlsafe(16)
-        await conn.execute(
-            """
-            INSERT INTO users (user_id, email, password_hash, created_at, tokens_used_today, last_token_reset)
-            VALUES ($1, $2, $3, $4, 0, CURRENT_DATE)
-            """,
-            user_id, request.email, password_hash, datetime.now(timezone.utc)
-        )
-        
-        # Create access token
-        access_token = create_access_token(
-            data={"sub": user_id, "email": request.email}
-        )
-        
-        # Create session
-        session_id = secrets.token_urlsafe(24)
-        expires_at = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-        
-        await conn.execute(
-            """
-            INSERT INTO sessions (session_id, user_id, token, created_at, expires_at)
-            VALUES ($1, $2, $3, $4, $5)
-            """,
-            session_id, user_id, access_token, datetime.now(timezone.utc), expires_at
-        )
-        
-        logger.info("User registered", user_id=user_id, email=request.email)
-        
-        return AuthResponse(
-            user_id=user_id,
-            email=request.email,
-            access_token=access_token,
-            expires_at=expires_at.isoformat(),
-            daily_token_limit=25000
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Email already registered"
         )
-        
-    finally:
-        await conn.close()
+    
+    # Hash password
+    password_hash = get_password_hash(request.password)
+    
+    # Create user
+    user_id = secrets.token_urlsafe(16)
+    await conn.execute(
+        """
+        INSERT INTO users (user_id, email, password_hash, created_at, tokens_used_today, last_token_reset)
+        VALUES ($1, $2, $3, $4, 0, CURRENT_DATE)
+        """,
+        user_id, request.email, password_hash, datetime.now(timezone.utc)
+    )
+    
+    # Create access token
+    access_token = create_access_token(
+        data={"sub": user_id, "email": request.email}
+    )
+    
+    # Create session
+    session_id = secrets.token_urlsafe(24)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
+    
+    await conn.execute(
+        """
+        INSERT INTO sessions (session_id, user_id, token, created_at, expires_at)
+        VALUES ($1, $2, $3, $4, $5)
+        """,
+        session_id, user_id, access_token, datetime.now(timezone.utc), expires_at
+    )
+    
+    logger.info("User registered", user_id=user_id, email=request.email)
+    
+    return AuthResponse(
+        user_id=user_id,
+        email=request.email,
+        access_token=access_token,
+        expires_at=expires_at.isoformat(),
+        daily_token_limit=25000
+    )
 
 @router.post("/login", response_model=AuthResponse)
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, conn: asyncpg.Connection = Depends(get_db_connection)):
     """
     Authenticate user with email and password hash
     Compatible with existing client that sends SHA256 hash
     """
-    conn = await get_db()
+    # Get user
+    user = await conn.fetchrow(
+        "SELECT user_id, email, password_hash FROM users WHERE email = $1",
+        request.email
+    )
     
-    try:
-        # Get user
-        user = await conn.fetchrow(
-            "SELECT user_id, email, password_hash FROM users WHERE email = $1",
-            request.email
-        )
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid email or password"
-            )
-        
-        # Verify password
-        if not verify_password(request.password, user['password_hash']):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid email or password"
-            )
-        
-        # Update last login
-        await conn.execute(
-            "UPDATE users SET last_login = $1 WHERE user_id = $2",
-            datetime.now(timezone.utc), user['user_id']
-        )
-        
-        # Create access token
-        access_token = create_access_token(
-            data={"sub": user['user_id'], "email": user['email']}
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
         )
-        
-        # Create session
-        session_id = secrets.token_urlsafe(24)
-        expires_at = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-        
-        await conn.execute(
-            """
-            INSERT INTO sessions (session_id, user_id, token, created_at, expires_at)
-            VALUES ($1, $2, $3, $4, $5)
-            """,
-            session_id, user['user_id'], access_token, datetime.now(timezone.utc), expires_at
+    
+    # Verify password
+    if not verify_password(request.password, user['password_hash']):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
         )
-        
-        logger.info("User logged in", user_id=user['user_id'], email=user['email'])
+    
+    # Update last login
+    await conn.execute(
+        "UPDATE users SET last_login = $1 WHERE user_id = $2",
+        datetime.now(timezone.utc), user['user_id']
+    )
+    
+    # Create access token
+    access_token = create_access_token(
+        data={"sub": user['user_id'], "email": user['email']}
+    )
+    
+    # Create session
+    session_id = secrets.token_urlsafe(24)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
+    
+    await conn.execute(
+        """
+        INSERT INTO sessions (session_id, user_id, token, created_at, expires_at)
+        VALUES ($1, $2, $3, $4, $5)
+        """,
+        session_id, user['user_id'], access_token, datetime.now(timezone.utc), expires_at
+    )
+    
+    logger.info("User logged in", user_id=user['user_id'], email=user['email'])
 
-        # Generate temporary API key (2 weeks) with round-robin load balancing
-        # Rotate keys to distribute load evenly across 4 keys
-        import hashlib
-        user_hash = int(hashlib.md5(user['user_id'].encode()).hexdigest(), 16)
-        key_index = (user_hash % 4) + 1  # 1, 2, 3, or 4
+    # Generate temporary API key (2 weeks) with round-robin load balancing
+    # Rotate keys to distribute load evenly across 4 keys
+    import hashlib
+    user_hash = int(hashlib.md5(user['user_id'].encode()).hexdigest(), 16)
+    key_index = (user_hash % 4) + 1  # 1, 2, 3, or 4
 
-        temp_key = os.getenv(f"CEREBRAS_API_KEY_{key_index}")
-        if not temp_key:
-            # Fallback to any available key
-            temp_key = (
-                os.getenv("CEREBRAS_API_KEY_1") or
-                os.getenv("CEREBRAS_API_KEY_2") or
-                os.getenv("CEREBRAS_API_KEY_3") or
-                os.getenv("CEREBRAS_API_KEY_4") or
-                os.getenv("CEREBRAS_API_KEY")
-            )
+    temp_key = os.getenv(f"CEREBRAS_API_KEY_{key_index}")
+    if not temp_key:
+        # Fallback to any available key
+        temp_key = (
+            os.getenv("CEREBRAS_API_KEY_1") or
+            os.getenv("CEREBRAS_API_KEY_2") or
+            os.getenv("CEREBRAS_API_KEY_3") or
+            os.getenv("CEREBRAS_API_KEY_4") or
+            os.getenv("CEREBRAS_API_KEY")
+        )
 
-        temp_key_expires = datetime.now(timezone.utc) + timedelta(days=14)
+    temp_key_expires = datetime.now(timezone.utc) + timedelta(days=14)
 
-        logger.info("Assigned temp key", user_id=user['user_id'], key_index=key_index if temp_key else "fallback")
+    logger.info("Assigned temp key", user_id=user['user_id'], key_index=key_index if temp_key else "fallback")
 
-        return AuthResponse(
-            user_id=user['user_id'],
-            email=user['email'],
-            access_token=access_token,
-            expires_at=expires_at.isoformat(),
-            daily_token_limit=25000,
-            temp_api_key=temp_key,
-            temp_key_expires=temp_key_expires.isoformat(),
-            temp_key_provider="cerebras"
-        )
-        
-    finally:
-        await conn.close()
+    return AuthResponse(
+        user_id=user['user_id'],
+        email=user['email'],
+        access_token=access_token,
+        expires_at=expires_at.isoformat(),
+        daily_token_limit=25000,
+        temp_api_key=temp_key,
+        temp_key_expires=temp_key_expires.isoformat(),
+        temp_key_provider="cerebras"
+    )
 
 @router.post("/refresh", response_model=AuthResponse)
-async def refresh_token(request: RefreshRequest):
+async def refresh_token(request: RefreshRequest, conn: asyncpg.Connection = Depends(get_db_connection)):
     """Refresh an access token"""
-    conn = await get_db()
-    
-    try:
-        # Verify token
-        payload = await verify_token(request.refresh_token)
-        if not payload:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token"
-            )
-        
-        user_id = payload.get("sub")
-        email = payload.get("email")
-        
-        # Check if user still exists
-        user = await conn.fetchrow(
-            "SELECT user_id FROM users WHERE user_id = $1",
-            user_id
-        )
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found"
-            )
-        
-        # Create new access token
-        new_token = create_access_token(
-            data={"sub": user_id, "email": email}
-        )
-        
-        expires_at = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-        
-        logger.info("Token refreshed", user_id=user_id)
-        
-        return AuthResponse(
-            user_id=user_id,
-            email=email,
-            access_token=new_token,
-            expires_at=expires_at.isoformat(),
-            daily_token_limit=25000
-        )
-        
-    finally:
-        await conn.close()
-
-@router.get("/me")
-async def get_current_user(authorization: Optional[str] = Header(None)):
-    """Get current user info from token"""
-    if not authorization or not authorization.startswith("Bearer "):
+    # Verify token
+    payload = await verify_token(request.refresh_token)
+    if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing or invalid authorization header"
+            detail="Invalid or expired token"
         )
     
-    token = authorization.split(" ")[1]
-    payload = await verify_token(token)
+    user_id = payload.get("sub")
+    email = payload.get("email")
     
-    if not payload:
+    # Check if user still exists
+    user = await conn.fetchrow(
+        "SELECT user_id FROM users WHERE user_id = $1",
+        user_id
+    )
+    
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
+            detail="User not found"
         )
     
-    conn = await get_db()
-    try:
-        user = await conn.fetchrow(
-            """
-            SELECT user_id, email, created_at, last_login, tokens_used_today, last_token_reset
-            FROM users WHERE user_id = $1
-            """,
-            payload.get("sub")
+    # Create new access token
+    new_token = create_access_token(
+        data={"sub": user_id, "email": email}
+    )
+    
+    expires_at = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
+    
+    logger.info("Token refreshed", user_id=user_id)
+    
+    return AuthResponse(
+        user_id=user_id,
+        email=email,
+        access_token=new_token,
+        expires_at=expires_at.isoformat(),
+        daily_token_limit=25000
+    )
+
+@router.get("/me")
+async def get_current_user(
+    payload: dict = Depends(token_payload),
+    conn: asyncpg.Connection = Depends(get_db_connection),
+):
+    """Get current user info from token"""
+    # Dependencies resolve in order, so bad tokens are rejected before a connection is acquired
+    user = await conn.fetchrow(
+        """
+        SELECT user_id, email, created_at, last_login, tokens_used_today, last_token_reset
+        FROM users WHERE user_id = $1
+        """,
+        payload.get("sub")
+    )
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
         )
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        return {
-            "user_id": user['user_id'],
-            "email": user['email'],
-            "created_at": user['created_at'].isoformat(),
-            "last_login": user['last_login'].isoformat() if user['last_login'] else None,
-            "tokens_used_today": user['tokens_used_today'],
-            "tokens_remaining": 25000 - user['tokens_used_today'],
-            "last_token_reset": user['last_token_reset'].isoformat()
-        }
-        
-    finally:
-        await conn.close()
+    
+    return {
+        "user_id": user['user_id'],
+        "email": user['email'],
+        "created_at": user['created_at'].isoformat(),
+        "last_login": user['last_login'].isoformat() if user['last_login'] else None,
+        "tokens_used_today": user['tokens_used_today'],
+        "tokens_remaining": 25000 - user['tokens_used_today'],
+        "last_token_reset": user['last_token_reset'].isoformat()
+    }
 
 @router.post("/logout")
-async def logout(authorization: Optional[str] = Header(None)):
+async def logout(
+    token: str = Depends(bearer_token),
+    conn: asyncpg.Connection = Depends(get_db_connection),
+):
     """Logout user and invalidate token"""
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Missing or invalid authorization header"
-        )
+    # Delete session
+    await conn.execute(
+        "DELETE FROM sessions WHERE token = $1",
+        token
+    )
     
-    token = authorization.split(" ")[1]
+    logger.info("User logged out")
     
-    conn = await get_db()
-    try:
-        # Delete session
-        await conn.execute(
-            "DELETE FROM sessions WHERE token = $1",
-            token
-        )
-        
-        logger.info("User logged out")
-        
-        return {"message": "Successfully logged out"}
-        
-    finally:
-        await conn.close()
+    return {"message": "Successfully logged out"}
 
@@ -0,0 +1,34 @@
+"""Bulk citation verification routes."""
+
+from __future__ import annotations
+
+import time
+from uuid import uuid4
+
+import structlog
+from fastapi import APIRouter
+
+from src.models.request import CitationVerifyRequest
+from src.services.citation_verifier import get_verifier
+
+logger = structlog.get_logger(__name__)
+router = APIRouter()
+
+
+@router.post("/citations/verify")
+async def verify_citations(request: CitationVerifyRequest):
+    """Verify every citation of a synthesis (its text plus any reference URLs) in one call."""
+    started = time.perf_counter()
+    report = await get_verifier().verify_response(request.text, extra_urls=request.urls)
+
+    report["trace_id"] = f"verify-{uuid4().hex}"
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        "citation_verify_success",
+        urls=report["url_verification"]["total"],
+        verified=report["url_verification"]["verified"],
+        cached=report["url_verification"]["cached"],
+        elapsed_ms=report["elapsed_ms"],
+        trace_id=report["trace_id"],
+    )
+    return report
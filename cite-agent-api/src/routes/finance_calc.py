@@ -274,6 +274,8 @@ async def calculate_series(
     Calculate a series of metric values over time
     
     Returns an array of calculated values with citations for each period.
+    Registry metrics are computed in one pass over all periods; other
+    names fall back to the raw fact series.
     """
     try:
         logger.info(
@@ -287,28 +289,34 @@ async def calculate_series(
             trace_id=getattr(request.state, "trace_id", "unknown")
         )
         
-        # Get facts store for real data
-        facts_store = get_facts_store()
-        
-        # Get series data
-        series_data = await facts_store.get_series(ticker, metric, freq, limit)
-        
-        if not series_data:
-            return create_problem_response(
-                request, 404,
-                "not-found",
-                "Metric not found",
-                f"Unknown metric: {metric}"
+        if kpi_registry.get_metric(metric):
+            response_data = await calc_engine.calculate_series(
+                ticker, metric, freq=freq, limit=limit, ttm=ttm, segment=segment
             )
-        
-        # Build response
-        response_data = {
-            "ticker": ticker,
-            "metric": metric,
-            "freq": freq,
-            "ttm": ttm,
-            "series": series_data
-        }
+            series_data = response_data["series"]
+        else:
+            # Get facts store for real data
+            facts_store = get_facts_store()
+            
+            # Get series data
+            series_data = await facts_store.get_series(ticker, metric, freq, limit)
+            
+            if not series_data:
+                return create_problem_response(
+                    request, 404,
+                    "not-found",
+                    "Metric not found",
+                    f"Unknown metric: {metric}"
+                )
+            
+            # Build response
+            response_data = {
+                "ticker": ticker,
+                "metric": metric,
+                "freq": freq,
+                "ttm": ttm,
+                "series": series_data
+            }
         
         logger.info(
             "Finance series calculation completed",
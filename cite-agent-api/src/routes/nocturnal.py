@@ -143,7 +143,7 @@ async def process_nocturnal_query(
             if any(keyword in response_text.lower() for keyword in ['doi:', 'arxiv:', 'http://', 'https://']):
                 try:
                     verifier = get_verifier()
-                    citation_quality = await verifier.verify_citations(response_text)
+                    citation_quality = await verifier.verify_response(response_text)
                 except Exception as e:
                     logger.warning("Citation verification failed", error=str(e))
             
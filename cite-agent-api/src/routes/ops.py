@@ -96,3 +96,42 @@ def system_info() -> Dict[str, Any]:
             "error": "Failed to retrieve system info",
             "details": str(e)
         }
+
+
+@router.get("/db")
+def db_pool_status() -> Dict[str, Any]:
+    """
+    Get shared Postgres pool size and saturation
+    
+    Returns:
+        Pool size, idle/in-use connections and acquire wait statistics
+    """
+    from src.core.db import pool_stats
+    
+    return pool_stats()
+
+
+@router.get("/embeddings")
+def embedding_cache_status() -> Dict[str, Any]:
+    """
+    Get embedding cache hit rate and size
+    
+    Returns:
+        Hit/miss counters, hit rate and memory/disk entry counts
+    """
+    from src.rag.embeddings import get_embedding_cache_stats
+    
+    return get_embedding_cache_stats()
+
+
+@router.get("/ratelimit")
+def rate_limiter_status() -> Dict[str, Any]:
+    """
+    Get shared rate limiter backend and key counts
+    
+    Returns:
+        Active backend, tracked keys, allow/deny counters and idle-key evictions
+    """
+    from src.core.limiter import limiter_stats
+    
+    return limiter_stats()
@@ -7,13 +7,18 @@ from datetime import datetime, timezone, date
 from typing import Optional, List, Dict, Any
 import structlog
 from fastapi import APIRouter, HTTPException, Depends, status, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+import anyio
 import asyncpg
+import json
 import os
 from groq import Groq
 import asyncio
+from src.core.db import acquire, get_db_connection, get_db_pool
 from src.services.llm_providers import get_provider_manager
 from src.services.citation_verifier import get_verifier
+from src.utils.sse import sse_event
 
 logger = structlog.get_logger(__name__)
 router = APIRouter(prefix="/query", tags=["query"])
@@ -25,11 +30,27 @@ router = APIRouter(prefix="/query", tags=["query"])
 # Token limits
 DAILY_TOKEN_LIMIT = 50000  # ~50 queries at 1000 tokens each (generous for beta)
 
-# Database connection
-async def get_db():
-    """Get database connection"""
-    db_url = os.getenv("DATABASE_URL", "postgresql://localhost/nocturnal_archive")
-    return await asyncpg.connect(db_url)
+# Hot-path statements; asyncpg's per-connection statement cache prepares them once
+SELECT_TOKEN_USAGE_SQL = """
+    SELECT tokens_used_today, last_token_reset
+    FROM users
+    WHERE user_id = $1
+"""
+RESET_TOKEN_USAGE_SQL = """
+    UPDATE users
+    SET tokens_used_today = 0, last_token_reset = $1
+    WHERE user_id = $2
+"""
+INSERT_QUERY_SQL = """
+    INSERT INTO queries (query_id, user_id, query_text, response_text, tokens_used, cost, model, timestamp)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+"""
+ADD_TOKEN_USAGE_SQL = """
+    UPDATE users
+    SET tokens_used_today = tokens_used_today + $1
+    WHERE user_id = $2
+"""
+SELECT_TOKENS_USED_SQL = "SELECT tokens_used_today FROM users WHERE user_id = $1"
 
 # Request/Response Models
 class QueryRequest(BaseModel):
@@ -91,14 +112,7 @@ async def check_and_update_token_limit(conn: asyncpg.Connection, user_id: str, t
     Returns True if allowed, False if limit exceeded
     """
     # Get current usage
-    user = await conn.fetchrow(
-        """
-        SELECT tokens_used_today, last_token_reset
-        FROM users
-        WHERE user_id = $1
-        """,
-        user_id
-    )
+    user = await conn.fetchrow(SELECT_TOKEN_USAGE_SQL, user_id)
     
     if not user:
         raise HTTPException(
@@ -112,14 +126,7 @@ async def check_and_update_token_limit(conn: asyncpg.Connection, user_id: str, t
     
     if last_reset < today:
         # Reset counter for new day
-        await conn.execute(
-            """
-            UPDATE users 
-            SET tokens_used_today = 0, last_token_reset = $1
-            WHERE user_id = $2
-            """,
-            today, user_id
-        )
+        await conn.execute(RESET_TOKEN_USAGE_SQL, today, user_id)
         tokens_used = 0
     else:
         tokens_used = user['tokens_used_today']
@@ -139,17 +146,16 @@ async def record_query(
     cost: float,
     model: str
 ) -> str:
-    """Record query in database for analytics, returns query_id"""
+    """Record query in database for analytics and charge its tokens, returns query_id"""
     import secrets
     query_id = secrets.token_urlsafe(16)
     
-    await conn.execute(
-        """
-        INSERT INTO queries (query_id, user_id, query_text, response_text, tokens_used, cost, model, timestamp)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-        """,
-        query_id, user_id, query_text[:1000], response_text[:5000], tokens_used, cost, model, datetime.now(timezone.utc)
-    )
+    async with conn.transaction():
+        await conn.execute(
+            INSERT_QUERY_SQL, query_id, user_id, query_text[:1000], response_text[:5000], tokens_used, cost, model, datetime.now(timezone.utc)
+        )
+        # Update user token usage
+        await conn.execute(ADD_TOKEN_USAGE_SQL, tokens_used, user_id)
     
     return query_id
 
@@ -157,8 +163,7 @@ async def record_query(
 async def record_accuracy_metrics(query_id: str, response_id: str, citation_results: dict):
     """Record accuracy metrics to database"""
     try:
-        conn = await get_db()
-        try:
+        async with acquire() as conn:
             # Insert response quality
             await conn.execute(
                 """
@@ -199,20 +204,8 @@ async def record_accuracy_metrics(query_id: str, response_id: str, citation_resu
                     url_result['status'],
                     url_result.get('status_code')
                 )
-        finally:
-            await conn.close()
     except Exception as e:
         logger.error("Failed to record accuracy metrics", error=str(e))
-    
-    # Update user token usage
-    await conn.execute(
-        """
-        UPDATE users
-        SET tokens_used_today = tokens_used_today + $1
-        WHERE user_id = $2
-        """,
-        tokens_used, user_id
-    )
 
 def estimate_tokens(text: str) -> int:
     """Rough token estimation (1 token ≈ 4 chars)"""
@@ -223,54 +216,32 @@ def calculate_cost(tokens: int) -> float:
     COST_PER_1K_TOKENS = 0.0001  # $0.0001 per 1K tokens
     return (tokens / 1000) * COST_PER_1K_TOKENS
 
-# Main query endpoint
-@router.post("/", response_model=QueryResponse)
-async def process_query(
-    request: QueryRequest,
-    current_user: dict = Depends(get_current_user_from_token)
-):
-    """
-    Process a user query securely
-    - Validates auth token
-    - Checks token limits
-    - Calls Groq API (keys never exposed to client)
-    - Tracks usage and costs
-    """
-    user_id = current_user['user_id']
-    
-    conn = await get_db()
-    try:
-        # Estimate tokens needed (rough estimate)
-        estimated_tokens = estimate_tokens(request.query) + (request.max_tokens or 2000)
-        
-        # Check token limit BEFORE making API call
+async def enforce_token_limit(pool: asyncpg.Pool, user_id: str, estimated_tokens: int) -> None:
+    """Raise 429 when ``estimated_tokens`` would exceed the user's daily budget"""
+    # Pooled connections are only held around database work, never across the LLM round trip.
+    async with acquire(pool) as conn:
         can_proceed = await check_and_update_token_limit(conn, user_id, estimated_tokens)
-        
         if not can_proceed:
             # Get current usage for error message
-            user = await conn.fetchrow(
-                "SELECT tokens_used_today FROM users WHERE user_id = $1",
-                user_id
-            )
-            tokens_remaining = DAILY_TOKEN_LIMIT - user['tokens_used_today']
-            
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail={
-                    "error": "Daily token limit exceeded",
-                    "tokens_used_today": user['tokens_used_today'],
-                    "daily_limit": DAILY_TOKEN_LIMIT,
-                    "tokens_remaining": max(0, tokens_remaining)
-                }
-            )
-        
-        # Call LLM with automatic provider failover
-        # Tries: Groq (4 keys) → Cerebras → Cloudflare → OpenRouter → others
-        provider_manager = get_provider_manager()
+            user = await conn.fetchrow(SELECT_TOKENS_USED_SQL, user_id)
+    
+    if not can_proceed:
+        tokens_remaining = DAILY_TOKEN_LIMIT - user['tokens_used_today']
         
-        try:
-            # Build specialized Cite-Agent system prompt  
-            system_prompt = """You are Cite Agent, a professional research assistant with Archive, FinSight (SEC+Yahoo), Web Search, and Shell Access.
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "error": "Daily token limit exceeded",
+                "tokens_used_today": user['tokens_used_today'],
+                "daily_limit": DAILY_TOKEN_LIMIT,
+                "tokens_remaining": max(0, tokens_remaining)
+            }
+        )
+
+async def build_messages(request: QueryRequest, provider_manager) -> List[Dict[str, str]]:
+    """System prompt, API context and (summarized) history followed by the user query"""
+    # Build specialized Cite-Agent system prompt  
+    system_prompt = """You are Cite Agent, a professional research assistant with Archive, FinSight (SEC+Yahoo), Web Search, and Shell Access.
 
 🎯 TONE & PERSONALITY:
 - Professional, helpful, and respectful
@@ -353,61 +324,117 @@ ONLY ask for clarification if:
 
 Otherwise: ANSWER using your tools. Be resourceful, not helpless."""
 
-            # Build messages with specialized system prompt
-            messages = [{"role": "system", "content": system_prompt}]
+    # Build messages with specialized system prompt
+    messages = [{"role": "system", "content": system_prompt}]
+    
+    # Add API context if provided
+    if request.api_context:
+        api_context_str = json.dumps(request.api_context, indent=2)
+        
+        # DEBUG: Log what we received
+        if request.api_context.get("shell_info", {}).get("search_results"):
+            logger.info("Shell search results received", 
+                      results=request.api_context["shell_info"]["search_results"][:200])
+        
+        messages.append({"role": "system", "content": f"API Data Available:\n{api_context_str}"})
+    
+    # CONVERSATION SUMMARIZATION: Pure token-based (like Claude/Cursor)
+    # Model: Cerebras llama-3.3-70b has 128K context window
+    # Budget: System(2K) + API(3K) + Conversation(30K) + Response(4K) = 39K / 128K (30% usage, safe margin)
+    if request.conversation_history:
+        # Use actual tokenizer for accurate counting
+        try:
+            import tiktoken
+            # Use cl100k_base encoding (GPT-4, llama-3 compatible)
+            encoder = tiktoken.get_encoding("cl100k_base")
             
-            # Import json at module level (used in multiple places)
-            import json
+            # Count tokens accurately
+            history_str = json.dumps(request.conversation_history)
+            estimated_tokens = len(encoder.encode(history_str))
+        except Exception:
+            # Fallback to heuristic if tiktoken fails
+            history_str = json.dumps(request.conversation_history)
+            estimated_tokens = len(history_str) // 4
+        
+        # Optimal thresholds (balanced between Claude 20K and over-generous 60K)
+        TARGET_TOKENS = 30000  # Start summarizing (handles ~60 message conversations)
+        RECENT_TOKENS = 15000  # Keep recent context (last ~30 messages worth)
+        
+        if estimated_tokens <= TARGET_TOKENS:
+            # Fits in budget - keep everything
+            messages.extend(request.conversation_history)
+            logger.info("Conversation fits", tokens=estimated_tokens, msgs=len(request.conversation_history))
+        else:
+            # Exceeds budget - summarize old, keep recent
+            # Step 1: Count backwards to find recent messages that fit in RECENT_TOKENS
+            recent_history = []
+            recent_tokens = 0
             
-            # Add API context if provided
-            if request.api_context:
-                api_context_str = json.dumps(request.api_context, indent=2)
-                
-                # DEBUG: Log what we received
-                if request.api_context.get("shell_info", {}).get("search_results"):
-                    logger.info("Shell search results received", 
-                              results=request.api_context["shell_info"]["search_results"][:200])
-                
-                messages.append({"role": "system", "content": f"API Data Available:\n{api_context_str}"})
+            # Use same encoder for per-message counting
+            try:
+                encoder = tiktoken.get_encoding("cl100k_base")
+                use_tiktoken = True
+            except:
+                use_tiktoken = False
             
-            # CONVERSATION SUMMARIZATION: Pure token-based (like Claude/Cursor)
-            # Model: Cerebras llama-3.3-70b has 128K context window
-            # Budget: System(2K) + API(3K) + Conversation(30K) + Response(4K) = 39K / 128K (30% usage, safe margin)
-            if request.conversation_history:
-                # Use actual tokenizer for accurate counting
-                try:
-                    import tiktoken
-                    # Use cl100k_base encoding (GPT-4, llama-3 compatible)
-                    encoder = tiktoken.get_encoding("cl100k_base")
+            for msg in reversed(request.conversation_history):
+                if use_tiktoken:
+                    msg_tokens = len(encoder.encode(json.dumps(msg)))
+                else:
+                    msg_tokens = len(json.dumps(msg)) // 4
                     
-                    # Count tokens accurately
-                    history_str = json.dumps(request.conversation_history)
-                    estimated_tokens = len(encoder.encode(history_str))
-                except Exception:
-                    # Fallback to heuristic if tiktoken fails
-                    history_str = json.dumps(request.conversation_history)
-                    estimated_tokens = len(history_str) // 4
-                
-                # Optimal thresholds (balanced between Claude 20K and over-generous 60K)
-                TARGET_TOKENS = 30000  # Start summarizing (handles ~60 message conversations)
-                RECENT_TOKENS = 15000  # Keep recent context (last ~30 messages worth)
-                
-                if estimated_tokens <= TARGET_TOKENS:
-                    # Fits in budget - keep everything
-                    messages.extend(request.conversation_history)
-                    logger.info("Conversation fits", tokens=estimated_tokens, msgs=len(request.conversation_history))
+                if recent_tokens + msg_tokens <= RECENT_TOKENS:
+                    recent_history.insert(0, msg)
+                    recent_tokens += msg_tokens
                 else:
-                    # Exceeds budget - summarize old, keep recent
-                    # Step 1: Count backwards to find recent messages that fit in RECENT_TOKENS
-                    recent_history = []
-                    recent_tokens = 0
+                    break
+            
+            # Step 2: Everything else gets summarized
+            early_history = request.conversation_history[:len(request.conversation_history) - len(recent_history)]
+            
+            if not early_history:
+                # Edge case: even one message is > RECENT_TOKENS
+                # Just truncate the message
+                messages.extend(request.conversation_history)
+                logger.warning("Single message too large", tokens=estimated_tokens)
+            else:
+                # Summarize early history
+                try:
+                    summary_messages = [
+                        {"role": "system", "content": "Summarize the key points and context from this conversation. Focus on: topic discussed, data/papers found, conclusions reached, user's goals. Keep under 300 words."},
+                        {"role": "user", "content": f"Conversation to summarize:\n{json.dumps(early_history, indent=2)}"}
+                    ]
+                    
+                    # Use fast model for summarization (cheap)
+                    summary_result = await provider_manager.query_with_fallback(
+                        query="summarize",
+                        conversation_history=[],
+                        messages=summary_messages,
+                        model="llama-3.1-8b-instant",
+                        temperature=0.2,
+                        max_tokens=500
+                    )
                     
-                    # Use same encoder for per-message counting
-                    try:
-                        encoder = tiktoken.get_encoding("cl100k_base")
-                        use_tiktoken = True
-                    except:
-                        use_tiktoken = False
+                    conversation_summary = summary_result['content']
+                    summary_tokens = len(conversation_summary) // 4
+                    
+                    messages.append({"role": "system", "content": f"📜 Previous conversation summary:\n{conversation_summary}"})
+                    messages.extend(recent_history)
+                    
+                    final_tokens = summary_tokens + recent_tokens
+                    logger.info("Summarized conversation", 
+                              original_tokens=estimated_tokens,
+                              final_tokens=final_tokens,
+                              saved_tokens=estimated_tokens - final_tokens,
+                              early_msgs=len(early_history), 
+                              recent_msgs=len(recent_history))
+                    
+                except Exception as e:
+                    # If summarization fails, truncate to fit RECENT_TOKENS budget
+                    logger.warning("Summarization failed, truncating", error=str(e))
+                    
+                    truncated_history = []
+                    truncated_tokens = 0
                     
                     for msg in reversed(request.conversation_history):
                         if use_tiktoken:
@@ -415,110 +442,35 @@ Otherwise: ANSWER using your tools. Be resourceful, not helpless."""
                         else:
                             msg_tokens = len(json.dumps(msg)) // 4
                             
-                        if recent_tokens + msg_tokens <= RECENT_TOKENS:
-                            recent_history.insert(0, msg)
-                            recent_tokens += msg_tokens
+                        if truncated_tokens + msg_tokens <= RECENT_TOKENS:
+                            truncated_history.insert(0, msg)
+                            truncated_tokens += msg_tokens
                         else:
                             break
                     
-                    # Step 2: Everything else gets summarized
-                    early_history = request.conversation_history[:len(request.conversation_history) - len(recent_history)]
-                    
-                    if not early_history:
-                        # Edge case: even one message is > RECENT_TOKENS
-                        # Just truncate the message
-                        messages.extend(request.conversation_history)
-                        logger.warning("Single message too large", tokens=estimated_tokens)
-                    else:
-                        # Summarize early history
-                        try:
-                            summary_messages = [
-                                {"role": "system", "content": "Summarize the key points and context from this conversation. Focus on: topic discussed, data/papers found, conclusions reached, user's goals. Keep under 300 words."},
-                                {"role": "user", "content": f"Conversation to summarize:\n{json.dumps(early_history, indent=2)}"}
-                            ]
-                            
-                            # Use fast model for summarization (cheap)
-                            summary_result = await provider_manager.query_with_fallback(
-                                query="summarize",
-                                conversation_history=[],
-                                messages=summary_messages,
-                                model="llama-3.1-8b-instant",
-                                temperature=0.2,
-                                max_tokens=500
-                            )
-                            
-                            conversation_summary = summary_result['content']
-                            summary_tokens = len(conversation_summary) // 4
-                            
-                            messages.append({"role": "system", "content": f"📜 Previous conversation summary:\n{conversation_summary}"})
-                            messages.extend(recent_history)
-                            
-                            final_tokens = summary_tokens + recent_tokens
-                            logger.info("Summarized conversation", 
-                                      original_tokens=estimated_tokens,
-                                      final_tokens=final_tokens,
-                                      saved_tokens=estimated_tokens - final_tokens,
-                                      early_msgs=len(early_history), 
-                                      recent_msgs=len(recent_history))
-                            
-                        except Exception as e:
-                            # If summarization fails, truncate to fit RECENT_TOKENS budget
-                            logger.warning("Summarization failed, truncating", error=str(e))
-                            
-                            truncated_history = []
-                            truncated_tokens = 0
-                            
-                            for msg in reversed(request.conversation_history):
-                                if use_tiktoken:
-                                    msg_tokens = len(encoder.encode(json.dumps(msg)))
-                                else:
-                                    msg_tokens = len(json.dumps(msg)) // 4
-                                    
-                                if truncated_tokens + msg_tokens <= RECENT_TOKENS:
-                                    truncated_history.insert(0, msg)
-                                    truncated_tokens += msg_tokens
-                                else:
-                                    break
-                            
-                            messages.extend(truncated_history)
-                            logger.info("Truncated to recent", tokens=truncated_tokens, msgs=len(truncated_history))
-            
-            messages.append({"role": "user", "content": request.query})
-            
-            # Use multi-provider manager with automatic failover
-            # Priority: Cerebras (14.4K RPD) → Groq → Cloudflare → others
-            # Pass the prepared messages (which include api_context)
-            result = await provider_manager.query_with_fallback(
-                query=request.query,
-                conversation_history=request.conversation_history,
-                messages=messages,  # ← CRITICAL: Pass the prepared messages with api_context!
-                model=request.model,
-                temperature=request.temperature,
-                max_tokens=request.max_tokens
-            )
-            
-            response_text = result['content']
-            tokens_used = result['tokens']
-            model_used = result['model']
-            provider_used = result['provider']
-            
-            logger.info(
-                "Query successful",
-                provider=provider_used,
-                model=model_used,
-                tokens=tokens_used
-            )
-            
-        except Exception as e:
-            logger.error("All LLM providers failed", error=str(e), user_id=user_id)
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="AI service temporarily unavailable. Please try again."
-            )
-        
-        # Calculate cost
-        cost = calculate_cost(tokens_used)
-        
+                    messages.extend(truncated_history)
+                    logger.info("Truncated to recent", tokens=truncated_tokens, msgs=len(truncated_history))
+    
+    messages.append({"role": "user", "content": request.query})
+    
+    return messages
+
+async def finalize_query(
+    pool: asyncpg.Pool,
+    user_id: str,
+    query_text: str,
+    response_text: str,
+    tokens_used: int,
+    model_used: str,
+    provider_used: str,
+    verify_citations: bool = True
+) -> Dict[str, Any]:
+    """Charge the tokens, record the query and return the accounting fields of QueryResponse"""
+    # Calculate cost
+    cost = calculate_cost(tokens_used)
+    
+    citation_results = None
+    if verify_citations:
         # Verify citations (async, don't block response)
         verifier = get_verifier()
         citation_results = await verifier.verify_response(response_text)
@@ -532,88 +484,212 @@ Otherwise: ANSWER using your tools. Be resourceful, not helpless."""
             broken_urls=citation_results['url_verification']['broken'],
             quality_score=citation_results['quality_score']
         )
-        
+    
+    async with acquire(pool) as conn:
         # Record query for analytics (including provider used)
         query_id = await record_query(
-            conn, user_id, request.query, response_text,
+            conn, user_id, query_text, response_text,
             tokens_used, cost, f"{provider_used}/{model_used}"
         )
         
+        # Get updated token count
+        user = await conn.fetchrow(SELECT_TOKENS_USED_SQL, user_id)
+    
+    tokens_remaining = DAILY_TOKEN_LIMIT - user['tokens_used_today']
+    
+    if citation_results is not None:
         # Record accuracy metrics (async, fire-and-forget)
         import uuid
         response_id = str(uuid.uuid4())
         asyncio.create_task(
             record_accuracy_metrics(query_id, response_id, citation_results)
         )
+    
+    logger.info(
+        "Query processed",
+        user_id=user_id,
+        tokens_used=tokens_used,
+        tokens_remaining=tokens_remaining,
+        cost=cost
+    )
+    
+    return {
+        "tokens_used": tokens_used,
+        "tokens_remaining": max(0, tokens_remaining),
+        "cost": cost,
+        "model": model_used,
+        "provider": provider_used,  # Show which provider was used
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "citation_quality": citation_results  # Include citation verification
+    }
+
+# Main query endpoint
+@router.post("/", response_model=QueryResponse)
+async def process_query(
+    request: QueryRequest,
+    current_user: dict = Depends(get_current_user_from_token),
+    pool: asyncpg.Pool = Depends(get_db_pool)
+):
+    """
+    Process a user query securely
+    - Validates auth token
+    - Checks token limits
+    - Calls Groq API (keys never exposed to client)
+    - Tracks usage and costs
+    """
+    user_id = current_user['user_id']
+    
+    # Estimate tokens needed (rough estimate)
+    estimated_tokens = estimate_tokens(request.query) + (request.max_tokens or 2000)
+    
+    # Check token limit BEFORE making API call
+    await enforce_token_limit(pool, user_id, estimated_tokens)
+    
+    # Call LLM with automatic provider failover
+    # Tries: Groq (4 keys) → Cerebras → Cloudflare → OpenRouter → others
+    provider_manager = get_provider_manager()
+    
+    try:
+        messages = await build_messages(request, provider_manager)
         
-        # Get updated token count
-        user = await conn.fetchrow(
-            "SELECT tokens_used_today FROM users WHERE user_id = $1",
-            user_id
+        # Use multi-provider manager with automatic failover
+        # Priority: Cerebras (14.4K RPD) → Groq → Cloudflare → others
+        # Pass the prepared messages (which include api_context)
+        result = await provider_manager.query_with_fallback(
+            query=request.query,
+            conversation_history=request.conversation_history,
+            messages=messages,  # ← CRITICAL: Pass the prepared messages with api_context!
+            model=request.model,
+            temperature=request.temperature,
+            max_tokens=request.max_tokens
         )
-        tokens_remaining = DAILY_TOKEN_LIMIT - user['tokens_used_today']
         
-        logger.info(
-            "Query processed",
-            user_id=user_id,
-            tokens_used=tokens_used,
-            tokens_remaining=tokens_remaining,
-            cost=cost
-        )
+        response_text = result['content']
+        tokens_used = result['tokens']
+        model_used = result['model']
+        provider_used = result['provider']
         
-        return QueryResponse(
-            response=response_text,
-            tokens_used=tokens_used,
-            tokens_remaining=max(0, tokens_remaining),
-            cost=cost,
+        logger.info(
+            "Query successful",
+            provider=provider_used,
             model=model_used,
-            provider=provider_used,  # Show which provider was used
-            timestamp=datetime.now(timezone.utc).isoformat(),
-            citation_quality=citation_results  # Include citation verification
+            tokens=tokens_used
         )
         
-    finally:
-        await conn.close()
+    except Exception as e:
+        logger.error("All LLM providers failed", error=str(e), user_id=user_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI service temporarily unavailable. Please try again."
+        )
+    
+    summary = await finalize_query(
+        pool, user_id, request.query, response_text, tokens_used, model_used, provider_used
+    )
+    return QueryResponse(response=response_text, **summary)
 
-@router.get("/limits")
-async def get_user_limits(current_user: dict = Depends(get_current_user_from_token)):
-    """Get current user's token usage and limits"""
+@router.post("/stream")
+async def process_query_stream(
+    request: QueryRequest,
+    current_user: dict = Depends(get_current_user_from_token),
+    pool: asyncpg.Pool = Depends(get_db_pool)
+):
+    """
+    Process a user query, streaming the answer as server-sent events
+    - ``token`` events carry content deltas as the provider generates them
+    - A final ``done`` event carries the accounting fields of ``POST /query/``
+    - ``error`` is sent if every provider fails or the stream breaks mid-answer
+    Tokens are charged when the stream ends, including streams the client abandons.
+    """
     user_id = current_user['user_id']
+    estimated_tokens = estimate_tokens(request.query) + (request.max_tokens or 2000)
+    await enforce_token_limit(pool, user_id, estimated_tokens)
     
-    conn = await get_db()
+    provider_manager = get_provider_manager()
     try:
-        user = await conn.fetchrow(
-            """
-            SELECT tokens_used_today, last_token_reset
-            FROM users
-            WHERE user_id = $1
-            """,
-            user_id
+        messages = await build_messages(request, provider_manager)
+    except Exception as e:
+        logger.error("Failed to prepare streaming query", error=str(e), user_id=user_id)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI service temporarily unavailable. Please try again."
         )
+    
+    async def events():
+        parts: List[str] = []
+        last: Dict[str, Any] = {}
+        final: Optional[Dict[str, Any]] = None
+        try:
+            async for chunk in provider_manager.stream_with_fallback(
+                query=request.query,
+                conversation_history=request.conversation_history,
+                messages=messages,
+                model=request.model,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens
+            ):
+                if chunk.get('done'):
+                    final = chunk
+                else:
+                    parts.append(chunk['content'])
+                    last = chunk
+                    yield sse_event("token", {"content": chunk['content']})
+        except Exception as e:
+            logger.error("Streaming query failed", error=str(e), user_id=user_id, streamed_chars=sum(map(len, parts)))
+            yield sse_event("error", {"detail": "AI service temporarily unavailable. Please try again."})
+        finally:
+            if final is None and parts:
+                # Broken or abandoned mid-answer: still charge what was generated.
+                # Shielded so a client disconnect cannot cancel the accounting.
+                with anyio.CancelScope(shield=True):
+                    response_text = "".join(parts)
+                    await finalize_query(
+                        pool, user_id, request.query, response_text, estimate_tokens(response_text),
+                        last['model'], last['provider'], verify_citations=False
+                    )
         
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        # Check if reset needed
-        today = date.today()
-        if user['last_token_reset'] < today:
-            tokens_used = 0
-        else:
-            tokens_used = user['tokens_used_today']
-        
-        tokens_remaining = DAILY_TOKEN_LIMIT - tokens_used
-        
-        return {
-            "daily_limit": DAILY_TOKEN_LIMIT,
-            "tokens_used_today": tokens_used,
-            "tokens_remaining": max(0, tokens_remaining),
-            "reset_date": user['last_token_reset'].isoformat(),
-            "percentage_used": (tokens_used / DAILY_TOKEN_LIMIT * 100) if DAILY_TOKEN_LIMIT > 0 else 0
-        }
-        
-    finally:
-        await conn.close()
+        if final is not None:
+            with anyio.CancelScope(shield=True):
+                summary = await finalize_query(
+                    pool, user_id, request.query, "".join(parts), final['tokens'], final['model'], final['provider']
+                )
+            yield sse_event("done", summary)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
+@router.get("/limits")
+async def get_user_limits(
+    current_user: dict = Depends(get_current_user_from_token),
+    conn: asyncpg.Connection = Depends(get_db_connection)
+):
+    """Get current user's token usage and limits"""
+    user_id = current_user['user_id']
+    
+    user = await conn.fetchrow(SELECT_TOKEN_USAGE_SQL, user_id)
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # Check if reset needed
+    today = date.today()
+    if user['last_token_reset'] < today:
+        tokens_used = 0
+    else:
+        tokens_used = user['tokens_used_today']
+    
+    tokens_remaining = DAILY_TOKEN_LIMIT - tokens_used
+    
+    return {
+        "daily_limit": DAILY_TOKEN_LIMIT,
+        "tokens_used_today": tokens_used,
+        "tokens_remaining": max(0, tokens_remaining),
+        "reset_date": user['last_token_reset'].isoformat(),
+        "percentage_used": (tokens_used / DAILY_TOKEN_LIMIT * 100) if DAILY_TOKEN_LIMIT > 0 else 0
+    }
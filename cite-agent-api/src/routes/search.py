@@ -6,7 +6,7 @@ import structlog
 import uuid
 import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Any, Dict, List, Optional
 
 from src.config.settings import Settings, get_settings
@@ -17,6 +17,7 @@ from src.services.performance_integration import performance_integration
 from src.utils.async_utils import resolve_awaitable
 from src.engine.research_engine import sophisticated_engine
 from src.utils.api_fallback import api_fallback
+from src.utils.sse import sse_event
 
 logger = structlog.get_logger(__name__)
 router = APIRouter()
@@ -424,6 +425,74 @@ async def search_papers(
         )
 
 
+@router.post("/search/stream")
+async def search_papers_stream(
+    request: SearchRequest,
+    settings: Settings = Depends(get_settings)
+):
+    """Stream search results as server-sent events while sources answer
+
+    Each ``papers`` event carries one source's new, deduplicated papers; a final
+    ``done`` event reports the totals and any sources cut off by the latency
+    budget. Performance enhancements need the full result set and are not applied.
+    """
+    trace_id = str(uuid.uuid4())
+    query_id = f"q_{uuid.uuid4().hex[:8]}"
+    logger.info(
+        "Streaming search request received",
+        query=request.query,
+        limit=request.limit,
+        sources=request.sources,
+        trace_id=trace_id
+    )
+
+    async def events():
+        searcher = PaperSearcher()
+        count = 0
+        try:
+            async for event in searcher.iter_search(
+                query=request.query,
+                limit=request.limit,
+                sources=request.sources,
+                filters=request.filters,
+                # The first page can go out as soon as it is full
+                enough=request.limit
+            ):
+                if event.get("done"):
+                    yield sse_event("done", {
+                        "count": count,
+                        "query_id": query_id,
+                        "trace_id": trace_id,
+                        "sources_used": event["sources_used"],
+                        "cancelled_sources": event["cancelled"],
+                    })
+                    continue
+
+                papers = []
+                for raw_paper in event["papers"][:max(0, request.limit - count)]:
+                    payload = _prepare_paper_payload(raw_paper, trace_id)
+                    if not payload:
+                        continue
+                    try:
+                        papers.append(Paper(**payload).model_dump(mode="json"))
+                    except Exception as err:
+                        logger.warning("Skipping paper due to validation failure", error=str(err), trace_id=trace_id)
+                if papers:
+                    count += len(papers)
+                    yield sse_event("papers", {"source": event["source"], "papers": papers})
+        except Exception as e:
+            logger.error("Streaming search failed", error=str(e), query=request.query, trace_id=trace_id)
+            yield sse_event("error", {"error": "search_failed", "message": "Failed to search papers", "trace_id": trace_id})
+        finally:
+            await searcher.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/search/insights/{query_id}")
 async def get_search_insights(
     query_id: str,
@@ -3,37 +3,54 @@ Advanced analytics and monitoring service
 """
 
 import structlog
-import asyncio
-import time
 from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta, timezone
-from collections import defaultdict, Counter
+from datetime import datetime, timezone
+from collections import defaultdict
 import json
 
+from src.utils.sketches import HyperLogLog, LatencyHistogram, RollingCounter, TopK
+
 logger = structlog.get_logger(__name__)
 
 
+QUANTILES = (0.5, 0.95, 0.99)
+TOP_USERS_CAPACITY = 1000  # heavy-hitter counters kept for per-user activity
+
+
+def _prom_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _prom_labels(**labels: str) -> str:
+    return "{" + ",".join(f'{name}="{_prom_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
 class AnalyticsService:
-    """Advanced analytics and monitoring service"""
+    """Advanced analytics and monitoring service
+
+    Every record_* call is O(1) and memory is bounded: latencies go into
+    fixed-size histograms per endpoint and per upstream provider, rates into
+    one-minute ring buffers, and per-user activity into a Space-Saving top-K.
+    """
     
     def __init__(self):
         self.metrics = {
             'requests': defaultdict(int),
-            'response_times': defaultdict(list),
+            'response_times': defaultdict(LatencyHistogram),
             'errors': defaultdict(int),
-            'user_activity': defaultdict(int),
+            'user_activity': TopK(TOP_USERS_CAPACITY),
             'api_usage': defaultdict(int),
-            'performance': defaultdict(list)
+            'performance': {},
+            'provider_latency': defaultdict(LatencyHistogram),
         }
+        self.active_users = HyperLogLog()
+        self.request_rate = RollingCounter(slots=60, slot_seconds=1.0)
+        self.error_rate = RollingCounter(slots=60, slot_seconds=1.0)
         self.start_time = datetime.now(timezone.utc)
     
     def record_request(self, endpoint: str, method: str, user_id: Optional[str] = None):
         """Record API request"""
-        key = f"{method}:{endpoint}"
-        self.metrics['requests'][key] += 1
-        
-        if user_id:
-            self.metrics['user_activity'][user_id] += 1
+        self._count_request(endpoint, method, user_id)
         
         logger.info(
             "Request recorded",
@@ -42,18 +59,37 @@ class AnalyticsService:
             user_id=user_id
         )
     
+    def record_http(
+        self,
+        endpoint: str,
+        method: str,
+        status_code: int,
+        response_time_ms: float,
+        user_id: Optional[str] = None,
+    ):
+        """Record a completed HTTP request (hot path: no logging)"""
+        self._count_request(endpoint, method, user_id)
+        self.record_response_time(endpoint, response_time_ms)
+        if status_code >= 500:
+            self.metrics['errors'][f"{endpoint}:http_{status_code}"] += 1
+            self.error_rate.add()
+    
+    def _count_request(self, endpoint: str, method: str, user_id: Optional[str]):
+        self.metrics['requests'][f"{method}:{endpoint}"] += 1
+        self.request_rate.add()
+        if user_id:
+            self.metrics['user_activity'].add(user_id)
+            self.active_users.add(user_id)
+    
     def record_response_time(self, endpoint: str, response_time: float):
-        """Record response time for an endpoint"""
-        self.metrics['response_times'][endpoint].append(response_time)
-        
-        # Keep only last 1000 measurements
-        if len(self.metrics['response_times'][endpoint]) > 1000:
-            self.metrics['response_times'][endpoint] = self.metrics['response_times'][endpoint][-1000:]
+        """Record response time (milliseconds) for an endpoint"""
+        self.metrics['response_times'][endpoint].record(response_time)
     
     def record_error(self, endpoint: str, error_type: str, error_message: str):
         """Record API error"""
         key = f"{endpoint}:{error_type}"
         self.metrics['errors'][key] += 1
+        self.error_rate.add()
         
         logger.error(
             "Error recorded",
@@ -62,8 +98,14 @@ class AnalyticsService:
             error_message=error_message
         )
     
-    def record_api_usage(self, api_name: str, tokens_used: int = 0, cost: float = 0.0):
-        """Record external API usage"""
+    def record_api_usage(
+        self,
+        api_name: str,
+        tokens_used: int = 0,
+        cost: float = 0.0,
+        latency_ms: Optional[float] = None,
+    ):
+        """Record external API usage, and its latency when known"""
         self.metrics['api_usage'][api_name] += 1
         
         if api_name not in self.metrics['performance']:
@@ -76,20 +118,43 @@ class AnalyticsService:
         self.metrics['performance'][api_name]['total_tokens'] += tokens_used
         self.metrics['performance'][api_name]['total_cost'] += cost
         self.metrics['performance'][api_name]['calls'] += 1
+        
+        if latency_ms is not None:
+            self.metrics['provider_latency'][api_name].record(latency_ms)
+    
+    @staticmethod
+    def _latency_stats(histogram: LatencyHistogram) -> Dict[str, Any]:
+        p50, p95, p99 = histogram.quantiles(QUANTILES)
+        return {
+            'average': histogram.mean,
+            'min': histogram.min,
+            'max': histogram.max,
+            'p50': p50,
+            'p95': p95,
+            'p99': p99,
+            'count': histogram.count
+        }
+    
+    def overall_latency(self) -> LatencyHistogram:
+        """Latency histogram merged across all endpoints"""
+        merged = LatencyHistogram()
+        for histogram in self.metrics['response_times'].values():
+            merged.merge(histogram)
+        return merged
     
     def get_metrics_summary(self) -> Dict[str, Any]:
         """Get comprehensive metrics summary"""
         
-        # Calculate average response times
-        avg_response_times = {}
-        for endpoint, times in self.metrics['response_times'].items():
-            if times:
-                avg_response_times[endpoint] = {
-                    'average': sum(times) / len(times),
-                    'min': min(times),
-                    'max': max(times),
-                    'count': len(times)
-                }
+        response_times = {
+            endpoint: self._latency_stats(histogram)
+            for endpoint, histogram in self.metrics['response_times'].items()
+            if histogram.count
+        }
+        provider_latency = {
+            provider: self._latency_stats(histogram)
+            for provider, histogram in self.metrics['provider_latency'].items()
+            if histogram.count
+        }
         
         # Calculate error rates
         total_requests = sum(self.metrics['requests'].values())
@@ -109,10 +174,11 @@ class AnalyticsService:
                 'uptime_hours': round(uptime_hours, 2),
                 'total_requests': total_requests,
                 'total_errors': sum(self.metrics['errors'].values()),
-                'active_users': len(self.metrics['user_activity']),
+                'active_users': self.active_users.count(),
                 'timestamp': datetime.now(timezone.utc).isoformat()
             },
-            'response_times': avg_response_times,
+            'response_times': response_times,
+            'provider_latency': provider_latency,
             'error_rates': error_rates,
             'api_usage': dict(self.metrics['api_usage']),
             'performance': dict(self.metrics['performance']),
@@ -134,26 +200,24 @@ class AnalyticsService:
         ]
     
     def _get_top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get top users by activity"""
+        """Get top users by activity (counts may over-estimate by ``max_error``)"""
+        activity = self.metrics['user_activity']
         return [
-            {'user_id': user_id, 'requests': count}
-            for user_id, count in sorted(self.metrics['user_activity'].items(), key=lambda x: x[1], reverse=True)[:limit]
+            {'user_id': user_id, 'requests': count, 'max_error': activity.error(user_id)}
+            for user_id, count in activity.top(limit)
         ]
     
     async def get_real_time_metrics(self) -> Dict[str, Any]:
         """Get real-time metrics for monitoring"""
         
-        # Get current minute metrics
+        # Rates come from the one-minute ring buffers
         current_time = datetime.now(timezone.utc)
-        minute_ago = current_time - timedelta(minutes=1)
         
-        # This would typically query a time-series database
-        # For now, return current metrics
         return {
             'timestamp': current_time.isoformat(),
-            'requests_per_minute': sum(self.metrics['requests'].values()) // max(1, int((current_time - self.start_time).total_seconds() / 60)),
-            'errors_per_minute': sum(self.metrics['errors'].values()) // max(1, int((current_time - self.start_time).total_seconds() / 60)),
-            'active_connections': len(self.metrics['user_activity']),
+            'requests_per_minute': self.request_rate.total(),
+            'errors_per_minute': self.error_rate.total(),
+            'active_connections': self.active_users.count(),
             'memory_usage': self._get_memory_usage(),
             'cpu_usage': self._get_cpu_usage()
         }
@@ -186,6 +250,9 @@ class AnalyticsService:
     async def export_metrics(self, format: str = 'json') -> str:
         """Export metrics in specified format"""
         
+        if format == 'prometheus':
+            return self.export_prometheus()
+        
         metrics_data = self.get_metrics_summary()
         
         if format == 'json':
@@ -210,11 +277,71 @@ class AnalyticsService:
         
         # Write response times
         writer.writerow([])
-        writer.writerow(['Endpoint', 'Average Response Time', 'Min', 'Max', 'Count'])
+        writer.writerow(['Endpoint', 'Average Response Time', 'Min', 'Max', 'P95', 'P99', 'Count'])
         for endpoint, stats in metrics_data['response_times'].items():
-            writer.writerow([endpoint, stats['average'], stats['min'], stats['max'], stats['count']])
+            writer.writerow([
+                endpoint, stats['average'], stats['min'], stats['max'], stats['p95'], stats['p99'], stats['count']
+            ])
         
         return output.getvalue()
+    
+    def export_prometheus(self) -> str:
+        """Render metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        
+        def summary(name: str, help_text: str, label: str, histograms: Dict[str, LatencyHistogram]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} summary")
+            for key, histogram in sorted(histograms.items()):
+                if not histogram.count:
+                    continue
+                for q, value in zip(QUANTILES, histogram.quantiles(QUANTILES)):
+                    lines.append(f"{name}{_prom_labels(**{label: key, 'quantile': str(q)})} {value:.6g}")
+                lines.append(f"{name}_sum{_prom_labels(**{label: key})} {histogram.total:.6g}")
+                lines.append(f"{name}_count{_prom_labels(**{label: key})} {histogram.count}")
+        
+        def counter(name: str, help_text: str, samples: List[tuple]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in samples:
+                lines.append(f"{name}{_prom_labels(**labels)} {value}")
+        
+        summary(
+            "nocturnal_request_latency_ms", "Request latency in milliseconds by endpoint",
+            "endpoint", self.metrics['response_times'],
+        )
+        summary(
+            "nocturnal_upstream_latency_ms", "Upstream provider call latency in milliseconds",
+            "provider", self.metrics['provider_latency'],
+        )
+        counter("nocturnal_requests_total", "Requests by method and endpoint", [
+            (dict(zip(("method", "endpoint"), key.split(':', 1))), count)
+            for key, count in sorted(self.metrics['requests'].items())
+        ])
+        counter("nocturnal_errors_total", "Errors by endpoint and type", [
+            (dict(zip(("endpoint", "type"), key.rsplit(':', 1))), count)
+            for key, count in sorted(self.metrics['errors'].items())
+        ])
+        counter("nocturnal_upstream_calls_total", "Upstream provider calls", [
+            ({"provider": name}, stats['calls']) for name, stats in sorted(self.metrics['performance'].items())
+        ])
+        counter("nocturnal_upstream_tokens_total", "Tokens consumed by upstream provider", [
+            ({"provider": name}, stats['total_tokens']) for name, stats in sorted(self.metrics['performance'].items())
+        ])
+        
+        uptime = (datetime.now(timezone.utc) - self.start_time).total_seconds()
+        lines.extend([
+            "# HELP nocturnal_requests_per_minute Requests over the last minute",
+            "# TYPE nocturnal_requests_per_minute gauge",
+            f"nocturnal_requests_per_minute {self.request_rate.total()}",
+            "# HELP nocturnal_active_users Distinct users seen since start (estimate)",
+            "# TYPE nocturnal_active_users gauge",
+            f"nocturnal_active_users {self.active_users.count()}",
+            "# HELP nocturnal_uptime_seconds Seconds since the analytics service started",
+            "# TYPE nocturnal_uptime_seconds gauge",
+            f"nocturnal_uptime_seconds {uptime:.0f}",
+        ])
+        return "\n".join(lines) + "\n"
 
 
 # Global analytics instance
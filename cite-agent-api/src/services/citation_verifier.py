@@ -4,14 +4,57 @@ Extracts and verifies citations from LLM responses
 """
 
 import re
+import html
+import time
 import httpx
+import socket
 import asyncio
-from typing import Dict, List, Any
-from urllib.parse import urlparse
+import ipaddress
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
 import structlog
 
+from src.config.settings import get_settings
+
 logger = structlog.get_logger(__name__)
 
+TITLE_BYTES = 16384            # a ranged GET reads at most this much looking for <title>
+TRANSIENT_TTL = 60             # seconds timeouts and connection errors are remembered
+MAX_REDIRECTS = 5
+_HEAD_FINAL = {404, 410}       # HEAD answers trusted without a GET fallback
+_TRAILING_PUNCTUATION = ".,;:'\""
+_DOI_HOSTS = {"doi.org", "dx.doi.org", "www.doi.org"}
+_ARXIV_PATH_RE = re.compile(r"^/(?:abs|pdf)/(.+?)(?:\.pdf)?$")
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+
+class BlockedTarget(Exception):
+    """A cited URL (or a redirect) points at a non-public address"""
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a cited URL: sentence punctuation, fragments and default ports dropped,
+    DOI links lowercased and arXiv PDF links mapped to their abstract page"""
+    url = url.strip().rstrip(_TRAILING_PUNCTUATION)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, 80 if scheme == "http" else 443) else f"{host}:{port}"
+    path = parts.path or "/"
+
+    if host in _DOI_HOSTS:
+        return f"https://doi.org{path.lower()}"
+    if host in ("arxiv.org", "www.arxiv.org"):
+        match = _ARXIV_PATH_RE.match(path)
+        if match:
+            return f"https://arxiv.org/abs/{match.group(1)}"
+    return urlunsplit((scheme, netloc, path, parts.query, ""))
+
 
 class CitationVerifier:
     """Verify citations in LLM responses"""
@@ -26,9 +69,22 @@ class CitationVerifier:
     QUOTE_PATTERN = r'"([^"]+)"'  # Text in quotes
     ATTRIBUTION_PATTERN = r'—\s*([^,\n]+)(?:,\s*(?:p\.|line)\s*(\d+))?'  # — Author, p. X
     
-    def __init__(self, timeout: int = 5, max_concurrent: int = 10):
+    def __init__(self, timeout: int = 5, max_concurrent: int = 10, allow_private: Optional[bool] = None):
+        settings = get_settings()
+        # Cited URLs are untrusted input: by default only public addresses are fetched
+        self.allow_private = settings.citation_verify_allow_private if allow_private is None else allow_private
         self.timeout = timeout
         self.max_concurrent = max_concurrent
+        self.positive_ttl = settings.citation_verify_ttl
+        self.negative_ttl = settings.citation_verify_negative_ttl
+        self.per_host = settings.citation_verify_per_host
+        self.cache_entries = settings.citation_verify_cache_entries
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
     
     def extract_citations(self, text: str) -> Dict[str, List[str]]:
         """
@@ -116,73 +172,164 @@ class CitationVerifier:
     
     async def verify_url(self, url: str) -> Dict[str, Any]:
         """
-        Verify a single URL
+        Verify a single URL, answering from the shared cache when possible
         
         Returns:
             {
                 'url': str,
-                'status': 'verified' | 'broken' | 'timeout' | 'error',
+                'status': 'verified' | 'broken' | 'timeout' | 'error' | 'blocked',
                 'status_code': int | None,
-                'title': str | None
+                'title': str | None,
+                'cached': bool
             }
         """
+        key = normalize_url(url)
+        cached = self._cached(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return {**cached, 'url': url, 'cached': True}
+
+        task = self._inflight.get(key)
+        owner = task is None
+        if owner:
+            self.stats["misses"] += 1
+            # A detached task: cancelling the caller that started it leaves the other waiters served
+            task = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None) if self._inflight.get(key) is done else None)
+        else:
+            self.stats["coalesced"] += 1
+        result = await asyncio.shield(task)
+        return {**result, 'url': url, 'cached': not owner}
+
+    async def _load(self, key: str) -> Dict[str, Any]:
+        result = await self._fetch(key)
+        self._remember(key, result)
+        return result
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return result
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        if result['status'] == 'verified':
+            ttl = self.positive_ttl
+        elif result['status'] == 'broken':
+            ttl = self.negative_ttl
+        else:
+            ttl = min(self.negative_ttl, TRANSIENT_TTL)
+        self._cache[key] = (time.monotonic() + ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+    def _client(self) -> httpx.AsyncClient:
+        """Keep-alive client shared by every verification on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._http_loop is not loop:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_concurrent * 2, max_keepalive_connections=self.max_concurrent),
+                headers={"User-Agent": "Nocturnal-Archive/1.0 (contact@nocturnal.dev)"},
+                # Redirects are followed in _send so every hop is checked
+                follow_redirects=False,
+            )
+            self._http_loop = loop
+            self._host_limits = {}
+        return self._http
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return limit
+
+    async def _check_target(self, url: str) -> None:
+        """Raise BlockedTarget unless ``url`` is http(s) and its host resolves only to public addresses"""
+        if self.allow_private:
+            return
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise BlockedTarget(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+            if not address.is_global or address.is_multicast:
+                raise BlockedTarget(url)
+
+    async def _send(self, client: httpx.AsyncClient, method: str, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """Streamed response after following redirects by hand, re-checking the target of every hop
+        (the caller closes it)"""
+        await self._check_target(url)
+        request = client.build_request(method, url, headers=headers, timeout=self.timeout)
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await client.send(request, stream=True)
+            if not response.is_redirect or response.next_request is None:
+                return response
+            await response.aclose()
+            request = response.next_request
+            await self._check_target(str(request.url))
+        raise httpx.TooManyRedirects("Exceeded maximum allowed redirects", request=request)
+
+    async def _fetch(self, url: str) -> Dict[str, Any]:
+        """HEAD first; servers that refuse HEAD get a ranged GET that stops after <title>"""
+        client = self._client()
         try:
-            async with httpx.AsyncClient() as client:
-                # Try HEAD first (faster)
-                response = await client.head(
-                    url, 
-                    timeout=self.timeout,
-                    follow_redirects=True
-                )
-                
-                if response.status_code == 200:
-                    return {
-                        'url': url,
-                        'status': 'verified',
-                        'status_code': 200,
-                        'title': None  # Could extract from GET if needed
-                    }
-                elif response.status_code == 405:  # HEAD not allowed, try GET
-                    response = await client.get(
-                        url,
-                        timeout=self.timeout,
-                        follow_redirects=True
-                    )
-                    if response.status_code == 200:
-                        return {
-                            'url': url,
-                            'status': 'verified',
-                            'status_code': 200,
-                            'title': self._extract_title(response.text)
-                        }
-                
-                return {
-                    'url': url,
-                    'status': 'broken',
-                    'status_code': response.status_code,
-                    'title': None
-                }
-                
-        except asyncio.TimeoutError:
-            return {
-                'url': url,
-                'status': 'timeout',
-                'status_code': None,
-                'title': None
-            }
+            async with self._host_limit(url):
+                response = await self._send(client, "HEAD", url)
+                await response.aclose()
+                if response.is_success:
+                    return self._result('verified', response.status_code)
+                if response.status_code in _HEAD_FINAL:
+                    return self._result('broken', response.status_code)
+                return await self._ranged_get(client, url)
+        except BlockedTarget:
+            logger.warning("URL verification blocked: non-public address", url=url)
+            return self._result('blocked')
+        except (httpx.TimeoutException, asyncio.TimeoutError):
+            return self._result('timeout')
         except Exception as e:
-            logger.warning(f"URL verification failed", url=url, error=str(e))
-            return {
-                'url': url,
-                'status': 'error',
-                'status_code': None,
-                'title': None
-            }
+            logger.warning("URL verification failed", url=url, error=str(e))
+            return self._result('error')
+
+    async def _ranged_get(self, client: httpx.AsyncClient, url: str) -> Dict[str, Any]:
+        headers = {"Range": f"bytes=0-{TITLE_BYTES - 1}"}
+        response = await self._send(client, "GET", url, headers=headers)
+        try:
+            if not response.is_success:
+                return self._result('broken', response.status_code)
+            # Servers that ignore Range send the whole page; stop reading once the title is in
+            head = b""
+            async for chunk in response.aiter_bytes():
+                head += chunk
+                if b"</title>" in head.lower() or len(head) >= TITLE_BYTES:
+                    break
+            title = self._extract_title(head[:TITLE_BYTES].decode(response.encoding or "utf-8", errors="ignore"))
+            return self._result('verified', response.status_code, title)
+        finally:
+            await response.aclose()
+
+    @staticmethod
+    def _result(status: str, status_code: Optional[int] = None, title: Optional[str] = None) -> Dict[str, Any]:
+        return {'status': status, 'status_code': status_code, 'title': title}
     
-    def _extract_title(self, html: str) -> str | None:
+    def _extract_title(self, html_text: str) -> str | None:
         """Extract title from HTML"""
-        match = re.search(r'<title>(.+?)</title>', html, re.IGNORECASE)
-        return match.group(1) if match else None
+        match = _TITLE_RE.search(html_text)
+        return " ".join(html.unescape(match.group(1)).split()) if match else None
+
+    async def aclose(self) -> None:
+        client, self._http = self._http, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
     
     async def verify_all_urls(self, urls: List[str]) -> Dict[str, Any]:
         """
@@ -195,6 +342,8 @@ class CitationVerifier:
                 'broken': int,
                 'timeout': int,
                 'error': int,
+                'blocked': int,
+                'cached': int,
                 'details': [...]
             }
         """
@@ -205,6 +354,8 @@ class CitationVerifier:
                 'broken': 0,
                 'timeout': 0,
                 'error': 0,
+                'blocked': 0,
+                'cached': 0,
                 'details': []
             }
         
@@ -222,8 +373,8 @@ class CitationVerifier:
         
         # Handle exceptions
         results = [
-            r if not isinstance(r, Exception) 
-            else {'url': urls[i], 'status': 'error', 'status_code': None, 'title': None}
+            r if not isinstance(r, BaseException) 
+            else {'url': urls[i], 'status': 'error', 'status_code': None, 'title': None, 'cached': False}
             for i, r in enumerate(results)
         ]
         
@@ -234,15 +385,20 @@ class CitationVerifier:
             'broken': sum(1 for r in results if r['status'] == 'broken'),
             'timeout': sum(1 for r in results if r['status'] == 'timeout'),
             'error': sum(1 for r in results if r['status'] == 'error'),
+            'blocked': sum(1 for r in results if r['status'] == 'blocked'),
+            'cached': sum(1 for r in results if r['cached']),
             'details': results
         }
         
         return status_counts
     
-    async def verify_response(self, response_text: str) -> Dict[str, Any]:
+    async def verify_response(self, response_text: str, extra_urls: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Verify all citations in a response (quantitative + qualitative)
         
+        ``extra_urls`` (e.g. a synthesis' reference list) are verified with the
+        URLs found in the text.
+        
         Returns:
             {
                 'has_citations': bool,
@@ -255,6 +411,8 @@ class CitationVerifier:
             }
         """
         citations = self.extract_citations(response_text)
+        if extra_urls:
+            citations['urls'] = list(dict.fromkeys(citations['urls'] + list(extra_urls)))
         url_verification = await self.verify_all_urls(citations['urls'])
         
         # Extract quotes (for qualitative analysis)
@@ -327,3 +485,9 @@ def get_verifier() -> CitationVerifier:
         _verifier = CitationVerifier()
     return _verifier
 
+
+async def close_verifier() -> None:
+    """Close the shared verification client on shutdown"""
+    if _verifier is not None:
+        await _verifier.aclose()
+
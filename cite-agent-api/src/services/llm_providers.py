@@ -5,14 +5,53 @@ Supports: Groq (4 keys), Cerebras, Cloudflare, OpenRouter, Together, Fireworks
 
 import os
 import asyncio
-from typing import List, Dict, Optional, Any
+import json
+import time
+from typing import AsyncIterator, List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass
 import structlog
 from groq import Groq
 import httpx
 
+from src.config.settings import get_settings
+from src.services.analytics import analytics_service
+from src.services.llm_routing import ProviderRouter, parse_duration
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 logger = structlog.get_logger(__name__)
 
+# Try providers in order (Cerebras first - highest rate limit)
+PROVIDER_PRIORITY = ['cerebras', 'groq', 'cloudflare', 'openrouter', 'together', 'fireworks']
+MIN_LATENCY_SAMPLES = 20  # calls before a provider's latency histogram sets its hedge delay
+OPENAI_COMPATIBLE = ('groq', 'cerebras', 'openrouter', 'together', 'fireworks')
+
+# MODEL MAPPING: Translate model names between providers
+# Cerebras uses 'llama-3.3-70b', Groq uses 'llama-3.3-70b-versatile'
+MODEL_MAP = {
+    'groq': {
+        'llama-3.3-70b': 'llama-3.3-70b-versatile',
+        'llama3.1-8b': 'llama-3.1-8b-instant'
+    },
+    'cerebras': {
+        'llama-3.3-70b-versatile': 'llama-3.3-70b',
+        'llama-3.1-8b-instant': 'llama3.1-8b'
+    }
+}
+
+
+class ProviderHTTPError(Exception):
+    """Non-200 reply from a provider, with what the router needs to react to it"""
+    
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
 @dataclass
 class ProviderConfig:
     name: str
@@ -28,6 +67,31 @@ class LLMProviderManager:
     def __init__(self):
         self.providers = self._load_providers()
         self.usage_tracking = {}  # Track usage per key
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.router = ProviderRouter()
+    
+    def _client(self, provider_name: str) -> httpx.AsyncClient:
+        """Long-lived keep-alive client for one provider, created on first use"""
+        client = self._clients.get(provider_name)
+        if client is None or client.is_closed:
+            settings = get_settings()
+            client = httpx.AsyncClient(
+                http2=settings.llm_http2 and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=settings.llm_http_max_connections,
+                    max_keepalive_connections=settings.llm_http_max_keepalive,
+                    keepalive_expiry=settings.llm_http_keepalive_expiry,
+                ),
+                timeout=60.0,
+            )
+            self._clients[provider_name] = client
+        return client
+    
+    async def aclose(self):
+        """Close every provider client pool"""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
         
     def _load_providers(self) -> Dict[str, ProviderConfig]:
         """Load all configured providers from environment"""
@@ -120,20 +184,41 @@ class LLMProviderManager:
         logger.info(f"Loaded {len(providers)} LLM providers", providers=list(providers.keys()))
         return providers
     
-    def get_next_key(self, provider_name: str) -> Optional[str]:
-        """Get next available key for provider (round-robin)"""
-        if provider_name not in self.providers:
-            return None
+    def _rotated_keys(self, provider_name: str) -> List[str]:
+        """Provider keys starting at the round-robin cursor, which then advances
         
+        The router keeps this order between keys it scores equally, so unmeasured
+        keys still share the load.
+        """
         provider = self.providers[provider_name]
         if not provider.keys:
+            return []
+        start = provider.current_key_index % len(provider.keys)
+        provider.current_key_index = (start + 1) % len(provider.keys)
+        return provider.keys[start:] + provider.keys[:start]
+    
+    def get_next_key(self, provider_name: str) -> Optional[str]:
+        """Get the healthiest key for provider (see ProviderRouter.rank)"""
+        if provider_name not in self.providers:
             return None
         
-        # Round-robin through keys
-        key = provider.keys[provider.current_key_index]
-        provider.current_key_index = (provider.current_key_index + 1) % len(provider.keys)
-        
-        return key
+        ranked = self.router.rank([(provider_name, key) for key in self._rotated_keys(provider_name)])
+        return ranked[0][1] if ranked else None
+    
+    def scoreboard(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Router health for every configured key, including ones not called yet"""
+        for provider_name, provider in self.providers.items():
+            for key in provider.keys:
+                self.router.health(provider_name, key)
+        return self.router.scoreboard()
+    
+    def _resolve_model(self, provider_name: str, model: Optional[str]) -> str:
+        """Provider-specific name for ``model`` (the provider's default when None)"""
+        provider = self.providers.get(provider_name)
+        if not provider:
+            raise ValueError(f"Unknown provider: {provider_name}")
+        requested_model = model or provider.models[0]
+        return MODEL_MAP.get(provider_name, {}).get(requested_model, requested_model)
     
     async def call_provider(
         self, 
@@ -146,36 +231,15 @@ class LLMProviderManager:
     ) -> Dict[str, Any]:
         """Call a specific provider with given parameters"""
         
-        provider = self.providers.get(provider_name)
-        if not provider:
-            raise ValueError(f"Unknown provider: {provider_name}")
-        
-        # MODEL MAPPING: Translate model names between providers
-        # Cerebras uses 'llama-3.3-70b', Groq uses 'llama-3.3-70b-versatile'
-        model_map = {
-            'groq': {
-                'llama-3.3-70b': 'llama-3.3-70b-versatile',
-                'llama3.1-8b': 'llama-3.1-8b-instant'
-            },
-            'cerebras': {
-                'llama-3.3-70b-versatile': 'llama-3.3-70b',
-                'llama-3.1-8b-instant': 'llama3.1-8b'
-            }
-        }
-        
-        requested_model = model or provider.models[0]
-        
-        # Map model if needed
-        if provider_name in model_map and requested_model in model_map[provider_name]:
-            model_to_use = model_map[provider_name][requested_model]
-        else:
-            model_to_use = requested_model
+        model_to_use = self._resolve_model(provider_name, model)
         
+        started = time.perf_counter()
+        self.router.begin(provider_name, api_key)
         try:
-            if provider_name in ['groq', 'cerebras', 'openrouter', 'together', 'fireworks']:
+            if provider_name in OPENAI_COMPATIBLE:
                 # OpenAI-compatible providers
-                return await self._call_openai_compatible(
-                    endpoint=provider.endpoint,
+                result = await self._call_openai_compatible(
+                    endpoint=self.providers[provider_name].endpoint,
                     api_key=api_key,
                     model=model_to_use,
                     messages=messages,
@@ -185,7 +249,7 @@ class LLMProviderManager:
                 )
             
             elif provider_name == 'cloudflare':
-                return await self._call_cloudflare(
+                result = await self._call_cloudflare(
                     api_key=api_key,
                     model=model_to_use,
                     messages=messages,
@@ -195,9 +259,26 @@ class LLMProviderManager:
             else:
                 raise ValueError(f"Unsupported provider: {provider_name}")
                 
+        except asyncio.CancelledError:
+            # Lost a hedge race: says nothing about this key's health
+            self.router.release(provider_name, api_key)
+            raise
         except Exception as e:
             logger.error(f"{provider_name} call failed", error=str(e))
+            if isinstance(e, ProviderHTTPError):
+                self.router.record_failure(provider_name, api_key, e.status_code, e.retry_after)
+            else:
+                self.router.record_failure(provider_name, api_key)
             raise
+        
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.router.record_success(provider_name, api_key, latency_ms)
+        analytics_service.record_api_usage(
+            provider_name,
+            tokens_used=result.get('tokens', 0),
+            latency_ms=latency_ms,
+        )
+        return result
     
     async def _call_openai_compatible(
         self,
@@ -211,35 +292,42 @@ class LLMProviderManager:
     ) -> Dict[str, Any]:
         """Call OpenAI-compatible API"""
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                endpoint,
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": model,
-                    "messages": messages,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens
-                },
-                timeout=60.0
+        client = self._client(provider_name)
+        response = await client.post(
+            endpoint,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            timeout=60.0
+        )
+        
+        self._check_response(provider_name, api_key, response)
+        data = response.json()
+        
+        return {
+            'content': data['choices'][0]['message']['content'],
+            'tokens': data.get('usage', {}).get('total_tokens', 0),
+            'model': model,
+            'provider': provider_name
+        }
+    
+    def _check_response(self, provider_name: str, api_key: str, response: httpx.Response) -> None:
+        """Feed quota headers to the router and raise ProviderHTTPError on non-200 replies"""
+        self.router.observe_headers(provider_name, api_key, response.headers)
+        if response.status_code == 429:
+            retry_after = parse_duration(response.headers.get('retry-after')) or parse_duration(
+                response.headers.get('x-ratelimit-reset-requests')
             )
-            
-            if response.status_code == 429:
-                raise Exception("Rate limit exceeded")
-            elif response.status_code != 200:
-                raise Exception(f"HTTP {response.status_code}: {response.text}")
-            
-            data = response.json()
-            
-            return {
-                'content': data['choices'][0]['message']['content'],
-                'tokens': data.get('usage', {}).get('total_tokens', 0),
-                'model': model,
-                'provider': provider_name
-            }
+            raise ProviderHTTPError("Rate limit exceeded", 429, retry_after)
+        if response.status_code != 200:
+            raise ProviderHTTPError(f"HTTP {response.status_code}: {response.text}", response.status_code)
     
     async def _call_cloudflare(
         self,
@@ -253,31 +341,159 @@ class LLMProviderManager:
         account_id = os.getenv('CLOUDFLARE_ACCOUNT_ID')
         endpoint = f'https://api.cloudflare.com/client/v4/accounts/{account_id}/ai/run/{model}'
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                endpoint,
+        client = self._client('cloudflare')
+        response = await client.post(
+            endpoint,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "messages": messages,
+                "max_tokens": max_tokens
+            },
+            timeout=60.0
+        )
+        
+        self._check_response('cloudflare', api_key, response)
+        data = response.json()
+        
+        return {
+            'content': data['result']['response'],
+            'tokens': data['result'].get('tokens_used', 0),
+            'model': model,
+            'provider': 'cloudflare'
+        }
+    
+    async def stream_provider(
+        self,
+        provider_name: str,
+        api_key: str,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4000
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a completion from one provider as it is generated
+        
+        Yields ``{'content', 'model', 'provider'}`` for every token delta, then a
+        final ``{'done': True, 'tokens', 'model', 'provider'}``. Token usage comes
+        from the provider when it reports it, otherwise it is estimated.
+        """
+        model_to_use = self._resolve_model(provider_name, model)
+        if provider_name in OPENAI_COMPATIBLE:
+            url = self.providers[provider_name].endpoint
+            payload = {
+                "model": model_to_use,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "stream": True,
+                "stream_options": {"include_usage": True}
+            }
+            extract = _openai_delta
+        elif provider_name == 'cloudflare':
+            account_id = os.getenv('CLOUDFLARE_ACCOUNT_ID')
+            url = f'https://api.cloudflare.com/client/v4/accounts/{account_id}/ai/run/{model_to_use}'
+            payload = {"messages": messages, "max_tokens": max_tokens, "stream": True}
+            extract = _cloudflare_delta
+        else:
+            raise ValueError(f"Unsupported provider: {provider_name}")
+        
+        started = time.perf_counter()
+        self.router.begin(provider_name, api_key)
+        chars = 0
+        tokens = 0
+        try:
+            async with self._client(provider_name).stream(
+                "POST",
+                url,
                 headers={
                     "Authorization": f"Bearer {api_key}",
                     "Content-Type": "application/json"
                 },
-                json={
-                    "messages": messages,
-                    "max_tokens": max_tokens
-                },
+                json=payload,
                 timeout=60.0
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                self._check_response(provider_name, api_key, response)
+                async for event in _iter_sse(response):
+                    content, usage = extract(event)
+                    tokens = usage or tokens
+                    if content:
+                        chars += len(content)
+                        yield {'content': content, 'model': model_to_use, 'provider': provider_name}
+        except (asyncio.CancelledError, GeneratorExit):
+            # Abandoned by the consumer: says nothing about this key's health
+            self.router.release(provider_name, api_key)
+            raise
+        except Exception as e:
+            logger.error(f"{provider_name} stream failed", error=str(e))
+            if isinstance(e, ProviderHTTPError):
+                self.router.record_failure(provider_name, api_key, e.status_code, e.retry_after)
+            else:
+                self.router.record_failure(provider_name, api_key)
+            raise
+        
+        latency_ms = (time.perf_counter() - started) * 1000
+        tokens = tokens or chars // 4
+        self.router.record_success(provider_name, api_key, latency_ms)
+        analytics_service.record_api_usage(provider_name, tokens_used=tokens, latency_ms=latency_ms)
+        yield {'done': True, 'tokens': tokens, 'model': model_to_use, 'provider': provider_name}
+    
+    async def stream_with_fallback(
+        self,
+        query: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        messages: Optional[List[Dict[str, str]]] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.2,
+        max_tokens: int = 4000
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of query_with_fallback (same chunks as stream_provider)
+        Fails over to the next candidate until the first token arrives; after that the
+        stream is committed to its provider and a failure is raised to the caller.
+        Streams are never hedged.
+        """
+        messages = _build_messages(query, conversation_history, messages)
+        
+        for provider_name, key in self._ranked_attempts():
+            logger.info(f"Streaming from {provider_name}", key_preview=key[:10])
+            stream = self.stream_provider(
+                provider_name=provider_name,
+                api_key=key,
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens
             )
+            try:
+                first = await stream.__anext__()
+            except Exception as e:
+                logger.warning(f"{provider_name} failed, trying next", error=str(e)[:100])
+                continue
             
-            if response.status_code != 200:
-                raise Exception(f"HTTP {response.status_code}: {response.text}")
-            
-            data = response.json()
-            
-            return {
-                'content': data['result']['response'],
-                'tokens': data['result'].get('tokens_used', 0),
-                'model': model,
-                'provider': 'cloudflare'
-            }
+            try:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
+        
+        # All providers failed
+        raise Exception("All LLM providers are unavailable")
+    
+    def _ranked_attempts(self) -> List[Tuple[str, str]]:
+        """Every configured (provider, key), healthiest first"""
+        return self.router.rank([
+            (provider_name, key)
+            for provider_name in PROVIDER_PRIORITY
+            if provider_name in self.providers
+            for key in self._rotated_keys(provider_name)
+        ])
     
     async def query_with_fallback(
         self,
@@ -290,62 +506,130 @@ class LLMProviderManager:
     ) -> Dict[str, Any]:
         """
         Try providers in priority order until one succeeds
-        Priority: cerebras (14.4K RPD) → groq (1K RPD) → cloudflare → openrouter → together → fireworks
+        Priority: cerebras (14.4K RPD) → groq (1K RPD) → cloudflare → openrouter → together → fireworks,
+        re-ordered per call by key health (see ProviderRouter); see llm_hedge_requests for
+        racing slow providers
         """
         
-        # Use pre-built messages if provided, otherwise build from query
-        if messages:
-            pass  # Use the provided messages as-is
-        elif conversation_history:
-            messages = conversation_history + [{"role": "user", "content": query}]
-        else:
-            messages = [{"role": "user", "content": query}]
+        messages = _build_messages(query, conversation_history, messages)
+        attempts = self._ranked_attempts()
         
-        # Try providers in order (Cerebras first - highest rate limit)
-        provider_priority = ['cerebras', 'groq', 'cloudflare', 'openrouter', 'together', 'fireworks']
+        async def attempt(provider_name: str, key: str) -> Dict[str, Any]:
+            logger.info(f"Trying {provider_name}", key_preview=key[:10])
+            result = await self.call_provider(
+                provider_name=provider_name,
+                api_key=key,
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            logger.info(
+                f"Success with {provider_name}",
+                tokens=result['tokens'],
+                model=result['model']
+            )
+            return result
         
-        for provider_name in provider_priority:
-            if provider_name not in self.providers:
-                continue  # Skip if not configured
-            
-            provider = self.providers[provider_name]
-            
-            # Try each key for this provider
-            for _ in range(len(provider.keys)):
-                key = self.get_next_key(provider_name)
-                if not key:
+        return await self._run_attempts(attempts, attempt, hedge=get_settings().llm_hedge_requests)
+    
+    def _hedge_delay(self, provider_name: str) -> float:
+        """Seconds to wait on ``provider_name`` before hedging: its p95, or the configured budget"""
+        histogram = analytics_service.metrics['provider_latency'].get(provider_name)
+        if histogram is not None and histogram.count >= MIN_LATENCY_SAMPLES:
+            return histogram.quantile(0.95) / 1000
+        return get_settings().llm_hedge_delay_ms / 1000
+    
+    async def _run_attempts(self, attempts, attempt, hedge: bool = False) -> Dict[str, Any]:
+        """Run ``attempt(provider, key)`` over ``attempts`` until one succeeds
+        
+        Failures move on to the next attempt immediately. With ``hedge``, an attempt
+        still running after its provider's latency budget is raced against the next
+        provider; the first success wins and the others are cancelled.
+        """
+        remaining = list(attempts)
+        running: Dict[asyncio.Task, str] = {}
+        
+        def launch(hedging: bool) -> Optional[str]:
+            busy = set(running.values())
+            for index, (provider_name, key) in enumerate(remaining):
+                # A hedge goes to a different provider than the ones already in flight
+                if not hedging or provider_name not in busy:
+                    del remaining[index]
+                    running[asyncio.ensure_future(attempt(provider_name, key))] = provider_name
+                    return provider_name
+            return None
+        
+        current = launch(hedging=False)
+        try:
+            while running:
+                timeout = self._hedge_delay(current) if hedge and remaining else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = launch(hedging=True)
+                    if hedged:
+                        logger.info(f"{current} over latency budget, hedging with {hedged}")
+                        current = hedged
                     continue
                 
-                try:
-                    logger.info(f"Trying {provider_name}", key_preview=key[:10])
-                    
-                    result = await self.call_provider(
-                        provider_name=provider_name,
-                        api_key=key,
-                        messages=messages,
-                        model=model,
-                        temperature=temperature,
-                        max_tokens=max_tokens
-                    )
-                    
-                    logger.info(
-                        f"Success with {provider_name}",
-                        tokens=result['tokens'],
-                        model=result['model']
-                    )
-                    
-                    return result
-                    
-                except Exception as e:
+                for task in done:
+                    provider_name = running.pop(task)
+                    if task.exception() is None:
+                        return task.result()
                     logger.warning(
                         f"{provider_name} failed, trying next",
-                        error=str(e)[:100]
+                        error=str(task.exception())[:100]
                     )
-                    continue
+                if not running or not hedge:
+                    current = launch(hedging=False) or current
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
         
         # All providers failed
         raise Exception("All LLM providers are unavailable")
 
+def _build_messages(
+    query: str,
+    conversation_history: Optional[List[Dict[str, str]]],
+    messages: Optional[List[Dict[str, str]]]
+) -> List[Dict[str, str]]:
+    # Use pre-built messages if provided, otherwise build from query
+    if messages:
+        return messages
+    if conversation_history:
+        return conversation_history + [{"role": "user", "content": query}]
+    return [{"role": "user", "content": query}]
+
+
+async def _iter_sse(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    """JSON payloads of a server-sent event stream, up to ``data: [DONE]``"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        if not data:
+            continue
+        try:
+            yield json.loads(data)
+        except ValueError:
+            logger.debug("Skipping malformed stream event", data=data[:100])
+
+
+def _openai_delta(event: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
+    choices = event.get('choices') or []
+    content = (choices[0].get('delta') or {}).get('content') if choices else None
+    return content, (event.get('usage') or {}).get('total_tokens')
+
+
+def _cloudflare_delta(event: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
+    return event.get('response'), (event.get('usage') or {}).get('total_tokens')
+
+
 # Global instance
 _provider_manager = None
 
@@ -356,3 +640,8 @@ def get_provider_manager() -> LLMProviderManager:
         _provider_manager = LLMProviderManager()
     return _provider_manager
 
+async def close_provider_manager():
+    """Close the provider HTTP pools on shutdown"""
+    if _provider_manager is not None:
+        await _provider_manager.aclose()
+
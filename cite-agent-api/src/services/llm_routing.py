@@ -0,0 +1,234 @@
+"""
+Health-scored routing across LLM providers and their API keys
+Tracks EWMA latency and error rate, 429 cooldowns, quota headers and a circuit per key
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+EWMA_ALPHA = 0.2               # weight of the newest observation
+ERROR_PENALTY = 4.0            # score multiplier per unit of error rate
+LOW_QUOTA_PENALTY = 2.0        # score multiplier when few requests remain in the provider window
+LOW_QUOTA_REQUESTS = 5
+FAILURE_THRESHOLD = 3          # consecutive failures that open a key's circuit
+BASE_OPEN_SECONDS = 15.0       # first open period; doubles on every failed probe
+MAX_OPEN_SECONDS = 300.0
+DEFAULT_COOLDOWN_SECONDS = 30.0  # 429 without Retry-After / reset headers
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from ``Retry-After`` / ``x-ratelimit-reset-*`` values such as ``12``, ``1m30s`` or ``250ms``"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    raw = headers.get(name)
+    try:
+        return int(float(raw)) if raw is not None else None
+    except ValueError:
+        return None
+
+
+def key_preview(api_key: str) -> str:
+    return f"{api_key[:6]}…" if len(api_key) > 6 else "…"
+
+
+@dataclass
+class KeyHealth:
+    """Live health of one provider key"""
+    provider: str
+    key_id: str
+    latency_ms: Optional[float] = None
+    error_rate: float = 0.0
+    successes: int = 0
+    failures: int = 0
+    rate_limited: int = 0
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0
+    circuit_open_until: float = 0.0
+    open_seconds: float = 0.0
+    probing: bool = False
+    remaining_requests: Optional[int] = None
+    remaining_tokens: Optional[int] = None
+
+    def state(self, now: float) -> str:
+        if now < self.cooldown_until:
+            return "cooling"
+        if self.consecutive_failures >= FAILURE_THRESHOLD:
+            return "open" if now < self.circuit_open_until else "half_open"
+        return "closed"
+
+    def available(self, now: float) -> bool:
+        state = self.state(now)
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def available_at(self) -> float:
+        return max(self.cooldown_until, self.circuit_open_until)
+
+
+class ProviderRouter:
+    """Orders (provider, key) candidates by health and records call outcomes
+
+    Keys without any latency history are tried first in the caller's order so
+    new keys get measured. Measured keys are ranked by EWMA latency, inflated
+    by their error rate and by a nearly exhausted quota. Keys that are cooling
+    down after a 429 or whose circuit is open go last, soonest-available first,
+    as a last resort.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._keys: Dict[Tuple[str, str], KeyHealth] = {}
+
+    def health(self, provider: str, api_key: str) -> KeyHealth:
+        health = self._keys.get((provider, api_key))
+        if health is None:
+            health = self._keys[(provider, api_key)] = KeyHealth(provider, key_preview(api_key))
+        return health
+
+    def provider_latency(self, provider: str) -> Optional[float]:
+        samples = [h.latency_ms for (name, _), h in self._keys.items() if name == provider and h.latency_ms is not None]
+        return sum(samples) / len(samples) if samples else None
+
+    def score(self, provider: str, api_key: str) -> Optional[float]:
+        """Expected cost in milliseconds; None when nothing is known yet"""
+        health = self.health(provider, api_key)
+        latency = health.latency_ms if health.latency_ms is not None else self.provider_latency(provider)
+        if latency is None:
+            return None
+        score = latency * (1 + ERROR_PENALTY * health.error_rate)
+        if health.remaining_requests is not None and health.remaining_requests < LOW_QUOTA_REQUESTS:
+            score *= LOW_QUOTA_PENALTY
+        return score
+
+    def rank(self, candidates: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        now = self.clock()
+
+        def sort_key(item):
+            position, (provider, api_key) = item
+            health = self.health(provider, api_key)
+            if not health.available(now):
+                return (2, health.available_at(), position)
+            score = self.score(provider, api_key)
+            if score is None:
+                return (0, 0.0, position)
+            return (1, score, position)
+
+        return [candidate for _, candidate in sorted(enumerate(candidates), key=sort_key)]
+
+    def begin(self, provider: str, api_key: str) -> None:
+        """Mark a call as started; a half-open circuit lets only this one through"""
+        health = self.health(provider, api_key)
+        if health.state(self.clock()) == "half_open":
+            health.probing = True
+
+    def release(self, provider: str, api_key: str) -> None:
+        """Forget a call that was cancelled before it finished"""
+        self.health(provider, api_key).probing = False
+
+    def record_success(self, provider: str, api_key: str, latency_ms: float) -> None:
+        health = self.health(provider, api_key)
+        health.latency_ms = latency_ms if health.latency_ms is None else (
+            EWMA_ALPHA * latency_ms + (1 - EWMA_ALPHA) * health.latency_ms
+        )
+        health.error_rate *= 1 - EWMA_ALPHA
+        health.successes += 1
+        health.consecutive_failures = 0
+        health.open_seconds = 0.0
+        health.probing = False
+
+    def record_failure(
+        self,
+        provider: str,
+        api_key: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        now = self.clock()
+        health = self.health(provider, api_key)
+        health.probing = False
+
+        if status_code == 429:
+            health.rate_limited += 1
+            cooldown = retry_after if retry_after is not None else DEFAULT_COOLDOWN_SECONDS
+            health.cooldown_until = max(health.cooldown_until, now + cooldown)
+            logger.info("LLM key rate limited", provider=provider, key=health.key_id, cooldown_seconds=cooldown)
+            return
+
+        health.failures += 1
+        health.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * health.error_rate
+        health.consecutive_failures += 1
+        if status_code in (401, 403):
+            # Revoked or invalid key: no point probing it soon
+            health.consecutive_failures = max(health.consecutive_failures, FAILURE_THRESHOLD)
+            health.open_seconds = MAX_OPEN_SECONDS
+        elif health.consecutive_failures >= FAILURE_THRESHOLD:
+            health.open_seconds = min(MAX_OPEN_SECONDS, max(BASE_OPEN_SECONDS, health.open_seconds * 2))
+        else:
+            return
+        health.circuit_open_until = now + health.open_seconds
+        logger.warning(
+            "LLM key circuit opened",
+            provider=provider,
+            key=health.key_id,
+            open_seconds=health.open_seconds,
+            status_code=status_code,
+        )
+
+    def observe_headers(self, provider: str, api_key: str, headers: Mapping[str, str]) -> None:
+        """Track remaining-quota headers (OpenAI-compatible ``x-ratelimit-*``)"""
+        health = self.health(provider, api_key)
+        remaining_requests = _int_header(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _int_header(headers, "x-ratelimit-remaining-tokens")
+        if remaining_requests is not None:
+            health.remaining_requests = remaining_requests
+        if remaining_tokens is not None:
+            health.remaining_tokens = remaining_tokens
+
+        if remaining_requests == 0:
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            health.cooldown_until = max(
+                health.cooldown_until,
+                self.clock() + (reset if reset is not None else DEFAULT_COOLDOWN_SECONDS),
+            )
+
+    def scoreboard(self) -> Dict[str, List[Dict[str, object]]]:
+        """Live per-key health grouped by provider, best candidates first"""
+        now = self.clock()
+        board: Dict[str, List[Dict[str, object]]] = {}
+        for (provider, api_key) in self.rank(list(self._keys)):
+            health = self._keys[(provider, api_key)]
+            score = self.score(provider, api_key)
+            board.setdefault(provider, []).append({
+                "key": health.key_id,
+                "state": health.state(now),
+                "score_ms": round(score, 1) if score is not None else None,
+                "latency_ms": round(health.latency_ms, 1) if health.latency_ms is not None else None,
+                "error_rate": round(health.error_rate, 3),
+                "successes": health.successes,
+                "failures": health.failures,
+                "rate_limited": health.rate_limited,
+                "remaining_requests": health.remaining_requests,
+                "remaining_tokens": health.remaining_tokens,
+                "available_in_seconds": round(max(0.0, health.available_at() - now), 1),
+            })
+        return board
@@ -0,0 +1,563 @@
+"""
+Offline paper corpus
+Append-only paper log with an on-disk BM25 inverted index: memory-mapped segments plus an in-memory tail
+"""
+
+import bisect
+import json
+import math
+import os
+import queue
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+import numpy as np
+import structlog
+
+from src.config.settings import get_settings
+from src.core.paths import OFFLINE_CORPUS_DIR, OFFLINE_PAPERS_JSON
+from src.services.paper_dedup import normalize_title, paper_identifiers
+
+logger = structlog.get_logger(__name__)
+
+K1 = 1.2
+B = 0.75
+TITLE_WEIGHT = 2               # title terms count twice towards term frequency
+FLUSH_DOCS = 256               # tail documents written out as one segment
+MAX_SEGMENTS = 8               # beyond this, all segments are merged into one
+WRITE_QUEUE_BATCHES = 64       # result batches waiting for the background writer before new ones are dropped
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the their this to was were with".split()
+)
+
+_LOG_NAME = "papers.jsonl"
+_MANIFEST_NAME = "manifest.json"
+_LOCK_NAME = "corpus.lock"
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in normalize_title(text).split() if len(token) > 1 and token not in STOPWORDS]
+
+
+def paper_terms(paper: Dict[str, Any]) -> List[str]:
+    """Index terms of a paper record: title (weighted), abstract, keywords, venue and authors"""
+    abstract = paper.get("abstract")
+    if isinstance(abstract, dict):
+        # OpenAlex inverted index: the words are the keys
+        abstract = " ".join(abstract)
+    keywords = [
+        keyword.get("display_name") if isinstance(keyword, dict) else keyword
+        for keyword in paper.get("keywords") or []
+    ]
+    authors = [
+        author.get("name") if isinstance(author, dict) else author
+        for author in paper.get("authors") or []
+    ]
+    fields = [abstract, paper.get("venue"), *keywords, *authors]
+    terms = tokenize(str(paper.get("title") or "")) * TITLE_WEIGHT
+    for field in fields:
+        if isinstance(field, str):
+            terms.extend(tokenize(field))
+    return terms
+
+
+def _paper_keys(paper: Dict[str, Any]) -> List[str]:
+    keys = paper_identifiers(paper)
+    title = normalize_title(paper.get("title"))
+    if title:
+        keys.append(f"title:{title}")
+    return keys
+
+
+def _load_array(path: Path) -> np.ndarray:
+    array = np.load(path, mmap_mode="r")
+    return array if array.size else np.load(path)
+
+
+class _Segment:
+    """Immutable, memory-mapped slice of the index covering docs ``start .. start + count``"""
+
+    def __init__(self, path: Path, start: int, count: int):
+        self.path = path
+        self.start = start
+        self.count = count
+        with open(path / "lexicon.json", "r", encoding="utf-8") as f:
+            self.lexicon: Dict[str, List[int]] = json.load(f)
+        self.postings = _load_array(path / "postings.npy")
+        self.freqs = _load_array(path / "freqs.npy")
+        self.lengths = _load_array(path / "lengths.npy")
+        self.offsets = _load_array(path / "offsets.npy")
+
+    def lookup(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return None
+        position, df = entry
+        docs = self.postings[position:position + df]
+        return docs, self.freqs[position:position + df], self.lengths[docs - self.start]
+
+
+class OfflineCorpus:
+    """Searchable local copy of papers seen online, usable when providers are slow or down
+
+    Papers are appended to ``papers.jsonl`` (the source of truth; a paper's doc
+    id is its line number) and indexed into an in-memory tail. Every
+    ``FLUSH_DOCS`` papers the tail is written out as an immutable segment of
+    numpy arrays that are memory-mapped on open, so startup reads no postings
+    and a query touches only its terms' posting slices. Segments are merged
+    once there are more than ``MAX_SEGMENTS``. Papers already in the corpus
+    (same DOI/PMID/arXiv id or normalized title) are not added again, and log
+    lines past the last segment are re-indexed on open, so an unclean
+    shutdown loses nothing.
+
+    Appends, flushes and compactions hold an advisory lock on a sidecar file,
+    so API workers can share one directory; each first picks up the segments
+    and log lines the others wrote. Segment files are written and merged
+    outside the in-memory index lock, so searches only wait for the swap.
+    Once ``max_papers`` are indexed, further papers are not added. Calls block
+    on disk IO, so async callers run them in a worker thread or hand papers to
+    ``remember_papers``.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        seed_path: Optional[Path] = OFFLINE_PAPERS_JSON,
+        max_papers: Optional[int] = None,
+    ):
+        settings = get_settings()
+        self.directory = Path(directory or settings.offline_corpus_dir or OFFLINE_CORPUS_DIR)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_papers = settings.offline_corpus_max_papers if max_papers is None else max_papers
+        self.log_path = self.directory / _LOG_NAME
+        self._segments: List[_Segment] = []
+        self._starts: List[int] = []
+        self._keys: Dict[str, int] = {}
+        self._docs = 0
+        self._total_length = 0
+        self._next_segment = 0     # nothing loaded yet: the first lock reads the manifest
+        self._size = 0
+        self._full = False
+        self._write_lock = threading.Lock()   # one writer per process; flock covers other processes
+        self._lock = threading.Lock()         # guards the in-memory index that searches read
+        self._reset_tail()
+        self._open(seed_path)
+
+    def __len__(self) -> int:
+        return self._docs
+
+    def _reset_tail(self) -> None:
+        self._tail_start = self._docs
+        self._tail_postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._tail_lengths: List[int] = []
+        self._tail_offsets: List[int] = []
+        self._tail_keys: Dict[str, int] = {}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive across threads and, through flock on a sidecar file, across processes"""
+        with self._write_lock, open(self.directory / _LOCK_NAME, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            with self._lock:
+                self._catch_up()
+            yield
+
+    def _open(self, seed_path: Optional[Path]) -> None:
+        with self._locked():
+            if self.log_path.exists():
+                return
+            self.log_path.touch()
+            if seed_path is not None and Path(seed_path).exists():
+                with open(seed_path, "r", encoding="utf-8") as f:
+                    self._add(json.load(f))
+                self._flush()
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        manifest_path = self.directory / _MANIFEST_NAME
+        if not manifest_path.exists():
+            return {"segments": [], "bytes": 0, "next_segment": 1}
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _catch_up(self) -> None:
+        """Pick up segments and log lines written by other processes (called under the lock)"""
+        manifest = self._read_manifest()
+        if manifest["next_segment"] != self._next_segment:
+            self._load(manifest)
+        elif self.log_path.exists() and self.log_path.stat().st_size > self._size:
+            self._replay(self._size)
+
+    def _load(self, manifest: Dict[str, Any]) -> None:
+        self._segments = []
+        self._starts = []
+        self._keys = {}
+        self._docs = 0
+        self._total_length = 0
+        self._next_segment = manifest["next_segment"]
+        for entry in manifest["segments"]:
+            segment = _Segment(self.directory / entry["name"], entry["start"], entry["count"])
+            with open(segment.path / "keys.json", "r", encoding="utf-8") as f:
+                self._keys.update(json.load(f))
+            self._add_segment(segment)
+        self._reset_tail()
+
+        self._size = manifest["bytes"]
+        if self.log_path.exists() and self.log_path.stat().st_size > self._size:
+            self._replay(self._size)
+
+    def _add_segment(self, segment: _Segment) -> None:
+        self._segments.append(segment)
+        self._starts.append(segment.start)
+        self._docs = segment.start + segment.count
+        self._total_length += int(segment.lengths.sum())
+
+    def _replay(self, offset: int) -> None:
+        """Re-index log lines written after ``offset`` (called under the lock)"""
+        size = self.log_path.stat().st_size
+        replayed = 0
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                paper = json.loads(line)
+                self._index(paper, offset, _paper_keys(paper))
+                offset += len(line)
+                replayed += 1
+        if offset < size:
+            # A write interrupted mid-line; drop the fragment so the next append starts cleanly
+            logger.warning("Truncating partial offline corpus record", path=str(self.log_path), offset=offset)
+            with open(self.log_path, "r+b") as f:
+                f.truncate(offset)
+        self._size = offset
+        if replayed:
+            logger.info("Offline corpus log replayed", papers=replayed)
+
+    def contains(self, paper: Dict[str, Any]) -> bool:
+        return any(key in self._keys for key in _paper_keys(paper))
+
+    def add(self, papers: Iterable[Dict[str, Any]]) -> int:
+        """Append and index papers not already in the corpus; returns how many were added"""
+        with self._locked():
+            return self._add(papers)
+
+    def _add(self, papers: Iterable[Dict[str, Any]]) -> int:
+        pending: List[Tuple[Dict[str, Any], int, List[str]]] = []
+        lines: List[bytes] = []
+        position = 0
+        batch_keys = set()
+        room = self.max_papers - self._docs
+        for paper in papers:
+            if not isinstance(paper, dict):
+                continue
+            keys = _paper_keys(paper)
+            if not keys or any(key in self._keys or key in batch_keys for key in keys):
+                continue
+            if len(pending) >= room:
+                if not self._full:
+                    self._full = True
+                    logger.warning("Offline corpus is full, not adding papers", max_papers=self.max_papers)
+                break
+            batch_keys.update(keys)
+            line = json.dumps(paper, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+            pending.append((paper, position, keys))
+            lines.append(line)
+            position += len(line)
+
+        if not pending:
+            return 0
+        with open(self.log_path, "ab") as f:
+            # Offsets come from the file itself, not from what this process last wrote
+            start = f.seek(0, os.SEEK_END)
+            f.write(b"".join(lines))
+        self._size = start + position
+
+        with self._lock:
+            for paper, paper_offset, keys in pending:
+                self._index(paper, start + paper_offset, keys)
+        if len(self._tail_lengths) >= FLUSH_DOCS:
+            self._flush()
+        return len(pending)
+
+    def _index(self, paper: Dict[str, Any], offset: int, keys: List[str]) -> None:
+        doc = self._docs
+        terms = paper_terms(paper)
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            self._tail_postings.setdefault(term, []).append((doc, count))
+        for key in keys:
+            self._keys.setdefault(key, doc)
+            self._tail_keys.setdefault(key, doc)
+        self._tail_lengths.append(len(terms))
+        self._tail_offsets.append(offset)
+        self._total_length += len(terms)
+        self._docs += 1
+
+    def flush(self) -> None:
+        """Write the in-memory tail out as a segment"""
+        with self._locked():
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._tail_lengths:
+            return
+        lexicon: Dict[str, List[int]] = {}
+        docs: List[int] = []
+        freqs: List[int] = []
+        for term in sorted(self._tail_postings):
+            entries = self._tail_postings[term]
+            lexicon[term] = [len(docs), len(entries)]
+            docs.extend(doc for doc, _ in entries)
+            freqs.extend(freq for _, freq in entries)
+
+        segment = self._write_segment(
+            self._tail_start,
+            lexicon,
+            np.asarray(docs, dtype=np.int32),
+            np.asarray(freqs, dtype=np.int32),
+            np.asarray(self._tail_lengths, dtype=np.int32),
+            np.asarray(self._tail_offsets, dtype=np.int64),
+            self._tail_keys,
+        )
+        with self._lock:
+            self._segments.append(segment)
+            self._starts.append(segment.start)
+            self._reset_tail()
+        self._write_manifest()
+
+        if len(self._segments) > MAX_SEGMENTS:
+            self._compact()
+
+    def compact(self) -> None:
+        """Merge every segment into one"""
+        with self._locked():
+            self._compact()
+
+    def _compact(self) -> None:
+        self._flush()
+        if len(self._segments) <= 1:
+            return
+        old = self._segments
+        lexicon: Dict[str, List[int]] = {}
+        doc_slices: List[np.ndarray] = []
+        freq_slices: List[np.ndarray] = []
+        position = 0
+        for term in sorted(set().union(*(segment.lexicon for segment in old))):
+            df = 0
+            # Segments cover increasing doc ranges, so concatenated postings stay sorted
+            for segment in old:
+                entry = segment.lexicon.get(term)
+                if entry is not None:
+                    start, count = entry
+                    doc_slices.append(segment.postings[start:start + count])
+                    freq_slices.append(segment.freqs[start:start + count])
+                    df += count
+            lexicon[term] = [position, df]
+            position += df
+
+        keys: Dict[str, int] = {}
+        for segment in old:
+            with open(segment.path / "keys.json", "r", encoding="utf-8") as f:
+                keys.update(json.load(f))
+
+        merged = self._write_segment(
+            old[0].start,
+            lexicon,
+            np.concatenate(doc_slices) if doc_slices else np.zeros(0, dtype=np.int32),
+            np.concatenate(freq_slices) if freq_slices else np.zeros(0, dtype=np.int32),
+            np.concatenate([segment.lengths for segment in old]),
+            np.concatenate([segment.offsets for segment in old]),
+            keys,
+        )
+        with self._lock:
+            self._segments = [merged]
+            self._starts = [merged.start]
+        self._write_manifest()
+        for segment in old:
+            shutil.rmtree(segment.path, ignore_errors=True)
+        logger.info("Offline corpus segments merged", segments=len(old), papers=merged.count)
+
+    def _write_segment(
+        self,
+        start: int,
+        lexicon: Dict[str, List[int]],
+        docs: np.ndarray,
+        freqs: np.ndarray,
+        lengths: np.ndarray,
+        offsets: np.ndarray,
+        keys: Dict[str, int],
+    ) -> _Segment:
+        name = f"seg-{self._next_segment:06d}"
+        self._next_segment += 1
+        path = self.directory / name
+        tmp_path = self.directory / f".{name}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir()
+        np.save(tmp_path / "postings.npy", docs)
+        np.save(tmp_path / "freqs.npy", freqs)
+        np.save(tmp_path / "lengths.npy", lengths)
+        np.save(tmp_path / "offsets.npy", offsets)
+        with open(tmp_path / "lexicon.json", "w", encoding="utf-8") as f:
+            json.dump(lexicon, f, separators=(",", ":"))
+        with open(tmp_path / "keys.json", "w", encoding="utf-8") as f:
+            json.dump(keys, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return _Segment(path, start, len(lengths))
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "segments": [
+                {"name": segment.path.name, "start": segment.start, "count": segment.count}
+                for segment in self._segments
+            ],
+            # Only called with an empty tail, so every log line is in a segment
+            "bytes": self._size,
+            "next_segment": self._next_segment,
+        }
+        tmp_path = self.directory / f".{_MANIFEST_NAME}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.directory / _MANIFEST_NAME)
+
+    def _postings(self, term: str) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        hits = [hit for hit in (segment.lookup(term) for segment in self._segments) if hit is not None]
+        tail = self._tail_postings.get(term)
+        if tail:
+            docs = np.fromiter((doc for doc, _ in tail), dtype=np.int64, count=len(tail))
+            freqs = np.fromiter((freq for _, freq in tail), dtype=np.int32, count=len(tail))
+            lengths = np.asarray(self._tail_lengths, dtype=np.int32)[docs - self._tail_start]
+            hits.append((docs, freqs, lengths))
+        return hits
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Papers ranked by BM25 over title, abstract, keywords, venue and authors"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        # Appends from other threads mutate the tail; other processes' writes are picked up on the next add
+        with self._lock:
+            return self._search(terms, limit)
+
+    def _search(self, terms: List[str], limit: int) -> List[Dict[str, Any]]:
+        if not self._docs:
+            return []
+
+        total = self._docs
+        average_length = max(self._total_length / total, 1.0)
+        scores = np.zeros(total, dtype=np.float32)
+        for term in terms:
+            hits = self._postings(term)
+            df = sum(len(docs) for docs, _, _ in hits)
+            if not df:
+                continue
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for docs, freqs, lengths in hits:
+                tf = freqs.astype(np.float32)
+                norm = K1 * (1 - B + B * lengths.astype(np.float32) / average_length)
+                # A term's postings hold each doc once, so fancy-index += is safe
+                scores[docs] += idf * tf * (K1 + 1) / (tf + norm)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        results = []
+        with open(self.log_path, "rb") as f:
+            for doc in ranked:
+                f.seek(self._offset(int(doc)))
+                paper = json.loads(f.readline())
+                paper.setdefault("source", "offline-corpus")
+                results.append(paper)
+        return results
+
+    def _offset(self, doc: int) -> int:
+        if doc >= self._tail_start:
+            return self._tail_offsets[doc - self._tail_start]
+        segment = self._segments[bisect.bisect_right(self._starts, doc) - 1]
+        return int(segment.offsets[doc - segment.start])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "papers": self._docs,
+            "segments": len(self._segments),
+            "tail_papers": len(self._tail_lengths),
+            "log_bytes": self._size,
+        }
+
+    def close(self) -> None:
+        self.flush()
+
+
+_corpus: Optional[OfflineCorpus] = None
+_corpus_lock = threading.Lock()
+_writes: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=WRITE_QUEUE_BATCHES)
+_writer: Optional[threading.Thread] = None
+
+
+def get_offline_corpus() -> OfflineCorpus:
+    """Get global offline corpus"""
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = OfflineCorpus()
+        return _corpus
+
+
+def remember_papers(papers: List[Dict[str, Any]]) -> None:
+    """Queue papers for the background corpus writer; returns without touching disk"""
+    global _writer
+    if not papers:
+        return
+    try:
+        _writes.put_nowait(papers)
+    except queue.Full:
+        logger.warning("Offline corpus writer behind, dropping papers", papers=len(papers))
+        return
+    with _corpus_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_loop, name="offline-corpus-writer", daemon=True)
+            _writer.start()
+
+
+def _write_loop() -> None:
+    while True:
+        papers = _writes.get()
+        try:
+            if papers is None:
+                return
+            get_offline_corpus().add(papers)
+        except Exception as exc:
+            logger.error("Failed to update offline corpus", error=str(exc))
+        finally:
+            _writes.task_done()
+
+
+def drain_offline_writes() -> None:
+    """Block until every queued paper batch has been written"""
+    _writes.join()
+
+
+def close_offline_corpus() -> None:
+    """Finish queued writes and flush the in-memory tail on shutdown"""
+    global _corpus, _writer
+    with _corpus_lock:
+        writer, _writer = _writer, None
+    if writer is not None and writer.is_alive():
+        _writes.put(None)
+        writer.join()
+    corpus, _corpus = _corpus, None
+    if corpus is not None:
+        corpus.close()
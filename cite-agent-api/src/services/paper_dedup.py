@@ -0,0 +1,254 @@
+"""
+Paper deduplication across sources
+Identifier cross-walks (DOI, PMID, arXiv) plus MinHash/LSH on normalized titles, merging duplicates
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+SHINGLE_SIZE = 3
+NUM_PERM = 32
+BANDS = 8                      # LSH: 8 bands of 4 rows ≈ 50% match chance at Jaccard 0.6, 99% at 0.9
+ROWS = NUM_PERM // BANDS
+TITLE_THRESHOLD = 0.8          # Jaccard of title shingles confirming an LSH candidate
+_PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(0x5EED)
+_PERM_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+_DOI_PREFIX_RE = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)", re.IGNORECASE)
+_ARXIV_DOI_RE = re.compile(r"^10\.48550/arxiv\.(.+)$", re.IGNORECASE)
+_ARXIV_URL_RE = re.compile(r"arxiv\.org/(?:abs|pdf)/([^\s?#]+?)(?:v\d+)?(?:\.pdf)?$", re.IGNORECASE)
+_PMID_URL_RE = re.compile(r"(\d+)/?$")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+def normalize_doi(value: Any) -> Optional[str]:
+    if not value or not isinstance(value, str):
+        return None
+    doi = _DOI_PREFIX_RE.sub("", value.strip()).lower()
+    return doi or None
+
+
+def normalize_title(value: Any) -> str:
+    """Lowercase ASCII words: accents, punctuation and spacing differences removed"""
+    if not value or not isinstance(value, str):
+        return ""
+    ascii_title = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    return _NON_WORD_RE.sub(" ", ascii_title.lower()).strip()
+
+
+def paper_identifiers(paper: Dict[str, Any]) -> List[str]:
+    """Namespaced identifiers of a paper record (``doi:``, ``pmid:``, ``arxiv:``)"""
+    keys: List[str] = []
+    doi = normalize_doi(paper.get("doi"))
+    if doi:
+        keys.append(f"doi:{doi}")
+        arxiv_doi = _ARXIV_DOI_RE.match(doi)
+        if arxiv_doi:
+            keys.append(f"arxiv:{arxiv_doi.group(1)}")
+
+    pmid = paper.get("pmid")
+    if pmid:
+        match = _PMID_URL_RE.search(str(pmid))
+        if match:
+            keys.append(f"pmid:{match.group(1)}")
+
+    arxiv_id = paper.get("arxiv_id")
+    if not arxiv_id:
+        for field in ("url", "pdf_url"):
+            match = _ARXIV_URL_RE.search(str(paper.get(field) or ""))
+            if match:
+                arxiv_id = match.group(1)
+                break
+    if arxiv_id:
+        keys.append(f"arxiv:{str(arxiv_id).lower()}")
+    return list(dict.fromkeys(keys))
+
+
+def title_shingles(title: str) -> Set[int]:
+    # In-process index only, so the per-process salted hash() is fine (and fast)
+    if len(title) < SHINGLE_SIZE:
+        return {hash(title) & _PRIME} if title else set()
+    return {hash(title[i:i + SHINGLE_SIZE]) & _PRIME for i in range(len(title) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingles: Set[int]) -> np.ndarray:
+    """``NUM_PERM`` min-hashes of a shingle set (universal hashing mod a Mersenne prime)"""
+    values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    return ((np.outer(_PERM_A, values) + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def _jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _numbers(title: str) -> Tuple[str, ...]:
+    # "Part 1" and "Part 2" are different papers however similar the rest of the title
+    return tuple(_NUMBER_RE.findall(title))
+
+
+def _years_compatible(a: Any, b: Any) -> bool:
+    try:
+        return a is None or b is None or abs(int(a) - int(b)) <= 1
+    except (TypeError, ValueError):
+        return True
+
+
+def _conflicting_dois(a: Any, b: Any) -> bool:
+    # Two publisher DOIs mean two different works however similar the titles;
+    # an arXiv DOI is the preprint of the same work
+    a, b = normalize_doi(a), normalize_doi(b)
+    if not a or not b or a == b:
+        return False
+    return not (_ARXIV_DOI_RE.match(a) or _ARXIV_DOI_RE.match(b))
+
+
+def _author_key(author: Any) -> str:
+    name = author.get("name") if isinstance(author, dict) else author
+    return normalize_title(str(name or ""))
+
+
+def _abstract_length(abstract: Any) -> int:
+    # OpenAlex ships inverted indexes; a plain-text abstract of any length reads better
+    if isinstance(abstract, str):
+        return len(abstract) + 1
+    return 1 if abstract else 0
+
+
+def merge_papers(target: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold ``other`` into ``target`` (in place): union of authors, max citations, best abstract"""
+    seen_authors = {_author_key(author) for author in target.get("authors") or []}
+    for author in other.get("authors") or []:
+        key = _author_key(author)
+        if key and key not in seen_authors:
+            seen_authors.add(key)
+            target.setdefault("authors", []).append(author)
+
+    target["citations_count"] = max(target.get("citations_count") or 0, other.get("citations_count") or 0)
+
+    if _abstract_length(other.get("abstract")) > _abstract_length(target.get("abstract")):
+        target["abstract"] = other["abstract"]
+
+    for field in ("doi", "pmid", "arxiv_id", "pdf_url", "url", "venue", "year"):
+        if not target.get(field) and other.get(field):
+            target[field] = other[field]
+    target["open_access"] = bool(target.get("open_access")) or bool(other.get("open_access"))
+
+    keywords = list(target.get("keywords") or [])
+    for keyword in other.get("keywords") or []:
+        if keyword not in keywords:
+            keywords.append(keyword)
+    target["keywords"] = keywords
+
+    sources = target.setdefault("merged_sources", [target.get("source")])
+    if other.get("source") not in sources:
+        sources.append(other.get("source"))
+    return target
+
+
+class PaperIndex:
+    """Incremental merge index over paper records from any number of sources
+
+    A record joins an existing paper when it shares a DOI, PMID or arXiv id, or
+    when its normalized title lands in a shared LSH bucket and the shingle
+    Jaccard similarity confirms it (with publication years at most a year
+    apart). Each ``add`` costs O(identifiers + bands) lookups, so merging n
+    records is near-linear. Merged records are updated in place.
+    """
+
+    def __init__(self, threshold: float = TITLE_THRESHOLD):
+        self.threshold = threshold
+        self.records: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_title: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self._shingles: List[Set[int]] = []
+        self._numbers: List[Tuple[str, ...]] = []
+        self.merged = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Index ``papers``; returns only those that were not duplicates (as their canonical records)"""
+        new_records = []
+        for paper in papers:
+            record = self._add_one(paper)
+            if record is not None:
+                new_records.append(record)
+        return new_records
+
+    def _add_one(self, paper: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        identifiers = paper_identifiers(paper)
+        title = normalize_title(paper.get("title"))
+        if not identifiers and not title:
+            return None
+
+        shingles = title_shingles(title)
+        bands = self._bands(shingles)
+        match = self._find(identifiers, title, shingles, bands, paper.get("year"))
+
+        if match is not None:
+            merge_papers(self.records[match], paper)
+            self.merged += 1
+            self._register(match, identifiers, title, bands)
+            return None
+
+        index = len(self.records)
+        record = dict(paper)
+        record["authors"] = list(paper.get("authors") or [])
+        self.records.append(record)
+        self._shingles.append(shingles)
+        self._numbers.append(_numbers(title))
+        self._register(index, identifiers, title, bands)
+        return self.records[index]
+
+    def _find(self, identifiers, title, shingles, bands, year) -> Optional[int]:
+        for key in identifiers:
+            if key in self._by_id:
+                return self._by_id[key]
+
+        doi = next((key[4:] for key in identifiers if key.startswith("doi:")), None)
+
+        def compatible(index: int) -> bool:
+            record = self.records[index]
+            return _years_compatible(record.get("year"), year) and not _conflicting_dois(record.get("doi"), doi)
+
+        exact = self._by_title.get(title)
+        if exact is not None and compatible(exact):
+            return exact
+
+        numbers = _numbers(title)
+        candidates = dict.fromkeys(index for band in bands for index in self._buckets.get(band, ()))
+        for index in candidates:
+            if (
+                compatible(index)
+                and self._numbers[index] == numbers
+                and _jaccard(shingles, self._shingles[index]) >= self.threshold
+            ):
+                return index
+        return None
+
+    def _bands(self, shingles: Set[int]) -> List[Tuple[int, bytes]]:
+        if len(shingles) < ROWS:
+            return []
+        signature = minhash(shingles)
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def _register(self, index: int, identifiers: List[str], title: str, bands: List[Tuple[int, bytes]]) -> None:
+        for key in identifiers:
+            self._by_id.setdefault(key, index)
+        if title:
+            self._by_title.setdefault(title, index)
+        for band in bands:
+            bucket = self._buckets.setdefault(band, [])
+            if index not in bucket:
+                bucket.append(index)
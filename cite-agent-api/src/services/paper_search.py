@@ -6,20 +6,95 @@ Production-ready implementation with caching and error handling
 import asyncio
 import aiohttp
 import structlog
-from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
-from datetime import datetime, timedelta
-import json
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple, Callable, Awaitable
+from datetime import datetime
 import os
-import re
-from pathlib import Path
+import time
 
 from src.config.settings import get_settings
 from src.utils.resiliency import cache
 from src.utils.error_handling import create_problem_response
 from src.models.request import SearchFilters
+from src.services.offline_corpus import get_offline_corpus, remember_papers
+from src.services.paper_dedup import PaperIndex
 
 logger = structlog.get_logger(__name__)
 
+DEFAULT_SOURCES = ["semantic_scholar", "openalex", "pubmed"]
+
+# Requests per second per source
+# OpenAlex: 10 requests per second
+# PubMed: 3 requests per second
+# Semantic Scholar: 5 requests per second (per API guidelines)
+SOURCE_RATES = {"openalex": 10.0, "pubmed": 3.0, "semantic_scholar": 5.0}
+
+
+class TokenBucket:
+    """Client-side pacing: ``rate`` requests per second with bursts of ``capacity``
+
+    ``acquire`` reserves the next free slot and sleeps exactly until it, so
+    concurrent searches queue up in order instead of sleeping blindly.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def reserve(self) -> float:
+        """Take a token; returns the seconds to wait before using it"""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def source_bucket(source: str) -> TokenBucket:
+    """Process-wide bucket for ``source``, shared by every PaperSearcher"""
+    bucket = _buckets.get(source)
+    if bucket is None:
+        bucket = _buckets[source] = TokenBucket(SOURCE_RATES.get(source, 10.0))
+    return bucket
+
+
+async def get_search_session() -> aiohttp.ClientSession:
+    """Long-lived keep-alive session shared by every PaperSearcher"""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            headers={
+                "User-Agent": "Nocturnal-Archive/1.0 (contact@nocturnal.dev)",
+                "Accept": "application/json"
+            },
+            timeout=aiohttp.ClientTimeout(total=30),
+            connector=aiohttp.TCPConnector(limit=get_settings().search_http_connections, ttl_dns_cache=300),
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_search_session() -> None:
+    """Close the shared session on shutdown"""
+    global _session
+    session, _session = _session, None
+    if session is not None and not session.closed:
+        await session.close()
+
+
 class PaperSearcher:
     """Production-ready paper search with real API integration"""
     
@@ -31,10 +106,6 @@ class PaperSearcher:
         self.openalex_base = "https://api.openalex.org"
         self.pubmed_base = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
         self.semantic_scholar_base = "https://api.semanticscholar.org/graph/v1"
-        self.offline_dataset_path = (
-            Path(__file__).resolve().parents[1] / "data" / "offline_papers.json"
-        )
-        self._offline_cache: Optional[List[Dict[str, Any]]] = None
         self.semantic_scholar_api_key = (
             getattr(self.settings, "semantic_scholar_api_key", None)
             or os.getenv("SEMANTIC_SCHOLAR_API_KEY")
@@ -47,51 +118,18 @@ class PaperSearcher:
             key_preview=self.semantic_scholar_api_key[:10] if self.semantic_scholar_api_key else "None"
         )
         
-        # Rate limiting
-        self.rate_limits = {
-            "openalex": {"requests": 0, "reset_time": datetime.now()},
-            "pubmed": {"requests": 0, "reset_time": datetime.now()},
-            "semantic_scholar": {"requests": 0, "reset_time": datetime.now()},
-        }
-        
     async def _get_session(self):
-        """Get aiohttp session with proper headers"""
-        if self.session is None:
-            self.session = aiohttp.ClientSession(
-                headers={
-                    "User-Agent": "Nocturnal-Archive/1.0 (contact@nocturnal.dev)",
-                    "Accept": "application/json"
-                },
-                timeout=aiohttp.ClientTimeout(total=30)
-            )
+        """Get the shared aiohttp session (see get_search_session)"""
+        self.session = await get_search_session()
         return self.session
     
-    def _check_rate_limit(self, source: str) -> bool:
-        """Check if we can make a request to the source"""
-        now = datetime.now()
-        if now > self.rate_limits[source]["reset_time"]:
-            self.rate_limits[source]["requests"] = 0
-            self.rate_limits[source]["reset_time"] = now + timedelta(minutes=1)
-        
-        # OpenAlex: 10 requests per second
-        # PubMed: 3 requests per second
-        # Semantic Scholar: 5 requests per second (per API guidelines)
-        limits = {"openalex": 10, "pubmed": 3, "semantic_scholar": 5}
-        limit = limits.get(source)
-        if limit is None:
-            return True
-        return self.rate_limits[source]["requests"] < limit
-    
-    def _increment_rate_limit(self, source: str):
-        """Increment rate limit counter"""
-        self.rate_limits[source]["requests"] += 1
+    async def _throttle(self, source: str):
+        """Wait for the source's rate-limit token"""
+        await source_bucket(source).acquire()
     
     @cache(ttl=3600, source_version="openalex")  # 1 hour cache
     async def search_openalex(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Search OpenAlex with real API integration"""
-        if not self._check_rate_limit("openalex"):
-            await asyncio.sleep(1)  # Wait for rate limit reset
-        
         try:
             session = await self._get_session()
             
@@ -103,8 +141,8 @@ class PaperSearcher:
             url = f"{self.openalex_base}/works"
 
             async def _try(params: dict) -> List[Dict[str, Any]]:
+                await self._throttle("openalex")
                 async with session.get(url, params=params) as response:
-                    self._increment_rate_limit("openalex")
                     if response.status == 200:
                         data = await response.json()
                         return self._format_openalex_results(data.get("results", []))
@@ -135,10 +173,6 @@ class PaperSearcher:
         """Search Semantic Scholar Graph API if credentials are available."""
         logger.info("search_semantic_scholar called", query=query, has_key=bool(self.semantic_scholar_api_key))
 
-        if not self._check_rate_limit("semantic_scholar"):
-            logger.info("Rate limited, waiting")
-            await asyncio.sleep(1)
-
         # NOTE: Semantic Scholar API works without key (lower rate limits)
         # API key is optional and just increases rate limits
         try:
@@ -159,8 +193,8 @@ class PaperSearcher:
             if self.semantic_scholar_api_key:
                 headers["x-api-key"] = self.semantic_scholar_api_key
 
+            await self._throttle("semantic_scholar")
             async with session.get(url, params=params, headers=headers) as response:
-                self._increment_rate_limit("semantic_scholar")
                 logger.info("Semantic Scholar response", status=response.status)
                 if response.status == 200:
                     data = await response.json()
@@ -181,9 +215,6 @@ class PaperSearcher:
     @cache(ttl=1800, source_version="pubmed")  # 30 minutes cache
     async def search_pubmed(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Search PubMed with real API integration"""
-        if not self._check_rate_limit("pubmed"):
-            await asyncio.sleep(1)  # Wait for rate limit reset
-        
         try:
             session = await self._get_session()
             
@@ -197,9 +228,8 @@ class PaperSearcher:
             }
             
             search_url = f"{self.pubmed_base}/esearch.fcgi"
+            await self._throttle("pubmed")
             async with session.get(search_url, params=search_params) as response:
-                self._increment_rate_limit("pubmed")
-                
                 if response.status == 200:
                     search_data = await response.json()
                     pmids = search_data.get("esearchresult", {}).get("idlist", [])
@@ -231,9 +261,8 @@ class PaperSearcher:
             }
             
             fetch_url = f"{self.pubmed_base}/efetch.fcgi"
+            await self._throttle("pubmed")
             async with session.get(fetch_url, params=fetch_params) as response:
-                self._increment_rate_limit("pubmed")
-                
                 if response.status == 200:
                     xml_data = await response.text()
                     return self._parse_pubmed_xml(xml_data)
@@ -267,12 +296,15 @@ class PaperSearcher:
                 if doi and doi.startswith("https://doi.org/"):
                     doi = doi.replace("https://doi.org/", "")
                 
+                ids = paper.get("ids") or {}
+                
                 formatted_paper = {
                     "id": paper.get("id", "").split("/")[-1],  # Extract OpenAlex ID
                     "title": paper.get("title", ""),
                     "authors": authors,
                     "year": paper.get("publication_year"),
                     "doi": doi,
+                    "pmid": (ids.get("pmid") or "").rstrip("/").split("/")[-1] or None,
                     "abstract": paper.get("abstract_inverted_index", {}),
                     "citations_count": paper.get("cited_by_count", 0),
                     "open_access": paper.get("open_access", {}).get("is_oa", False),
@@ -324,11 +356,58 @@ class PaperSearcher:
         query: str,
         limit: int = 10,
         sources: Optional[List[str]] = None,
-        filters: Optional[SearchFilters] = None
+        filters: Optional[SearchFilters] = None,
+        budget: Optional[float] = None
     ) -> Dict[str, Any]:
-        """Main search method with real API integration."""
+        """Main search method with real API integration (collects iter_search)"""
+        papers: List[Dict[str, Any]] = []
+        sources_used = sources or DEFAULT_SOURCES
+        async for event in self.iter_search(query, limit, sources, filters, budget=budget):
+            if event.get("done"):
+                sources_used = event["sources_used"]
+            else:
+                papers.extend(event["papers"])
+
+        # Papers reported by several sources rank ahead of equally cited ones
+        sorted_results = sorted(
+            papers,
+            key=lambda x: (x.get("citations_count") or 0, len(x.get("merged_sources") or ())),
+            reverse=True
+        )
+
+        return {
+            "papers": sorted_results[:limit],
+            "count": len(sorted_results),
+            "query": query,
+            "sources_used": sources_used,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    async def iter_search(
+        self,
+        query: str,
+        limit: int = 10,
+        sources: Optional[List[str]] = None,
+        filters: Optional[SearchFilters] = None,
+        budget: Optional[float] = None,
+        enough: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield ``{"source", "papers"}`` with each source's new, filtered, deduplicated papers as it answers
+
+        Sources are queried concurrently and their records merged through a
+        PaperIndex; papers merged later are updated in place, so callers holding
+        earlier events see the merged record. The search waits for every source
+        until the latency ``budget`` (seconds, default ``search_latency_budget``)
+        runs out, cancelling sources still in flight; streaming callers may pass
+        ``enough`` to stop as soon as that many unique papers are in. Provider
+        results are queued for the offline corpus, which tops up searches that
+        found fewer than ``enough`` (default ``limit``) papers. The last event is
+        ``{"done": True, "sources_used", "cancelled"}``.
+        """
         if sources is None:
-            sources = ["semantic_scholar", "openalex", "pubmed"]
+            sources = DEFAULT_SOURCES
+        budget = self.settings.search_latency_budget if budget is None else budget
+        wanted = limit if enough is None else enough
 
         providers = {
             "openalex": self.search_openalex,
@@ -336,77 +415,92 @@ class PaperSearcher:
             "semantic_scholar": self.search_semantic_scholar,
         }
 
-        all_results: List[Dict[str, Any]] = []
+        index = PaperIndex()
+        found = 0
         attempted_sources: List[str] = []
+        pending: Dict[asyncio.Task, str] = {}
 
-        async_tasks: List[asyncio.Task] = []
-
-        for source in sources:
-            if source == "offline":
-                attempted_sources.append(source)
-                try:
-                    offline_results = self._search_offline_corpus(query, max(limit, 10))
-                    if offline_results:
-                        all_results.extend(offline_results)
-                except Exception as exc:
-                    logger.error("Offline corpus search failed", error=str(exc))
-                continue
-
-            provider = providers.get(source)
-            if not provider:
-                logger.warning("Unknown source requested", source=source)
-                continue
+        def fresh(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            nonlocal found
+            unique = self._deduplicate_results(self._apply_filters(results, filters), index)
+            found += len(unique)
+            return unique
 
-            attempted_sources.append(source)
-            async_tasks.append(asyncio.create_task(self._execute_provider(provider, source, query, limit)))
-
-        if async_tasks:
-            provider_payloads = await asyncio.gather(*async_tasks, return_exceptions=True)
-            for payload in provider_payloads:
-                if isinstance(payload, Exception):
-                    # Exception already logged inside _execute_provider
+        try:
+            for source in sources:
+                if source == "offline":
+                    attempted_sources.append(source)
+                    try:
+                        offline_results = fresh(await self._search_offline_corpus(query, max(limit, 10)))
+                        if offline_results:
+                            yield {"source": source, "papers": offline_results}
+                    except Exception as exc:
+                        logger.error("Offline corpus search failed", error=str(exc))
                     continue
-                source_name, provider_results = payload
-                if provider_results:
-                    all_results.extend(provider_results)
 
-        if not all_results:
-            attempted_sources.append("offline")
-            all_results.extend(self._search_offline_corpus(query, limit))
-
-        filtered_results = self._apply_filters(all_results, filters)
-
-        unique_results = self._deduplicate_results(filtered_results)
-        sorted_results = sorted(unique_results, key=lambda x: x.get("citations_count", 0), reverse=True)
+                provider = providers.get(source)
+                if not provider:
+                    logger.warning("Unknown source requested", source=source)
+                    continue
 
-        result = {
-            "papers": sorted_results[:limit],
-            "count": len(sorted_results),
-            "query": query,
+                attempted_sources.append(source)
+                pending[asyncio.create_task(self._execute_provider(provider, source, query, limit))] = source
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + budget
+            while pending and (enough is None or found < enough):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    source = pending.pop(task)
+                    if task.cancelled():
+                        logger.warning("Provider search cancelled", source=source)
+                        continue
+                    # Provider errors are already logged and swallowed by _execute_provider
+                    _, provider_results = task.result()
+                    unique = fresh(provider_results)
+                    try:
+                        if unique:
+                            yield {"source": source, "papers": unique}
+                    finally:
+                        # Also when the caller stops here; only queued, the corpus writer thread does the disk work
+                        self._remember_offline(provider_results)
+        finally:
+            cancelled = list(pending.values())
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if cancelled:
+            logger.info("Paper search returned early", query=query, found=found, cancelled=cancelled)
+
+        if found < wanted and "offline" not in attempted_sources:
+            # Providers were slow, down or short: top up from papers seen in earlier searches
+            try:
+                offline_results = fresh(await self._search_offline_corpus(query, limit))
+            except Exception as exc:
+                logger.error("Offline corpus search failed", error=str(exc))
+                offline_results = []
+            if offline_results or not found:
+                attempted_sources.append("offline")
+            if offline_results:
+                yield {"source": "offline", "papers": offline_results}
+
+        yield {
+            "done": True,
             "sources_used": list(dict.fromkeys(attempted_sources)) or sources,
-            "timestamp": datetime.now().isoformat()
+            "cancelled": cancelled,
         }
-
-        # Ensure session is closed to avoid warnings in short-lived test runs
-        try:
-            await self.close()
-        except Exception:
-            pass
-        return result
     
-    def _deduplicate_results(self, results: List[Dict]) -> List[Dict]:
-        """Remove duplicate papers based on DOI or title"""
-        seen = set()
-        unique = []
-        
-        for paper in results:
-            # Use DOI as primary key, fallback to title
-            key = paper.get("doi") or paper.get("title", "").lower()
-            if key and key not in seen:
-                seen.add(key)
-                unique.append(paper)
-        
-        return unique
+    def _deduplicate_results(self, results: List[Dict], index: Optional[PaperIndex] = None) -> List[Dict]:
+        """Merge duplicate papers (shared DOI/PMID/arXiv id or near-identical title)
+
+        Returns the records not already in ``index``; duplicates are folded into them.
+        """
+        return (index if index is not None else PaperIndex()).add(results)
 
     def _apply_filters(
         self,
@@ -490,6 +584,8 @@ class PaperSearcher:
                     "authors": authors,
                     "year": paper.get("year"),
                     "doi": doi,
+                    "pmid": external_ids.get("PubMed"),
+                    "arxiv_id": external_ids.get("ArXiv"),
                     "abstract": paper.get("abstract", ""),
                     "citations_count": paper.get("citationCount", 0),
                     "open_access": open_access,
@@ -503,52 +599,14 @@ class PaperSearcher:
                 logger.error("Error formatting Semantic Scholar result", error=str(exc))
         return formatted
 
-    def _load_offline_corpus(self) -> List[Dict[str, Any]]:
-        if self._offline_cache is not None:
-            return self._offline_cache
-        if not self.offline_dataset_path.exists():
-            self._offline_cache = []
-            return []
-        try:
-            with self.offline_dataset_path.open("r", encoding="utf-8") as handle:
-                self._offline_cache = json.load(handle)
-        except Exception as exc:
-            logger.error("Failed to load offline corpus", error=str(exc))
-            self._offline_cache = []
-        return self._offline_cache
+    async def _search_offline_corpus(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        # File reads (and on first use, opening the index) stay off the event loop
+        return await asyncio.to_thread(lambda: get_offline_corpus().search(query, limit))
 
-    def _search_offline_corpus(self, query: str, limit: int) -> List[Dict[str, Any]]:
-        corpus = self._load_offline_corpus()
-        if not corpus:
-            return []
-        terms = [term for term in re.findall(r"[a-z0-9]{3,}", query.lower())]
-        if not terms:
-            return corpus[:limit]
-
-        def score(paper: Dict[str, Any]) -> int:
-            haystack = " ".join([
-                paper.get("title", ""),
-                paper.get("abstract", ""),
-                " ".join(keyword for keyword in paper.get("keywords", []) if isinstance(keyword, str)),
-            ]).lower()
-            return sum(1 for term in terms if term in haystack)
-
-        ranked = sorted(corpus, key=score, reverse=True)
-        top = []
-        for item in ranked:
-            if score(item) == 0 and top:
-                break
-            clone = dict(item)
-            clone.setdefault("source", "offline-corpus")
-            top.append(clone)
-            if len(top) >= limit:
-                break
-        return top
+    def _remember_offline(self, results: List[Dict[str, Any]]) -> None:
+        """Keep provider results in the offline corpus for later outages, off the request path"""
+        remember_papers(results)
 
     async def close(self):
-        """Close the session"""
-        if self.session:
-            try:
-                await self.session.close()
-            finally:
-                self.session = None
\ No newline at end of file
+        """Release the session; the shared pool stays open for the next search (see close_search_session)"""
+        self.session = None
\ No newline at end of file
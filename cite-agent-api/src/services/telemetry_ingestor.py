@@ -2,19 +2,22 @@
 
 from __future__ import annotations
 
+import atexit
 import hashlib
 import json
 import os
+import queue
 import threading
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterator, List, Optional, Set
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 import structlog
 
 from src.config.settings import get_settings
+from src.utils.sketches import HyperLogLog
 
 logger = structlog.get_logger(__name__)
 
@@ -83,17 +86,156 @@ class TelemetryAuthenticator:
         raise TelemetryAuthError("Telemetry ingestion is disabled", status_code=403)
 
 
+INDEX_STRIDE = 256  # records between entries of the per-file offset index
+ROLLUP_SUFFIX = ".rollup.json"
+ALL_TOKENS = "*"
+
+
+@dataclass
+class _Counts:
+    """Aggregates for one day and one token, updated as events are written."""
+
+    total: int = 0
+    by_event: Dict[str, int] = field(default_factory=dict)
+    sessions: HyperLogLog = field(default_factory=HyperLogLog)
+    accounts: HyperLogLog = field(default_factory=HyperLogLog)
+    last_seen: Optional[str] = None
+
+    def add(self, event_name: str, session: Optional[str], account: Optional[str], seen: Optional[str]) -> None:
+        self.total += 1
+        self.by_event[event_name] = self.by_event.get(event_name, 0) + 1
+        if session:
+            self.sessions.add(session)
+        if account:
+            self.accounts.add(account)
+        if seen and (self.last_seen is None or seen > self.last_seen):
+            self.last_seen = seen
+
+    def merge(self, other: "_Counts") -> "_Counts":
+        self.total += other.total
+        for name, count in other.by_event.items():
+            self.by_event[name] = self.by_event.get(name, 0) + count
+        self.sessions.merge(other.sessions)
+        self.accounts.merge(other.accounts)
+        if other.last_seen and (self.last_seen is None or other.last_seen > self.last_seen):
+            self.last_seen = other.last_seen
+        return self
+
+    def copy(self) -> "_Counts":
+        return _Counts(
+            total=self.total,
+            by_event=dict(self.by_event),
+            sessions=self.sessions.copy(),
+            accounts=self.accounts.copy(),
+            last_seen=self.last_seen,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "by_event": self.by_event,
+            "sessions": self.sessions.to_dict(),
+            "accounts": self.accounts.to_dict(),
+            "last_seen": self.last_seen,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "_Counts":
+        return cls(
+            total=int(data.get("total", 0)),
+            by_event={str(k): int(v) for k, v in data.get("by_event", {}).items()},
+            sessions=HyperLogLog.from_dict(data.get("sessions", {})),
+            accounts=HyperLogLog.from_dict(data.get("accounts", {})),
+            last_seen=data.get("last_seen"),
+        )
+
+
+@dataclass
+class _DayRollup:
+    """Rollups and offset index for one daily JSONL file."""
+
+    offset: int = 0                                     # bytes of the file folded in so far
+    records: int = 0
+    index: List[int] = field(default_factory=list)      # byte offset of every INDEX_STRIDE-th record
+    tokens: Dict[str, _Counts] = field(default_factory=dict)
+    dirty: bool = False
+
+    def fold(self, record: Dict[str, Any], line_offset: int) -> None:
+        if self.records % INDEX_STRIDE == 0:
+            self.index.append(line_offset)
+        self.records += 1
+
+        event_name = str(record.get("event", "unknown"))
+        meta = record.get("meta") or {}
+        session = record.get("session") or meta.get("session")
+        account = record.get("account_id")
+        seen = record.get("received_at") or record.get("timestamp")
+        for key in (ALL_TOKENS, record.get("token_hash")):
+            if key:
+                counts = self.tokens.get(key)
+                if counts is None:
+                    counts = self.tokens[key] = _Counts()
+                counts.add(
+                    event_name,
+                    str(session) if session else None,
+                    str(account) if account else None,
+                    str(seen) if seen else None,
+                )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset": self.offset,
+            "records": self.records,
+            "index": self.index,
+            "tokens": {key: counts.to_dict() for key, counts in self.tokens.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "_DayRollup":
+        return cls(
+            offset=int(data["offset"]),
+            records=int(data["records"]),
+            index=[int(value) for value in data["index"]],
+            tokens={key: _Counts.from_dict(value) for key, value in data.get("tokens", {}).items()},
+        )
+
+
 class TelemetryIngestor:
-    """Durable JSONL sink for telemetry events."""
+    """Durable JSONL sink for telemetry events.
+
+    ``persist`` only queues the serialized record; a writer thread appends
+    queued records in batches and folds them into per-day, per-token rollups.
+    Rollups and a sparse offset index are checkpointed next to each daily file
+    (``<date>.rollup.json``) and caught up from the file on startup, so
+    summaries never re-read the JSONL and event listings read only the tail.
+    """
 
-    def __init__(self, storage_dir: Path, retention_days: int = 30) -> None:
+    def __init__(
+        self,
+        storage_dir: Path,
+        retention_days: int = 30,
+        *,
+        batch_size: int = 500,
+        checkpoint_interval: float = 5.0,
+    ) -> None:
         self.storage_dir = storage_dir
         self.storage_dir.mkdir(parents=True, exist_ok=True)
         self.retention_days = max(0, retention_days)
-        self._lock = threading.Lock()
+        self.batch_size = max(1, batch_size)
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()  # guards _rollups
+        self._rollups: Dict[str, _DayRollup] = {}
+        self._queue: "queue.Queue[Optional[Tuple[str, bytes, Dict[str, Any]]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._current_day: Optional[str] = None
+        self._last_checkpoint = time.monotonic()
+
+        self._enforce_retention()
+        self._load_rollups()
 
     def persist(self, event: Dict[str, Any], *, token_hash: str, metadata: Optional[Dict[str, Any]] = None) -> Path:
-        """Persist a telemetry event to disk.
+        """Queue a telemetry event for the writer thread.
 
         Args:
             event: Validated telemetry payload.
@@ -102,31 +244,43 @@ class TelemetryIngestor:
         """
         payload = dict(event)
         payload.setdefault("timestamp", datetime.now(timezone.utc))
-        serialized = self._serialize_record(payload, token_hash=token_hash, metadata=metadata)
-        file_path = self.storage_dir / f"{datetime.now(timezone.utc).date().isoformat()}.jsonl"
+        record = self._build_record(payload, token_hash=token_hash, metadata=metadata)
+        day = datetime.now(timezone.utc).date().isoformat()
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
 
-        with self._lock:
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            with file_path.open("a", encoding="utf-8") as handle:
-                handle.write(serialized)
-                handle.write("\n")
-            self._enforce_retention()
+        self._ensure_writer()
+        self._queue.put((day, line, record))
 
         logger.info(
             "telemetry_ingested",
-            event=payload.get("event"),
+            telemetry_event=payload.get("event"),
             token_hash=token_hash[:12],
-            path=str(file_path),
+            path=str(self._day_path(day)),
         )
-        return file_path
-
-    def _serialize_record(
+        return self._day_path(day)
+
+    def flush(self) -> None:
+        """Block until every queued event is on disk and folded into the rollups."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Drain the queue, stop the writer and checkpoint rollups."""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            atexit.unregister(self.close)
+            self._queue.put(None)
+            writer.join()
+        self._checkpoint(force=True)
+
+    def _build_record(
         self,
         payload: Dict[str, Any],
         *,
         token_hash: str,
         metadata: Optional[Dict[str, Any]] = None,
-    ) -> str:
+    ) -> Dict[str, Any]:
         record: Dict[str, Any] = dict(payload)
         ts = record.get("timestamp")
         if isinstance(ts, datetime):
@@ -138,7 +292,141 @@ class TelemetryIngestor:
         record["token_hash"] = token_hash[:32]
         if metadata:
             record["meta"] = {k: v for k, v in metadata.items() if v is not None}
-        return json.dumps(record, ensure_ascii=False)
+        return record
+
+    def _day_path(self, day: str) -> Path:
+        return self.storage_dir / f"{day}.jsonl"
+
+    def _rollup_path(self, day: str) -> Path:
+        return self.storage_dir / f"{day}{ROLLUP_SUFFIX}"
+
+    # Writer thread -----------------------------------------------------
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="telemetry-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _run_writer(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            items = [item for item in batch if item is not None]
+            try:
+                if items:
+                    self._write_batch(items)
+                self._checkpoint()
+            except Exception as exc:  # pragma: no cover - keep the writer alive
+                logger.warning("telemetry_write_failed", error=str(exc), dropped=len(items))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(items) != len(batch):
+                return
+
+    def _write_batch(self, items: List[Tuple[str, bytes, Dict[str, Any]]]) -> None:
+        by_day: Dict[str, List[Tuple[bytes, Dict[str, Any]]]] = {}
+        for day, line, record in items:
+            by_day.setdefault(day, []).append((line, record))
+
+        for day, entries in by_day.items():
+            if day != self._current_day:
+                self._current_day = day
+                self._enforce_retention()
+
+            path = self._day_path(day)
+            with path.open("ab") as handle:
+                start = handle.tell()
+                handle.write(b"".join(line for line, _ in entries))
+
+            with self._lock:
+                rollup = self._rollups.setdefault(day, _DayRollup())
+                if rollup.offset != start:
+                    # Someone else appended to the file; catch up from disk instead
+                    self._replay(path, rollup)
+                else:
+                    offset = start
+                    for line, record in entries:
+                        rollup.fold(record, offset)
+                        offset += len(line)
+                    rollup.offset = offset
+                rollup.dirty = True
+
+    def _checkpoint(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < self.checkpoint_interval:
+            return
+        self._last_checkpoint = now
+
+        with self._lock:
+            pending = {}
+            for day, rollup in self._rollups.items():
+                if rollup.dirty:
+                    pending[day] = rollup.to_dict()
+                    rollup.dirty = False
+
+        for day, data in pending.items():
+            path = self._rollup_path(day)
+            tmp = path.with_suffix(".tmp")
+            try:
+                tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+                os.replace(tmp, path)
+            except Exception as exc:  # pragma: no cover - rebuilt from the JSONL on restart
+                logger.warning("telemetry_checkpoint_failed", path=str(path), error=str(exc))
+
+    # Rollup maintenance ------------------------------------------------
+
+    def _load_rollups(self) -> None:
+        for path in sorted(self.storage_dir.glob("*.jsonl")):
+            try:
+                datetime.strptime(path.stem, "%Y-%m-%d")
+            except ValueError:
+                continue
+            day = path.stem
+            rollup = _DayRollup()
+            sidecar = self._rollup_path(day)
+            if sidecar.exists():
+                try:
+                    rollup = _DayRollup.from_dict(json.loads(sidecar.read_text(encoding="utf-8")))
+                except Exception as exc:
+                    logger.warning("telemetry_rollup_invalid", path=str(sidecar), error=str(exc))
+                    rollup = _DayRollup()
+            if rollup.offset > path.stat().st_size:
+                rollup = _DayRollup()  # file was truncated or replaced; rebuild
+            self._replay(path, rollup)
+            self._rollups[day] = rollup
+
+    def _replay(self, path: Path, rollup: _DayRollup) -> None:
+        """Fold complete lines after ``rollup.offset`` into the rollup."""
+        start = rollup.offset
+        try:
+            with path.open("rb") as handle:
+                handle.seek(start)
+                offset = start
+                for raw in handle:
+                    if not raw.endswith(b"\n"):
+                        break  # partial tail from an interrupted append
+                    line = raw.strip()
+                    if line:
+                        try:
+                            rollup.fold(json.loads(line), offset)
+                        except json.JSONDecodeError:
+                            logger.warning("telemetry_record_decode_failed", path=str(path))
+                    offset += len(raw)
+        except FileNotFoundError:
+            return
+        if offset != start:
+            rollup.offset = offset
+            rollup.dirty = True
 
     def _enforce_retention(self) -> None:
         if self.retention_days <= 0:
@@ -150,46 +438,55 @@ class TelemetryIngestor:
             except ValueError:
                 continue
             if file_date < cutoff:
-                try:
-                    file.unlink()
-                except Exception as exc:  # pragma: no cover - best effort cleanup
-                    logger.warning("telemetry_retention_cleanup_failed", path=str(file), error=str(exc))
+                with self._lock:
+                    self._rollups.pop(file.stem, None)
+                for stale in (file, self._rollup_path(file.stem)):
+                    try:
+                        stale.unlink(missing_ok=True)
+                    except Exception as exc:  # pragma: no cover - best effort cleanup
+                        logger.warning("telemetry_retention_cleanup_failed", path=str(stale), error=str(exc))
+
+    def _window_days(self, days: int) -> List[str]:
+        """ISO dates of the last ``days`` days, oldest first."""
+        today = datetime.now(timezone.utc).date()
+        return [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+
+    # Queries -----------------------------------------------------------
 
     def _iter_records(self, *, token_hash: Optional[str], days: int) -> Iterator[Dict[str, Any]]:
+        """Yield records newest first, reading each file backwards one index segment at a time."""
+        self.flush()
         days = max(1, days)
-        cutoff_date = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
         token_short = token_hash[:32] if token_hash else None
 
-        files = sorted(self.storage_dir.glob("*.jsonl"), reverse=True)
-        for path in files:
-            try:
-                file_date = datetime.strptime(path.stem, "%Y-%m-%d").date()
-            except ValueError:
-                continue
-            if file_date < cutoff_date:
-                continue
-
+        with self._lock:
+            files = [
+                (day, self._rollups[day].offset, list(self._rollups[day].index))
+                for day in reversed(self._window_days(days))
+                if day in self._rollups
+            ]
+
+        for day, end, index in files:
+            path = self._day_path(day)
+            bounds = index + [end]
             try:
-                with path.open("r", encoding="utf-8") as handle:
-                    lines = handle.readlines()
+                with path.open("rb") as handle:
+                    for seg_start, seg_end in reversed(list(zip(bounds, bounds[1:]))):
+                        handle.seek(seg_start)
+                        for line in reversed(handle.read(seg_end - seg_start).splitlines()):
+                            line = line.strip()
+                            if not line:
+                                continue
+                            try:
+                                record = json.loads(line)
+                            except json.JSONDecodeError:
+                                logger.warning("telemetry_record_decode_failed", path=str(path))
+                                continue
+                            if token_short and record.get("token_hash") != token_short:
+                                continue
+                            yield record
             except FileNotFoundError:
                 continue
-            except Exception as exc:  # pragma: no cover - best effort
-                logger.warning("telemetry_iter_error", path=str(path), error=str(exc))
-                continue
-
-            for line in reversed(lines):
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    record = json.loads(line)
-                except json.JSONDecodeError:
-                    logger.warning("telemetry_record_decode_failed", path=str(path))
-                    continue
-                if token_short and record.get("token_hash") != token_short:
-                    continue
-                yield record
 
     def iter_events(
         self,
@@ -210,45 +507,35 @@ class TelemetryIngestor:
 
         return sorted(events, key=lambda item: item.get("received_at", ""), reverse=True)
 
+    def _day_counts(self, days: List[str], token_hash: Optional[str]) -> Dict[str, _Counts]:
+        self.flush()
+        key = token_hash[:32] if token_hash else ALL_TOKENS
+        with self._lock:
+            result = {}
+            for day in days:
+                rollup = self._rollups.get(day)
+                counts = rollup.tokens.get(key) if rollup else None
+                result[day] = counts.copy() if counts else _Counts()
+            return result
+
     def summarize(
         self,
         *,
         token_hash: Optional[str] = None,
         days: int = 7,
-        limit: int = 1000,
     ) -> Dict[str, Any]:
-        """Summarize telemetry activity for the given token hash."""
+        """Summarize telemetry activity for the given token hash from the daily rollups."""
 
-        events = []
-        for idx, record in enumerate(self._iter_records(token_hash=token_hash, days=days)):
-            events.append(record)
-            if idx + 1 >= limit:
-                break
-        total = len(events)
-        per_event: Dict[str, int] = {}
-        sessions: Set[str] = set()
-        accounts: Set[str] = set()
-        last_seen = None
-
-        for record in events:
-            event_name = record.get("event", "unknown")
-            per_event[event_name] = per_event.get(event_name, 0) + 1
-            session = record.get("session") or record.get("meta", {}).get("session")
-            if session:
-                sessions.add(str(session))
-            account = record.get("account_id")
-            if account:
-                accounts.add(str(account))
-            ts = record.get("received_at") or record.get("timestamp")
-            if ts and (last_seen is None or ts > last_seen):
-                last_seen = ts
+        merged = _Counts()
+        for counts in self._day_counts(self._window_days(max(1, days)), token_hash).values():
+            merged.merge(counts)
 
         return {
-            "total_events": total,
-            "by_event": per_event,
-            "unique_sessions": len(sessions),
-            "unique_accounts": len(accounts),
-            "last_seen": last_seen,
+            "total_events": merged.total,
+            "by_event": merged.by_event,
+            "unique_sessions": merged.sessions.count(),
+            "unique_accounts": merged.accounts.count(),
+            "last_seen": merged.last_seen,
             "days": days,
             "inspected_at": datetime.now(timezone.utc).isoformat(),
         }
@@ -262,83 +549,18 @@ class TelemetryIngestor:
         """Summarize telemetry counts per day for the requested window."""
 
         days = max(1, min(days, 30))
-        token_short = token_hash[:32] if token_hash else None
-        cutoff_date = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
-
-        aggregates: Dict[str, Dict[str, Any]] = {}
-
-        files = sorted(self.storage_dir.glob("*.jsonl"))
-        for path in files:
-            try:
-                file_date = datetime.strptime(path.stem, "%Y-%m-%d").date()
-            except ValueError:
-                continue
-            if file_date < cutoff_date:
-                continue
-
-            date_key = file_date.isoformat()
-            bucket = aggregates.setdefault(
-                date_key,
-                {
-                    "date": date_key,
-                    "total_events": 0,
-                    "by_event": {},
-                    "sessions": set(),
-                    "accounts": set(),
-                },
-            )
+        per_day = self._day_counts(self._window_days(days), token_hash)
 
-            try:
-                with path.open("r", encoding="utf-8") as handle:
-                    for line in handle:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        try:
-                            record = json.loads(line)
-                        except json.JSONDecodeError:
-                            logger.warning("telemetry_record_decode_failed", path=str(path))
-                            continue
-                        if token_short and record.get("token_hash") != token_short:
-                            continue
-                        event_name = record.get("event", "unknown")
-                        bucket["total_events"] += 1
-                        bucket["by_event"][event_name] = bucket["by_event"].get(event_name, 0) + 1
-                        session = record.get("session") or record.get("meta", {}).get("session")
-                        if session:
-                            bucket["sessions"].add(str(session))
-                        account = record.get("account_id")
-                        if account:
-                            bucket["accounts"].add(str(account))
-            except FileNotFoundError:
-                continue
-            except Exception as exc:  # pragma: no cover - best effort
-                logger.warning("telemetry_iter_error", path=str(path), error=str(exc))
-
-        series: List[Dict[str, Any]] = []
-        for offset in range(days - 1, -1, -1):
-            day = (datetime.now(timezone.utc).date() - timedelta(days=offset)).isoformat()
-            bucket = aggregates.get(
-                day,
-                {
-                    "date": day,
-                    "total_events": 0,
-                    "by_event": {},
-                    "sessions": set(),
-                    "accounts": set(),
-                },
-            )
-            series.append(
-                {
-                    "date": bucket["date"],
-                    "total_events": bucket["total_events"],
-                    "by_event": bucket["by_event"],
-                    "unique_sessions": len(bucket["sessions"]),
-                    "unique_accounts": len(bucket["accounts"]),
-                }
-            )
-
-        return series
+        return [
+            {
+                "date": day,
+                "total_events": counts.total,
+                "by_event": counts.by_event,
+                "unique_sessions": counts.sessions.count(),
+                "unique_accounts": counts.accounts.count(),
+            }
+            for day, counts in per_day.items()
+        ]
 
 
 def _resolve_storage_dir() -> Path:
@@ -350,8 +572,19 @@ def _resolve_storage_dir() -> Path:
         return base.expanduser()
 
 
-@lru_cache(maxsize=8)
+_ingestors: Dict[str, TelemetryIngestor] = {}
+_ingestors_lock = threading.Lock()
+
+
 def _ingestor_factory(storage_root: str) -> TelemetryIngestor:
+    with _ingestors_lock:
+        ingestor = _ingestors.get(storage_root)
+        if ingestor is None:
+            ingestor = _ingestors[storage_root] = _create_ingestor(storage_root)
+        return ingestor
+
+
+def _create_ingestor(storage_root: str) -> TelemetryIngestor:
     retention_raw = os.getenv("NOCTURNAL_TELEMETRY_RETENTION_DAYS", "30")
     try:
         retention_days = int(retention_raw)
@@ -366,7 +599,11 @@ def get_telemetry_ingestor() -> TelemetryIngestor:
 
 
 def reset_telemetry_ingestor_cache() -> None:
-    _ingestor_factory.cache_clear()
+    with _ingestors_lock:
+        ingestors = list(_ingestors.values())
+        _ingestors.clear()
+    for ingestor in ingestors:
+        ingestor.close()
 
 
 def get_telemetry_authenticator() -> TelemetryAuthenticator:
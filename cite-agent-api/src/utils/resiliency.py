@@ -2,17 +2,21 @@
 Resiliency utilities: Redis caching and circuit breaker
 """
 
+import asyncio
+import inspect
 import time
 import json
 import hashlib
+from collections import OrderedDict
 from functools import wraps
-from typing import Callable, Optional, Protocol, runtime_checkable
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple, runtime_checkable
 import structlog
 
 logger = structlog.get_logger(__name__)
 
-# Redis connection (will be initialized when Redis is available)
+# Redis connections (will be initialized when Redis is available)
 redis_client = None
+async_redis_client = None
 
 # Optional metrics recorder (duck-typed to avoid hard dependency)
 metrics_recorder = None
@@ -53,17 +57,20 @@ def _observe(metric: str, value: float, *, tags: Optional[dict] = None) -> None:
 
 def init_redis(redis_url: str = "redis://localhost:6379/0"):
     """Initialize Redis connection"""
-    global redis_client
+    global redis_client, async_redis_client
     try:
         import redis
+        import redis.asyncio as redis_asyncio
         redis_client = redis.from_url(redis_url)
         redis_client.ping()  # Test connection
+        async_redis_client = redis_asyncio.from_url(redis_url)
         logger.info("redis_connection_established", log_event="redis_connection_established", url=redis_url)
         _increment("resiliency.redis.connected", tags={"url": redis_url})
     except Exception as e:
         logger.warning("redis_unavailable", log_event="redis_unavailable", error=str(e), url=redis_url)
         _increment("resiliency.redis.unavailable", tags={"url": redis_url})
         redis_client = None
+        async_redis_client = None
 
 def _get_cache_key(func_name: str, args: tuple, kwargs: dict) -> str:
     """Generate cache key from function name and arguments"""
@@ -75,14 +82,200 @@ def _get_cache_key(func_name: str, args: tuple, kwargs: dict) -> str:
     key_str = json.dumps(key_data, sort_keys=True, default=str)
     return f"cache:{func_name}:{hashlib.md5(key_str.encode()).hexdigest()}"
 
-def cache(ttl: int = 600, source_version: str = "v1"):
+
+def _is_method(func: Callable) -> bool:
+    """True when the first parameter is self/cls (excluded from cache keys)"""
+    try:
+        params = list(inspect.signature(func).parameters)
+    except (TypeError, ValueError):
+        return False
+    return bool(params) and params[0] in {"self", "cls"}
+
+
+def _is_cacheable(result: Any) -> bool:
+    """Provider failures (None) and empty payloads are never cached"""
+    if result is None:
+        return False
+    if isinstance(result, (list, dict)) and len(result) == 0:
+        return False
+    return True
+
+
+class LocalCache:
+    """Bounded in-process LRU with per-entry TTL and stale window (L1 tier)
+
+    Values are stored JSON-encoded so hits behave exactly like Redis hits:
+    every caller gets a fresh decoded copy.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[Optional[str], bool]:
+        """Return (encoded value, is_stale); (None, False) when absent or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        fresh_until, stale_until, encoded = entry
+        now = time.monotonic()
+        if now >= stale_until:
+            self._entries.pop(key, None)
+            return None, False
+        self._entries.move_to_end(key)
+        return encoded, now >= fresh_until
+
+    def set(self, key: str, encoded: str, ttl: float, stale_ttl: float = 0) -> None:
+        now = time.monotonic()
+        self._entries[key] = (now + ttl, now + ttl + stale_ttl, encoded)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _async_cache_wrapper(
+    func: Callable,
+    *,
+    ttl: int,
+    source_version: str,
+    stale_ttl: int,
+    l1: LocalCache,
+) -> Callable:
+    """Coroutine-aware cache: L1 -> redis.asyncio -> coalesced call"""
+    metric_tags = {"func": func.__name__, "version": source_version}
+    skip_self = _is_method(func)
+    pending: Dict[str, asyncio.Task] = {}
+
+    async def _store(cache_key: str, result: Any) -> None:
+        encoded = json.dumps(result, default=str)
+        l1.set(cache_key, encoded, ttl, stale_ttl)
+        if async_redis_client is None:
+            return
+        try:
+            await async_redis_client.setex(cache_key, ttl, encoded)
+        except Exception as e:
+            logger.warning("cache_store_failed", log_event="cache_error", error=str(e), func=func.__name__)
+            _increment("resiliency.cache.error", tags=metric_tags)
+
+    async def _load(cache_key: str, args: tuple, kwargs: dict) -> Tuple[Any, str]:
+        if async_redis_client is not None:
+            try:
+                cached_value = await async_redis_client.get(cache_key)
+            except Exception as e:
+                logger.warning("cache_fallback", log_event="cache_error", error=str(e), func=func.__name__)
+                _increment("resiliency.cache.error", tags=metric_tags)
+                cached_value = None
+            if cached_value:
+                encoded = cached_value.decode() if isinstance(cached_value, bytes) else cached_value
+                l1.set(cache_key, encoded, ttl, stale_ttl)
+                return json.loads(encoded), "redis"
+
+        result = await func(*args, **kwargs)
+        if not _is_cacheable(result):
+            return result, "skip"
+        await _store(cache_key, result)
+        return result, "miss"
+
+    async def _refresh(cache_key: str, args: tuple, kwargs: dict) -> Tuple[Any, str]:
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            logger.warning("cache_refresh_failed", log_event="cache_error", error=str(e), func=func.__name__)
+            raise
+        if not _is_cacheable(result):
+            return result, "skip"
+        await _store(cache_key, result)
+        return result, "miss"
+
+    def _start(cache_key: str, load) -> asyncio.Task:
+        """Run ``load`` detached from its caller, so cancelling the caller leaves coalesced waiters served"""
+        task = asyncio.ensure_future(load)
+        pending[cache_key] = task
+
+        def _done(done: asyncio.Task) -> None:
+            if pending.get(cache_key) is done:
+                del pending[cache_key]
+            if not done.cancelled():
+                done.exception()  # callers re-raise it themselves; nobody may be left to retrieve it
+
+        task.add_done_callback(_done)
+        return task
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        cache_key = _get_cache_key(
+            f"{source_version}:{func.__name__}",
+            args[1:] if skip_self else args,
+            kwargs,
+        )
+
+        encoded, is_stale = l1.get(cache_key)
+        if encoded is not None:
+            if is_stale:
+                _increment("resiliency.cache.stale", tags=metric_tags)
+                if cache_key not in pending:
+                    _start(cache_key, _refresh(cache_key, args, kwargs))
+            else:
+                _increment("resiliency.cache.hit", tags={**metric_tags, "tier": "l1"})
+            _observe("resiliency.cache.latency_seconds", time.perf_counter() - start, tags={**metric_tags, "source": "l1"})
+            return json.loads(encoded)
+
+        inflight = pending.get(cache_key)
+        if inflight is not None:
+            _increment("resiliency.cache.coalesced", tags=metric_tags)
+            result, _ = await asyncio.shield(inflight)
+            _observe("resiliency.cache.latency_seconds", time.perf_counter() - start, tags={**metric_tags, "source": "coalesced"})
+            return result
+
+        result, source = await asyncio.shield(_start(cache_key, _load(cache_key, args, kwargs)))
+
+        if source == "redis":
+            _increment("resiliency.cache.hit", tags={**metric_tags, "tier": "redis"})
+        elif source == "miss":
+            _increment("resiliency.cache.miss", tags=metric_tags)
+        else:
+            _increment("resiliency.cache.skip", tags=metric_tags)
+        _observe("resiliency.cache.latency_seconds", time.perf_counter() - start, tags={**metric_tags, "source": source})
+        return result
+
+    wrapper.cache_clear = l1.clear
+    wrapper.l1_cache = l1
+    return wrapper
+
+
+def cache(ttl: int = 600, source_version: str = "v1", *, stale_ttl: int = 0, l1_max_entries: int = 256):
     """
     Redis cache decorator
     
+    Coroutine functions get an async-aware wrapper: a bounded in-process L1
+    in front of ``redis.asyncio``, request coalescing for concurrent identical
+    calls and optional stale-while-revalidate. ``self``/``cls`` are left out
+    of cache keys so method results are shared across processes.
+    
     Args:
         ttl: Time to live in seconds
+        source_version: Namespace included in cache keys
+        stale_ttl: Seconds an expired L1 entry may still be served while it
+            is refreshed in the background (async functions only)
+        l1_max_entries: Size bound of the in-process L1 (async functions only)
     """
     def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            return _async_cache_wrapper(
+                func,
+                ttl=ttl,
+                source_version=source_version,
+                stale_ttl=stale_ttl,
+                l1=LocalCache(l1_max_entries),
+            )
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             start = time.perf_counter()
@@ -138,16 +331,91 @@ def cache(ttl: int = 600, source_version: str = "v1"):
         return wrapper
     return decorator
 
+def _async_circuit_wrapper(func: Callable, *, name: str, fail_threshold: int, reset_seconds: int) -> Callable:
+    """Coroutine-aware circuit breaker backed by redis.asyncio"""
+    cb_key = f"cb:{name}"
+    metric_tags = {"circuit": name, "func": func.__name__}
+
+    async def _read_state() -> dict:
+        cb_state = await async_redis_client.get(cb_key)
+        return json.loads(cb_state) if cb_state else {"fails": 0, "until": 0}
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+
+        if async_redis_client is None:
+            # Redis not available, skip circuit breaker safeguards
+            _increment("resiliency.circuit.bypass", tags=metric_tags)
+            result = await func(*args, **kwargs)
+            _observe("resiliency.circuit.latency_seconds", time.perf_counter() - start, tags={**metric_tags, "state": "bypass"})
+            return result
+
+        try:
+            state = await _read_state()
+        except Exception as e:
+            logger.error("Circuit breaker error", name=name, error=str(e))
+            state = {"fails": 0, "until": 0}
+
+        if state.get("until", 0) > time.time():
+            logger.warning("circuit_open_block", log_event="circuit_open_block", name=name, until=state["until"])
+            _increment("resiliency.circuit.open_block", tags=metric_tags)
+            _observe("resiliency.circuit.latency_seconds", time.perf_counter() - start, tags={**metric_tags, "state": "open_block"})
+            raise RuntimeError(f"Circuit breaker '{name}' is open")
+
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            logger.warning("circuit_failure", log_event="circuit_failure", name=name, error=str(e))
+            _increment("resiliency.circuit.failure", tags=metric_tags)
+            _observe("resiliency.circuit.latency_seconds", time.perf_counter() - start, tags={**metric_tags, "state": "failure"})
+            try:
+                state = await _read_state()
+                state["fails"] += 1
+                if state["fails"] >= fail_threshold:
+                    state["until"] = time.time() + reset_seconds
+                    state["fails"] = 0  # Reset counter when opening circuit
+                    logger.warning("circuit_opened", log_event="circuit_open", name=name, threshold=fail_threshold, reset_seconds=reset_seconds)
+                    _increment("resiliency.circuit.open", tags=metric_tags)
+                await async_redis_client.set(cb_key, json.dumps(state))
+            except Exception as cb_error:
+                logger.error("Circuit breaker error", name=name, error=str(cb_error))
+            raise
+
+        if state.get("fails", 0) > 0:
+            try:
+                await async_redis_client.set(cb_key, json.dumps({"fails": 0, "until": 0}))
+                logger.info("circuit_reset", log_event="circuit_reset", name=name)
+            except Exception as cb_error:
+                logger.error("Circuit breaker error", name=name, error=str(cb_error))
+        _increment("resiliency.circuit.success", tags=metric_tags)
+        _observe("resiliency.circuit.latency_seconds", time.perf_counter() - start, tags={**metric_tags, "state": "success"})
+        return result
+
+    return wrapper
+
+
 def circuit_breaker(name: str, fail_threshold: int = 5, reset_seconds: int = 60):
     """
     Circuit breaker decorator
     
+    Works for both plain and coroutine functions; the async variant uses
+    ``redis.asyncio`` so it never blocks the event loop.
+    
     Args:
         name: Circuit breaker name
         fail_threshold: Number of failures before opening circuit
         reset_seconds: Seconds to wait before trying again
     """
     def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            return _async_circuit_wrapper(
+                func,
+                name=name,
+                fail_threshold=fail_threshold,
+                reset_seconds=reset_seconds,
+            )
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             metric_tags = {"circuit": name, "func": func.__name__}
@@ -0,0 +1,277 @@
+"""Mergeable streaming sketches for rollups that must stay small."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import heapq
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+def _hash64(value: str) -> int:
+    # Stable across processes (unlike hash()) so persisted sketches stay valid
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Distinct-count estimator with ~3% error in ``2 ** precision`` bytes.
+
+    Small sets are kept as exact 64-bit hashes and only converted to registers
+    once they outgrow ``sparse_limit``, so rarely used keys stay tiny and report
+    exact counts.
+    """
+
+    def __init__(self, precision: int = 10, sparse_limit: int = 128) -> None:
+        self.precision = precision
+        self.sparse_limit = sparse_limit
+        self._exact: Optional[Set[int]] = set()
+        self._registers: Optional[bytearray] = None
+
+    @property
+    def size(self) -> int:
+        return 1 << self.precision
+
+    def add(self, value: str) -> None:
+        hashed = _hash64(value)
+        if self._exact is not None:
+            self._exact.add(hashed)
+            if len(self._exact) > self.sparse_limit:
+                self._densify()
+        else:
+            self._set(hashed)
+
+    def update(self, values: Iterable[str]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Fold ``other`` into this sketch (in place) and return self."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        if other._exact is not None:
+            if self._exact is not None:
+                self._exact |= other._exact
+                if len(self._exact) > self.sparse_limit:
+                    self._densify()
+            else:
+                for hashed in other._exact:
+                    self._set(hashed)
+            return self
+
+        if self._exact is not None:
+            self._densify()
+        registers = self._registers
+        for idx, rank in enumerate(other._registers):
+            if rank > registers[idx]:
+                registers[idx] = rank
+        return self
+
+    def count(self) -> int:
+        if self._exact is not None:
+            return len(self._exact)
+
+        m = self.size
+        registers = self._registers
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -rank for rank in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+    def copy(self) -> "HyperLogLog":
+        clone = HyperLogLog(self.precision, self.sparse_limit)
+        clone._exact = set(self._exact) if self._exact is not None else None
+        clone._registers = bytearray(self._registers) if self._registers is not None else None
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self._exact is not None:
+            return {"p": self.precision, "exact": sorted(self._exact)}
+        return {"p": self.precision, "registers": base64.b64encode(bytes(self._registers)).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], sparse_limit: int = 128) -> "HyperLogLog":
+        sketch = cls(int(data.get("p", 10)), sparse_limit)
+        if "registers" in data:
+            sketch._exact = None
+            sketch._registers = bytearray(base64.b64decode(data["registers"]))
+        else:
+            sketch._exact = {int(value) for value in data.get("exact", [])}
+        return sketch
+
+    def _densify(self) -> None:
+        exact, self._exact = self._exact or set(), None
+        self._registers = bytearray(self.size)
+        for hashed in exact:
+            self._set(hashed)
+
+    def _set(self, hashed: int) -> None:
+        bits = 64 - self.precision
+        idx = hashed >> bits
+        rest = hashed & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1
+        if rank > self._registers[idx]:
+            self._registers[idx] = rank
+
+
+class LatencyHistogram:
+    """Fixed-size log-bucketed histogram with bounded relative error.
+
+    Buckets grow geometrically (DDSketch layout), so any quantile is reported
+    within ``relative_accuracy`` of the true value between ``min_value`` and
+    ``max_value``. Recording is O(1) and histograms with the same parameters
+    merge by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 0.01, max_value: float = 600_000.0) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        self.counts: List[int] = [0] * (math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float) -> None:
+        clamped = min(max(value, self.min_value), self.max_value)
+        self.counts[math.ceil(math.log(clamped) / self._log_gamma) - self._offset] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Fold ``other`` into this histogram (in place) and return self."""
+        if (other.relative_accuracy, other.min_value, other.max_value) != (
+            self.relative_accuracy, self.min_value, self.max_value
+        ):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        """Estimate several quantiles in a single pass over the buckets."""
+        if not self.count:
+            return [0.0 for _ in qs]
+        order = sorted(range(len(qs)), key=lambda i: qs[i])
+        ranks = [max(0.0, min(1.0, qs[i])) * (self.count - 1) for i in order]
+        results = [0.0] * len(qs)
+        seen = 0
+        position = 0
+        for idx, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            while position < len(ranks) and seen > ranks[position]:
+                # Midpoint of the bucket, which keeps the estimate within the relative accuracy
+                estimate = 2 * self.gamma ** (idx + self._offset) / (self.gamma + 1)
+                results[order[position]] = min(max(estimate, self.min), self.max)
+                position += 1
+            if position == len(ranks):
+                break
+        return results
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class RollingCounter:
+    """Event counts over a sliding time window, kept in a fixed ring of slots."""
+
+    def __init__(self, slots: int = 60, slot_seconds: float = 1.0) -> None:
+        self.slots = slots
+        self.slot_seconds = slot_seconds
+        self._counts = [0] * slots
+        self._ids = [-1] * slots
+
+    @property
+    def window_seconds(self) -> float:
+        return self.slots * self.slot_seconds
+
+    def add(self, amount: int = 1, now: Optional[float] = None) -> None:
+        slot = int((time.time() if now is None else now) // self.slot_seconds)
+        idx = slot % self.slots
+        if self._ids[idx] != slot:
+            self._ids[idx] = slot
+            self._counts[idx] = 0
+        self._counts[idx] += amount
+
+    def total(self, now: Optional[float] = None) -> int:
+        """Events recorded within the window ending at ``now``."""
+        slot = int((time.time() if now is None else now) // self.slot_seconds)
+        oldest = slot - self.slots
+        return sum(count for count, ident in zip(self._counts, self._ids) if oldest < ident <= slot)
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """Events per second over the window."""
+        return self.total(now) / self.window_seconds
+
+
+class TopK:
+    """Space-Saving heavy hitters: the most frequent keys in ``capacity`` counters.
+
+    Once full, a new key takes over the smallest counter and inherits its
+    count, so reported counts may over-estimate by at most ``error(key)``.
+    """
+
+    def __init__(self, capacity: int = 1000) -> None:
+        self.capacity = max(1, capacity)
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []  # lazily invalidated (count, key) entries
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, key: str, amount: int = 1) -> None:
+        counts = self._counts
+        if key in counts:
+            counts[key] += amount
+        elif len(counts) < self.capacity:
+            counts[key] = amount
+            self._errors[key] = 0
+        else:
+            victim = self._min_key()
+            floor = counts.pop(victim)
+            self._errors.pop(victim, None)
+            counts[key] = floor + amount
+            self._errors[key] = floor
+
+        heapq.heappush(self._heap, (counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, k) for k, count in counts.items()]
+            heapq.heapify(self._heap)
+
+    def error(self, key: str) -> int:
+        return self._errors.get(key, 0)
+
+    def top(self, limit: int = 10) -> List[Tuple[str, int]]:
+        return heapq.nlargest(limit, self._counts.items(), key=lambda item: item[1])
+
+    def _min_key(self) -> str:
+        heap = self._heap
+        while heap:
+            count, key = heap[0]
+            if self._counts.get(key) == count:
+                return key
+            heapq.heappop(heap)
+        return min(self._counts, key=self._counts.__getitem__)
+
+
+__all__ = ["HyperLogLog", "LatencyHistogram", "RollingCounter", "TopK"]
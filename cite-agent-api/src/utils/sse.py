@@ -0,0 +1,11 @@
+"""Server-sent event framing shared by the streaming endpoints."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """One ``text/event-stream`` frame carrying ``data`` as JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
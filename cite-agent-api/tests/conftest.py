@@ -98,4 +98,15 @@ def _patch_httpx(monkeypatch, httpx_client: httpx.Client) -> Iterator[None]:
         return httpx_client.request(method, normalized, **kwargs)
 
     monkeypatch.setattr(httpx, "request", _request)
-    yield
\ No newline at end of file
+    yield
+
+@pytest.fixture(autouse=True)
+def _offline_corpus(monkeypatch, tmp_path) -> Iterator[None]:
+    """Give each test an empty offline paper index instead of data/offline_corpus."""
+    from src.services import offline_corpus
+
+    corpus = offline_corpus.OfflineCorpus(tmp_path / "offline_corpus", seed_path=None)
+    monkeypatch.setattr(offline_corpus, "_corpus", corpus)
+    yield
+    # Papers queued by this test's searches must not land in the next test's corpus
+    offline_corpus.drain_offline_writes()
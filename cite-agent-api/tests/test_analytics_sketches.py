@@ -0,0 +1,72 @@
+"""Tests for the streaming analytics sketches and Prometheus export"""
+
+import random
+
+import pytest
+
+from src.services.analytics import AnalyticsService
+from src.utils.sketches import LatencyHistogram, RollingCounter, TopK
+
+
+def test_histogram_quantiles_within_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(20000)]
+    left, right = LatencyHistogram(), LatencyHistogram()
+    for idx, value in enumerate(values):
+        (left if idx % 2 else right).record(value)
+
+    merged = left.merge(right)
+    ordered = sorted(values)
+    for q, estimate in zip((0.5, 0.95, 0.99), merged.quantiles((0.5, 0.95, 0.99))):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert estimate == pytest.approx(exact, rel=0.03)
+    assert merged.count == len(values)
+    assert len(merged.counts) == len(LatencyHistogram().counts)
+
+
+def test_rolling_counter_forgets_old_slots():
+    counter = RollingCounter(slots=60, slot_seconds=1.0)
+    counter.add(5, now=1000.0)
+    counter.add(2, now=1030.5)
+    assert counter.total(now=1031.0) == 7
+    assert counter.total(now=1061.0) == 2
+    assert counter.total(now=1200.0) == 0
+
+
+def test_topk_keeps_heavy_hitters_in_bounded_memory():
+    topk = TopK(capacity=20)
+    for idx in range(20000):
+        topk.add("heavy" if idx % 4 == 0 else f"user-{idx}")
+
+    assert len(topk) == 20
+    key, count = topk.top(1)[0]
+    assert key == "heavy"
+    assert count - topk.error(key) <= 5000 <= count
+
+
+def test_prometheus_export():
+    service = AnalyticsService()
+    for ms in (10.0, 20.0, 30.0):
+        service.record_http("/api/search", "POST", 200, ms, user_id="alice")
+    service.record_http("/api/search", "POST", 503, 40.0)
+    service.record_api_usage("groq", tokens_used=12, latency_ms=250.0)
+
+    text = service.export_prometheus()
+    assert '# TYPE nocturnal_request_latency_ms summary' in text
+    assert 'nocturnal_request_latency_ms_count{endpoint="/api/search"} 4' in text
+    assert 'nocturnal_upstream_latency_ms_count{provider="groq"} 1' in text
+    assert 'nocturnal_requests_total{method="POST",endpoint="/api/search"} 4' in text
+    assert 'nocturnal_errors_total{endpoint="/api/search",type="http_503"} 1' in text
+    assert "nocturnal_active_users 1" in text
+
+    summary = service.get_metrics_summary()
+    assert summary["response_times"]["/api/search"]["p50"] == pytest.approx(20.0, rel=0.02)
+    assert summary["response_times"]["/api/search"]["max"] == 40.0
+    assert summary["top_users"][0]["user_id"] == "alice"
+
+
+def test_prometheus_route(client):
+    response = client.get("/api/analytics/prometheus", headers={"X-API-Key": "na_test_api_key_123"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "nocturnal_uptime_seconds" in response.text
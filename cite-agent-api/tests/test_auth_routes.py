@@ -0,0 +1,39 @@
+"""Auth routes reject bad tokens before taking a pooled connection"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.core.db import get_db_connection
+from src.routes import auth
+
+
+@pytest.fixture
+def auth_client():
+    acquired = []
+
+    async def fake_connection():
+        acquired.append(True)
+        yield object()
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.dependency_overrides[get_db_connection] = fake_connection
+    with TestClient(app) as client:
+        yield client, acquired
+
+
+@pytest.mark.parametrize("method, path", [("get", "/auth/me"), ("post", "/auth/logout")])
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Token abc"}])
+def test_missing_or_malformed_header_never_acquires(auth_client, method, path, headers):
+    client, acquired = auth_client
+    response = getattr(client, method)(path, headers=headers)
+    assert response.status_code == 401
+    assert acquired == []
+
+
+def test_invalid_token_never_acquires(auth_client):
+    client, acquired = auth_client
+    response = client.get("/auth/me", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
+    assert acquired == []
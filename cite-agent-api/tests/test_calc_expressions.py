@@ -0,0 +1,75 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.calc.engine import CalculationEngine, Fact, PeriodType
+from src.calc.expressions import ExpressionError, compile_expression
+from src.calc.registry import KPIRegistry
+
+
+def _fact(name, value):
+    return Fact(
+        concept=name, value=value, unit="USD", period="2024-Q4", period_type=PeriodType.DURATION,
+        accession="0000000000-24-000001", fragment_id=None, url="", dimensions={}, quality_flags=[],
+    )
+
+
+def test_registry_compiles_expressions_at_load():
+    registry = KPIRegistry()
+
+    assert "grossMargin" in registry.compiled
+    assert registry.get_compiled("grossMargin") is compile_expression("(revenue - costOfRevenue) / revenue")
+    assert set(registry.compiled["roa"].inputs) == {"netIncome", "totalAssets"}
+    assert registry.compiled["netDebt"].optional_inputs == {"totalDebt", "cashAndEquivalents"}
+    # Prose placeholders are reported rather than failing the load
+    assert "cashConversionCycle" in registry.compile_errors
+
+
+@pytest.mark.parametrize(
+    "expr, values, expected",
+    [
+        ("(revenue - costOfRevenue) / revenue", {"revenue": 200.0, "costOfRevenue": 50.0}, 0.75),
+        ("a - b", {"a": 1.0, "b": -5.0}, 6.0),
+        ("-a ** 2 + 3 * 4 / 2", {"a": 2.0}, 2.0),
+        ("(totalDebt?) - (cashAndEquivalents?)", {"cashAndEquivalents": 10.0}, -10.0),
+        ("1.5e3 + x", {"x": 0.5}, 1500.5),
+    ],
+)
+def test_evaluation_matches_python_semantics(expr, values, expected):
+    assert compile_expression(expr).evaluate(values) == pytest.approx(expected)
+
+
+def test_series_evaluation_over_arrays():
+    compiled = compile_expression("(revenue - costOfRevenue) / revenue")
+    result = compiled.evaluate({"revenue": np.array([100.0, 200.0]), "costOfRevenue": np.array([40.0, 50.0])})
+    assert result.tolist() == [0.6, 0.75]
+
+
+@pytest.mark.parametrize(
+    "expr",
+    ["__import__('os')", "a.__class__", "open(a)", "a +", "(a", "a b", "avg(a + 1, 2)", ""],
+)
+def test_rejects_unsafe_or_malformed_expressions(expr):
+    with pytest.raises(ExpressionError):
+        compile_expression(expr)
+
+
+def test_missing_required_input_and_zero_division():
+    with pytest.raises(ExpressionError, match="Missing input 'b'"):
+        compile_expression("a / b").evaluate({"a": 1.0})
+    with pytest.raises(ExpressionError):
+        compile_expression("a / b").evaluate({"a": 1.0, "b": 0.0})
+
+
+def test_engine_evaluates_functions_with_raw_arguments():
+    engine = CalculationEngine.__new__(CalculationEngine)
+    seen = []
+    engine.functions = {"avg": lambda inputs, args: seen.append(args) or inputs[args[0]].value}
+    inputs = {"netIncome": _fact("netIncome", 10.0), "totalAssets": _fact("totalAssets", 200.0)}
+
+    value = asyncio.run(engine._evaluate_expression("netIncome / avg(totalAssets, 2)", inputs))
+
+    assert value == pytest.approx(0.05)
+    assert seen == [["totalAssets", "2"]]
+    assert engine._find_optional_inputs("(totalDebt?) - cash") == {"totalDebt"}
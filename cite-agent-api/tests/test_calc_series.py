@@ -0,0 +1,85 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from src.calc.engine import CalculationEngine, OutputType, _SeriesWindow
+from src.calc.registry import KPIRegistry
+from src.facts.store import FactsStore
+
+CIK = "0000000002"
+QUARTERS = [
+    ("2024-Q1", "2024-01-01", "2024-03-31"),
+    ("2024-Q2", "2024-04-01", "2024-06-30"),
+    ("2024-Q3", "2024-07-01", "2024-09-30"),
+    ("2024-Q4", "2024-10-01", "2024-12-31"),
+    ("2025-Q1", "2025-01-01", "2025-03-31"),
+    ("2025-Q2", "2025-04-01", "2025-06-30"),
+]
+
+
+def _entry(value, period, start, end):
+    return {
+        "value": value,
+        "unit": "USD",
+        "end_date": period,
+        "start_date": start,
+        "end_date_actual": end,
+        "accession": f"{CIK}-{period}",
+        "period_type": "duration",
+    }
+
+
+async def _make_engine() -> CalculationEngine:
+    store = FactsStore()
+    revenue = [_entry(100.0 + 10 * i, *q) for i, q in enumerate(QUARTERS)]
+    # The filer switched revenue tags in 2025; the series must stitch both
+    await store.store_company_facts({
+        "cik": CIK,
+        "entity_name": "Series Corp",
+        "tickers": ["SERS"],
+        "facts": {
+            "us-gaap:SalesRevenueNet": revenue[:4],
+            "us-gaap:Revenues": revenue[4:],
+            "us-gaap:CostOfGoodsAndServicesSold": [_entry(40.0, *q) for q in QUARTERS],
+        },
+    })
+    return CalculationEngine(store, KPIRegistry())
+
+
+@pytest.mark.asyncio
+async def test_series_aligns_inputs_and_evaluates_in_one_pass():
+    engine = await _make_engine()
+    result = await engine.calculate_series("SERS", "grossMargin", freq="Q", limit=4)
+
+    assert [p["period"] for p in result["series"]] == ["2025-Q2", "2025-Q1", "2024-Q4", "2024-Q3"]
+    newest = result["series"][0]
+    assert newest["inputs"] == {"revenue": 150.0, "costOfRevenue": 40.0}
+    expected = engine._format_value(110.0 / 150.0, OutputType(result["output_type"]))
+    assert newest["value"] == pytest.approx(expected)
+    assert {c["concept"] for c in newest["citations"]} == {"us-gaap:Revenues", "us-gaap:CostOfGoodsAndServicesSold"}
+
+
+@pytest.mark.asyncio
+async def test_series_ttm_only_where_four_contiguous_quarters_exist():
+    engine = await _make_engine()
+    result = await engine.calculate_series("SERS", "revenue", freq="Q", limit=10, ttm=True)
+
+    assert [p["period"] for p in result["series"]] == ["2025-Q2", "2025-Q1", "2024-Q4"]
+    assert result["series"][0]["inputs"]["revenue"] == pytest.approx(120 + 130 + 140 + 150)
+    assert "TTM" in result["series"][0]["quality_flags"]
+
+
+def test_window_shift_refuses_to_bridge_gaps():
+    ends = ["2024-03-31", "2024-06-30", "2024-12-31", "2025-03-31"]  # Q3 missing
+    ordinals = np.array([date.fromisoformat(e).toordinal() for e in ends], dtype=np.float64)
+    window = _SeriesWindow(ordinals, "Q")
+    values = np.array([1.0, 2.0, 4.0, 5.0])
+
+    qoq = window.apply("qoq", {"x": values}, ("x",))
+    assert np.isnan(qoq[0]) and qoq[1] == pytest.approx(1.0)
+    assert np.isnan(qoq[2]) and qoq[3] == pytest.approx(0.25)
+
+    yoy = window.apply("yoy", {"x": values}, ("x",))
+    assert yoy[3] == pytest.approx(4.0)
+    assert window.apply("avg", {"x": values}, ("x", "2"))[1] == pytest.approx(1.5)
@@ -0,0 +1,216 @@
+"""Tests for cached, pooled citation URL verification"""
+
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from src.services import citation_verifier
+from src.services.citation_verifier import CitationVerifier, normalize_url
+
+PAGE = b"<html><head><title>\n  Graphene &amp; friends </title></head><body>" + b"x" * 200_000 + b"</body></html>"
+
+
+@asynccontextmanager
+async def fake_publisher():
+    """HEAD-friendly, HEAD-refusing, missing and redirecting pages; records every request"""
+    hits = Counter()
+    ranges = []
+    active = {"now": 0, "max": 0}
+
+    async def paper(request: web.Request) -> web.Response:
+        hits[(request.method, request.path)] += 1
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.05)
+        active["now"] -= 1
+        return web.Response(status=200)
+
+    async def no_head(request: web.Request) -> web.Response:
+        hits[(request.method, request.path)] += 1
+        if request.method == "HEAD":
+            return web.Response(status=405)
+        ranges.append(request.headers.get("Range"))
+        return web.Response(body=PAGE, content_type="text/html")
+
+    async def gone(request: web.Request) -> web.Response:
+        hits[(request.method, request.path)] += 1
+        return web.Response(status=404)
+
+    async def moved(request: web.Request) -> web.Response:
+        hits[(request.method, request.path)] += 1
+        port = request.transport.get_extra_info("sockname")[1]
+        raise web.HTTPFound(f"http://localhost:{port}/paper/1")
+
+    app = web.Application()
+    app.router.add_route("HEAD", "/paper/{id}", paper)
+    app.router.add_route("*", "/landing", no_head)
+    app.router.add_route("*", "/gone", gone)
+    app.router.add_route("*", "/moved", moved)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}", hits, ranges, active
+    finally:
+        await runner.cleanup()
+
+
+def test_normalize_url():
+    assert normalize_url("https://DX.DOI.org/10.1000/ABC.") == "https://doi.org/10.1000/abc"
+    assert normalize_url("https://arxiv.org/pdf/2101.00001v2.pdf") == "https://arxiv.org/abs/2101.00001v2"
+    assert normalize_url("HTTPS://Example.com:443/Paper#section") == "https://example.com/Paper"
+    assert normalize_url("http://example.com:8080/a?b=1") == "http://example.com:8080/a?b=1"
+
+
+@pytest.mark.asyncio
+async def test_results_are_cached_by_normalized_url():
+    async with fake_publisher() as (base, hits, _, _):
+        verifier = CitationVerifier(allow_private=True)
+        try:
+            first = await verifier.verify_url(f"{base}/paper/1")
+            again = await verifier.verify_url(f"{base}/paper/1.")
+            fragment = await verifier.verify_url(f"{base}/paper/1#abstract")
+        finally:
+            await verifier.aclose()
+
+    assert first["status"] == "verified" and not first["cached"]
+    assert again["cached"] and fragment["cached"]
+    assert again["url"] == f"{base}/paper/1."
+    assert hits[("HEAD", "/paper/1")] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checks_share_one_request_and_respect_host_limit():
+    async with fake_publisher() as (base, hits, _, active):
+        verifier = CitationVerifier(allow_private=True)
+        verifier.per_host = 2
+        try:
+            report = await verifier.verify_all_urls([f"{base}/paper/{i % 6}" for i in range(12)])
+        finally:
+            await verifier.aclose()
+
+    assert report["verified"] == 12
+    assert sum(hits.values()) == 6
+    assert active["max"] <= 2
+
+
+@pytest.mark.asyncio
+async def test_head_refused_falls_back_to_ranged_get_for_the_title():
+    async with fake_publisher() as (base, hits, ranges, _):
+        verifier = CitationVerifier(allow_private=True)
+        try:
+            result = await verifier.verify_url(f"{base}/landing")
+            gone = await verifier.verify_url(f"{base}/gone")
+        finally:
+            await verifier.aclose()
+
+    assert result["status"] == "verified"
+    assert result["title"] == "Graphene & friends"
+    assert ranges == [f"bytes=0-{citation_verifier.TITLE_BYTES - 1}"]
+    # A 404 on HEAD is final: no GET
+    assert gone["status"] == "broken" and gone["status_code"] == 404
+    assert hits[("GET", "/gone")] == 0
+
+
+@pytest.mark.asyncio
+async def test_negative_results_expire_separately():
+    async with fake_publisher() as (base, hits, _, _):
+        verifier = CitationVerifier(allow_private=True)
+        verifier.negative_ttl = 0
+        try:
+            for _ in range(2):
+                await verifier.verify_url(f"{base}/gone")
+                await verifier.verify_url(f"{base}/paper/1")
+        finally:
+            await verifier.aclose()
+
+    assert hits[("HEAD", "/gone")] == 2
+    assert hits[("HEAD", "/paper/1")] == 1
+
+
+@pytest.mark.asyncio
+async def test_private_targets_are_blocked_on_every_hop(monkeypatch):
+    async with fake_publisher() as (base, hits, _, _):
+        verifier = CitationVerifier()
+        try:
+            direct = await verifier.verify_url(f"{base}/paper/1")
+            metadata = await verifier.verify_url("http://169.254.169.254/latest/meta-data")
+        finally:
+            await verifier.aclose()
+
+        # The first hop is let through; the redirect to localhost must be checked again
+        verifier = CitationVerifier(allow_private=True)
+        check = verifier._check_target
+
+        async def allow_only_ip(url):
+            if "localhost" in url:
+                raise citation_verifier.BlockedTarget(url)
+            await check(url)
+
+        monkeypatch.setattr(verifier, "_check_target", allow_only_ip)
+        try:
+            redirected = await verifier.verify_url(f"{base}/moved")
+        finally:
+            await verifier.aclose()
+
+    assert direct["status"] == metadata["status"] == redirected["status"] == "blocked"
+    assert hits[("HEAD", "/moved")] == 1
+    assert hits[("HEAD", "/paper/1")] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_owner_leaves_waiters_served():
+    async with fake_publisher() as (base, hits, _, _):
+        verifier = CitationVerifier(allow_private=True)
+        try:
+            owner = asyncio.create_task(verifier.verify_url(f"{base}/paper/1"))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(verifier.verify_url(f"{base}/paper/1"))
+            await asyncio.sleep(0.01)
+            owner.cancel()
+            result = await waiter
+        finally:
+            await verifier.aclose()
+
+    assert owner.cancelled()
+    assert result["status"] == "verified" and result["cached"]
+    assert hits[("HEAD", "/paper/1")] == 1
+
+
+def test_bulk_verify_requires_a_valid_key(client):
+    body = {"urls": ["https://doi.org/10.1/a"]}
+    assert client.post("/api/citations/verify", json=body, headers={"X-API-Key": "bogus"}).status_code == 401
+
+
+def test_bulk_verify_endpoint(client, monkeypatch):
+    verifier = CitationVerifier()
+    fetched = []
+
+    async def fetch(url):
+        fetched.append(url)
+        return verifier._result("broken" if "missing" in url else "verified", 200)
+
+    monkeypatch.setattr(verifier, "_fetch", fetch)
+    monkeypatch.setattr(citation_verifier, "_verifier", verifier)
+    synthesis = (
+        "Graphene is strong (https://doi.org/10.1/A). See also https://arxiv.org/pdf/2101.00001.pdf "
+        "and https://example.org/missing."
+    )
+    body = {"text": synthesis, "urls": ["https://doi.org/10.1/a", "https://example.org/refs"]}
+    headers = {"X-API-Key": "na_test_api_key_123"}
+
+    first = client.post("/api/citations/verify", json=body, headers=headers)
+    second = client.post("/api/citations/verify", json=body, headers=headers)
+
+    assert first.status_code == 200
+    report = first.json()["url_verification"]
+    assert report["total"] == 5
+    assert (report["verified"], report["broken"]) == (4, 1)
+    assert len(fetched) == 4  # the DOI link in text and list normalise to one fetch
+    assert second.json()["url_verification"]["cached"] == 5
+    assert client.post("/api/citations/verify", json={}, headers=headers).status_code == 422
@@ -0,0 +1,99 @@
+import numpy as np
+
+from src.rag import embeddings
+from src.rag.embeddings import DiskEmbeddingStore, EmbeddingCache
+
+
+class _CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, normalize_embeddings=True):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+
+def _use(monkeypatch, cache, model=None):
+    monkeypatch.setattr(embeddings, "_cache", cache)
+    monkeypatch.setattr(embeddings, "get_embedding_model", lambda: model)
+
+
+def test_embed_only_sends_misses_to_model(monkeypatch):
+    model = _CountingModel()
+    cache = EmbeddingCache(max_entries=100)
+    _use(monkeypatch, cache, model)
+
+    first = embeddings.embed(["alpha", "beta", "alpha"])
+    assert model.calls == [["alpha", "beta"]]
+    assert first[0] == first[2]
+
+    second = embeddings.embed(["beta", "gamma"])
+    assert model.calls[-1] == ["gamma"]
+    assert second[0] == first[1]
+
+    stats = cache.snapshot()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["hit_rate"] == 0.25
+
+
+def test_fallback_embeddings_are_cached_and_deterministic(monkeypatch):
+    cache = EmbeddingCache(max_entries=100)
+    _use(monkeypatch, cache)
+
+    vector = embeddings.embed("margin compression")[0]
+    assert len(vector) == embeddings._FALLBACK_DIM
+    assert embeddings.embed("margin compression")[0] == vector
+    assert cache.stats["hits"] == 1
+
+
+def test_lru_evicts_oldest_entries():
+    cache = EmbeddingCache(max_entries=2)
+    keys = [cache.key("m", t) for t in ("a", "b", "c")]
+    cache.put_many(keys, np.eye(3, dtype=np.float32))
+
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_disk_store_survives_restart(tmp_path, monkeypatch):
+    model = _CountingModel()
+    _use(monkeypatch, EmbeddingCache(max_entries=10, directory=tmp_path), model)
+    stored = embeddings.embed(["persisted text"])
+
+    reopened = EmbeddingCache(max_entries=10, directory=tmp_path)
+    reopened.open_disk_stores()
+    _use(monkeypatch, reopened, model)
+
+    assert embeddings.embed(["persisted text"]) == stored
+    assert len(model.calls) == 1
+    assert reopened.stats["disk_hits"] == 1
+
+
+def test_disk_store_ignores_torn_rows(tmp_path):
+    store = DiskEmbeddingStore(tmp_path, dim=2)
+    store.put_many(["k1", "k2"], np.array([[1, 2], [3, 4]], dtype=np.float32))
+    with open(tmp_path / "embeddings-2.f32", "r+b") as f:
+        f.truncate(12)  # second row only half written
+
+    reopened = DiskEmbeddingStore(tmp_path, dim=2)
+    assert reopened.get("k1").tolist() == [1.0, 2.0]
+    assert reopened.get("k2") is None
+
+    reopened.put_many(["k3"], np.array([[5, 6]], dtype=np.float32))
+    assert DiskEmbeddingStore(tmp_path, dim=2).get("k3").tolist() == [5.0, 6.0]
+
+
+def test_disk_store_writers_sharing_a_directory(tmp_path):
+    # Two instances stand in for two processes appending to the same files
+    first = DiskEmbeddingStore(tmp_path, dim=2)
+    second = DiskEmbeddingStore(tmp_path, dim=2)
+    first.put_many(["a"], np.array([[1, 2]], dtype=np.float32))
+    second.put_many(["b", "a"], np.array([[3, 4], [9, 9]], dtype=np.float32))
+    first.put_many(["c"], np.array([[5, 6]], dtype=np.float32))
+
+    assert (tmp_path / "embeddings-2.f32").stat().st_size == 3 * 2 * 4
+    assert second.get("a").tolist() == [1.0, 2.0]
+    assert first.get("b").tolist() == [3.0, 4.0]
+    reopened = DiskEmbeddingStore(tmp_path, dim=2)
+    assert [reopened.get(key).tolist() for key in "abc"] == [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]
@@ -0,0 +1,87 @@
+import pytest
+
+from src.facts.store import Fact, FactsStore, PeriodType
+
+CIK = "0000000001"
+CONCEPT = "us-gaap:Revenues"
+
+
+def _entry(value, period, start, end, segment=None):
+    return {
+        "value": value,
+        "unit": "USD",
+        "end_date": period,
+        "start_date": start,
+        "end_date_actual": end,
+        "accession": f"0000000001-{period}",
+        "dimensions": {"BusinessSegment": segment} if segment else {},
+        "period_type": "duration",
+    }
+
+
+async def _make_store() -> FactsStore:
+    facts_store = FactsStore()
+    await facts_store.store_company_facts({
+        "cik": CIK,
+        "entity_name": "Columnar Corp",
+        "tickers": ["COLS"],
+        "facts": {
+            CONCEPT: [
+                _entry(100.0, "2025-Q1", "2025-01-01", "2025-03-31"),
+                _entry(110.0, "2025-Q2", "2025-04-01", "2025-06-30"),
+                # Year-to-date value for the same label must lose to the 3-month fact
+                _entry(210.0, "2025-Q2", "2025-01-01", "2025-06-30"),
+                _entry(120.0, "2025-Q3", "2025-07-01", "2025-09-30"),
+                _entry(130.0, "2025-Q4", "2025-10-01", "2025-12-31"),
+                _entry(40.0, "2025-Q4", "2025-10-01", "2025-12-31", segment="Cloud"),
+                _entry(460.0, "2025-FY", "2025-01-01", "2025-12-31"),
+            ]
+        },
+    })
+    return facts_store
+
+
+@pytest.mark.asyncio
+async def test_latest_and_period_lookup_use_duration_filtered_index():
+    store = await _make_store()
+    latest = await store.get_fact("COLS", CONCEPT, period="latest", freq="Q")
+    assert latest.period == "2025-Q4"
+    assert latest.value == pytest.approx(130.0)
+    assert latest.url == f"https://www.sec.gov/Archives/edgar/data/{CIK}/0000000001-2025-Q4"
+
+    q2 = await store.get_fact("COLS", CONCEPT, period="2025-Q2", freq="Q")
+    assert q2.value == pytest.approx(110.0)
+
+    annual = await store.get_fact("COLS", CONCEPT, period="latest", freq="A")
+    assert annual.period == "2025-FY"
+    assert annual.period_type is PeriodType.DURATION
+
+
+@pytest.mark.asyncio
+async def test_segment_series_and_ttm():
+    store = await _make_store()
+    cloud = await store.get_fact("COLS", CONCEPT, freq="Q", segment="Cloud")
+    assert cloud.value == pytest.approx(40.0)
+    assert cloud.dimensions == {"BusinessSegment": "Cloud"}
+
+    series = await store.get_facts_series("COLS", CONCEPT, freq="Q", limit=3)
+    assert [fact.period for fact in series] == ["2025-Q4", "2025-Q4", "2025-Q3"]
+
+    ttm = await store.get_fact("COLS", CONCEPT, freq="Q", ttm=True, segment="Cloud")
+    assert ttm is None  # a single segment quarter cannot form a TTM window
+
+
+@pytest.mark.asyncio
+async def test_dict_views_round_trip():
+    store = await _make_store()
+    facts = store.facts_by_company[CIK][CONCEPT]
+    assert len(facts) == 7
+    assert all(isinstance(fact, Fact) for fact in facts)
+    assert len(store.facts_by_concept[CONCEPT]) == 7
+
+    store.facts_by_company[CIK] = {CONCEPT: facts[:2]}
+    assert store.get_store_stats()["total_facts"] >= 2
+    assert [f.value for f in store.facts_by_concept[CONCEPT] if f.cik == CIK] == [100.0, 110.0]
+
+    store._clear_company_facts(CIK)
+    assert CIK not in store.facts_by_company
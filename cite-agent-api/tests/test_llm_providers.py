@@ -0,0 +1,102 @@
+"""Tests for LLM provider ordering, failover and hedging"""
+
+import asyncio
+
+import pytest
+
+from src.services import llm_providers
+from src.services.analytics import AnalyticsService
+from src.services.llm_providers import LLMProviderManager, ProviderConfig
+from src.services.llm_routing import ProviderRouter
+
+
+def _manager(monkeypatch, *names):
+    monkeypatch.setattr(llm_providers, "analytics_service", AnalyticsService())
+    manager = LLMProviderManager.__new__(LLMProviderManager)
+    manager.providers = {
+        name: ProviderConfig(name=name, keys=[f"{name}-key-0000"], endpoint="", models=["m"], rate_limit_per_day=1)
+        for name in names
+    }
+    manager.usage_tracking = {}
+    manager._clients = {}
+    manager.router = ProviderRouter()
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_latency_history_reorders_providers(monkeypatch):
+    manager = _manager(monkeypatch, "cerebras", "groq", "together")
+    manager.router.record_success("cerebras", "cerebras-key-0000", 900.0)
+    manager.router.record_success("groq", "groq-key-0000", 150.0)
+    calls = []
+
+    async def call_provider(provider_name, api_key, **kwargs):
+        calls.append(provider_name)
+        if provider_name != "cerebras":
+            raise RuntimeError("boom")
+        return {"provider": provider_name, "tokens": 1, "model": "m"}
+
+    monkeypatch.setattr(manager, "call_provider", call_provider)
+
+    # together has no history yet, so it is sampled first; then the faster provider
+    result = await manager.query_with_fallback("hi")
+    assert calls == ["together", "groq", "cerebras"]
+    assert result["provider"] == "cerebras"
+
+
+@pytest.mark.asyncio
+async def test_sequential_failover(monkeypatch):
+    manager = _manager(monkeypatch, "cerebras", "groq")
+    calls = []
+
+    async def attempt(provider, key):
+        calls.append(provider)
+        if provider == "cerebras":
+            raise RuntimeError("boom")
+        return {"provider": provider}
+
+    result = await manager._run_attempts([("cerebras", "k1"), ("groq", "k2")], attempt)
+    assert result == {"provider": "groq"}
+    assert calls == ["cerebras", "groq"]
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_cancels_the_slow_provider(monkeypatch):
+    manager = _manager(monkeypatch, "cerebras", "groq")
+    monkeypatch.setattr(manager, "_hedge_delay", lambda provider: 0.02)
+    cancelled = []
+
+    async def attempt(provider, key):
+        try:
+            await asyncio.sleep(5 if provider == "cerebras" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(provider)
+            raise
+        return {"provider": provider}
+
+    result = await asyncio.wait_for(
+        manager._run_attempts([("cerebras", "k1"), ("groq", "k2")], attempt, hedge=True),
+        timeout=1,
+    )
+    assert result == {"provider": "groq"}
+    assert cancelled == ["cerebras"]
+
+
+@pytest.mark.asyncio
+async def test_all_attempts_failing_raises(monkeypatch):
+    manager = _manager(monkeypatch, "groq")
+
+    async def attempt(provider, key):
+        raise RuntimeError("down")
+
+    with pytest.raises(Exception, match="All LLM providers are unavailable"):
+        await manager._run_attempts([("groq", "k1")], attempt, hedge=True)
+
+
+@pytest.mark.asyncio
+async def test_provider_clients_are_reused_and_closed(monkeypatch):
+    manager = _manager(monkeypatch, "groq")
+    client = manager._client("groq")
+    assert manager._client("groq") is client
+    await manager.aclose()
+    assert client.is_closed
@@ -0,0 +1,190 @@
+"""Tests for health-scored LLM key routing against a local OpenAI-compatible server"""
+
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from src.services import llm_providers
+from src.services.analytics import AnalyticsService
+from src.services.llm_providers import LLMProviderManager, ProviderConfig
+from src.services.llm_routing import FAILURE_THRESHOLD, ProviderRouter, parse_duration
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@asynccontextmanager
+async def fake_openai_server(behaviour):
+    """Serve /v1/chat/completions; ``behaviour[key]`` is (delay_seconds, status) for each bearer key"""
+    hits = Counter()
+
+    async def completions(request: web.Request) -> web.Response:
+        key = request.headers["Authorization"].split(" ", 1)[1]
+        hits[key] += 1
+        delay, status = behaviour[key]
+        await asyncio.sleep(delay)
+        if status == 429:
+            return web.json_response(
+                {"error": {"message": "rate limited"}},
+                status=429,
+                headers={"retry-after": "60", "x-ratelimit-remaining-requests": "0"},
+            )
+        if status != 200:
+            return web.json_response({"error": {"message": "upstream error"}}, status=status)
+        return web.json_response(
+            {"choices": [{"message": {"content": key}}], "usage": {"total_tokens": 7}},
+            headers={"x-ratelimit-remaining-requests": "99", "x-ratelimit-remaining-tokens": "5000"},
+        )
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1/chat/completions", hits
+    finally:
+        await runner.cleanup()
+
+
+def _manager(monkeypatch, endpoint, providers):
+    monkeypatch.setattr(llm_providers, "analytics_service", AnalyticsService())
+    manager = LLMProviderManager.__new__(LLMProviderManager)
+    manager.providers = {
+        name: ProviderConfig(name=name, keys=keys, endpoint=endpoint, models=["m"], rate_limit_per_day=1)
+        for name, keys in providers.items()
+    }
+    manager.usage_tracking = {}
+    manager._clients = {}
+    manager.router = ProviderRouter()
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_key_cools_down(monkeypatch):
+    behaviour = {"groq-limited": (0, 429), "groq-healthy": (0, 200)}
+    async with fake_openai_server(behaviour) as (endpoint, hits):
+        manager = _manager(monkeypatch, endpoint, {"groq": ["groq-limited", "groq-healthy"]})
+        try:
+            for _ in range(6):
+                result = await manager.query_with_fallback("hi")
+                assert result["content"] == "groq-healthy"
+        finally:
+            await manager.aclose()
+
+    # The 429 parks the key for its Retry-After instead of being retried every call
+    assert hits["groq-limited"] == 1
+    board = {row["key"]: row for row in manager.scoreboard()["groq"]}
+    assert board["groq-l…"]["state"] == "cooling"
+    assert board["groq-l…"]["available_in_seconds"] > 50
+    assert board["groq-h…"]["remaining_requests"] == 99
+    assert board["groq-h…"]["remaining_tokens"] == 5000
+
+
+@pytest.mark.asyncio
+async def test_fastest_key_wins_once_measured(monkeypatch):
+    behaviour = {"cerebras-slow": (0.15, 200), "groq-fast": (0, 200)}
+    async with fake_openai_server(behaviour) as (endpoint, hits):
+        manager = _manager(monkeypatch, endpoint, {"cerebras": ["cerebras-slow"], "groq": ["groq-fast"]})
+        try:
+            contents = [(await manager.query_with_fallback("hi"))["content"] for _ in range(6)]
+        finally:
+            await manager.aclose()
+
+    # Each key is sampled once in priority order, then the faster one takes the traffic
+    assert contents == ["cerebras-slow", "groq-fast"] + ["groq-fast"] * 4
+    assert manager.get_next_key("cerebras") == "cerebras-slow"
+    assert [row["key"] for row in manager.scoreboard()["groq"]] == ["groq-f…"]
+
+
+@pytest.mark.asyncio
+async def test_failing_key_opens_its_circuit(monkeypatch):
+    behaviour = {"groq-broken": (0, 500), "groq-healthy": (0.01, 200)}
+    async with fake_openai_server(behaviour) as (endpoint, hits):
+        manager = _manager(monkeypatch, endpoint, {"groq": ["groq-broken", "groq-healthy"]})
+        try:
+            for _ in range(FAILURE_THRESHOLD):
+                with pytest.raises(llm_providers.ProviderHTTPError):
+                    await manager.call_provider("groq", "groq-broken", [{"role": "user", "content": "hi"}])
+            for _ in range(4):
+                assert (await manager.query_with_fallback("hi"))["content"] == "groq-healthy"
+        finally:
+            await manager.aclose()
+
+    assert hits["groq-broken"] == FAILURE_THRESHOLD
+    assert manager.router.health("groq", "groq-broken").state(manager.router.clock()) == "open"
+
+
+def test_unmeasured_keys_first_then_fastest():
+    router = ProviderRouter(clock=FakeClock())
+    router.record_success("cerebras", "k1", 900.0)
+    router.record_success("groq", "k2", 150.0)
+
+    ranked = router.rank([("cerebras", "k1"), ("groq", "k2"), ("together", "k3")])
+    assert ranked == [("together", "k3"), ("groq", "k2"), ("cerebras", "k1")]
+
+
+def test_circuit_half_opens_for_a_single_probe():
+    clock = FakeClock()
+    router = ProviderRouter(clock=clock)
+    for _ in range(FAILURE_THRESHOLD):
+        router.record_failure("groq", "k1", status_code=500)
+    router.record_success("groq", "k2", 400.0)
+
+    assert router.rank([("groq", "k1"), ("groq", "k2")]) == [("groq", "k2"), ("groq", "k1")]
+
+    clock.now += 20
+    health = router.health("groq", "k1")
+    assert health.state(clock.now) == "half_open"
+    router.begin("groq", "k1")
+    assert not health.available(clock.now)  # only one probe at a time
+
+    router.record_failure("groq", "k1", status_code=500)
+    assert health.state(clock.now) == "open"
+    assert health.open_seconds == 30.0  # backoff doubled
+
+    clock.now += 31
+    router.begin("groq", "k1")
+    router.record_success("groq", "k1", 100.0)
+    assert health.state(clock.now) == "closed"
+    assert router.rank([("groq", "k2"), ("groq", "k1")])[0] == ("groq", "k1")
+
+
+def test_errors_and_low_quota_inflate_scores():
+    router = ProviderRouter(clock=FakeClock())
+    router.record_success("groq", "k1", 100.0)
+    router.record_success("groq", "k2", 150.0)
+    router.record_failure("groq", "k1", status_code=502)
+    assert router.rank([("groq", "k1"), ("groq", "k2")])[0] == ("groq", "k2")
+
+    router.observe_headers("groq", "k2", {"x-ratelimit-remaining-requests": "1"})
+    router.record_success("groq", "k1", 100.0)
+    assert router.rank([("groq", "k1"), ("groq", "k2")])[0] == ("groq", "k1")
+
+
+def test_exhausted_quota_cools_until_reset():
+    clock = FakeClock()
+    router = ProviderRouter(clock=clock)
+    router.observe_headers("groq", "k1", {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2m0.5s"})
+    health = router.health("groq", "k1")
+    assert health.state(clock.now) == "cooling"
+    assert health.cooldown_until == pytest.approx(clock.now + 120.5)
+
+
+def test_parse_duration():
+    assert parse_duration("12") == 12.0
+    assert parse_duration("1m30s") == 90.0
+    assert parse_duration("250ms") == pytest.approx(0.25)
+    assert parse_duration("7.66s") == pytest.approx(7.66)
+    assert parse_duration("soon") is None
+    assert parse_duration(None) is None
@@ -0,0 +1,156 @@
+"""Tests for the on-disk BM25 offline paper corpus"""
+
+import asyncio
+import json
+import random
+import time
+
+import pytest
+
+from src.services import offline_corpus
+from src.services.offline_corpus import FLUSH_DOCS, MAX_SEGMENTS, OfflineCorpus
+from src.services.paper_search import PaperSearcher
+
+
+def _paper(doi, title, abstract="", source="openalex", **extra):
+    return {"id": doi, "doi": doi, "title": title, "abstract": abstract, "year": 2021,
+            "authors": [{"name": "A. Author"}], "citations_count": 1, "source": source, **extra}
+
+
+@pytest.fixture
+def papers():
+    return [
+        _paper("10.1/graphene", "Graphene transistors at terahertz frequencies", "Carrier mobility in graphene devices."),
+        _paper("10.1/perovskite", "Perovskite solar cell stability", "Degradation of perovskite absorbers."),
+        _paper("10.1/mixed", "Solar powered sensors", "Graphene electrodes appear briefly."),
+        _paper("10.1/openalex", "Protein folding kinetics",
+               {"folding": [0], "intermediates": [1], "chaperones": [2]}),
+    ]
+
+
+def test_bm25_ranks_title_and_rare_terms_first(tmp_path, papers):
+    corpus = OfflineCorpus(tmp_path, seed_path=None)
+    assert corpus.add(papers) == 4
+
+    assert [p["doi"] for p in corpus.search("graphene")] == ["10.1/graphene", "10.1/mixed"]
+    assert [p["doi"] for p in corpus.search("perovskite solar")][0] == "10.1/perovskite"
+    # OpenAlex inverted-index abstracts are searchable too
+    assert [p["doi"] for p in corpus.search("chaperones")] == ["10.1/openalex"]
+    assert corpus.search("the of and") == []
+    assert corpus.search("graphene", limit=1)[0]["source"] == "openalex"
+
+
+def test_known_papers_are_not_added_twice(tmp_path, papers):
+    corpus = OfflineCorpus(tmp_path, seed_path=None)
+    corpus.add(papers)
+
+    same_title = _paper(None, "Graphene Transistors at Terahertz Frequencies!", source="semantic_scholar")
+    same_doi = _paper("https://doi.org/10.1/PEROVSKITE", "Renamed", source="pubmed")
+    assert corpus.add([same_title, same_doi, papers[0]]) == 0
+    assert len(corpus) == 4
+
+
+def test_index_survives_reopen_and_replays_unflushed_log(tmp_path, papers):
+    corpus = OfflineCorpus(tmp_path, seed_path=None)
+    corpus.add(papers[:2])
+    corpus.flush()
+    corpus.add(papers[2:])  # still in the in-memory tail: only the log has it
+
+    with open(tmp_path / "papers.jsonl", "ab") as f:
+        f.write(b'{"title": "half a rec')  # crash mid-write
+
+    reopened = OfflineCorpus(tmp_path, seed_path=None)
+    assert len(reopened) == 4
+    assert [p["doi"] for p in reopened.search("graphene")] == ["10.1/graphene", "10.1/mixed"]
+    assert reopened.stats()["segments"] == 1 and reopened.stats()["tail_papers"] == 2
+
+    reopened.add([_paper("10.1/new", "Graphene membranes")])
+    lines = (tmp_path / "papers.jsonl").read_bytes().splitlines()
+    assert json.loads(lines[-1])["doi"] == "10.1/new"
+
+
+def test_writers_sharing_a_directory_stay_consistent(tmp_path, papers):
+    # Two instances stand in for two API workers
+    first = OfflineCorpus(tmp_path, seed_path=None)
+    second = OfflineCorpus(tmp_path, seed_path=None)
+    first.add(papers[:2])
+    assert second.add(papers[1:3]) == 1  # picks up first's papers before appending
+    first.flush()
+    second.add([papers[3]])
+    second.compact()
+
+    assert len(second) == 4
+    assert [p["doi"] for p in second.search("graphene")] == ["10.1/graphene", "10.1/mixed"]
+    first.add([_paper("10.1/new", "Graphene membranes")])
+    assert len(first) == 5 and first.stats()["segments"] == 1
+    assert [p["doi"] for p in first.search("chaperones")] == ["10.1/openalex"]
+    assert len(OfflineCorpus(tmp_path, seed_path=None)) == 5
+
+
+def test_corpus_stops_growing_at_max_papers(tmp_path, papers):
+    corpus = OfflineCorpus(tmp_path, seed_path=None, max_papers=3)
+    assert corpus.add(papers[:2]) == 2
+    assert corpus.add(papers[2:]) == 1
+    assert len(corpus) == 3
+    assert len(OfflineCorpus(tmp_path, seed_path=None, max_papers=3)) == 3
+
+
+def test_seed_file_is_imported_once(tmp_path, papers):
+    seed = tmp_path / "seed.json"
+    seed.write_text(json.dumps(papers[:1]))
+
+    corpus = OfflineCorpus(tmp_path / "corpus", seed_path=seed)
+    assert len(corpus) == 1 and corpus.stats()["segments"] == 1
+    assert len(OfflineCorpus(tmp_path / "corpus", seed_path=seed)) == 1
+
+
+def test_segments_merge_and_search_stays_fast(tmp_path):
+    rng = random.Random(7)
+    vocabulary = [f"term{i}" for i in range(3000)]
+    papers = [
+        _paper(f"10.9/{i}", " ".join(rng.sample(vocabulary, 6)), " ".join(rng.sample(vocabulary, 30)))
+        for i in range(FLUSH_DOCS * (MAX_SEGMENTS + 2))
+    ]
+    papers.append(_paper("10.9/target", "zebrafish regeneration atlas", "zebrafish fin"))
+
+    corpus = OfflineCorpus(tmp_path, seed_path=None)
+    for start in range(0, len(papers), 100):
+        corpus.add(papers[start:start + 100])
+    corpus.flush()
+    assert corpus.stats()["segments"] <= MAX_SEGMENTS
+
+    reopened = OfflineCorpus(tmp_path, seed_path=None)
+    started = time.perf_counter()
+    results = reopened.search("zebrafish regeneration", limit=5)
+    assert time.perf_counter() - started < 0.05
+    assert results[0]["doi"] == "10.9/target"
+
+    sample = papers[1234]
+    assert reopened.search(sample["title"], limit=1)[0]["doi"] == sample["doi"]
+
+
+@pytest.mark.asyncio
+async def test_search_falls_back_to_papers_seen_online(monkeypatch, papers):
+    searcher = PaperSearcher()
+
+    async def online(query, limit=10):
+        return papers
+
+    async def down(query, limit=10):
+        raise RuntimeError("503")
+
+    async def slow(query, limit=10):
+        await asyncio.sleep(5)
+        return []
+
+    monkeypatch.setattr(searcher, "search_openalex", online)
+    first = await searcher.search_papers("graphene", limit=2, sources=["openalex"])
+    offline_corpus.drain_offline_writes()
+    assert len(offline_corpus.get_offline_corpus()) == 4
+    assert "offline" not in first["sources_used"]
+
+    monkeypatch.setattr(searcher, "search_openalex", down)
+    monkeypatch.setattr(searcher, "search_pubmed", slow)
+    result = await searcher.search_papers("graphene", limit=2, sources=["openalex", "pubmed"], budget=0.05)
+    assert [p["doi"] for p in result["papers"]] == ["10.1/graphene", "10.1/mixed"]
+    assert result["sources_used"] == ["openalex", "pubmed", "offline"]
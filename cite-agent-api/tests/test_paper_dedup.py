@@ -0,0 +1,87 @@
+"""Tests for cross-source paper merging (identifier cross-walks and MinHash titles)"""
+
+import random
+import time
+
+from src.services.paper_dedup import PaperIndex, normalize_title, paper_identifiers
+
+
+def _paper(title, source, **fields):
+    return {"title": title, "source": source, "authors": [], "citations_count": 0, **fields}
+
+
+def test_punctuation_and_case_variants_merge():
+    index = PaperIndex()
+    new = index.add([
+        _paper("Attention Is All You Need", "openalex", year=2017, citations_count=90000,
+               authors=[{"name": "Ashish Vaswani"}], abstract={"The": [0]}),
+        _paper("Attention is all you need.", "semantic_scholar", year=2017, citations_count=95000,
+               authors=[{"name": "Ashish Vaswani"}, {"name": "Noam Shazeer"}],
+               abstract="The dominant sequence transduction models..."),
+    ])
+
+    assert len(new) == 1 and len(index) == 1
+    merged = new[0]
+    assert merged["citations_count"] == 95000
+    assert [a["name"] for a in merged["authors"]] == ["Ashish Vaswani", "Noam Shazeer"]
+    assert merged["abstract"].startswith("The dominant")
+    assert merged["merged_sources"] == ["openalex", "semantic_scholar"]
+
+
+def test_near_duplicate_titles_merge_but_distinct_papers_do_not():
+    index = PaperIndex()
+    index.add([_paper("Deep residual learning for image recognition", "openalex", year=2016)])
+
+    assert index.add([_paper("Deep Residual Learning for Image-Recognition", "semantic_scholar", year=2016)]) == []
+    assert len(index.add([_paper("Deep residual learning for speech recognition", "pubmed", year=2016)])) == 1
+    # Same title, years far apart: a different work (e.g. a later commentary)
+    assert len(index.add([_paper("Deep residual learning for image recognition", "pubmed", year=2021)])) == 1
+
+
+def test_identifier_crosswalks():
+    index = PaperIndex()
+    index.add([_paper("A", "openalex", doi="10.1000/XYZ", pmid="https://pubmed.ncbi.nlm.nih.gov/123")])
+
+    assert index.add([_paper("Completely different title", "semantic_scholar", doi="https://doi.org/10.1000/xyz")]) == []
+    assert index.add([_paper("Other", "pubmed", pmid="123")]) == []
+
+    index.add([_paper("Preprint", "openalex", doi="10.48550/arXiv.1706.03762")])
+    assert index.add([_paper("Other", "semantic_scholar", url="https://arxiv.org/abs/1706.03762v5")]) == []
+
+
+def test_different_publisher_dois_are_not_merged_on_title():
+    index = PaperIndex()
+    index.add([_paper("Editorial", "openalex", doi="10.1/a", year=2020)])
+    assert len(index.add([_paper("Editorial", "semantic_scholar", doi="10.1/b", year=2020)])) == 1
+    # ...but a journal version merges with its arXiv preprint
+    index.add([_paper("Scaling laws for neural language models", "openalex", doi="10.48550/arxiv.2001.08361", year=2020)])
+    assert index.add([_paper("Scaling Laws for Neural Language Models", "crossref", doi="10.5555/slnlm", year=2020)]) == []
+
+
+def test_identifier_helpers():
+    assert normalize_title("  Café: a  Study — of  Things! ") == "cafe a study of things"
+    assert paper_identifiers({"doi": "doi:10.48550/ARXIV.2001.08361"}) == ["doi:10.48550/arxiv.2001.08361", "arxiv:2001.08361"]
+
+
+def test_numbered_parts_stay_separate():
+    index = PaperIndex()
+    index.add([_paper("Galaxy rotation curves, part 1", "openalex", year=2019)])
+    assert len(index.add([_paper("Galaxy rotation curves, part 2", "openalex", year=2019)])) == 1
+
+
+def test_merging_scales_near_linearly():
+    rng = random.Random(7)
+    vocabulary = [f"{a}{b}" for a in ("neur", "prot", "clim", "quant", "graph", "cell", "lang", "gene")
+                  for b in ("al", "ein", "ate", "um", "ene", "ular", "uage", "ome", "ics", "ation")]
+    papers = [
+        _paper(" ".join(rng.sample(vocabulary, 8)), "openalex", year=2000 + i % 20, doi=None)
+        for i in range(4000)
+    ]
+    duplicates = [dict(p, title=p["title"].title() + ".", source="semantic_scholar") for p in papers]
+
+    started = time.perf_counter()
+    index = PaperIndex()
+    assert len(index.add(papers)) == 4000
+    assert index.add(duplicates) == []
+    assert time.perf_counter() - started < 5
+    assert index.merged == 4000
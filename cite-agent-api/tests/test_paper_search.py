@@ -0,0 +1,149 @@
+"""Tests for concurrent paper search with token buckets, latency budgets and streaming"""
+
+import asyncio
+import json
+
+import pytest
+
+from src.services import paper_search
+from src.services.paper_search import PaperSearcher, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _paper(doi, citations=0, source="openalex"):
+    return {"id": doi, "title": f"Paper {doi}", "doi": doi, "year": 2020, "citations_count": citations,
+            "authors": [{"name": "A. Author"}], "source": source}
+
+
+def _searcher(monkeypatch, **sources):
+    """PaperSearcher whose sources are ``(delay_seconds, papers)`` fakes"""
+    searcher = PaperSearcher()
+    calls = {"cancelled": []}
+
+    def fake(name, delay, papers):
+        async def search(query, limit=10):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                calls["cancelled"].append(name)
+                raise
+            return papers
+        return search
+
+    for name, (delay, papers) in sources.items():
+        monkeypatch.setattr(searcher, f"search_{name}", fake(name, delay, papers))
+    return searcher, calls
+
+
+async def _collect(events):
+    return [event async for event in events]
+
+
+def test_token_bucket_paces_instead_of_sleeping_blindly():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=2, clock=clock)
+
+    assert [bucket.reserve(), bucket.reserve()] == [0.0, 0.0]
+    # Further requests queue behind each other at the refill rate
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    clock.now += 10
+    assert bucket.reserve() == 0.0
+
+
+@pytest.mark.asyncio
+async def test_search_papers_merges_every_source_within_the_budget(monkeypatch):
+    searcher, calls = _searcher(
+        monkeypatch,
+        openalex=(0.0, [_paper("10.1/a", 5), _paper("10.1/b", 9)]),
+        semantic_scholar=(0.05, [_paper("10.1/a", 5, "semantic_scholar"), _paper("10.1/c", 1, "semantic_scholar")]),
+    )
+
+    # The first source alone already fills the limit; the second is still waited for
+    result = await searcher.search_papers("q", limit=2, sources=["openalex", "semantic_scholar"], budget=2)
+
+    assert [p["doi"] for p in result["papers"]] == ["10.1/b", "10.1/a"]
+    assert result["papers"][1]["merged_sources"] == ["openalex", "semantic_scholar"]
+    assert result["count"] == 3
+    assert calls["cancelled"] == []
+
+
+@pytest.mark.asyncio
+async def test_streaming_returns_once_enough_results_and_cancels_stragglers(monkeypatch):
+    searcher, calls = _searcher(
+        monkeypatch,
+        openalex=(0.0, [_paper("10.1/a", 5), _paper("10.1/b", 9)]),
+        semantic_scholar=(0.01, [_paper("10.1/a", 5, "semantic_scholar"), _paper("10.1/c", 1, "semantic_scholar")]),
+        pubmed=(5.0, [_paper("10.1/d")]),
+    )
+
+    events = await asyncio.wait_for(
+        _collect(searcher.iter_search("q", limit=3, sources=["openalex", "semantic_scholar", "pubmed"], enough=3)),
+        timeout=2,
+    )
+
+    assert [[p["doi"] for p in event["papers"]] for event in events[:-1]] == [["10.1/a", "10.1/b"], ["10.1/c"]]
+    assert events[-1]["cancelled"] == ["pubmed"]
+    assert calls["cancelled"] == ["pubmed"]
+
+
+@pytest.mark.asyncio
+async def test_latency_budget_returns_partial_results(monkeypatch):
+    searcher, calls = _searcher(
+        monkeypatch,
+        openalex=(0.0, [_paper("10.1/a")]),
+        pubmed=(5.0, [_paper("10.1/d")]),
+    )
+
+    events = [
+        event async for event in searcher.iter_search("q", limit=10, sources=["openalex", "pubmed"], budget=0.05)
+    ]
+
+    assert events[0] == {"source": "openalex", "papers": [_paper("10.1/a")]}
+    assert events[-1] == {"done": True, "sources_used": ["openalex", "pubmed"], "cancelled": ["pubmed"]}
+    assert calls["cancelled"] == ["pubmed"]
+
+
+@pytest.mark.asyncio
+async def test_searchers_share_one_session():
+    first = await PaperSearcher()._get_session()
+    searcher = PaperSearcher()
+    assert await searcher._get_session() is first
+    await searcher.close()
+    assert not first.closed
+    await paper_search.close_search_session()
+    assert first.closed
+
+
+def test_search_stream_endpoint(client, monkeypatch):
+    async def openalex(self, query, limit=10):
+        return [_paper("10.1/a", 3), _paper("10.1/b", 7)]
+
+    async def semantic_scholar(self, query, limit=10):
+        await asyncio.sleep(5)
+        return []
+
+    monkeypatch.setattr(PaperSearcher, "search_openalex", openalex)
+    monkeypatch.setattr(PaperSearcher, "search_semantic_scholar", semantic_scholar)
+
+    response = client.post(
+        "/api/search/stream",
+        json={"query": "graphene", "limit": 2, "sources": ["openalex", "semantic_scholar"]},
+        headers={"X-API-Key": "na_test_api_key_123"},
+    )
+
+    assert response.status_code == 200
+    frames = [frame.splitlines() for frame in response.text.strip().split("\n\n")]
+    events = [(lines[0][len("event: "):], json.loads(lines[1][len("data: "):])) for lines in frames]
+    assert [name for name, _ in events] == ["papers", "done"]
+    assert [paper["doi"] for paper in events[0][1]["papers"]] == ["10.1/a", "10.1/b"]
+    assert events[1][1]["count"] == 2
+    assert events[1][1]["cancelled_sources"] == ["semantic_scholar"]
@@ -0,0 +1,192 @@
+"""Tests for token streaming from providers through /api/query/stream"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from src.core.db import get_db_pool
+from src.main import app
+from src.routes import query as query_routes
+from src.services import llm_providers
+from src.services.analytics import AnalyticsService
+from src.services.llm_providers import LLMProviderManager, ProviderConfig
+from src.services.llm_routing import ProviderRouter
+
+
+@asynccontextmanager
+async def fake_streaming_server(behaviour):
+    """OpenAI-compatible SSE server; ``behaviour[key]`` is a status code or a list of tokens"""
+    async def completions(request: web.Request) -> web.StreamResponse:
+        key = request.headers["Authorization"].split(" ", 1)[1]
+        body = await request.json()
+        assert body["stream"] is True
+        tokens = behaviour[key]
+        if isinstance(tokens, int):
+            return web.json_response({"error": {"message": "nope"}}, status=tokens, headers={"retry-after": "30"})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for token in tokens:
+            chunk = {"choices": [{"delta": {"content": token}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(0.01)
+        usage = {"choices": [], "usage": {"total_tokens": 42}}
+        await response.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/v1/chat/completions"
+    finally:
+        await runner.cleanup()
+
+
+def _manager(monkeypatch, endpoint, providers):
+    monkeypatch.setattr(llm_providers, "analytics_service", AnalyticsService())
+    manager = LLMProviderManager.__new__(LLMProviderManager)
+    manager.providers = {
+        name: ProviderConfig(name=name, keys=keys, endpoint=endpoint, models=["m"], rate_limit_per_day=1)
+        for name, keys in providers.items()
+    }
+    manager.usage_tracking = {}
+    manager._clients = {}
+    manager.router = ProviderRouter()
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_stream_fails_over_before_the_first_token(monkeypatch):
+    behaviour = {"cerebras-key": 429, "groq-key": ["Hel", "lo", "!"]}
+    async with fake_streaming_server(behaviour) as endpoint:
+        manager = _manager(monkeypatch, endpoint, {"cerebras": ["cerebras-key"], "groq": ["groq-key"]})
+        try:
+            chunks = [chunk async for chunk in manager.stream_with_fallback("hi")]
+        finally:
+            await manager.aclose()
+
+    assert [c["content"] for c in chunks[:-1]] == ["Hel", "lo", "!"]
+    assert chunks[-1] == {"done": True, "tokens": 42, "model": "m", "provider": "groq"}
+    assert manager.router.health("cerebras", "cerebras-key").state(manager.router.clock()) == "cooling"
+    assert manager.router.health("groq", "groq-key").successes == 1
+
+
+@pytest.mark.asyncio
+async def test_first_token_arrives_before_generation_finishes(monkeypatch):
+    behaviour = {"groq-key": ["a"] + ["b"] * 20}
+    async with fake_streaming_server(behaviour) as endpoint:
+        manager = _manager(monkeypatch, endpoint, {"groq": ["groq-key"]})
+        try:
+            stream = manager.stream_with_fallback("hi")
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            first = await stream.__anext__()
+            first_token_at = loop.time() - started
+            rest = [chunk async for chunk in stream]
+            total = loop.time() - started
+        finally:
+            await manager.aclose()
+
+    assert first["content"] == "a"
+    assert rest[-1]["done"]
+    assert first_token_at < total / 2
+
+
+@pytest.mark.asyncio
+async def test_stream_raises_when_every_provider_fails(monkeypatch):
+    async with fake_streaming_server({"groq-key": 500}) as endpoint:
+        manager = _manager(monkeypatch, endpoint, {"groq": ["groq-key"]})
+        try:
+            with pytest.raises(Exception, match="All LLM providers are unavailable"):
+                [chunk async for chunk in manager.stream_with_fallback("hi")]
+        finally:
+            await manager.aclose()
+
+
+class _StreamingManager:
+    def __init__(self, tokens, fail_after=None):
+        self.tokens = tokens
+        self.fail_after = fail_after
+
+    async def stream_with_fallback(self, **kwargs):
+        for index, token in enumerate(self.tokens):
+            if index == self.fail_after:
+                raise RuntimeError("connection reset")
+            yield {"content": token, "model": "m", "provider": "groq"}
+        yield {"done": True, "tokens": 9, "model": "m", "provider": "groq"}
+
+
+def _parse_events(body: str):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def streaming_route(monkeypatch):
+    charged = []
+
+    async def no_limit(pool, user_id, estimated_tokens):
+        return None
+
+    async def no_history(request, provider_manager):
+        return [{"role": "user", "content": request.query}]
+
+    async def finalize(pool, user_id, query_text, response_text, tokens_used, model_used, provider_used,
+                       verify_citations=True):
+        charged.append((response_text, tokens_used, verify_citations))
+        return {"tokens_used": tokens_used, "tokens_remaining": 100, "cost": 0.0, "model": model_used,
+                "provider": provider_used, "timestamp": "t", "citation_quality": None}
+
+    monkeypatch.setattr(query_routes, "enforce_token_limit", no_limit)
+    monkeypatch.setattr(query_routes, "build_messages", no_history)
+    monkeypatch.setattr(query_routes, "finalize_query", finalize)
+    app.dependency_overrides[query_routes.get_current_user_from_token] = lambda: {"user_id": "u1", "email": None}
+    app.dependency_overrides[get_db_pool] = lambda: None
+    yield charged
+    app.dependency_overrides.pop(query_routes.get_current_user_from_token, None)
+    app.dependency_overrides.pop(get_db_pool, None)
+
+
+def test_query_stream_relays_tokens_and_charges_at_end(client, monkeypatch, streaming_route):
+    monkeypatch.setattr(query_routes, "get_provider_manager", lambda: _StreamingManager(["The ", "answer"]))
+
+    response = client.post(
+        "/api/query/stream",
+        json={"query": "what?"},
+        headers={"X-API-Key": "na_test_api_key_123", "Authorization": "Bearer x"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_events(response.text)
+    assert events[:2] == [("token", {"content": "The "}), ("token", {"content": "answer"})]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["tokens_used"] == 9
+    assert streaming_route == [("The answer", 9, True)]
+
+
+def test_query_stream_charges_partial_answers(client, monkeypatch, streaming_route):
+    monkeypatch.setattr(
+        query_routes, "get_provider_manager", lambda: _StreamingManager(["Partial ", "answer ", "lost"], fail_after=2)
+    )
+
+    response = client.post(
+        "/api/query/stream",
+        json={"query": "what?"},
+        headers={"X-API-Key": "na_test_api_key_123", "Authorization": "Bearer x"},
+    )
+
+    events = _parse_events(response.text)
+    assert [name for name, _ in events] == ["token", "token", "error"]
+    assert streaming_route == [("Partial answer ", len("Partial answer ") // 4, False)]
@@ -0,0 +1,62 @@
+import numpy as np
+
+from src.rag import index
+
+
+def _results(vectors):
+    return [
+        {"id": f"doc{i}", "snippet": f"snippet {i}", "embedding": vector}
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def test_mmr_uses_stored_embeddings_without_reembedding(monkeypatch):
+    def fail_embed(_texts):
+        raise AssertionError("stored embeddings should be reused")
+
+    monkeypatch.setattr(index, "embed", fail_embed)
+
+    # doc1 duplicates doc0; doc2 is less relevant but diverse
+    results = _results(["[1, 0, 0]", "[1, 0, 0]", "[0, 1, 0]", "[0, 0, 1]"])
+    reranked = index._mmr_rerank(results, [0.8, 0.6, 0.0], k=2, lambda_param=0.5)
+
+    assert [r["id"] for r in reranked] == ["doc0", "doc2"]
+
+
+def test_mmr_batches_missing_embeddings(monkeypatch):
+    calls = []
+
+    def fake_embed(texts):
+        calls.append(list(texts))
+        return [[0.0, 1.0] for _ in texts]
+
+    monkeypatch.setattr(index, "embed", fake_embed)
+
+    results = _results([[1.0, 0.0], None, None, [1.0, 0.0]])
+    reranked = index._mmr_rerank(results, [1.0, 0.0], k=3)
+
+    assert calls == [["snippet 1", "snippet 2"]]
+    assert len({r["id"] for r in reranked}) == 3
+
+
+def test_mmr_matches_reference_greedy_selection():
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(50, 16))
+    query = rng.normal(size=16)
+    lam = 0.7
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = query / np.linalg.norm(query)
+    expected = [0]
+    while len(expected) < 5:
+        best, best_score = None, -np.inf
+        for c in range(50):
+            if c in expected:
+                continue
+            score = lam * unit[c] @ q - (1 - lam) * max(unit[c] @ unit[s] for s in expected)
+            if score > best_score:
+                best, best_score = c, score
+        expected.append(best)
+
+    reranked = index._mmr_rerank(_results(vectors.tolist()), query.tolist(), k=5, lambda_param=lam)
+    assert [r["id"] for r in reranked] == [f"doc{i}" for i in expected]
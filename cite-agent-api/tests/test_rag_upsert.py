@@ -0,0 +1,93 @@
+from src.rag import index
+
+
+class _Result:
+    def __init__(self, rows=(), rowcount=0):
+        self._rows = list(rows)
+        self.rowcount = rowcount
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class _FakeConn:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        if "SELECT id, content_hash" in sql:
+            rows = [
+                type("Row", (), {"id": i, "content_hash": self.table[i]})
+                for i in params["ids"] if i in self.table
+            ]
+            return _Result(rows)
+        if "INSERT INTO docs_staging" in sql:
+            self.staged = list(params)
+        if "INSERT INTO docs " in sql:
+            for row in self.staged:
+                self.table[row["id"]] = row["content_hash"]
+            return _Result(rowcount=len(self.staged))
+        return _Result()
+
+
+class _FakeEngine:
+    def __init__(self):
+        self.table = {}
+
+    def connect(self):
+        return _FakeConn(self.table)
+
+    begin = connect
+
+
+def test_upsert_skips_unchanged_chunks_and_batches_embeddings(monkeypatch):
+    engine = _FakeEngine()
+    embedded = []
+
+    def fake_embed(texts):
+        embedded.append(len(texts))
+        return [[0.0] * 4 for _ in texts]
+
+    monkeypatch.setattr(index, "engine", engine)
+    monkeypatch.setattr(index, "embed", fake_embed)
+    monkeypatch.setattr(index, "_schema_ready", True)
+    monkeypatch.setattr(index, "_pgvector_reachable", False)
+    monkeypatch.setattr(index, "_pgvector_down_until", 0.0)
+
+    docs = [
+        {"id": f"T:{i}", "title": "t", "ticker": "T", "section": "MD&A", "text": f"body {i}"}
+        for i in range(5)
+    ]
+    batches = []
+    stats = index.upsert_docs_batched(docs, batch_size=2, progress=lambda s: batches.append(s.batches))
+
+    assert stats.chunks == 5 and stats.written == 5 and stats.unchanged == 0
+    assert embedded == [2, 2, 1]
+    assert batches == [1, 2, 3]
+
+    embedded.clear()
+    docs[3]["text"] = "body 3 revised"
+    stats = index.upsert_docs_batched(docs, batch_size=2)
+
+    assert stats.unchanged == 4 and stats.written == 1
+    assert embedded == [1]
+
+
+def test_write_keeps_the_last_row_of_a_repeated_id(monkeypatch):
+    engine = _FakeEngine()
+    monkeypatch.setattr(index, "_schema_ready", True)
+    rows = [
+        {"id": "T:0#c0", "content_hash": "old"},
+        {"id": "T:1#c0", "content_hash": "other"},
+        {"id": "T:0#c0", "content_hash": "new"},
+    ]
+
+    assert index.PgVectorStore(engine).write(rows, [[0.0], [1.0], [2.0]]) == 2
+    assert engine.table == {"T:0#c0": "new", "T:1#c0": "other"}
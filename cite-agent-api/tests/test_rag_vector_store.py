@@ -0,0 +1,140 @@
+import time
+
+import numpy as np
+
+from src.rag import index
+from src.rag.vector_store import LocalVectorStore
+
+
+def _rows(n, ticker="AAPL", day="2024-01-01"):
+    return [
+        {"id": f"{ticker}:{i}", "title": "t", "url": "", "date": day, "ticker": ticker,
+         "cik": "", "section": "MD&A", "text": f"chunk {i}", "content_hash": f"h{i}"}
+        for i in range(n)
+    ]
+
+
+def test_exact_search_with_filters(tmp_path):
+    store = LocalVectorStore(tmp_path)
+    store.write(_rows(2, "AAPL", "2024-01-01"), [[1, 0], [0.9, 0.1]])
+    store.write(_rows(1, "MSFT", "2025-06-01"), [[1, 0]])
+
+    hits = store.query([1, 0], limit=5)
+    assert [h["id"] for h in hits][:1] in (["AAPL:0"], ["MSFT:0"])
+    assert len(hits) == 3 and hits[0]["score"] >= hits[-1]["score"]
+
+    assert {h["id"] for h in store.query([1, 0], 5, tickers=["MSFT"])} == {"MSFT:0"}
+    assert {h["id"] for h in store.query([1, 0], 5, cutoff="2024-12-31")} == {"AAPL:0", "AAPL:1"}
+
+
+def test_reupsert_and_clear_survive_reload(tmp_path):
+    store = LocalVectorStore(tmp_path)
+    store.write(_rows(2), [[1, 0], [0, 1]])
+    updated = _rows(1)
+    updated[0]["content_hash"] = "changed"
+    store.write(updated, [[0, 1]])
+    store.write(_rows(1, "MSFT"), [[1, 1]])
+    assert store.clear("MSFT") == 1
+
+    reloaded = LocalVectorStore(tmp_path)
+    assert reloaded.stored_hashes(["AAPL:0", "AAPL:1", "MSFT:0"]) == {"AAPL:0": "changed", "AAPL:1": "h1"}
+    assert reloaded.stats()["total_documents"] == 2
+    assert reloaded.query([0, 1], 1)[0]["score"] > 0.99
+
+
+def test_torn_append_is_trimmed(tmp_path):
+    store = LocalVectorStore(tmp_path)
+    store.write(_rows(2), [[1, 0], [0, 1]])
+    with open(tmp_path / "vectors.f32", "r+b") as f:
+        f.truncate(12)
+
+    reloaded = LocalVectorStore(tmp_path)
+    assert reloaded.stored_hashes(["AAPL:0", "AAPL:1"]) == {"AAPL:0": "h0"}
+    reloaded.write(_rows(1, "MSFT"), [[0, 1]])
+    assert LocalVectorStore(tmp_path).query([0, 1], 1)[0]["id"] == "MSFT:0"
+
+
+def test_ivf_recall_against_exact_search(tmp_path):
+    rng = np.random.default_rng(3)
+    centers = rng.normal(size=(64, 32))
+    vectors = centers[rng.integers(0, 64, 20000)] + 0.3 * rng.normal(size=(20000, 32))
+    store = LocalVectorStore(tmp_path, ivf_min_rows=1000, nprobe=8)
+    store.write(_rows(20000), vectors)
+
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = rng.normal(size=(20, 32)) + centers[:20]
+    recall = []
+    start = None
+    for i, q in enumerate(queries):
+        if i == 1:
+            start = time.perf_counter()  # first query trains the index
+        hits = {h["id"] for h in store.query(q, 10)}
+        exact = np.argsort(-(unit @ (q / np.linalg.norm(q))))[:10]
+        recall.append(len(hits & {f"AAPL:{j}" for j in exact}) / 10)
+    per_query = (time.perf_counter() - start) / (len(queries) - 1)
+
+    assert store.stats()["index"]["lists"] > 1
+    assert np.mean(recall) >= 0.9
+    assert per_query < 0.05
+
+
+def test_index_module_falls_back_to_local_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(index, "engine", None)
+    monkeypatch.setattr(index, "_local_store", None)
+    monkeypatch.setenv("RAG_LOCAL_INDEX_DIR", str(tmp_path))
+
+    docs = [
+        {"id": "AAPL:Item7", "title": "MD&A", "date": "2024-02-01", "ticker": "AAPL",
+         "section": "MD&A", "text": "Gross margin compression from pricing pressure."},
+        {"id": "MSFT:Item1A", "title": "Risk Factors", "date": "2024-03-01", "ticker": "MSFT",
+         "section": "Risk Factors", "text": "Cloud competition may reduce revenue growth."},
+    ]
+    assert index.upsert_docs(docs) == 2
+    assert index.upsert_docs(docs) == 0
+
+    hits = index.search("margin compression", k=1, tickers=["AAPL"])
+    assert [h["id"] for h in hits] == ["AAPL:Item7#c0"]
+    assert "embedding" not in hits[0]
+    assert index.get_doc_stats()["total_documents"] == 2
+    assert index.clear_docs("MSFT") == 1
+
+
+def test_stores_sharing_a_directory(tmp_path):
+    # Two instances stand in for two processes appending to the same files
+    first = LocalVectorStore(tmp_path)
+    second = LocalVectorStore(tmp_path)
+    first.write(_rows(1, "AAPL"), [[1, 0]])
+    second.write(_rows(1, "MSFT"), [[0, 1]])
+    first.write(_rows(1, "NVDA"), [[1, 1]])
+    second.clear("AAPL")
+
+    assert (tmp_path / "vectors.f32").stat().st_size == 3 * 2 * 4
+    assert first.query([0, 1], 1)[0]["id"] == "MSFT:0"
+    assert second.query([1, 1], 1)[0]["id"] == "NVDA:0"
+    assert first.stored_hashes(["AAPL:0", "MSFT:0", "NVDA:0"]) == {"MSFT:0": "h0", "NVDA:0": "h0"}
+    assert LocalVectorStore(tmp_path).stats()["total_documents"] == 2
+
+
+def test_unreachable_database_falls_back_to_local_store(tmp_path, monkeypatch):
+    # create_engine never connects, so an engine exists even with no server behind it
+    class _DownEngine:
+        probes = 0
+
+        def connect(self):
+            _DownEngine.probes += 1
+            raise index.sa.exc.OperationalError("SELECT 1", {}, Exception("connection refused"))
+
+    monkeypatch.setattr(index, "engine", _DownEngine())
+    monkeypatch.setattr(index, "_pgvector_reachable", False)
+    monkeypatch.setattr(index, "_pgvector_down_until", 0.0)
+    monkeypatch.setattr(index, "_local_store", None)
+    monkeypatch.setenv("RAG_LOCAL_INDEX_DIR", str(tmp_path))
+
+    assert isinstance(index.get_vector_store(), LocalVectorStore)
+    assert isinstance(index.get_vector_store(), LocalVectorStore)
+    assert _DownEngine.probes == 1
+
+    # Once the retry interval has passed the database is probed again
+    monkeypatch.setattr(index, "_pgvector_down_until", 0.0)
+    index.get_vector_store()
+    assert _DownEngine.probes == 2
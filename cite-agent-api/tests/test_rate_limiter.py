@@ -0,0 +1,118 @@
+"""Tests for the shared bucketed sliding-window limiter"""
+
+import pytest
+
+from src.core.limiter import Limiter, LocalLimiterBackend, RateLimit
+
+T0 = 1_699_999_998.0  # aligned to whole 6s buckets
+
+
+def test_window_slides_one_bucket_at_a_time():
+    backend = LocalLimiterBackend()
+    rule = RateLimit(limit=3, window=60, buckets=10)
+
+    assert backend.hit("k", [rule], now=T0).allowed
+    assert backend.hit("k", [rule], now=T0 + 30).allowed
+    assert backend.hit("k", [rule], now=T0 + 31).allowed
+
+    denied = backend.hit("k", [rule], now=T0 + 40)
+    assert not denied.allowed
+    assert denied.remaining == 0
+    # The first request's bucket leaves the window at T0 + 60
+    assert denied.retry_after == pytest.approx(20.0)
+
+    assert backend.hit("k", [rule], now=T0 + 60).allowed
+    assert not backend.hit("k", [rule], now=T0 + 61).allowed
+
+
+def test_rejected_hit_is_not_counted_in_any_window():
+    backend = LocalLimiterBackend()
+    hourly = RateLimit(limit=100, window=3600)
+    burst = RateLimit(limit=2, window=60)
+
+    backend.hit("k", [hourly, burst], now=T0)
+    backend.hit("k", [hourly, burst], now=T0 + 1)
+    result = backend.hit("k", [hourly, burst], now=T0 + 2)
+
+    assert not result.allowed
+    assert result.limit == 2
+    assert backend.peek("k", [hourly], now=T0 + 2).used == 2
+
+
+def test_memory_per_key_is_bounded_by_bucket_count():
+    backend = LocalLimiterBackend()
+    rule = RateLimit(limit=10_000, window=60, buckets=10)
+
+    for i in range(5_000):
+        backend.hit("k", [rule], now=T0 + i * 0.1)
+
+    window = next(iter(backend._windows.values()))
+    assert len(window.counts) <= rule.buckets + 1
+
+
+def test_idle_keys_are_swept_and_lru_capped():
+    backend = LocalLimiterBackend(sweep_interval=30, max_keys=3)
+    rule = RateLimit(limit=5, window=60)
+
+    for name in "abcd":
+        backend.hit(name, [rule], now=T0)
+    assert backend.stats()["keys"] == 3
+    assert backend.stats()["evicted_lru"] == 1
+
+    # Next hit after the window has passed sweeps the idle keys first
+    backend.hit("e", [rule], now=T0 + 120)
+    stats = backend.stats()
+    assert stats["keys"] == 1
+    assert stats["evicted_idle"] == 3
+
+
+class _BrokenRedis:
+    def register_script(self, script):
+        async def run(keys, args):
+            raise ConnectionError("redis down")
+        return run
+
+
+@pytest.mark.asyncio
+async def test_limiter_falls_back_to_local_when_redis_fails():
+    from src.core.limiter import RedisLimiterBackend
+
+    limiter = Limiter(RedisLimiterBackend(_BrokenRedis()), local=LocalLimiterBackend())
+    rule = RateLimit(limit=1, window=60)
+
+    assert (await limiter.hit("k", [rule])).allowed
+    assert limiter.backend == "memory"
+    assert not (await limiter.hit("k", [rule])).allowed
+
+
+class _ScriptedRedis:
+    """Replays a canned Lua reply to exercise reply decoding"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def register_script(self, script):
+        async def run(keys, args):
+            self.calls.append((keys, args))
+            return self.reply
+        return run
+
+
+@pytest.mark.asyncio
+async def test_redis_reply_is_decoded_per_window():
+    from src.core.limiter import RedisLimiterBackend
+
+    rule = RateLimit(limit=3, window=60, buckets=10)
+    current = rule.bucket(T0)
+    client = _ScriptedRedis([1, [current, current - 2, 1, current, 1]])
+    backend = RedisLimiterBackend(client)
+
+    result = await backend.hit("k", [rule], now=T0)
+
+    assert result.allowed
+    assert result.used == 3
+    assert result.remaining == 0
+    keys, args = client.calls[0]
+    assert keys == ["ratelimit:k|60"]
+    assert args[2:] == [3, repr(6.0), 10]
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from src.utils import resiliency
+from src.utils.resiliency import cache, set_metrics_recorder
+
+
+class _Recorder:
+    def __init__(self):
+        self.counts = {}
+
+    def increment(self, name, value=1, tags=None):
+        key = (name, (tags or {}).get("tier"))
+        self.counts[key] = self.counts.get(key, 0) + value
+
+    def observe(self, name, value, tags=None):
+        pass
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    monkeypatch.setattr(resiliency, "async_redis_client", None)
+    rec = _Recorder()
+    set_metrics_recorder(rec)
+    yield rec
+    set_metrics_recorder(None)
+
+
+class _Source:
+    calls = 0
+
+    @cache(ttl=60, source_version="test")
+    async def lookup(self, ticker: str, *, freq: str = "Q"):
+        type(self).calls += 1
+        await asyncio.sleep(0.01)
+        return {"ticker": ticker, "freq": freq}
+
+
+@pytest.mark.asyncio
+async def test_async_cache_coalesces_and_serves_from_l1(recorder):
+    _Source.lookup.cache_clear()
+    _Source.calls = 0
+
+    results = await asyncio.gather(*(_Source().lookup("AAPL") for _ in range(10)))
+    assert all(result == {"ticker": "AAPL", "freq": "Q"} for result in results)
+    assert _Source.calls == 1
+
+    # Different instance, same arguments: self is not part of the key
+    assert await _Source().lookup("AAPL") == {"ticker": "AAPL", "freq": "Q"}
+    assert _Source.calls == 1
+    assert recorder.counts[("resiliency.cache.hit", "l1")] == 1
+    assert recorder.counts[("resiliency.cache.coalesced", None)] == 9
+
+    await _Source().lookup("AAPL", freq="A")
+    assert _Source.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_async_cache_skips_empty_and_serves_stale(recorder):
+    calls = []
+
+    @cache(ttl=0, source_version="test", stale_ttl=60)
+    async def fetch(key):
+        calls.append(key)
+        return {"n": len(calls)} if key != "missing" else None
+
+    assert await fetch("missing") is None
+    assert await fetch("missing") is None
+    assert calls == ["missing", "missing"]
+
+    assert await fetch("k") == {"n": 3}
+    # Expired but inside the stale window: old value now, refresh in background
+    assert await fetch("k") == {"n": 3}
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert await fetch("k") == {"n": 4}
+    assert recorder.counts[("resiliency.cache.stale", None)] >= 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_owner_leaves_waiters_served(recorder):
+    calls = []
+
+    @cache(ttl=60, source_version="test")
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return {"key": key}
+
+    owner = asyncio.create_task(fetch("k"))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(fetch("k"))
+    await asyncio.sleep(0.01)
+    owner.cancel()
+
+    assert await waiter == {"key": "k"}
+    assert owner.cancelled()
+    assert calls == ["k"]
+    # The load finished in the background and filled the cache
+    assert await fetch("k") == {"key": "k"} and calls == ["k"]
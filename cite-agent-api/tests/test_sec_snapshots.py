@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from src.adapters.sec_snapshots import CompanyFactsSnapshotStore
+
+CIK = "0000320193"
+PAYLOAD = {"cik": 320193, "entityName": "Apple Inc.", "facts": {"us-gaap": {}}}
+
+
+async def _start_stand_in():
+    """Minimal data.sec.gov stand-in that honours If-None-Match"""
+    calls = []
+
+    async def companyfacts(request: web.Request) -> web.Response:
+        calls.append(request.headers.get("If-None-Match"))
+        await asyncio.sleep(0.05)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.json_response(PAYLOAD, headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/api/xbrl/companyfacts/CIK{cik}.json", companyfacts)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/xbrl/companyfacts/CIK{CIK}.json", calls
+
+
+@pytest.mark.asyncio
+async def test_single_flight_and_fresh_snapshot(tmp_path):
+    runner, url, calls = await _start_stand_in()
+    store = CompanyFactsSnapshotStore(tmp_path, max_age=3600)
+    try:
+        async with aiohttp.ClientSession() as session:
+            results = await asyncio.gather(*(store.get(CIK, session, url) for _ in range(5)))
+            assert all(result == PAYLOAD for result in results)
+            assert len(calls) == 1
+
+            # A second store over the same directory is served from disk
+            cold = CompanyFactsSnapshotStore(tmp_path, max_age=3600)
+            assert await cold.get(CIK, session, url) == PAYLOAD
+            assert len(calls) == 1
+            assert cold.stats["disk_hits"] == 1
+            assert (tmp_path / f"CIK{CIK}.json.gz").exists()
+    finally:
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_expired_snapshot_revalidates_with_etag(tmp_path):
+    runner, url, calls = await _start_stand_in()
+    store = CompanyFactsSnapshotStore(tmp_path, max_age=0)
+    try:
+        async with aiohttp.ClientSession() as session:
+            assert await store.get(CIK, session, url) == PAYLOAD
+            assert await store.get(CIK, session, url) == PAYLOAD
+    finally:
+        await runner.cleanup()
+
+    assert calls == [None, '"v1"']
+    assert store.stats == {**store.stats, "fetched": 1, "revalidated": 1}
+    meta = json.loads((tmp_path / f"CIK{CIK}.meta.json").read_text())
+    assert meta["etag"] == '"v1"'
+
+
+@pytest.mark.asyncio
+async def test_unreachable_or_slow_sec_serves_stale_snapshot(tmp_path):
+    runner, url, calls = await _start_stand_in()
+    store = CompanyFactsSnapshotStore(tmp_path, max_age=0)
+    try:
+        async with aiohttp.ClientSession() as session:
+            assert await store.get(CIK, session, url) == PAYLOAD
+        # The stand-in answers after 50 ms: too slow for this session
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0.01)) as session:
+            assert await store.get(CIK, session, url) == PAYLOAD
+    finally:
+        await runner.cleanup()
+
+    async with aiohttp.ClientSession() as session:
+        assert await store.get(CIK, session, url) == PAYLOAD
+        # Nothing on disk for another company: no data rather than an exception
+        assert await store.get("0000789019", session, url.replace(CIK, "0000789019")) is None
+    assert store.stats["stale_served"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_owner_leaves_waiters_served(tmp_path):
+    runner, url, calls = await _start_stand_in()
+    store = CompanyFactsSnapshotStore(tmp_path, max_age=3600)
+    try:
+        async with aiohttp.ClientSession() as session:
+            owner = asyncio.ensure_future(store.get(CIK, session, url))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.ensure_future(store.get(CIK, session, url))
+            await asyncio.sleep(0.01)
+            owner.cancel()
+
+            assert await waiter == PAYLOAD
+            assert owner.cancelled()
+            assert len(calls) == 1
+            assert not store._inflight
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,90 @@
+"""Tests for the batched telemetry writer and its rollups"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+from src.services.telemetry_ingestor import INDEX_STRIDE, TelemetryIngestor
+
+TOKEN_A = "a" * 64
+TOKEN_B = "b" * 64
+
+
+def _ingest(ingestor, count, token, event="cli_start", session_every=1):
+    for idx in range(count):
+        ingestor.persist(
+            {"event": event, "session": f"{token[:1]}-{idx // session_every}", "seq": idx},
+            token_hash=token,
+        )
+
+
+def test_summary_comes_from_rollups(tmp_path):
+    ingestor = TelemetryIngestor(tmp_path)
+    try:
+        _ingest(ingestor, 600, TOKEN_A, session_every=3)
+        _ingest(ingestor, 5, TOKEN_B, event="query")
+
+        summary = ingestor.summarize(token_hash=TOKEN_A, days=7)
+        assert summary["total_events"] == 600
+        assert summary["by_event"] == {"cli_start": 600}
+        assert abs(summary["unique_sessions"] - 200) <= 10
+
+        overall = ingestor.summarize(days=1)
+        assert overall["total_events"] == 605
+        assert overall["by_event"]["query"] == 5
+
+        series = ingestor.summarize_by_day(token_hash=TOKEN_B, days=3)
+        assert [entry["total_events"] for entry in series] == [0, 0, 5]
+        assert series[-1]["unique_sessions"] == 5
+    finally:
+        ingestor.close()
+
+
+def test_events_are_read_newest_first_across_index_segments(tmp_path):
+    ingestor = TelemetryIngestor(tmp_path)
+    try:
+        _ingest(ingestor, INDEX_STRIDE * 2 + 10, TOKEN_A)
+        _ingest(ingestor, 3, TOKEN_B)
+
+        events = ingestor.iter_events(token_hash=TOKEN_A, limit=INDEX_STRIDE + 5)
+        seqs = [event["seq"] for event in events]
+        assert len(seqs) == INDEX_STRIDE + 5
+        assert set(seqs) == set(range(INDEX_STRIDE * 2 + 10 - len(seqs), INDEX_STRIDE * 2 + 10))
+    finally:
+        ingestor.close()
+
+
+def test_restart_catches_up_from_checkpoint(tmp_path):
+    ingestor = TelemetryIngestor(tmp_path)
+    _ingest(ingestor, 20, TOKEN_A)
+    ingestor.close()
+
+    day = datetime.now(timezone.utc).date().isoformat()
+    sidecar = json.loads((tmp_path / f"{day}.rollup.json").read_text())
+    assert sidecar["records"] == 20
+
+    # Lines appended after the checkpoint (e.g. before a crash) are replayed on load
+    with (tmp_path / f"{day}.jsonl").open("a", encoding="utf-8") as handle:
+        handle.write(json.dumps({"event": "late", "token_hash": TOKEN_A[:32]}) + "\n")
+        handle.write('{"event": "torn"')
+
+    reloaded = TelemetryIngestor(tmp_path)
+    try:
+        summary = reloaded.summarize(token_hash=TOKEN_A, days=1)
+        assert summary["total_events"] == 21
+        assert summary["by_event"]["late"] == 1
+    finally:
+        reloaded.close()
+
+
+def test_retention_drops_old_files_and_rollups(tmp_path):
+    old_day = (datetime.now(timezone.utc).date() - timedelta(days=40)).isoformat()
+    (tmp_path / f"{old_day}.jsonl").write_text('{"event": "old"}\n', encoding="utf-8")
+    (tmp_path / f"{old_day}.rollup.json").write_text("{}", encoding="utf-8")
+
+    ingestor = TelemetryIngestor(tmp_path, retention_days=30)
+    try:
+        assert not (tmp_path / f"{old_day}.jsonl").exists()
+        assert not (tmp_path / f"{old_day}.rollup.json").exists()
+        assert ingestor.summarize(days=30)["total_events"] == 0
+    finally:
+        ingestor.close()
@@ -5,8 +5,6 @@ A Groq-powered research and finance co-pilot with deterministic tooling and
 prior stacks preserved only in Git history, kept out of the runtime footprint.
 """
 
-from .enhanced_ai_agent import EnhancedNocturnalAgent, ChatRequest, ChatResponse
-
 __version__ = "1.4.0"
 __author__ = "Cite Agent Team"
 __email__ = "contact@citeagent.dev"
@@ -17,6 +15,14 @@ __all__ = [
     "ChatResponse"
 ]
 
+def __getattr__(name):
+    # The agent (and its logging setup) loads on first use, so importing a
+    # standalone submodule such as cite_agent.file_search has no side effects
+    if name in __all__:
+        from . import enhanced_ai_agent
+        return getattr(enhanced_ai_agent, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # Package metadata
 PACKAGE_NAME = "cite-agent"
 PACKAGE_VERSION = __version__
@@ -432,6 +432,7 @@ class NocturnalCLI:
                 try:
                     from rich.spinner import Spinner
                     from rich.live import Live
+                    from rich.markup import escape
 
                     # Show detailed progress indicator
                     spinner = Spinner("dots", text="[dim]Processing query...[/dim]")
@@ -457,8 +458,16 @@ class NocturnalCLI:
                         else:
                             spinner.update(text="[cyan]🤖 Thinking...[/cyan]")
 
+                        def show_shell_output(stream: str, text: str) -> None:
+                            # Latest line of a running command, so long scripts show progress
+                            lines = text.strip().splitlines()
+                            if lines:
+                                spinner.update(text=f"[cyan]⚙️  {escape(lines[-1][:80])}[/cyan]")
+
+                        self.agent.shell_output_callback = show_shell_output
                         response = await self.agent.process_request(request)
                     finally:
+                        self.agent.shell_output_callback = None
                         live.stop()
 
                     # Print response immediately (no artificial typing delay)
@@ -586,21 +595,22 @@ class NocturnalCLI:
 
     def list_library(self, tag: Optional[str] = None):
         """List papers in local library"""
-        papers = self.workflow.list_papers(tag=tag)
+        total = self.workflow.count_papers(tag=tag)
+        papers = self.workflow.list_papers(tag=tag, limit=20)
         
         if not papers:
             self.console.print("[warning]No papers in library yet.[/warning]")
             self.console.print("[dim]Use --save-paper after a search to add papers.[/dim]")
             return
         
-        table = Table(title=f"📚 Library ({len(papers)} papers)", box=box.ROUNDED)
+        table = Table(title=f"📚 Library ({total} papers)", box=box.ROUNDED)
         table.add_column("ID", style="cyan")
         table.add_column("Title", style="bold")
         table.add_column("Authors", style="dim")
         table.add_column("Year", justify="right")
         table.add_column("Tags", style="yellow")
         
-        for paper in papers[:20]:  # Show first 20
+        for paper in papers:  # Newest 20
             authors_str = paper.authors[0] if paper.authors else "Unknown"
             if len(paper.authors) > 1:
                 authors_str += " et al."
@@ -617,8 +627,8 @@ class NocturnalCLI:
         
         self.console.print(table)
         
-        if len(papers) > 20:
-            self.console.print(f"[dim]... and {len(papers) - 20} more papers[/dim]")
+        if total > 20:
+            self.console.print(f"[dim]... and {total - 20} more papers[/dim]")
 
     def export_library_bibtex(self):
         """Export library to BibTeX"""
@@ -641,7 +651,7 @@ class NocturnalCLI:
 
     def show_history(self, limit: int = 10):
         """Show recent query history"""
-        history = self.workflow.get_history()[:limit]
+        history = self.workflow.get_history(limit=limit)
         
         if not history:
             self.console.print("[warning]No query history yet.[/warning]")
@@ -5,11 +5,27 @@ from __future__ import annotations
 
 import json
 import hashlib
+import logging
 import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Set
+
+try:  # POSIX only; elsewhere appends rely on O_APPEND alone
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TAIL_BLOCK = 8192
+_SEARCH_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
 
 
 @dataclass
@@ -44,14 +60,104 @@ class ArchiveEntry:
         )
 
 
+def _parse_line(line: bytes) -> Optional[ArchiveEntry]:
+    # A torn final line (crash mid-append) or foreign data is skipped, not fatal
+    try:
+        payload = json.loads(line)
+    except ValueError:
+        return None
+    return ArchiveEntry.from_dict(payload) if isinstance(payload, dict) else None
+
+
+def _iter_lines_reversed(path: Path) -> Iterator[bytes]:
+    """Lines of ``path`` from last to first, reading backwards in ``TAIL_BLOCK`` chunks"""
+    with open(path, "rb") as handle:
+        handle.seek(0, os.SEEK_END)
+        position = handle.tell()
+        remainder = b""
+        while position > 0:
+            step = min(TAIL_BLOCK, position)
+            position -= step
+            handle.seek(position)
+            block = handle.read(step) + remainder
+            lines = block.split(b"\n")
+            # The first piece may continue in the previous block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
+
+
+class _SummaryIndex:
+    """SQLite FTS5 index over archived questions and summaries, across conversations"""
+
+    def __init__(self, path: Path) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS summaries USING fts5("
+            "question, summary, user_hash UNINDEXED, conversation UNINDEXED, timestamp UNINDEXED, "
+            "tokenize='porter unicode61')"
+        )
+        self._conn.commit()
+
+    def add(self, user_hash: str, conversation: str, entry: ArchiveEntry) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO summaries (question, summary, user_hash, conversation, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (entry.question, entry.summary, user_hash, conversation, entry.timestamp),
+            )
+            self._conn.commit()
+
+    def remove_conversation(self, conversation: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM summaries WHERE conversation = ?", (conversation,))
+            self._conn.commit()
+
+    def search(self, user_hash: str, query: str, limit: int, exclude: Optional[str] = None) -> List[ArchiveEntry]:
+        tokens = _SEARCH_TOKEN_RE.findall(query.lower())
+        if not tokens:
+            return []
+        # Quoted terms OR'ed together: user text never reaches the FTS query syntax
+        match = " OR ".join(f'"{token}"' for token in dict.fromkeys(tokens))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question, summary, timestamp FROM summaries "
+                "WHERE summaries MATCH ? AND user_hash = ? AND conversation != ? "
+                "ORDER BY bm25(summaries) LIMIT ?",
+                (match, user_hash, exclude or "", limit),
+            ).fetchall()
+        return [
+            ArchiveEntry(timestamp=timestamp, question=question, summary=summary, tools_used=[])
+            for question, summary, timestamp in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
 class ConversationArchive:
-    """Stores compact conversation summaries for long-running research threads."""
+    """Stores compact conversation summaries for long-running research threads.
+
+    Each conversation is an append-only JSON Lines log: a turn is one
+    ``O_APPEND`` write under an advisory lock, and ``get_recent_context`` reads
+    only the tail of the file. Once a log holds twice ``max_entries`` lines it
+    is compacted back to ``max_entries`` on a background thread (written aside
+    and swapped in with ``os.replace``). With ``search_index`` (or
+    ``CITE_AGENT_ARCHIVE_SEARCH=1``) summaries are also indexed with SQLite
+    FTS5 so ``search`` can recall related turns from other conversations.
+    """
 
     def __init__(
         self,
         root: Optional[Path] = None,
         enabled: Optional[bool] = None,
         max_entries: int = 30,
+        search_index: Optional[bool] = None,
     ) -> None:
         self.enabled = True if enabled is None else bool(enabled)
         self.max_entries = max(1, max_entries)
@@ -61,6 +167,28 @@ class ConversationArchive:
         if self.enabled:
             self.root.mkdir(parents=True, exist_ok=True)
 
+        self._line_counts: Dict[Path, int] = {}
+        self._counts_lock = threading.Lock()
+        self._compactor: Optional[ThreadPoolExecutor] = None
+        self._compacting: Set[Path] = set()
+
+        if search_index is None:
+            search_index = os.getenv("CITE_AGENT_ARCHIVE_SEARCH", "").lower() in {"1", "true", "yes"}
+        self.index: Optional[_SummaryIndex] = None
+        self._index_path = self.root / "summaries.sqlite3" if self.enabled and search_index else None
+        self._summary_index()
+
+    def _summary_index(self) -> Optional[_SummaryIndex]:
+        """The full-text index, reopened after ``close``; None when disabled or unavailable"""
+        if self.index is None and self._index_path is not None:
+            try:
+                self.index = _SummaryIndex(self._index_path)
+            except sqlite3.Error as exc:
+                # Python builds without FTS5 simply go without recall
+                logger.debug(f"Archive full-text index unavailable: {exc}")
+                self._index_path = None
+        return self.index
+
     @staticmethod
     def _hash_identifier(identifier: str) -> str:
         digest = hashlib.sha256(identifier.encode("utf-8")).hexdigest()
@@ -69,7 +197,55 @@ class ConversationArchive:
     def _conversation_path(self, user_id: str, conversation_id: str) -> Path:
         user_hash = self._hash_identifier(user_id or "anonymous")
         convo_hash = self._hash_identifier(conversation_id or "default")
-        return self.root / f"{user_hash}-{convo_hash}.json"
+        return self.root / f"{user_hash}-{convo_hash}.jsonl"
+
+    @contextmanager
+    def _locked(self, path: Path) -> Iterator[None]:
+        """Exclusive advisory lock on a sidecar file, shared with other CLI sessions.
+
+        Locking a sidecar rather than the log itself keeps appenders from
+        writing to a log that compaction has just replaced.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(path.with_suffix(".lock"), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _migrate_legacy(self, path: Path) -> None:
+        """Convert a pre-log ``<conversation>.json`` array into the JSON Lines log"""
+        legacy = path.with_suffix(".json")
+        if not legacy.exists():
+            return
+        try:
+            data = json.loads(legacy.read_text(encoding="utf-8"))
+            entries = [ArchiveEntry.from_dict(item) for item in data if isinstance(item, dict)]
+        except Exception:
+            entries = []
+        existing = path.read_bytes() if path.exists() else b""
+        migrated = "".join(json.dumps(item.to_dict(), ensure_ascii=False) + "\n" for item in entries)
+        self._replace(path, migrated.encode("utf-8") + existing)
+        legacy.unlink()
+
+    @staticmethod
+    def _replace(path: Path, data: bytes) -> None:
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+
+    def _count_lines(self, path: Path) -> int:
+        count = 0
+        with open(path, "rb") as handle:
+            for block in iter(lambda: handle.read(1 << 16), b""):
+                count += block.count(b"\n")
+        return count
 
     def record_entry(
         self,
@@ -90,21 +266,98 @@ class ConversationArchive:
             tools_used=list(tools_used or []),
             citations=list(citations or []) or None,
         )
+        line = (json.dumps(entry.to_dict(), ensure_ascii=False) + "\n").encode("utf-8")
 
         path = self._conversation_path(user_id, conversation_id)
-        entries: List[ArchiveEntry] = []
-        if path.exists():
+        with self._locked(path):
+            self._migrate_legacy(path)
+            fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
             try:
-                data = json.loads(path.read_text(encoding="utf-8"))
-                entries = [ArchiveEntry.from_dict(item) for item in data]
-            except Exception:
-                entries = []
+                # Terminate a torn last line so this entry starts on its own line
+                end = os.lseek(fd, 0, os.SEEK_END)
+                if end:
+                    os.lseek(fd, end - 1, os.SEEK_SET)
+                    if os.read(fd, 1) != b"\n":
+                        line = b"\n" + line
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            with self._counts_lock:
+                lines = self._line_counts.get(path)
+                lines = self._count_lines(path) if lines is None else lines + 1
+                self._line_counts[path] = lines
+
+        if lines > 2 * self.max_entries:
+            self._schedule_compaction(path)
 
-        entries.append(entry)
-        entries = entries[-self.max_entries:]
+        index = self._summary_index()
+        if index is not None:
+            try:
+                index.add(self._hash_identifier(user_id or "anonymous"), path.stem, entry)
+            except sqlite3.Error as exc:
+                logger.debug(f"Archive index write failed: {exc}")
 
-        serialized = [item.to_dict() for item in entries]
-        path.write_text(json.dumps(serialized, indent=2), encoding="utf-8")
+    def _schedule_compaction(self, path: Path) -> None:
+        with self._counts_lock:
+            if path in self._compacting:
+                return
+            self._compacting.add(path)
+            if self._compactor is None:
+                self._compactor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive-compact")
+            self._compactor.submit(self._compact_path, path)
+
+    def _compact_path(self, path: Path) -> None:
+        try:
+            with self._locked(path):
+                if not path.exists():
+                    return
+                kept: List[bytes] = []
+                for line in _iter_lines_reversed(path):
+                    if _parse_line(line) is not None:
+                        kept.append(line)
+                        if len(kept) >= self.max_entries:
+                            break
+                self._replace(path, b"".join(line + b"\n" for line in reversed(kept)))
+                with self._counts_lock:
+                    self._line_counts[path] = len(kept)
+        except OSError as exc:
+            logger.debug(f"Archive compaction of {path.name} failed: {exc}")
+        finally:
+            with self._counts_lock:
+                self._compacting.discard(path)
+
+    def compact(self, user_id: str, conversation_id: str) -> None:
+        """Trim a conversation's log to its last ``max_entries`` turns now"""
+        if not self.enabled:
+            return
+        path = self._conversation_path(user_id, conversation_id)
+        self._compact_path(path)
+
+    def load_entries(self, user_id: str, conversation_id: str, limit: Optional[int] = None) -> List[ArchiveEntry]:
+        """The most recent ``limit`` (default ``max_entries``) turns, oldest first"""
+        if not self.enabled:
+            return []
+        limit = max(1, limit or self.max_entries)
+        path = self._conversation_path(user_id, conversation_id)
+        if not path.exists():
+            legacy = path.with_suffix(".json")
+            if not legacy.exists():
+                return []
+            with self._locked(path):
+                self._migrate_legacy(path)
+
+        entries: List[ArchiveEntry] = []
+        try:
+            for line in _iter_lines_reversed(path):
+                entry = _parse_line(line)
+                if entry is not None:
+                    entries.append(entry)
+                    if len(entries) >= limit:
+                        break
+        except OSError:
+            return []
+        entries.reverse()
+        return entries
 
     def get_recent_context(
         self,
@@ -115,38 +368,79 @@ class ConversationArchive:
         if not self.enabled:
             return ""
 
-        path = self._conversation_path(user_id, conversation_id)
-        if not path.exists():
+        entries = self.load_entries(user_id, conversation_id, limit=max(1, limit))
+        if not entries:
             return ""
 
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-        except Exception:
-            return ""
+        lines = ["Archived context from previous sessions:"]
+        for item in entries:
+            lines.append(f"• {item.timestamp[:19]} — {self._snippet(item.summary)}")
+        return "\n".join(lines)
 
-        if not isinstance(data, list):
-            return ""
+    @staticmethod
+    def _snippet(summary: str) -> str:
+        snippet = summary.strip().replace("\n", " ")
+        if len(snippet) > 220:
+            snippet = snippet[:217].rstrip() + "..."
+        return snippet
 
-        entries = [ArchiveEntry.from_dict(item) for item in data][-max(1, limit):]
+    def search(
+        self,
+        user_id: str,
+        query: str,
+        limit: int = 5,
+        exclude_conversation: Optional[str] = None,
+    ) -> List[ArchiveEntry]:
+        """Best-matching archived turns of ``user_id`` across conversations (needs ``search_index``)"""
+        index = self._summary_index() if self.enabled else None
+        if index is None:
+            return []
+        exclude = None
+        if exclude_conversation is not None:
+            exclude = self._conversation_path(user_id, exclude_conversation).stem
+        try:
+            return index.search(self._hash_identifier(user_id or "anonymous"), query, limit, exclude)
+        except sqlite3.Error as exc:
+            logger.debug(f"Archive search failed: {exc}")
+            return []
+
+    def get_related_context(self, user_id: str, conversation_id: str, query: str, limit: int = 2) -> str:
+        entries = self.search(user_id, query, limit=limit, exclude_conversation=conversation_id)
         if not entries:
             return ""
-
-        lines = ["Archived context from previous sessions:"]
+        lines = ["Related context from other conversations:"]
         for item in entries:
-            snippet = item.summary.strip().replace("\n", " ")
-            if len(snippet) > 220:
-                snippet = snippet[:217].rstrip() + "..."
-            lines.append(f"• {item.timestamp[:19]} — {snippet}")
+            lines.append(f"• {item.timestamp[:19]} — {self._snippet(item.summary)}")
         return "\n".join(lines)
 
     def clear_conversation(self, user_id: str, conversation_id: str) -> None:
         if not self.enabled:
             return
         path = self._conversation_path(user_id, conversation_id)
-        if path.exists():
-            path.unlink()
+        with self._locked(path):
+            for candidate in (path, path.with_suffix(".json")):
+                if candidate.exists():
+                    candidate.unlink()
+            with self._counts_lock:
+                self._line_counts.pop(path, None)
+        path.with_suffix(".lock").unlink(missing_ok=True)
+        index = self._summary_index()
+        if index is not None:
+            try:
+                index.remove_conversation(path.stem)
+            except sqlite3.Error as exc:
+                logger.debug(f"Archive index delete failed: {exc}")
 
     def list_conversations(self) -> List[str]:
         if not self.enabled or not self.root.exists():
             return []
-        return [p.name for p in self.root.glob("*.json")]
+        return [p.name for p in self.root.glob("*.jsonl")] + [p.name for p in self.root.glob("*.json")]
+
+    def close(self) -> None:
+        """Finish pending compactions and close the full-text index (both reopen on next use)"""
+        compactor, self._compactor = self._compactor, None
+        if compactor is not None:
+            compactor.shutdown(wait=True)
+        if self.index is not None:
+            self.index.close()
+            self.index = None
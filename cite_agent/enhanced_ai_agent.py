@@ -11,13 +11,12 @@ import logging
 import os
 import re
 import shlex
-import subprocess
 import time
 from importlib import resources
 
 import aiohttp
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional, Tuple, Set
+from typing import AsyncIterator, Dict, Any, Iterator, List, Optional, Tuple, Set
 from urllib.parse import urlparse
 from dataclasses import dataclass, field
 from pathlib import Path
@@ -26,6 +25,9 @@ import platform
 from .telemetry import TelemetryManager
 from .setup_config import DEFAULT_QUERY_LIMIT
 from .conversation_archive import ConversationArchive
+from .file_search import iter_files, iter_grep
+from .shell_runner import PersistentShell, ShellResult
+from .ticker_matcher import CompanyNameMatcher, default_cache_path, load_matcher
 
 # Suppress noise
 logging.basicConfig(level=logging.ERROR)
@@ -69,6 +71,8 @@ class EnhancedNocturnalAgent:
         self.client = None
         self.conversation_history = []
         self.shell_session = None
+        # Optional (stream, text) callback receiving command output as it arrives
+        self.shell_output_callback = None
         self.memory = {}
         self.daily_token_usage = 0
         self.daily_limit = 100000
@@ -119,6 +123,9 @@ class EnhancedNocturnalAgent:
         self.finsight_client = None
         self.session = None
         self.company_name_to_ticker = {}
+        self._ticker_data_path: Optional[Path] = None
+        self._company_matcher: Optional[CompanyNameMatcher] = None
+        self._company_matcher_source: Optional[Dict[str, str]] = None
 
         # Groq key rotation state
         self.api_keys: List[str] = []
@@ -312,6 +319,11 @@ class EnhancedNocturnalAgent:
         finally:
             self.shell_session = None
 
+        try:
+            self.archive.close()
+        except Exception:
+            pass
+
         self.client = None
         self.current_api_key = None
         self.current_key_index = 0
@@ -515,10 +527,14 @@ class EnhancedNocturnalAgent:
             "square": "SQ"
         }
 
-        def _augment_from_records(records: List[Dict[str, Any]]) -> None:
-            for item in records:
-                name = str(item.get("name", "")).lower()
-                symbol = item.get("symbol")
+        def _augment_from_records(records: Any) -> None:
+            # Either [{"name", "symbol"}] or SEC's company_tickers.json ({"0": {"title", "ticker"}})
+            items = records.values() if isinstance(records, dict) else records
+            for item in items:
+                if not isinstance(item, dict):
+                    continue
+                name = str(item.get("name") or item.get("title") or "").lower()
+                symbol = item.get("symbol") or item.get("ticker")
                 if name and symbol:
                     mapping.setdefault(name, symbol)
                     short = (
@@ -532,7 +548,7 @@ class EnhancedNocturnalAgent:
                         mapping.setdefault(short, symbol)
 
         try:
-            supplemental: List[Dict[str, Any]] = []
+            supplemental: Any = []
 
             try:
                 package_resource = resources.files("nocturnal_archive.data").joinpath("company_tickers.json")
@@ -549,6 +565,7 @@ class EnhancedNocturnalAgent:
                 for data_path in candidate_paths:
                     if data_path.exists():
                         supplemental = json.loads(data_path.read_text(encoding="utf-8"))
+                        self._ticker_data_path = data_path.resolve()
                         break
 
             if supplemental:
@@ -567,7 +584,7 @@ class EnhancedNocturnalAgent:
                     continue
                 try:
                     override_records = json.loads(override_path.read_text(encoding="utf-8"))
-                    if isinstance(override_records, list):
+                    if isinstance(override_records, (list, dict)):
                         _augment_from_records(override_records)
                 except Exception as override_exc:
                     logger.warning(f"Failed to load ticker override from {override_path}: {override_exc}")
@@ -716,7 +733,7 @@ class EnhancedNocturnalAgent:
             api_results={"workspace_listing": listing}
         )
 
-    def _respond_with_shell_command(self, request: ChatRequest, command: str) -> ChatResponse:
+    def _respond_with_shell_command(self, request: ChatRequest, command: str, output: Optional[str] = None) -> ChatResponse:
         command_stub = command.split()[0] if command else ""
         if not self._is_safe_shell_command(command):
             message = (
@@ -729,7 +746,8 @@ class EnhancedNocturnalAgent:
             success = False
             output_len = 0
         else:
-            output = self.execute_command(command)
+            if output is None:
+                output = self.execute_command(command)
             truncated_output = output if len(output) <= 2000 else output[:2000] + "\n… (truncated)"
             message = (
                 f"Running the command: `{command}`\n\n"
@@ -1449,17 +1467,24 @@ class EnhancedNocturnalAgent:
             error_message=error_message or failure_reason
         )
 
+    def _company_name_matcher(self) -> CompanyNameMatcher:
+        """Automaton over ``company_name_to_ticker``, loaded from its disk cache on first use."""
+        if self._company_matcher is None or self._company_matcher_source is not self.company_name_to_ticker:
+            self._company_matcher = load_matcher(
+                self.company_name_to_ticker,
+                default_cache_path(self._ticker_data_path) if self.company_name_to_ticker else None,
+            )
+            self._company_matcher_source = self.company_name_to_ticker
+        return self._company_matcher
+
     def _extract_tickers_from_text(self, text: str) -> List[str]:
         """Find tickers either as explicit symbols or from known company names."""
-        text_lower = text.lower()
         # Explicit ticker-like symbols
         ticker_candidates: List[str] = []
         for token in re.findall(r"\b[A-Z]{1,5}(?:\d{0,2})\b", text):
             ticker_candidates.append(token)
-        # Company name matches
-        for name, sym in self.company_name_to_ticker.items():
-            if name and name in text_lower:
-                ticker_candidates.append(sym)
+        # Company name matches (whole words, longest name wins)
+        ticker_candidates.extend(self._company_name_matcher().find(text))
         # Deduplicate preserve order
         seen = set()
         ordered: List[str] = []
@@ -1663,18 +1688,8 @@ class EnhancedNocturnalAgent:
 
             if self.shell_session is None:
                 try:
-                    if self._is_windows:
-                        command = ['powershell', '-NoLogo', '-NoProfile']
-                    else:
-                        command = ['bash']
-                    self.shell_session = subprocess.Popen(
-                        command,
-                        stdin=subprocess.PIPE,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT,
-                        text=True,
-                        cwd=os.getcwd()
-                    )
+                    self.shell_session = PersistentShell(cwd=os.getcwd())
+                    self.shell_session.start()
                 except Exception as exc:
                     print(f"⚠️ Unable to launch persistent shell session: {exc}")
                     self.shell_session = None
@@ -1884,6 +1899,79 @@ class EnhancedNocturnalAgent:
                 error_message=str(e)
             )
     
+    async def call_backend_query_stream(self, query: str, conversation_history: Optional[List[Dict]] = None,
+                                        api_results: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Stream an answer from the backend /query/stream endpoint (server-sent events)
+        Yields text as the backend relays provider tokens. Error statuses (auth, token
+        limit, busy backend) fall back to call_backend_query so they read the same.
+        """
+        if not self.auth_token or not self.session:
+            response = await self.call_backend_query(query, conversation_history, api_results)
+            yield response.response
+            return
+
+        payload = {
+            "query": query,
+            "conversation_history": conversation_history or [],
+            "api_context": api_results,
+            "model": "openai/gpt-oss-120b",
+            "temperature": 0.2,
+            "max_tokens": 4000,
+        }
+        headers = {
+            "Authorization": f"Bearer {self.auth_token}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        }
+        url = f"{self.backend_api_url}/query/stream"
+        parts: List[str] = []
+
+        try:
+            async with self.session.post(url, json=payload, headers=headers, timeout=aiohttp.ClientTimeout(total=None, sock_read=60)) as response:
+                if response.status != 200:
+                    fallback = await self.call_backend_query(query, conversation_history, api_results)
+                    yield fallback.response
+                    return
+
+                event = "message"
+                async for raw in response.content:
+                    line = raw.decode("utf-8").rstrip("\r\n")
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                        continue
+                    if not line.startswith("data:"):
+                        continue
+                    try:
+                        data = json.loads(line[5:].strip())
+                    except ValueError:
+                        continue
+
+                    if event == "token":
+                        parts.append(data.get("content", ""))
+                        yield data.get("content", "")
+                    elif event == "error":
+                        yield f"\n❌ {data.get('detail', 'Backend stream failed')}"
+                    elif event == "done":
+                        response_text = "".join(parts)
+                        self.conversation_history.append({"role": "user", "content": query})
+                        self.conversation_history.append({"role": "assistant", "content": response_text})
+                        self.workflow.save_query_result(
+                            query=query,
+                            response=response_text,
+                            metadata={
+                                "tools_used": ["backend_llm"],
+                                "tokens_used": data.get("tokens_used", 0),
+                                "model": data.get("model"),
+                                "provider": data.get("provider"),
+                                "streamed": True
+                            }
+                        )
+        except asyncio.TimeoutError:
+            yield "\n❌ Request timeout. Please try again."
+        except aiohttp.ClientError as e:
+            yield f"\n❌ Error calling backend: {str(e)}"
+
     async def _call_files_api(
         self,
         method: str,
@@ -2236,78 +2324,72 @@ class EnhancedNocturnalAgent:
             return "ls -lah"
         return "pwd"
 
-    def execute_command(self, command: str) -> str:
-        """Execute command and return output - improved with echo markers"""
+    _SHELL_PREFIXES = [
+        'run this bash:', 'execute this:', 'run command:', 'execute:',
+        'run this:', 'run:', 'bash:', 'command:', 'this bash:', 'this:',
+        'r code to', 'R code to', 'python code to', 'in r:', 'in R:',
+        'in python:', 'in bash:', 'with r:', 'with bash:'
+    ]
+
+    def _clean_shell_command(self, command: str) -> str:
+        """Remove natural language prefixes ("run this:", "in bash:") from a command"""
+        command = command.strip()
+        for prefix in self._SHELL_PREFIXES:
+            if command.lower().startswith(prefix.lower()):
+                command = command[len(prefix):].strip()
+                # Try again in case of nested prefixes
+                for prefix2 in self._SHELL_PREFIXES:
+                    if command.lower().startswith(prefix2.lower()):
+                        command = command[len(prefix2):].strip()
+                        break
+                break
+        return command
+
+    def _shell_result_text(self, result: ShellResult, timeout: float) -> str:
+        output = result.output.strip()
+        if result.truncated:
+            output += "\n… (output truncated)"
+        if result.timed_out:
+            output += f"\n⚠️ Command timed out after {timeout:g}s; the shell was restarted"
+        elif not output and result.exit_code:
+            output = f"Command exited with status {result.exit_code}"
+
+        if os.getenv("NOCTURNAL_DEBUG", "").lower() == "1":
+            output_preview = output[:200] if output else "(no output)"
+            print(f"✅ Command executed: {result.command} (exit {result.exit_code}, {result.duration:.2f}s)")
+            print(f"📤 Output ({len(output)} chars): {output_preview}...")
+
+        return output.strip() if output.strip() else "Command executed (no output)"
+
+    async def execute_command_async(self, command: str, timeout: float = 30.0) -> str:
+        """
+        Run a command in the persistent shell without blocking the event loop.
+
+        stdout and stderr are captured separately (stderr follows stdout in the
+        returned text) and streamed to ``shell_output_callback`` as they arrive.
+        """
+        command = self._clean_shell_command(command)
         try:
             if self.shell_session is None:
                 return "ERROR: Shell session not initialized"
-            
-            # Clean command - remove natural language prefixes
-            command = command.strip()
-            prefixes_to_remove = [
-                'run this bash:', 'execute this:', 'run command:', 'execute:', 
-                'run this:', 'run:', 'bash:', 'command:', 'this bash:', 'this:',
-                'r code to', 'R code to', 'python code to', 'in r:', 'in R:',
-                'in python:', 'in bash:', 'with r:', 'with bash:'
-            ]
-            for prefix in prefixes_to_remove:
-                if command.lower().startswith(prefix.lower()):
-                    command = command[len(prefix):].strip()
-                    # Try again in case of nested prefixes
-                    for prefix2 in prefixes_to_remove:
-                        if command.lower().startswith(prefix2.lower()):
-                            command = command[len(prefix2):].strip()
-                            break
-                    break
-            
-            # Use echo markers to detect when command is done
-            import uuid
-            marker = f"CMD_DONE_{uuid.uuid4().hex[:8]}"
-            
-            # Send command with marker
-            terminator = "\r\n" if self._is_windows else "\n"
-            if self._is_windows:
-                full_command = f"{command}; echo '{marker}'{terminator}"
-            else:
-                full_command = f"{command}; echo '{marker}'{terminator}"
-            self.shell_session.stdin.write(full_command)
-            self.shell_session.stdin.flush()
-
-            # Read until we see the marker
-            output_lines = []
-            start_time = time.time()
-            timeout = 30  # Increased for R scripts
-            
-            while time.time() - start_time < timeout:
-                try:
-                    line = self.shell_session.stdout.readline()
-                    if not line:
-                        break
-                    
-                    line = line.rstrip()
-                    
-                    # Check if we hit the marker
-                    if marker in line:
-                        break
-                    
-                    output_lines.append(line)
-                except Exception:
-                    break
-            
-            output = '\n'.join(output_lines).strip()
-            debug_mode = os.getenv("NOCTURNAL_DEBUG", "").lower() == "1"
-            
-            # Log execution details in debug mode
-            if debug_mode:
-                output_preview = output[:200] if output else "(no output)"
-                print(f"✅ Command executed: {command}")
-                print(f"📤 Output ({len(output)} chars): {output_preview}...")
-            
-            return output if output else "Command executed (no output)"
+            result = await self.shell_session.run(command, timeout=timeout, on_output=self.shell_output_callback)
+            return self._shell_result_text(result, timeout)
+        except Exception as e:
+            if os.getenv("NOCTURNAL_DEBUG", "").lower() == "1":
+                print(f"❌ Command failed: {command}")
+                print(f"❌ Error: {e}")
+            return f"ERROR: {e}"
 
+    def execute_command(self, command: str, timeout: float = 30.0) -> str:
+        """Execute command and return output (blocking; prefer execute_command_async in async code)"""
+        command = self._clean_shell_command(command)
+        try:
+            if self.shell_session is None:
+                return "ERROR: Shell session not initialized"
+            result = self.shell_session.run_sync(command, timeout=timeout)
+            return self._shell_result_text(result, timeout)
         except Exception as e:
-            debug_mode = os.getenv("NOCTURNAL_DEBUG", "").lower() == "1"
-            if debug_mode:
+            if os.getenv("NOCTURNAL_DEBUG", "").lower() == "1":
                 print(f"❌ Command failed: {command}")
                 print(f"❌ Error: {e}")
             return f"ERROR: {e}"
@@ -2544,20 +2626,22 @@ class EnhancedNocturnalAgent:
                 "replacements": 0
             }
 
-    def glob_search(self, pattern: str, path: str = ".") -> Dict[str, Any]:
+    def glob_search(self, pattern: str, path: str = ".", max_results: int = 1000) -> Dict[str, Any]:
         """
         Fast file pattern matching (like Claude Code's Glob tool)
 
+        Walks lazily, pruning .git, node_modules and .gitignore'd directories,
+        and stops after ``max_results`` files.
+
         Args:
             pattern: Glob pattern (e.g., "*.py", "**/*.md", "src/**/*.ts")
             path: Starting directory (default: current directory)
+            max_results: Maximum number of files to return
 
         Returns:
-            {"files": List[str], "count": int, "pattern": str}
+            {"files": List[str], "count": int, "pattern": str, "truncated": bool}
         """
         try:
-            import glob as glob_module
-
             # Expand ~ to home directory
             path = os.path.expanduser(path)
 
@@ -2565,22 +2649,23 @@ class EnhancedNocturnalAgent:
             if not os.path.isabs(path):
                 path = os.path.abspath(path)
 
-            # Combine path and pattern
             full_pattern = os.path.join(path, pattern)
+            files: List[str] = []
+            truncated = False
+            for file_path in iter_files(path, pattern):
+                if len(files) >= max_results:
+                    truncated = True
+                    break
+                files.append(file_path)
 
-            # Find matches (recursive if ** in pattern)
-            matches = glob_module.glob(full_pattern, recursive=True)
-
-            # Filter to files only (not directories)
-            files = [f for f in matches if os.path.isfile(f)]
-
-            # Sort by modification time (newest first)
+            # Sort by modification time (newest first); only the returned files are stat'ed
             files.sort(key=lambda f: os.path.getmtime(f), reverse=True)
 
             return {
                 "files": files,
                 "count": len(files),
-                "pattern": full_pattern
+                "pattern": full_pattern,
+                "truncated": truncated
             }
 
         except Exception as e:
@@ -2591,6 +2676,34 @@ class EnhancedNocturnalAgent:
                 "error": f"{type(e).__name__}: {e}"
             }
 
+    def iter_grep_search(self, pattern: str, path: str = ".",
+                         file_pattern: str = "*",
+                         output_mode: str = "files_with_matches",
+                         ignore_case: bool = False,
+                         max_results: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        Stream grep_search results: one {"path", "count", "lines"} dict per matching
+        file as soon as a worker finishes it. Raises re.error / ValueError on bad input.
+        """
+        modes = {"files_with_matches": "files", "content": "content", "count": "count"}
+        if output_mode not in modes:
+            raise ValueError(
+                f"Invalid output_mode: {output_mode}. Use 'files_with_matches', 'content', or 'count'."
+            )
+        path = os.path.expanduser(path)
+        if not os.path.isabs(path):
+            path = os.path.abspath(path)
+        # count keeps counting every file; the other modes stop at max_results
+        yield from iter_grep(
+            pattern,
+            path,
+            file_pattern,
+            mode=modes[output_mode],
+            ignore_case=ignore_case,
+            max_results=None if output_mode == "count" else max_results,
+            max_per_file=max_results if output_mode == "content" else None,
+        )
+
     def grep_search(self, pattern: str, path: str = ".",
                     file_pattern: str = "*",
                     output_mode: str = "files_with_matches",
@@ -2600,6 +2713,10 @@ class EnhancedNocturnalAgent:
         """
         Fast content search (like Claude Code's Grep tool / ripgrep)
 
+        Files are walked lazily (skipping .git, node_modules, .gitignore'd paths
+        and binaries) and searched on a thread pool; the search stops as soon as
+        ``max_results`` files (or lines, in content mode) have matched.
+
         Args:
             pattern: Regex pattern to search for
             path: Directory to search in
@@ -2616,35 +2733,15 @@ class EnhancedNocturnalAgent:
             - count: {"counts": {file: match_count}}
         """
         try:
-            # import re removed - using module-level import
-
-            # Expand ~ to home directory
-            path = os.path.expanduser(path)
-
-            # Make absolute if relative
-            if not os.path.isabs(path):
-                path = os.path.abspath(path)
-
-            # Compile regex
-            flags = re.IGNORECASE if ignore_case else 0
-            regex = re.compile(pattern, flags)
-
-            # Find files to search
-            glob_result = self.glob_search(file_pattern, path)
-            files_to_search = glob_result["files"]
+            results = list(self.iter_grep_search(
+                pattern, path, file_pattern,
+                output_mode=output_mode,
+                ignore_case=ignore_case,
+                max_results=max_results,
+            ))
 
-            # Search each file
             if output_mode == "files_with_matches":
-                matching_files = []
-                for file_path in files_to_search[:max_results]:
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                            content = f.read()
-                        if regex.search(content):
-                            matching_files.append(file_path)
-                    except:
-                        continue
-
+                matching_files = [result["path"] for result in results]
                 return {
                     "files": matching_files,
                     "count": len(matching_files),
@@ -2652,55 +2749,24 @@ class EnhancedNocturnalAgent:
                 }
 
             elif output_mode == "content":
-                matches = {}
-                for file_path in files_to_search:
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                            lines = f.readlines()
-
-                        file_matches = []
-                        for line_num, line in enumerate(lines, 1):
-                            if regex.search(line):
-                                file_matches.append((line_num, line.rstrip()))
-
-                                if len(file_matches) >= max_results:
-                                    break
-
-                        if file_matches:
-                            matches[file_path] = file_matches
-                    except:
-                        continue
-
+                matches = {result["path"]: result["lines"] for result in results}
                 return {
                     "matches": matches,
                     "file_count": len(matches),
                     "pattern": pattern
                 }
 
-            elif output_mode == "count":
-                counts = {}
-                for file_path in files_to_search:
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                            content = f.read()
-
-                        match_count = len(regex.findall(content))
-                        if match_count > 0:
-                            counts[file_path] = match_count
-                    except:
-                        continue
-
-                return {
-                    "counts": counts,
-                    "total_matches": sum(counts.values()),
-                    "pattern": pattern
-                }
-
-            else:
-                return {
-                    "error": f"Invalid output_mode: {output_mode}. Use 'files_with_matches', 'content', or 'count'."
-                }
+            counts = {result["path"]: result["count"] for result in results}
+            return {
+                "counts": counts,
+                "total_matches": sum(counts.values()),
+                "pattern": pattern
+            }
 
+        except ValueError as e:
+            return {
+                "error": str(e)
+            }
         except re.error as e:
             return {
                 "error": f"Invalid regex pattern: {e}"
@@ -3146,20 +3212,21 @@ class EnhancedNocturnalAgent:
         
         # Show library
         if any(phrase in question_lower for phrase in ["show my library", "list my papers", "what's in my library", "my saved papers"]):
-            papers = self.workflow.list_papers()
+            total = self.workflow.count_papers()
+            papers = self.workflow.list_papers(limit=10)
             if not papers:
                 message = "Your library is empty. As you find papers, I can save them for you."
             else:
                 paper_list = []
-                for i, paper in enumerate(papers[:10], 1):
+                for i, paper in enumerate(papers, 1):
                     authors_str = paper.authors[0] if paper.authors else "Unknown"
                     if len(paper.authors) > 1:
                         authors_str += " et al."
                     paper_list.append(f"{i}. {paper.title} ({authors_str}, {paper.year})")
                 
-                message = f"You have {len(papers)} paper(s) in your library:\n\n" + "\n".join(paper_list)
-                if len(papers) > 10:
-                    message += f"\n\n...and {len(papers) - 10} more."
+                message = f"You have {total} paper(s) in your library:\n\n" + "\n".join(paper_list)
+                if total > 10:
+                    message += f"\n\n...and {total - 10} more."
             
             return self._quick_reply(request, message, tools_used=["workflow_library"], confidence=1.0)
         
@@ -3167,7 +3234,7 @@ class EnhancedNocturnalAgent:
         if any(phrase in question_lower for phrase in ["export to bibtex", "export bibtex", "generate bibtex", "bibtex export"]):
             success = self.workflow.export_to_bibtex()
             if success:
-                message = f"✅ Exported {len(self.workflow.list_papers())} papers to BibTeX.\n\nFile: {self.workflow.bibtex_file}\n\nYou can import this into Zotero, Mendeley, or use it in your LaTeX project."
+                message = f"✅ Exported {self.workflow.count_papers()} papers to BibTeX.\n\nFile: {self.workflow.bibtex_file}\n\nYou can import this into Zotero, Mendeley, or use it in your LaTeX project."
             else:
                 message = "❌ Failed to export BibTeX. Make sure you have papers in your library first."
             
@@ -3185,7 +3252,7 @@ class EnhancedNocturnalAgent:
         
         # Show history
         if any(phrase in question_lower for phrase in ["show history", "my history", "recent queries", "what did i search"]):
-            history = self.workflow.get_history()[:10]
+            history = self.workflow.get_history(limit=10)
             if not history:
                 message = "No query history yet."
             else:
@@ -3484,7 +3551,7 @@ class EnhancedNocturnalAgent:
                 tools: List[str] = []
 
                 if self.shell_session:
-                    pwd_output = self.execute_command("pwd")
+                    pwd_output = await self.execute_command_async("pwd")
                     if pwd_output and not pwd_output.startswith("ERROR"):
                         cwd_line = pwd_output.strip().splitlines()[-1]
                         tools.append("shell_execution")
@@ -3538,7 +3605,7 @@ class EnhancedNocturnalAgent:
             if might_need_shell and self.shell_session:
                 # Get current directory and context for intelligent planning
                 try:
-                    current_dir = self.execute_command("pwd").strip()
+                    current_dir = (await self.execute_command_async("pwd")).strip()
                     self.file_context['current_cwd'] = current_dir
                 except:
                     current_dir = "~"
@@ -3908,7 +3975,7 @@ JSON:"""
 
                             # If not intercepted, execute as shell command
                             if not intercepted:
-                                output = self.execute_command(command)
+                                output = await self.execute_command_async(command)
                             
                             if not output.startswith("ERROR"):
                                 # Success - store results with formatted preview
@@ -3950,7 +4017,7 @@ JSON:"""
                                     # If cd command, update current_cwd
                                     if command.startswith('cd '):
                                         try:
-                                            new_cwd = self.execute_command("pwd").strip()
+                                            new_cwd = (await self.execute_command_async("pwd")).strip()
                                             self.file_context['current_cwd'] = new_cwd
                                         except:
                                             pass
@@ -3965,13 +4032,13 @@ JSON:"""
                     elif shell_action == "pwd":
                         target = plan.get("target_path")
                         if target:
-                            ls_output = self.execute_command(f"ls -lah {target}")
+                            ls_output = await self.execute_command_async(f"ls -lah {target}")
                             api_results["shell_info"] = {
                                 "directory_contents": ls_output,
                                 "target_path": target
                             }
                         else:
-                            ls_output = self.execute_command("ls -lah")
+                            ls_output = await self.execute_command_async("ls -lah")
                             api_results["shell_info"] = {"directory_contents": ls_output}
                         tools_used.append("shell_execution")
                     
@@ -3980,7 +4047,7 @@ JSON:"""
                         search_path = plan.get("search_path", "~")
                         if search_target:
                             find_cmd = f"find {search_path} -maxdepth 4 -type d -iname '*{search_target}*' 2>/dev/null | head -20"
-                            find_output = self.execute_command(find_cmd)
+                            find_output = await self.execute_command_async(find_cmd)
                             if debug_mode:
                                 print(f"🔍 FIND: {find_cmd}")
                                 print(f"🔍 OUTPUT: {repr(find_output)}")
@@ -4005,7 +4072,7 @@ JSON:"""
                             
                             # Execute cd command
                             cd_cmd = f"cd {target} && pwd"
-                            cd_output = self.execute_command(cd_cmd)
+                            cd_output = await self.execute_command_async(cd_cmd)
                             
                             if not cd_output.startswith("ERROR"):
                                 api_results["shell_info"] = {
@@ -4030,7 +4097,7 @@ JSON:"""
                             filenames = re.findall(r'([a-zA-Z0-9_-]+\.[a-zA-Z]{1,4})', request.question)
                             if filenames:
                                 # Check if file exists in current directory
-                                pwd = self.execute_command("pwd").strip()
+                                pwd = (await self.execute_command_async("pwd")).strip()
                                 file_path = f"{pwd}/{filenames[0]}"
                         
                         if file_path:
@@ -4038,7 +4105,7 @@ JSON:"""
                                 print(f"🔍 READING FILE: {file_path}")
                             
                             # Read file content (first 100 lines to detect structure)
-                            cat_output = self.execute_command(f"head -100 {file_path}")
+                            cat_output = await self.execute_command_async(f"head -100 {file_path}")
                             
                             if not cat_output.startswith("ERROR"):
                                 # Detect file type and extract structure
@@ -4388,25 +4455,25 @@ JSON:"""
 
             direct_shell = re.match(r"^(?:run|execute)\s*:?\s*(.+)$", request.question.strip(), re.IGNORECASE)
             if direct_shell:
-                return self._respond_with_shell_command(request, direct_shell.group(1).strip())
+                command = direct_shell.group(1).strip()
+                output = await self.execute_command_async(command) if self._is_safe_shell_command(command) else None
+                return self._respond_with_shell_command(request, command, output)
 
             # Get memory context
             memory_context = self._get_memory_context(request.user_id, request.conversation_id)
-            archive_context = self.archive.get_recent_context(
-                request.user_id,
-                request.conversation_id,
-                limit=3,
-            ) if getattr(self, "archive", None) else ""
-            if archive_context:
-                if memory_context:
-                    memory_context = f"{memory_context}\n\n{archive_context}"
-                else:
-                    memory_context = archive_context
-            archive_context = self.archive.get_recent_context(
-                request.user_id,
-                request.conversation_id,
-                limit=3,
-            ) if getattr(self, "archive", None) else ""
+            archive_context = ""
+            if getattr(self, "archive", None):
+                archive_context = self.archive.get_recent_context(
+                    request.user_id,
+                    request.conversation_id,
+                    limit=3,
+                )
+                related_context = self.archive.get_related_context(
+                    request.user_id,
+                    request.conversation_id,
+                    request.question,
+                )
+                archive_context = "\n\n".join(part for part in (archive_context, related_context) if part)
             if archive_context:
                 if memory_context:
                     memory_context = f"{memory_context}\n\n{archive_context}"
@@ -4731,7 +4798,7 @@ JSON:"""
                 command = commands[0].strip()
                 if self._is_safe_shell_command(command):
                     print(f"\n🔧 Executing: {command}")
-                    output = self.execute_command(command)
+                    output = await self.execute_command_async(command)
                     print(f"✅ Command completed")
                     execution_results = {
                         "command": command,
@@ -4843,17 +4910,15 @@ JSON:"""
     
     async def process_request_streaming(self, request: ChatRequest):
         """
-        Process request with streaming response from Groq API
-        Returns a Groq stream object that yields chunks as they arrive
+        Process request with streaming response from the backend or Groq API
+        Returns an async generator of text (backend mode) or a Groq stream object
+        (dev mode); groq_stream_to_generator() accepts either
 
         This enables real-time character-by-character streaming in the UI
         """
-        # PRODUCTION MODE: Backend doesn't support streaming yet, use regular response
+        # PRODUCTION MODE: stream tokens relayed by the backend
         if self.client is None:
-            response = await self.call_backend_query(request.question, self.conversation_history[-10:])
-            async def single_yield():
-                yield response.response
-            return single_yield()
+            return self.call_backend_query_stream(request.question, self.conversation_history[-10:])
 
         # DEV MODE ONLY
         try:
@@ -4880,7 +4945,9 @@ JSON:"""
             # Direct shell commands (non-streaming fallback)
             direct_shell = re.match(r"^(?:run|execute)\s*:?\s*(.+)$", request.question.strip(), re.IGNORECASE)
             if direct_shell:
-                result = self._respond_with_shell_command(request, direct_shell.group(1).strip())
+                command = direct_shell.group(1).strip()
+                output = await self.execute_command_async(command) if self._is_safe_shell_command(command) else None
+                result = self._respond_with_shell_command(request, command, output)
                 async def shell_gen():
                     yield result.response
                 return shell_gen()
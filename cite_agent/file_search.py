@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""Lazy, ignore-aware file walking and parallel regex search for the agents' grep/glob tools."""
+
+from __future__ import annotations
+
+import mmap
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Pattern, Set, Tuple
+
+ALWAYS_SKIP_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+    ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".ruff_cache",
+})
+SNIFF_BYTES = 8192             # a NUL byte in the first 8 KiB marks a file as binary
+MMAP_THRESHOLD = 4 * 1024 * 1024  # larger files are memory-mapped instead of read
+SEARCH_MODES = ("files", "count", "content")
+
+_MAGIC_RE = re.compile(r"[*?\[]")
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a glob (``*``, ``?``, ``[...]``, ``**``) to a regex over ``/``-separated paths."""
+    out: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if char == "*":
+            if pattern.startswith("**", i):
+                if pattern.startswith("**/", i):
+                    out.append("(?:.*/)?")
+                    i += 3
+                else:
+                    out.append(".*")
+                    i += 2
+                continue
+            out.append("[^/]*")
+        elif char == "?":
+            out.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end
+        else:
+            out.append(re.escape(char))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """``.gitignore`` rules of one directory; the last matching rule wins, ``!`` re-includes."""
+
+    def __init__(self, base: str, lines: List[str]):
+        self.base = base
+        self.rules: List[Tuple[Pattern[str], bool, bool]] = []
+        for raw in lines:
+            line = raw.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # A slash anywhere but the end anchors the pattern to this directory
+            anchored = "/" in line
+            body = glob_to_regex(line.lstrip("/"))
+            regex = re.compile(f"^{body}$" if anchored else f"^(?:.*/)?{body}$")
+            self.rules.append((regex, negate, dir_only))
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["IgnoreRules"]:
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                rules = cls(directory, f.readlines())
+        except OSError:
+            return None
+        return rules if rules.rules else None
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """True (ignored), False (re-included) or None (no rule applies)"""
+        # Paths come from walking below ``base``, so slicing is a cheap relpath
+        relative = path[len(self.base):].lstrip(os.sep).replace(os.sep, "/")
+        verdict = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative):
+                verdict = not negate
+        return verdict
+
+
+def _is_ignored(path: str, is_dir: bool, rules: Tuple[IgnoreRules, ...]) -> bool:
+    # Deeper .gitignore files override their parents
+    for rule_set in reversed(rules):
+        verdict = rule_set.match(path, is_dir)
+        if verdict is not None:
+            return verdict
+    return False
+
+
+def _ancestor_rules(root: str) -> Tuple[IgnoreRules, ...]:
+    """``.gitignore`` files above ``root`` up to the repository root"""
+    rules: List[IgnoreRules] = []
+    current = os.path.dirname(root)
+    if os.path.isdir(os.path.join(root, ".git")):
+        return ()
+    while current and current != os.path.dirname(current):
+        loaded = IgnoreRules.load(current)
+        if loaded:
+            rules.append(loaded)
+        if os.path.isdir(os.path.join(current, ".git")):
+            break
+        current = os.path.dirname(current)
+    else:
+        # Not inside a repository: unrelated .gitignore files higher up do not apply
+        return ()
+    return tuple(reversed(rules))
+
+
+def split_pattern(root: str, pattern: str) -> Tuple[str, str]:
+    """Move the literal leading directories of ``pattern`` into ``root``
+
+    ``split_pattern("/repo", "src/**/*.ts")`` is ``("/repo/src", "**/*.ts")``, so
+    the walk starts as deep as possible. Absolute patterns replace ``root``.
+    """
+    full = os.path.join(os.path.expanduser(root), os.path.expanduser(pattern))
+    parts = full.replace(os.sep, "/").split("/")
+    literal: List[str] = []
+    for part in parts[:-1]:
+        if _MAGIC_RE.search(part):
+            break
+        literal.append(part)
+    base = "/".join(literal) or "/"
+    rest = "/".join(parts[len(literal):])
+    return os.path.abspath(base), rest
+
+
+def iter_files(
+    root: str = ".",
+    pattern: str = "**/*",
+    *,
+    respect_ignore: bool = True,
+    include_hidden: Optional[bool] = None,
+) -> Iterator[str]:
+    """Lazily yield files under ``root`` whose relative path matches the glob ``pattern``
+
+    Directories in ``ALWAYS_SKIP_DIRS`` and those excluded by ``.gitignore`` are
+    pruned before they are entered. Without ``**`` the walk goes no deeper than
+    the pattern does. Hidden entries are skipped unless the pattern names one,
+    as ``glob`` does.
+    """
+    root, pattern = split_pattern(root, pattern)
+    if not os.path.isdir(root):
+        return
+    if include_hidden is None:
+        include_hidden = any(part.startswith(".") for part in pattern.split("/"))
+    matcher = re.compile(f"^{glob_to_regex(pattern)}$")
+    max_depth = None if "**" in pattern else pattern.count("/")
+
+    base_rules = _ancestor_rules(root) if respect_ignore else ()
+    stack: List[Tuple[str, int, Tuple[IgnoreRules, ...]]] = [(root, 0, base_rules)]
+    while stack:
+        directory, depth, rules = stack.pop()
+        if respect_ignore:
+            local = IgnoreRules.load(directory)
+            if local:
+                rules = rules + (local,)
+        try:
+            with os.scandir(directory) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError:
+            continue
+
+        subdirs: List[str] = []
+        for entry in entries:
+            if not include_hidden and entry.name.startswith("."):
+                continue
+            try:
+                # Symlinked directories are not followed, so link cycles cannot trap the walk
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in ALWAYS_SKIP_DIRS or (max_depth is not None and depth >= max_depth):
+                    continue
+                if respect_ignore and _is_ignored(entry.path, True, rules):
+                    continue
+                subdirs.append(entry.path)
+                continue
+            relative = entry.path[len(root):].lstrip(os.sep).replace(os.sep, "/")
+            if not matcher.match(relative):
+                continue
+            if respect_ignore and _is_ignored(entry.path, False, rules):
+                continue
+            yield entry.path
+        stack.extend((subdir, depth + 1, rules) for subdir in reversed(subdirs))
+
+
+def compile_pattern(pattern: str, ignore_case: bool = False) -> Pattern[bytes]:
+    """Bytes regex for ``pattern`` (``^``/``$`` match at line boundaries); raises ``re.error``"""
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(pattern.encode("utf-8"), flags)
+
+
+def search_file(path: str, regex: Pattern[bytes], mode: str = "content", max_per_file: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """``{"path", "count", "lines"}`` for one file, or None when it is binary, unreadable or has no match
+
+    ``files`` stops at the first match, ``count`` counts every match and
+    ``content`` lists each matching line once as ``(line_number, text)``.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+            if not head or b"\x00" in head:
+                return None
+            size = os.fstat(f.fileno()).st_size
+            if size <= len(head):
+                data: Any = head
+            elif size >= MMAP_THRESHOLD:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = head + f.read()
+    except (OSError, ValueError):
+        return None
+
+    try:
+        if mode == "files":
+            return {"path": path, "count": 1, "lines": []} if regex.search(data) else None
+
+        if mode == "count":
+            count = sum(1 for _ in regex.finditer(data))
+            return {"path": path, "count": count, "lines": []} if count else None
+
+        lines: List[Tuple[int, str]] = []
+        line_number, scanned, last_line = 1, 0, 0
+        for match in regex.finditer(data):
+            start = match.start()
+            line_number += data[scanned:start].count(b"\n")
+            scanned = start
+            if line_number == last_line:
+                continue
+            last_line = line_number
+            line_start = data.rfind(b"\n", 0, start) + 1
+            line_end = data.find(b"\n", start)
+            text = data[line_start:line_end if line_end != -1 else len(data)]
+            lines.append((line_number, text.decode("utf-8", errors="replace").rstrip()))
+            if max_per_file and len(lines) >= max_per_file:
+                break
+        return {"path": path, "count": len(lines), "lines": lines} if lines else None
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def iter_grep(
+    pattern: str,
+    root: str = ".",
+    file_pattern: str = "**/*",
+    *,
+    mode: str = "content",
+    ignore_case: bool = False,
+    max_results: Optional[int] = None,
+    max_per_file: Optional[int] = None,
+    respect_ignore: bool = True,
+    workers: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield per-file results of ``search_file`` as worker threads finish them
+
+    Files stream in from ``iter_files`` while at most a few batches are in
+    flight. ``max_results`` caps matching files (``files``/``count``) or lines
+    (``content``); once reached, queued files are cancelled and the walk stops.
+    Closing the generator early has the same effect.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Invalid mode: {mode}. Use one of {SEARCH_MODES}")
+    regex = compile_pattern(pattern, ignore_case)
+    workers = workers or min(8, (os.cpu_count() or 2) + 2)
+    window = workers * 4
+    remaining = max_results
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="file-search")
+    pending: Set[Future] = set()
+
+    def drain(block_until: int) -> Iterator[Dict[str, Any]]:
+        nonlocal pending, remaining
+        while len(pending) > block_until:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result is None:
+                    continue
+                if remaining is not None:
+                    if mode == "content":
+                        result["lines"] = result["lines"][:remaining]
+                        result["count"] = len(result["lines"])
+                        remaining -= result["count"]
+                    else:
+                        remaining -= 1
+                yield result
+                if remaining is not None and remaining <= 0:
+                    return
+
+    try:
+        for path in iter_files(root, file_pattern, respect_ignore=respect_ignore):
+            pending.add(pool.submit(search_file, path, regex, mode, max_per_file))
+            if len(pending) >= window:
+                yield from drain(window // 2)
+                if remaining is not None and remaining <= 0:
+                    return
+        yield from drain(0)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
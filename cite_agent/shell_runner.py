@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""Persistent shell driven from a background event loop, for the agent's command execution."""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import logging
+import os
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import Future as ConcurrentFuture
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+try:  # POSIX only
+    import pty
+    import tty
+except ImportError:  # pragma: no cover - Windows
+    pty = tty = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30.0
+MAX_OUTPUT_BYTES = 1024 * 1024   # per stream; the rest is counted, not kept
+READ_CHUNK = 64 * 1024
+
+OutputCallback = Callable[[str, str], None]
+
+
+@dataclass
+class ShellResult:
+    command: str
+    stdout: str
+    stderr: str
+    exit_code: Optional[int]
+    timed_out: bool = False
+    truncated: bool = False
+    duration: float = 0.0
+
+    @property
+    def output(self) -> str:
+        """stdout followed by stderr, as a terminal would show them"""
+        parts = [text.rstrip("\n") for text in (self.stdout, self.stderr) if text.strip()]
+        return "\n".join(parts)
+
+
+class _StreamCapture:
+    """Keeps the first ``limit`` bytes of a stream and forwards them, decoded, to ``on_output``"""
+
+    def __init__(self, name: str, limit: int, on_output: Optional[OutputCallback]):
+        self.name = name
+        self.limit = limit
+        self.on_output = on_output
+        self.kept = bytearray()
+        self.dropped = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    def feed(self, data: bytes) -> None:
+        if not data:
+            return
+        room = self.limit - len(self.kept)
+        if room < len(data):
+            self.dropped += len(data) - max(room, 0)
+            data = data[:max(room, 0)]
+        if not data:
+            return
+        self.kept += data
+        if self.on_output:
+            text = self._decoder.decode(data)
+            if text:
+                self.on_output(self.name, text)
+
+    def text(self) -> str:
+        return self.kept.decode("utf-8", errors="replace")
+
+
+class PersistentShell:
+    """One long-lived ``bash`` (or PowerShell) whose state (cwd, variables) carries across commands
+
+    The shell runs on a private event loop in a daemon thread, so callers on any
+    loop - or none - can use it: ``await run()`` never blocks the caller's loop
+    and ``run_sync()`` blocks only its own thread. Each command is followed by a
+    marker on stdout (carrying its exit status and the new cwd) and another on
+    stderr; both pipes are read in chunks until their marker arrives, so output
+    without a trailing newline cannot stall the read. On POSIX the shell's stdin
+    is a raw PTY, so programs that probe for a terminal see one. A command that
+    outruns its timeout takes the shell's process group down with it; the next
+    command starts a fresh shell in the last known directory.
+    """
+
+    def __init__(
+        self,
+        argv: Optional[List[str]] = None,
+        cwd: Optional[str] = None,
+        *,
+        use_pty: Optional[bool] = None,
+        max_output_bytes: int = MAX_OUTPUT_BYTES,
+    ):
+        self._is_windows = os.name == "nt"
+        if argv is None:
+            argv = ["powershell", "-NoLogo", "-NoProfile"] if self._is_windows else ["bash", "--noprofile", "--norc"]
+        self.argv = argv
+        self.cwd = cwd or os.getcwd()
+        self.use_pty = (pty is not None and not self._is_windows) if use_pty is None else use_pty
+        self.max_output_bytes = max_output_bytes
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._master_fd: Optional[int] = None
+        self._closed = False
+        self._thread_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Spawn the shell now rather than on the first command (raises if it cannot start)"""
+        self._submit(self._ensure_process()).result()
+
+    def poll(self) -> Optional[int]:
+        """None while the shell can take commands (it is respawned as needed), else its exit status"""
+        if not self._closed:
+            return None
+        process = self._process
+        return process.returncode if process and process.returncode is not None else 0
+
+    async def run(
+        self,
+        command: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        on_output: Optional[OutputCallback] = None,
+    ) -> ShellResult:
+        """Run ``command``; ``on_output(stream, text)`` receives chunks on the caller's loop as they arrive"""
+        callback: Optional[OutputCallback] = None
+        if on_output is not None:
+            caller = asyncio.get_running_loop()
+
+            def forward(stream: str, text: str) -> None:
+                caller.call_soon_threadsafe(on_output, stream, text)
+
+            callback = forward
+
+        return await asyncio.wrap_future(self._submit(self._run(command, timeout, callback)))
+
+    def run_sync(
+        self,
+        command: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        on_output: Optional[OutputCallback] = None,
+    ) -> ShellResult:
+        """Blocking ``run`` for synchronous callers (``on_output`` is called from the worker thread)"""
+        return self._submit(self._run(command, timeout, on_output)).result()
+
+    def terminate(self) -> None:
+        """Kill the shell and stop the worker thread; further commands raise RuntimeError"""
+        with self._thread_lock:
+            if self._closed:
+                return
+            self._closed = True
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._kill(), loop).result(timeout=5)
+        except Exception as exc:
+            logger.debug(f"Shell shutdown failed: {exc}")
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+    # ------------------------------------------------------------------
+    # Worker loop
+    # ------------------------------------------------------------------
+
+    def _submit(self, coro) -> ConcurrentFuture:
+        with self._thread_lock:
+            if self._closed:
+                coro.close()
+                raise RuntimeError("shell has been terminated")
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="persistent-shell", daemon=True
+                )
+                self._thread.start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    async def _ensure_process(self) -> asyncio.subprocess.Process:
+        if self._process is not None and self._process.returncode is None:
+            return self._process
+        self._close_master()
+
+        stdin = asyncio.subprocess.PIPE
+        slave_fd = None
+        if self.use_pty:
+            self._master_fd, slave_fd = pty.openpty()
+            # Raw mode: no echo, no line-length limit, no signal characters
+            tty.setraw(slave_fd)
+            stdin = slave_fd
+        try:
+            self._process = await asyncio.create_subprocess_exec(
+                *self.argv,
+                stdin=stdin,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=self.cwd if os.path.isdir(self.cwd) else None,
+                start_new_session=not self._is_windows,
+            )
+        except Exception:
+            self._close_master()
+            raise
+        finally:
+            if slave_fd is not None:
+                os.close(slave_fd)
+        return self._process
+
+    async def _run(self, command: str, timeout: float, on_output: Optional[OutputCallback]) -> ShellResult:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            process = await self._ensure_process()
+            token = f"__SHELL_DONE_{uuid.uuid4().hex}__".encode("ascii")
+            stdout = _StreamCapture("stdout", self.max_output_bytes, on_output)
+            stderr = _StreamCapture("stderr", self.max_output_bytes, on_output)
+            started = time.monotonic()
+
+            # Readers first, so a command that fills a pipe cannot deadlock the write
+            pumps = asyncio.gather(
+                self._pump(process.stdout, token, stdout),
+                self._pump(process.stderr, token, stderr),
+            )
+            timed_out = False
+            trailer = None
+            try:
+                await self._write(process, self._script(command, token.decode("ascii")))
+                trailer, _ = await asyncio.wait_for(pumps, timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                await self._kill()
+            except asyncio.CancelledError:
+                pumps.cancel()
+                await self._kill()
+                raise
+            except (BrokenPipeError, ConnectionResetError, OSError) as exc:
+                pumps.cancel()
+                logger.debug(f"Shell pipe closed while running {command!r}: {exc}")
+                await self._kill()
+
+            exit_code: Optional[int] = None
+            if trailer is not None:
+                exit_code, cwd = self._parse_trailer(trailer)
+                if cwd:
+                    self.cwd = cwd
+            elif not timed_out:
+                # The command ended the shell itself (``exit 3``); the next one gets a new shell
+                exit_code = await process.wait()
+                self._close_master()
+
+            return ShellResult(
+                command=command,
+                stdout=stdout.text(),
+                stderr=stderr.text(),
+                exit_code=exit_code,
+                timed_out=timed_out,
+                truncated=bool(stdout.dropped or stderr.dropped),
+                duration=time.monotonic() - started,
+            )
+
+    def _script(self, command: str, token: str) -> str:
+        # The leading newline ends output that lacks one; _pump strips it again
+        if self._is_windows:
+            return (
+                f"{command}\r\n"
+                f"$__status = if ($?) {{ 0 }} else {{ if ($LASTEXITCODE) {{ $LASTEXITCODE }} else {{ 1 }} }}; "
+                f"[Console]::Out.Write(\"`n{token} $__status $PWD`n\"); "
+                f"[Console]::Error.Write(\"`n{token}`n\")\r\n"
+            )
+        return (
+            f"{{ {command}\n}}\n"
+            f"printf '\\n%s %d %s\\n' '{token}' \"$?\" \"$PWD\"; printf '\\n%s\\n' '{token}' >&2\n"
+        )
+
+    @staticmethod
+    def _parse_trailer(trailer: bytes) -> Tuple[Optional[int], Optional[str]]:
+        parts = trailer.decode("utf-8", errors="replace").strip().split(" ", 1)
+        try:
+            exit_code: Optional[int] = int(parts[0])
+        except ValueError:
+            exit_code = None
+        return exit_code, (parts[1] if len(parts) > 1 else None)
+
+    async def _write(self, process: asyncio.subprocess.Process, script: str) -> None:
+        data = script.encode("utf-8")
+        if self._master_fd is None:
+            process.stdin.write(data)
+            await process.stdin.drain()
+            return
+        master_fd = self._master_fd
+
+        def write_all() -> None:
+            view = memoryview(data)
+            while view:
+                written = os.write(master_fd, view)
+                view = view[written:]
+
+        await asyncio.get_running_loop().run_in_executor(None, write_all)
+
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, token: bytes, capture: _StreamCapture) -> Optional[bytes]:
+        """Feed ``stream`` to ``capture`` up to the marker line; returns the rest of that line (None at EOF)"""
+        needle = b"\n" + token
+        pending = b""
+        while True:
+            index = pending.find(needle)
+            if index != -1:
+                capture.feed(pending[:index])
+                pending = pending[index:]
+                end = pending.find(b"\n", len(needle))
+                if end != -1:
+                    return pending[len(needle):end].rstrip(b"\r")
+            else:
+                # Hold back only a tail that could be the start of a marker split across reads
+                cut = pending.rfind(b"\n")
+                if cut == -1 or not needle.startswith(pending[cut:]):
+                    cut = len(pending)
+                capture.feed(pending[:cut])
+                pending = pending[cut:]
+            try:
+                chunk = await stream.read(READ_CHUNK)
+            except asyncio.CancelledError:
+                # Timed out: keep what was held back
+                capture.feed(pending)
+                raise
+            if not chunk:
+                capture.feed(pending)
+                return None
+            pending += chunk
+
+    async def _kill(self) -> None:
+        process = self._process
+        if process is not None and process.returncode is None:
+            try:
+                if self._is_windows:
+                    process.kill()
+                else:
+                    os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            try:
+                await asyncio.wait_for(process.wait(), 5)
+            except asyncio.TimeoutError:
+                logger.debug(f"Shell {process.pid} did not exit after SIGKILL")
+        self._close_master()
+
+    def _close_master(self) -> None:
+        if self._master_fd is not None:
+            try:
+                os.close(self._master_fd)
+            except OSError:
+                pass
+            self._master_fd = None
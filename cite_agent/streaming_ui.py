@@ -159,11 +159,21 @@ async def groq_stream_to_generator(stream) -> AsyncGenerator[str, None]:
     Convert Groq streaming response to async generator
     
     Args:
-        stream: Groq stream object from client.chat.completions.create(stream=True)
+        stream: Groq stream object from client.chat.completions.create(stream=True),
+            or an async iterable of text such as the backend token stream
     
     Yields:
         Text chunks from the stream
     """
+    if hasattr(stream, "__aiter__"):
+        async for chunk in stream:
+            if isinstance(chunk, str):
+                if chunk:
+                    yield chunk
+            elif chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        return
+
     for chunk in stream:
         if chunk.choices and chunk.choices[0].delta.content:
             yield chunk.choices[0].delta.content
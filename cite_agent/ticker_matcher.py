@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Aho-Corasick matcher that finds known company names in free text."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+_SEPARATOR_RE = re.compile(r"[^a-z0-9&]+")
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase words separated by single spaces (``AT&T`` keeps its ampersand)."""
+    return _SEPARATOR_RE.sub(" ", text.lower()).strip()
+
+
+def mapping_digest(mapping: Dict[str, str]) -> str:
+    payload = json.dumps(sorted(mapping.items()), separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompanyNameMatcher:
+    """Company name -> ticker lookup compiled into an Aho-Corasick automaton.
+
+    ``find`` scans the text once, whatever the number of names, and keeps only
+    matches on word boundaries; where matches overlap the leftmost, then
+    longest, wins ("goldman sachs" over "goldman"). Normalized text is ASCII,
+    so every trie edge lives in one ``node << 7 | ord(char)`` -> child table,
+    which keeps the on-disk cache a handful of flat integer arrays.
+    """
+
+    def __init__(self, mapping: Dict[str, str], digest: Optional[str] = None) -> None:
+        self.digest = digest or mapping_digest(mapping)
+        self._patterns: List[Tuple[int, str]] = []
+        self._edges: Dict[int, int] = {}
+        self._term: List[int] = [-1]
+        children: List[List[Tuple[int, int]]] = [[]]
+        for name, symbol in mapping.items():
+            normalized = normalize_name(name)
+            if not normalized or not symbol:
+                continue
+            node = 0
+            for char in normalized:
+                key = node << 7 | ord(char)
+                child = self._edges.get(key)
+                if child is None:
+                    child = self._edges[key] = len(self._term)
+                    self._term.append(-1)
+                    children.append([])
+                    children[node].append((ord(char), child))
+                node = child
+            if self._term[node] < 0:
+                self._term[node] = len(self._patterns)
+                self._patterns.append((len(normalized), symbol))
+
+        self._fail: List[int] = [0] * len(self._term)
+        self._dict_link: List[int] = [-1] * len(self._term)
+        queue = deque(child for _, child in children[0])
+        while queue:
+            node = queue.popleft()
+            for code, child in children[node]:
+                fallback = self._fail[node]
+                while fallback and (fallback << 7 | code) not in self._edges:
+                    fallback = self._fail[fallback]
+                target = self._edges.get(fallback << 7 | code, 0)
+                self._fail[child] = target if target != child else 0
+                # Nearest proper suffix that is itself a name
+                suffix = self._fail[child]
+                self._dict_link[child] = suffix if self._term[suffix] >= 0 else self._dict_link[suffix]
+                queue.append(child)
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def find(self, text: str) -> List[str]:
+        """Tickers of the company names in ``text``, in order of appearance."""
+        text = normalize_name(text)
+        edges, fail, term, dict_link = self._edges, self._fail, self._term, self._dict_link
+        matches: List[Tuple[int, int, str]] = []
+        node = 0
+        for position, char in enumerate(text):
+            code = ord(char)
+            child = edges.get(node << 7 | code)
+            while child is None and node:
+                node = fail[node]
+                child = edges.get(node << 7 | code)
+            node = child or 0
+            hit = node if term[node] >= 0 else dict_link[node]
+            while hit > 0:
+                length, symbol = self._patterns[term[hit]]
+                start = position - length + 1
+                end = position + 1
+                if (start == 0 or text[start - 1] == " ") and (end == len(text) or text[end] == " "):
+                    matches.append((start, -length, symbol))
+                hit = dict_link[hit]
+
+        tickers: List[str] = []
+        covered = 0
+        for start, negative_length, symbol in sorted(matches):
+            if start < covered:
+                continue
+            covered = start - negative_length
+            if symbol not in tickers:
+                tickers.append(symbol)
+        return tickers
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "version": CACHE_VERSION,
+            "digest": self.digest,
+            "patterns": self._patterns,
+            "edge_keys": list(self._edges),
+            "edge_targets": list(self._edges.values()),
+            "term": self._term,
+            "fail": self._fail,
+            "dict_link": self._dict_link,
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, object]) -> "CompanyNameMatcher":
+        matcher = cls.__new__(cls)
+        matcher.digest = payload["digest"]
+        matcher._patterns = [(length, symbol) for length, symbol in payload["patterns"]]
+        matcher._edges = dict(zip(payload["edge_keys"], payload["edge_targets"]))
+        matcher._term = payload["term"]
+        matcher._fail = payload["fail"]
+        matcher._dict_link = payload["dict_link"]
+        return matcher
+
+
+def default_cache_path(data_path: Optional[Path]) -> Path:
+    """Next to the ticker data file when that directory is writable, else the user cache."""
+    if data_path is not None and os.access(data_path.parent, os.W_OK):
+        return data_path.with_name(f"{data_path.stem}.matcher.json")
+    return Path.home() / ".nocturnal_archive" / "cache" / "company_tickers.matcher.json"
+
+
+def load_matcher(mapping: Dict[str, str], cache_path: Optional[Path] = None) -> CompanyNameMatcher:
+    """Matcher for ``mapping``, read from ``cache_path`` when it was built from the same names."""
+    digest = mapping_digest(mapping)
+    if cache_path is not None and cache_path.exists():
+        try:
+            payload = json.loads(cache_path.read_text(encoding="utf-8"))
+            if payload.get("version") == CACHE_VERSION and payload.get("digest") == digest:
+                return CompanyNameMatcher.from_dict(payload)
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.debug(f"Ignoring unreadable ticker matcher cache {cache_path}: {exc}")
+
+    matcher = CompanyNameMatcher(mapping, digest=digest)
+    if cache_path is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(matcher.to_dict(), separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_path, cache_path)
+        except OSError as exc:
+            logger.debug(f"Could not cache ticker matcher at {cache_path}: {exc}")
+    return matcher
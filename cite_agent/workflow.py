@@ -13,11 +13,13 @@ import hashlib
 import json
 import os
 import re
+import sqlite3
 import subprocess
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
+from dataclasses import dataclass
 
 
 @dataclass
@@ -133,117 +135,342 @@ class Paper:
 
 
 class WorkflowManager:
-    """Manages scholar workflow integrations"""
-    
-    def __init__(self):
-        self.config_dir = Path.home() / ".cite_agent"
+    """Manages scholar workflow integrations
+
+    The paper library and query history live in one SQLite database
+    (``workflow.sqlite3``): papers are upserted by id, tags sit in their own
+    indexed table, and an FTS5 index over title, authors, abstract and notes
+    backs ``search_library``. The JSON files of older versions are imported
+    once, on first open, and left in place.
+    """
+
+    def __init__(self, config_dir: Optional[Path] = None):
+        self.config_dir = Path(config_dir) if config_dir else Path.home() / ".cite_agent"
         self.library_dir = self.config_dir / "library"
         self.exports_dir = self.config_dir / "exports"
         self.history_dir = self.config_dir / "history"
         self.bibtex_file = self.exports_dir / "references.bib"
-        
+        self.db_path = self.config_dir / "workflow.sqlite3"
+
         # Create directories
-        self.config_dir.mkdir(exist_ok=True)
-        self.library_dir.mkdir(exist_ok=True)
+        self.config_dir.mkdir(parents=True, exist_ok=True)
         self.exports_dir.mkdir(exist_ok=True)
-        self.history_dir.mkdir(exist_ok=True)
-    
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=10.0, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._fts = self._create_schema()
+        self._migrate_json_files()
+
+    def _create_schema(self) -> bool:
+        """Create tables; returns whether the FTS5 index is available"""
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS papers (
+                    paper_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    authors TEXT NOT NULL DEFAULT '[]',
+                    year INTEGER,
+                    doi TEXT,
+                    url TEXT,
+                    abstract TEXT,
+                    venue TEXT,
+                    citation_count INTEGER NOT NULL DEFAULT 0,
+                    added_date TEXT,
+                    notes TEXT,
+                    tags TEXT NOT NULL DEFAULT '[]'
+                );
+                CREATE INDEX IF NOT EXISTS papers_added_date ON papers(added_date);
+                CREATE INDEX IF NOT EXISTS papers_year ON papers(year);
+                CREATE TABLE IF NOT EXISTS paper_tags (
+                    tag TEXT NOT NULL,
+                    paper_id TEXT NOT NULL,
+                    PRIMARY KEY (tag, paper_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS paper_tags_paper ON paper_tags(paper_id);
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    metadata TEXT NOT NULL DEFAULT '{}'
+                );
+                CREATE INDEX IF NOT EXISTS history_timestamp ON history(timestamp);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                """
+            )
+        try:
+            with self._conn:
+                # External-content index kept in sync by triggers
+                self._conn.executescript(
+                    """
+                    CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                        title, authors, abstract, notes,
+                        content='papers', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS papers_fts_insert AFTER INSERT ON papers BEGIN
+                        INSERT INTO papers_fts(rowid, title, authors, abstract, notes)
+                        VALUES (new.rowid, new.title, new.authors, new.abstract, new.notes);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS papers_fts_delete AFTER DELETE ON papers BEGIN
+                        INSERT INTO papers_fts(papers_fts, rowid, title, authors, abstract, notes)
+                        VALUES ('delete', old.rowid, old.title, old.authors, old.abstract, old.notes);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS papers_fts_update AFTER UPDATE ON papers BEGIN
+                        INSERT INTO papers_fts(papers_fts, rowid, title, authors, abstract, notes)
+                        VALUES ('delete', old.rowid, old.title, old.authors, old.abstract, old.notes);
+                        INSERT INTO papers_fts(rowid, title, authors, abstract, notes)
+                        VALUES (new.rowid, new.title, new.authors, new.abstract, new.notes);
+                    END;
+                    """
+                )
+            return True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE scans
+            return False
+
+    def _migrate_json_files(self) -> None:
+        """One-time import of the per-paper JSON files and daily history JSONL files"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return
+            # IMMEDIATE: a second CLI session waits here instead of importing twice
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                    for paper_file in sorted(self.library_dir.glob("*.json")) if self.library_dir.exists() else []:
+                        try:
+                            with open(paper_file, 'r') as f:
+                                self._upsert(Paper(**json.load(f)))
+                        except Exception as e:
+                            print(f"Error reading {paper_file}: {e}")
+                    for history_file in sorted(self.history_dir.glob("*.jsonl")) if self.history_dir.exists() else []:
+                        with open(history_file, 'r') as f:
+                            for line in f:
+                                try:
+                                    entry = json.loads(line)
+                                    self._insert_history(entry["timestamp"], entry["query"], entry.get("response", ""), entry.get("metadata") or {})
+                                except (ValueError, KeyError, TypeError):
+                                    continue
+                    self._conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (datetime.now().isoformat(),)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _upsert(self, paper: Paper) -> None:
+        tags = list(dict.fromkeys(paper.tags or []))
+        self._conn.execute(
+            """
+            INSERT INTO papers (paper_id, title, authors, year, doi, url, abstract, venue,
+                                citation_count, added_date, notes, tags)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(paper_id) DO UPDATE SET
+                title = excluded.title, authors = excluded.authors, year = excluded.year,
+                doi = excluded.doi, url = excluded.url, abstract = excluded.abstract,
+                venue = excluded.venue, citation_count = excluded.citation_count,
+                added_date = excluded.added_date, notes = excluded.notes, tags = excluded.tags
+            """,
+            (
+                paper.paper_id, paper.title, json.dumps(paper.authors or []), paper.year,
+                paper.doi, paper.url, paper.abstract, paper.venue, paper.citation_count or 0,
+                paper.added_date, paper.notes, json.dumps(tags),
+            ),
+        )
+        self._conn.execute("DELETE FROM paper_tags WHERE paper_id = ?", (paper.paper_id,))
+        self._conn.executemany(
+            "INSERT INTO paper_tags (tag, paper_id) VALUES (?, ?)", [(tag, paper.paper_id) for tag in tags]
+        )
+
+    def _insert_history(self, timestamp: str, query: str, response: str, metadata: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT INTO history (timestamp, query, response, metadata) VALUES (?, ?, ?, ?)",
+            (timestamp, query, response, json.dumps(metadata, default=str)),
+        )
+
+    @staticmethod
+    def _row_to_paper(row: sqlite3.Row) -> Paper:
+        return Paper(
+            title=row["title"],
+            authors=json.loads(row["authors"]),
+            year=row["year"],
+            doi=row["doi"],
+            url=row["url"],
+            abstract=row["abstract"],
+            venue=row["venue"],
+            citation_count=row["citation_count"],
+            paper_id=row["paper_id"],
+            added_date=row["added_date"],
+            notes=row["notes"],
+            tags=json.loads(row["tags"]),
+        )
+
     def add_paper(self, paper: Paper) -> bool:
         """Add paper to local library"""
         try:
             # Generate paper ID if not provided
             if not paper.paper_id:
                 paper.paper_id = self._generate_paper_id(paper)
-            
-            # Save paper as JSON
-            paper_file = self.library_dir / f"{paper.paper_id}.json"
-            with open(paper_file, 'w') as f:
-                json.dump(asdict(paper), f, indent=2)
-            
+
+            with self._lock, self._conn:
+                self._upsert(paper)
+
             return True
         except Exception as e:
             print(f"Error adding paper: {e}")
             return False
-    
+
+    def add_papers(self, papers: Iterable[Paper]) -> int:
+        """Add many papers in one transaction; returns how many were stored"""
+        count = 0
+        try:
+            with self._lock, self._conn:
+                for paper in papers:
+                    if not paper.paper_id:
+                        paper.paper_id = self._generate_paper_id(paper)
+                    self._upsert(paper)
+                    count += 1
+        except Exception as e:
+            print(f"Error adding papers: {e}")
+            return 0
+        return count
+
     def get_paper(self, paper_id: str) -> Optional[Paper]:
         """Retrieve paper from library"""
         try:
-            paper_file = self.library_dir / f"{paper_id}.json"
-            if not paper_file.exists():
-                return None
-            
-            with open(paper_file, 'r') as f:
-                data = json.load(f)
-                return Paper(**data)
+            with self._lock:
+                row = self._conn.execute("SELECT * FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+            return self._row_to_paper(row) if row else None
         except Exception as e:
             print(f"Error retrieving paper: {e}")
             return None
-    
-    def list_papers(self, tag: Optional[str] = None) -> List[Paper]:
+
+    def iter_papers(
+        self,
+        tag: Optional[str] = None,
+        query: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Paper]:
+        """Stream papers (newest first, or best match first with ``query``) without loading the library"""
+        source, where, params, order = self._paper_filters(tag, query)
+        sql = f"SELECT p.* FROM {source}{where} ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(256)
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_to_paper(row)
+
+    def count_papers(self, tag: Optional[str] = None, query: Optional[str] = None) -> int:
+        """Number of papers matching the same filters as ``iter_papers``"""
+        source, where, params, _ = self._paper_filters(tag, query)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {source}{where}", params).fetchone()[0]
+
+    def _paper_filters(self, tag: Optional[str], query: Optional[str]) -> Tuple[str, str, List[Any], str]:
+        source, order = "papers p", "p.added_date DESC"
+        conditions: List[str] = []
+        params: List[Any] = []
+        if query is not None:
+            terms = re.findall(r"\w+", query.lower())
+            if self._fts and terms:
+                # Prefix match on every word; quoting keeps user text out of the FTS syntax
+                source = "papers_fts JOIN papers p ON p.rowid = papers_fts.rowid"
+                conditions.append("papers_fts MATCH ?")
+                params.append(" ".join(f'"{term}"*' for term in terms))
+                order = f"bm25(papers_fts), {order}"
+            else:
+                like = f"%{query.lower()}%"
+                conditions.append(
+                    "(lower(p.title) LIKE ? OR lower(p.authors) LIKE ? OR lower(p.abstract) LIKE ? OR lower(p.notes) LIKE ?)"
+                )
+                params.extend([like] * 4)
+        if tag is not None:
+            conditions.append("p.paper_id IN (SELECT paper_id FROM paper_tags WHERE tag = ?)")
+            params.append(tag)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return source, where, params, order
+
+    def list_papers(self, tag: Optional[str] = None, limit: Optional[int] = None) -> List[Paper]:
         """List all papers in library, optionally filtered by tag"""
-        papers = []
-        for paper_file in self.library_dir.glob("*.json"):
-            try:
-                with open(paper_file, 'r') as f:
-                    data = json.load(f)
-                    paper = Paper(**data)
-                    
-                    if tag is None or tag in paper.tags:
-                        papers.append(paper)
-            except Exception as e:
-                print(f"Error reading {paper_file}: {e}")
-        
-        # Sort by added date (newest first)
-        papers.sort(key=lambda p: p.added_date or "", reverse=True)
-        return papers
-    
-    def export_to_bibtex(self, papers: Optional[List[Paper]] = None, append: bool = True) -> bool:
+        try:
+            return list(self.iter_papers(tag=tag, limit=limit))
+        except Exception as e:
+            print(f"Error reading library: {e}")
+            return []
+
+    def export_to_bibtex(
+        self,
+        papers: Optional[Iterable[Paper]] = None,
+        append: bool = True,
+        tag: Optional[str] = None,
+        query: Optional[str] = None,
+    ) -> bool:
         """Export papers to BibTeX file"""
         try:
             if papers is None:
-                # Export all papers from library
-                papers = self.list_papers()
-            
+                # Stream the library (or the tag/query selection) straight from the database
+                papers = self.iter_papers(tag=tag, query=query)
+
             mode = 'a' if append else 'w'
             with open(self.bibtex_file, mode) as f:
                 if not append:
                     f.write("% Generated by Cite-Agent\n")
                     f.write(f"% Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                
+
                 for paper in papers:
                     f.write(paper.to_bibtex())
                     f.write("\n")
-            
+
             return True
         except Exception as e:
             print(f"Error exporting to BibTeX: {e}")
             return False
-    
-    def export_to_markdown(self, papers: Optional[List[Paper]] = None, output_file: Optional[Path] = None) -> bool:
+
+    def export_to_markdown(
+        self,
+        papers: Optional[List[Paper]] = None,
+        output_file: Optional[Path] = None,
+        tag: Optional[str] = None,
+        query: Optional[str] = None,
+    ) -> bool:
         """Export papers to markdown file"""
         try:
             if papers is None:
-                papers = self.list_papers()
-            
+                total = self.count_papers(tag=tag, query=query)
+                papers = self.iter_papers(tag=tag, query=query)
+            else:
+                total = len(papers)
+
             if output_file is None:
                 output_file = self.exports_dir / f"papers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
-            
+
             with open(output_file, 'w') as f:
                 f.write(f"# Research Library Export\n\n")
                 f.write(f"*Exported: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*\n\n")
-                f.write(f"Total papers: {len(papers)}\n\n")
+                f.write(f"Total papers: {total}\n\n")
                 f.write("---\n\n")
-                
+
                 for i, paper in enumerate(papers, 1):
                     f.write(f"## {i}. {paper.title}\n\n")
                     f.write(paper.to_markdown())
                     f.write("\n---\n\n")
-            
+
             return True
         except Exception as e:
             print(f"Error exporting to markdown: {e}")
             return False
-    
+
     def copy_to_clipboard(self, text: str) -> bool:
         """Copy text to system clipboard"""
         try:
@@ -279,89 +506,74 @@ class WorkflowManager:
         except Exception as e:
             print(f"Error copying to clipboard: {e}")
             return False
-    
+
     def save_query_result(self, query: str, response: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
         """Save query and response to history"""
         try:
-            timestamp = datetime.now()
-            history_file = self.history_dir / f"{timestamp.strftime('%Y%m%d')}.jsonl"
-            
-            entry = {
-                "timestamp": timestamp.isoformat(),
-                "query": query,
-                "response": response,
-                "metadata": metadata or {}
-            }
-            
-            with open(history_file, 'a') as f:
-                f.write(json.dumps(entry) + '\n')
-            
+            with self._lock, self._conn:
+                self._insert_history(datetime.now().isoformat(), query, response, metadata or {})
             return True
         except Exception as e:
             print(f"Error saving query result: {e}")
             return False
-    
-    def get_history(self, days: int = 7) -> List[Dict[str, Any]]:
-        """Retrieve query history from last N days"""
-        history = []
-        cutoff = datetime.now()
-        
-        for history_file in sorted(self.history_dir.glob("*.jsonl"), reverse=True):
-            try:
-                with open(history_file, 'r') as f:
-                    for line in f:
-                        entry = json.loads(line)
-                        history.append(entry)
-            except Exception as e:
-                print(f"Error reading history: {e}")
-        
-        return history[:100]  # Limit to last 100 queries
-    
-    def search_library(self, query: str) -> List[Paper]:
-        """Search papers in library by title, author, or abstract"""
-        query_lower = query.lower()
-        results = []
-        
-        for paper in self.list_papers():
-            # Search in title
-            if query_lower in paper.title.lower():
-                results.append(paper)
-                continue
-            
-            # Search in authors
-            if any(query_lower in author.lower() for author in paper.authors):
-                results.append(paper)
-                continue
-            
-            # Search in abstract
-            if paper.abstract and query_lower in paper.abstract.lower():
-                results.append(paper)
-                continue
-        
-        return results
-    
+
+    def get_history(self, days: int = 7, limit: int = 100) -> List[Dict[str, Any]]:
+        """Retrieve query history from last N days (newest first)"""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT timestamp, query, response, metadata FROM history "
+                    "WHERE timestamp >= ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                    (cutoff, limit),
+                ).fetchall()
+        except Exception as e:
+            print(f"Error reading history: {e}")
+            return []
+        return [
+            {
+                "timestamp": row["timestamp"],
+                "query": row["query"],
+                "response": row["response"],
+                "metadata": json.loads(row["metadata"]),
+            }
+            for row in rows
+        ]
+
+    def search_library(self, query: str, limit: Optional[int] = None) -> List[Paper]:
+        """Search papers in library by title, author, abstract or notes (best matches first)"""
+        try:
+            return list(self.iter_papers(query=query, limit=limit))
+        except Exception as e:
+            print(f"Error searching library: {e}")
+            return []
+
     def add_note_to_paper(self, paper_id: str, note: str) -> bool:
         """Add note to a paper in the library"""
         paper = self.get_paper(paper_id)
         if not paper:
             return False
-        
+
         if paper.notes:
             paper.notes += f"\n\n{note}"
         else:
             paper.notes = note
-        
+
         return self.add_paper(paper)
-    
+
     def tag_paper(self, paper_id: str, tags: List[str]) -> bool:
         """Add tags to a paper"""
         paper = self.get_paper(paper_id)
         if not paper:
             return False
-        
-        paper.tags = list(set(paper.tags + tags))
+
+        paper.tags = list(dict.fromkeys(paper.tags + tags))
         return self.add_paper(paper)
-    
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
     def _generate_paper_id(self, paper: Paper) -> str:
         """Generate unique paper ID"""
         # Use DOI if available
@@ -5,8 +5,19 @@ import re
 import os
 import requests
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional
 from dataclasses import dataclass
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _file_search():
+    """cite-agent's lazy, .gitignore-aware walk and threaded search, imported on first use (None if absent)"""
+    try:
+        from cite_agent import file_search
+    except ImportError:
+        return None
+    return file_search
 
 
 @dataclass
@@ -80,6 +91,42 @@ class GrepTool:
         max_results: int = 100
     ) -> List[Dict[str, Any]]:
         """Search for pattern in files"""
+        if _file_search() is None:
+            return self._search_legacy(pattern, path, file_pattern, case_sensitive, max_results)
+        try:
+            return list(self.iter_search(pattern, path, file_pattern, case_sensitive, max_results))
+        except re.error as e:
+            return [{"error": f"Invalid regex: {e}"}]
+
+    def iter_search(
+        self,
+        pattern: str,
+        path: Optional[str] = None,
+        file_pattern: Optional[str] = None,
+        case_sensitive: bool = True,
+        max_results: int = 100
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield matches file by file as they are found (raises re.error on a bad pattern)"""
+        search_path = Path(path) if path else self.root_dir
+        for result in _file_search().iter_grep(
+            pattern,
+            str(search_path),
+            file_pattern or "**/*",
+            mode="content",
+            ignore_case=not case_sensitive,
+            max_results=max_results,
+        ):
+            for line_num, content in result["lines"]:
+                yield {'file': result["path"], 'line': line_num, 'content': content}
+
+    def _search_legacy(
+        self,
+        pattern: str,
+        path: Optional[str],
+        file_pattern: Optional[str],
+        case_sensitive: bool,
+        max_results: int
+    ) -> List[Dict[str, Any]]:
         results = []
         search_path = Path(path) if path else self.root_dir
 
@@ -135,6 +182,10 @@ class GlobTool:
         full_pattern = str(search_path / pattern)
 
         try:
+            file_search = _file_search() if recursive else None
+            if file_search is not None:
+                # Files only, skipping .git, node_modules and .gitignore'd paths
+                return sorted(file_search.iter_files(str(search_path), pattern))
             matches = glob.glob(full_pattern, recursive=recursive)
             return sorted(matches)
         except Exception as e:
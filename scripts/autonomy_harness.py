@@ -79,6 +79,16 @@ class _StubShell:
         return None
 
 
+def _install_fake_shell(agent: EnhancedNocturnalAgent, fake_execute: Callable[[str], str]) -> None:
+    """Route both the blocking and the async command entry points to ``fake_execute``."""
+
+    async def fake_execute_async(cmd: str, timeout: float = 30.0) -> str:
+        return fake_execute(cmd)
+
+    agent.execute_command = fake_execute  # type: ignore[assignment]
+    agent.execute_command_async = fake_execute_async  # type: ignore[assignment]
+
+
 class FakeBackend:
     """Intercepts backend calls to keep scenarios deterministic."""
 
@@ -564,7 +574,7 @@ async def run_local_file_showcase() -> Dict[str, Any]:
                 return target.read_text(encoding="utf-8")
             return ""
 
-        agent.execute_command = fake_execute  # type: ignore[assignment]
+        _install_fake_shell(agent, fake_execute)
 
         response = await agent.process_request(
             ChatRequest(question="Read the contents of notes.txt and summarize it")
@@ -679,7 +689,7 @@ async def run_archive_resume_showcase() -> Dict[str, Any]:
             summary_payload["citations"],
         )
         archive_context_first = agent_first.archive.get_recent_context("demo", "session")
-        archive_files_after_first = list(Path(tmp).glob("*.json"))
+        archive_files_after_first = list(Path(tmp).glob("*.jsonl"))
         await agent_first.close()
 
         ledger_second: List[Dict[str, Any]] = []
@@ -788,7 +798,7 @@ async def run_data_analysis_showcase() -> Dict[str, Any]:
             }
             return json.dumps(result)
 
-        agent.execute_command = fake_execute  # type: ignore[assignment]
+        _install_fake_shell(agent, fake_execute)
 
         response = await agent.process_request(
             ChatRequest(question="Analyze sample_data.csv and report summary statistics.")
@@ -879,7 +889,7 @@ async def run_repo_overview_showcase() -> Dict[str, Any]:
             )
         return ""
 
-    agent.execute_command = fake_execute  # type: ignore[assignment]
+    _install_fake_shell(agent, fake_execute)
 
     original_read_file = agent.read_file
 
@@ -970,7 +980,7 @@ async def run_data_pipeline_showcase() -> Dict[str, Any]:
                 return _json.dumps(records)
             return ""
 
-        agent.execute_command = fake_execute  # type: ignore[assignment]
+        _install_fake_shell(agent, fake_execute)
 
         original_read_file = agent.read_file
 
@@ -1024,7 +1034,7 @@ async def run_self_service_shell_showcase() -> Dict[str, Any]:
             return "main.py\nREADME.md\nrequirements.txt"
         return ""
 
-    agent.execute_command = fake_execute  # type: ignore[assignment]
+    _install_fake_shell(agent, fake_execute)
     agent.shell_session = _StubShell()
 
     async def backend_ready() -> Tuple[bool, str]:
@@ -1096,7 +1106,7 @@ async def run_conversation_memory_showcase() -> Dict[str, Any]:
             )
 
             archive_entries = agent.archive.list_conversations()
-            archive_files = [p.name for p in Path(tmp).glob("*.json")]
+            archive_files = [p.name for p in Path(tmp).glob("*.jsonl")]
             await agent.close()
 
             guardrails = {
@@ -1264,7 +1274,7 @@ async def run_repo_refactor_showcase() -> Dict[str, Any]:
                 return helper_path.read_text(encoding="utf-8")
             return ""
 
-        agent.execute_command = fake_execute  # type: ignore[assignment]
+        _install_fake_shell(agent, fake_execute)
 
         original_read = agent.read_file
 
@@ -1338,7 +1348,7 @@ async def run_workspace_grounding_showcase() -> Dict[str, Any]:
                 return "README.md\ndata.csv\nnotes.txt"
             return ""
 
-        agent.execute_command = fake_execute  # type: ignore[assignment]
+        _install_fake_shell(agent, fake_execute)
         agent.file_context["current_cwd"] = str(tmp_path)
 
         response = await agent.process_request(
@@ -1,6 +1,8 @@
 import json
 from pathlib import Path
 
+import pytest
+
 from cite_agent.conversation_archive import ConversationArchive
 
 
@@ -33,9 +35,65 @@ def test_conversation_archive_round_trip(tmp_path):
     files = archive.list_conversations()
     assert files
 
-    # Ensure contents persisted as JSON
-    path = Path(tmp_path / "archive").glob("*.json")
+    # Ensure contents persisted as one JSON line per turn
+    path = Path(tmp_path / "archive").glob("*.jsonl")
     first_file = next(path)
-    payload = json.loads(first_file.read_text())
-    assert isinstance(payload, list)
+    payload = [json.loads(line) for line in first_file.read_text().splitlines()]
     assert len(payload) == 2
+    assert payload[0]["question"] == "What is Tesla's revenue?"
+
+
+def test_archive_tail_reads_skip_torn_lines_and_compact(tmp_path):
+    archive = ConversationArchive(root=tmp_path, max_entries=5)
+    for turn in range(10):
+        archive.record_entry("user-1", "session-1", f"q{turn}", f"answer {turn}")
+    log = next(tmp_path.glob("*.jsonl"))
+    with open(log, "ab") as handle:
+        handle.write(b'{"timestamp": "2024-01-01T00:00:00", "summ')
+
+    entries = archive.load_entries("user-1", "session-1", limit=3)
+    assert [entry.summary for entry in entries] == ["answer 7", "answer 8", "answer 9"]
+
+    # Past twice max_entries the log is trimmed in the background
+    archive.record_entry("user-1", "session-1", "q10", "answer 10")
+    archive.close()
+    lines = log.read_text().splitlines()
+    assert [json.loads(line)["summary"] for line in lines] == [f"answer {turn}" for turn in range(6, 11)]
+    assert "answer 10" in archive.get_recent_context("user-1", "session-1")
+
+
+def test_legacy_json_archive_is_migrated(tmp_path):
+    archive = ConversationArchive(root=tmp_path)
+    legacy = archive._conversation_path("user-1", "session-1").with_suffix(".json")
+    legacy.write_text(json.dumps([{"timestamp": "2024-01-01T00:00:00", "question": "old", "summary": "legacy summary"}]))
+
+    assert "legacy summary" in archive.get_recent_context("user-1", "session-1")
+    archive.record_entry("user-1", "session-1", "new", "fresh summary")
+
+    assert not legacy.exists()
+    assert [entry.summary for entry in archive.load_entries("user-1", "session-1")] == ["legacy summary", "fresh summary"]
+
+    archive.clear_conversation("user-1", "session-1")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_full_text_recall_across_conversations(tmp_path):
+    archive = ConversationArchive(root=tmp_path, search_index=True)
+    if archive.index is None:
+        pytest.skip("SQLite built without FTS5")
+    archive.record_entry("user-1", "session-1", "Tesla revenue?", "Tesla revenue grew 19% on vehicle deliveries.")
+    archive.record_entry("user-1", "session-2", "Transformer papers?", "Found attention papers with DOIs.")
+    archive.record_entry("user-2", "session-3", "Tesla margins?", "Tesla gross margin was 18%.")
+
+    hits = archive.search("user-1", "what did we learn about tesla")
+    assert [hit.summary for hit in hits] == ["Tesla revenue grew 19% on vehicle deliveries."]
+    assert archive.get_related_context("user-1", "session-1", "tesla revenue") == ""
+    assert "Tesla revenue grew" in archive.get_related_context("user-1", "session-2", "tesla revenue")
+
+    archive.clear_conversation("user-1", "session-1")
+    assert archive.search("user-1", "tesla") == []
+    archive.close()
+
+    # The index reopens on next use, e.g. after the agent reloads
+    assert "attention papers" in archive.get_related_context("user-1", "session-9", "transformer attention")
+    archive.close()
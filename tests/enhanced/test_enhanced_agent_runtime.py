@@ -274,3 +274,52 @@ def test_query_limit_signature_tampering(monkeypatch):
     agent = EnhancedNocturnalAgent()
 
     assert agent.daily_query_limit == DEFAULT_QUERY_LIMIT
+
+
+@pytest.mark.asyncio
+async def test_backend_streaming_yields_tokens_as_they_arrive():
+    import aiohttp
+    from aiohttp import web
+
+    from cite_agent.streaming_ui import groq_stream_to_generator
+
+    release = asyncio.Event()
+
+    async def query_stream(request):
+        assert request.headers["Authorization"] == "Bearer token-123"
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b'event: token\ndata: {"content": "Hello"}\n\n')
+        await release.wait()
+        await response.write(b'event: token\ndata: {"content": " world"}\n\n')
+        await response.write(b'event: done\ndata: {"tokens_used": 3, "model": "m", "provider": "groq"}\n\n')
+        return response
+
+    app = web.Application()
+    app.router.add_post("/api/query/stream", query_stream)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    agent = EnhancedNocturnalAgent()
+    saved: List[Dict] = []
+    agent.workflow.save_query_result = lambda **kwargs: saved.append(kwargs)  # type: ignore[assignment]
+    agent.auth_token = "token-123"
+    agent.backend_api_url = f"http://127.0.0.1:{port}/api"
+    agent.session = aiohttp.ClientSession()
+
+    try:
+        stream = await agent.process_request_streaming(ChatRequest(question="hi"))
+        chunks = groq_stream_to_generator(stream)
+        # The first token is rendered while the backend is still generating
+        assert await asyncio.wait_for(chunks.__anext__(), timeout=2) == "Hello"
+        release.set()
+        assert [chunk async for chunk in chunks] == [" world"]
+    finally:
+        await agent.session.close()
+        await runner.cleanup()
+
+    assert agent.conversation_history[-1] == {"role": "assistant", "content": "Hello world"}
+    assert saved[0]["metadata"]["tokens_used"] == 3
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from cite_agent import file_search
+from cite_agent.enhanced_ai_agent import EnhancedNocturnalAgent
+from cite_agent.file_search import iter_files, iter_grep
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "config").write_text("needle\n")
+    (tmp_path / ".gitignore").write_text("build/\n*.log\n!keep.log\n")
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.py").write_text("needle\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "out.py").write_text("needle\n")
+    (tmp_path / "src" / "deep").mkdir(parents=True)
+    (tmp_path / "src" / "deep" / "mod.py").write_text("x = 1\nneedle = 2\n")
+    (tmp_path / "src" / "app.py").write_text("needle\nneedle again\nnothing\n")
+    (tmp_path / "top.py").write_text("no match here\n")
+    (tmp_path / "debug.log").write_text("needle\n")
+    (tmp_path / "keep.log").write_text("needle\n")
+    (tmp_path / "blob.bin").write_bytes(b"needle\x00\x01\x02")
+    return tmp_path
+
+
+def _relative(root, paths):
+    return sorted(os.path.relpath(path, root).replace(os.sep, "/") for path in paths)
+
+
+def test_walk_prunes_ignored_and_vendored_directories(tree):
+    assert _relative(tree, iter_files(str(tree), "**/*")) == [
+        "blob.bin", "keep.log", "src/app.py", "src/deep/mod.py", "top.py",
+    ]
+    # Without ** the walk stays at the pattern's depth
+    assert _relative(tree, iter_files(str(tree), "*.py")) == ["top.py"]
+    assert _relative(tree, iter_files(str(tree), "src/*.py")) == ["src/app.py"]
+    assert _relative(tree, iter_files(str(tree), "**/*.py", respect_ignore=False)) == [
+        "build/out.py", "src/app.py", "src/deep/mod.py", "top.py",
+    ]
+
+
+def test_grep_modes_skip_binaries(tree):
+    files = list(iter_grep("needle", str(tree), mode="files"))
+    assert _relative(tree, (result["path"] for result in files)) == [
+        "keep.log", "src/app.py", "src/deep/mod.py",
+    ]
+
+    counts = {os.path.basename(r["path"]): r["count"] for r in iter_grep("needle", str(tree), mode="count")}
+    assert counts == {"keep.log": 1, "app.py": 2, "mod.py": 1}
+
+    content = {os.path.basename(r["path"]): r["lines"] for r in iter_grep("^needle", str(tree), "**/*.py")}
+    assert content == {"app.py": [(1, "needle"), (2, "needle again")], "mod.py": [(2, "needle = 2")]}
+
+
+def test_large_files_are_memory_mapped(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_search, "MMAP_THRESHOLD", 1024)
+    monkeypatch.setattr(file_search, "SNIFF_BYTES", 64)
+    big = tmp_path / "big.txt"
+    big.write_text("filler line\n" * 500 + "the needle\n" + "filler line\n" * 10)
+
+    [result] = iter_grep("needle", str(tmp_path), "*.txt")
+    assert result["lines"] == [(501, "the needle")]
+
+
+def test_max_results_stops_early(tmp_path):
+    for index in range(200):
+        (tmp_path / f"f{index:03d}.txt").write_text("needle\nneedle\n")
+
+    files = list(iter_grep("needle", str(tmp_path), "*.txt", mode="files", max_results=5, workers=2))
+    assert len(files) == 5
+    lines = list(iter_grep("needle", str(tmp_path), "*.txt", max_results=3, workers=2))
+    assert sum(result["count"] for result in lines) == 3
+
+
+def test_agent_tools_keep_their_result_shapes(tree):
+    agent = EnhancedNocturnalAgent()
+
+    globbed = agent.glob_search("**/*.py", str(tree))
+    assert globbed["count"] == 3 and not globbed["truncated"]
+    assert agent.glob_search("**/*", str(tree), max_results=2)["truncated"]
+
+    found = agent.grep_search("needle", str(tree), "**/*.py")
+    assert found["count"] == 2 and found["pattern"] == "needle"
+
+    content = agent.grep_search("needle", str(tree), "**/*.py", output_mode="content")
+    assert content["file_count"] == 2
+    assert content["matches"][str(tree / "src" / "app.py")] == [(1, "needle"), (2, "needle again")]
+
+    counted = agent.grep_search("needle", str(tree), "**/*", output_mode="count")
+    assert counted["total_matches"] == 4
+
+    assert agent.grep_search("(", str(tree))["error"].startswith("Invalid regex pattern")
+    assert "Invalid output_mode" in agent.grep_search("x", str(tree), output_mode="bogus")["error"]
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from cite_agent.enhanced_ai_agent import EnhancedNocturnalAgent
+from cite_agent.shell_runner import PersistentShell
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="exercises the bash shell")
+
+
+@pytest.fixture
+def shell(tmp_path):
+    runner = PersistentShell(cwd=str(tmp_path))
+    yield runner
+    runner.terminate()
+
+
+def test_state_exit_codes_and_separate_streams(shell, tmp_path):
+    (tmp_path / "sub").mkdir()
+    first = shell.run_sync("cd sub && export GREETING=hi; echo out; echo err >&2; printf 'no newline'")
+    assert first.stdout == "out\nno newline"
+    assert first.stderr == "err\n"
+    assert first.exit_code == 0
+
+    second = shell.run_sync("echo $GREETING; pwd; exit_code_test() { return 7; }; exit_code_test")
+    assert second.stdout.splitlines() == ["hi", str(tmp_path / "sub")]
+    assert second.exit_code == 7
+    assert shell.cwd == str(tmp_path / "sub")
+
+
+def test_timeout_restarts_shell_in_last_directory(shell, tmp_path):
+    shell.run_sync(f"cd {tmp_path}")
+    result = shell.run_sync("echo started; sleep 10", timeout=0.5)
+    assert result.timed_out and result.exit_code is None
+    assert result.stdout == "started\n"
+
+    assert shell.run_sync("pwd").stdout.strip() == str(tmp_path)
+    assert shell.run_sync("exit 3").exit_code == 3
+    assert shell.run_sync("echo back").stdout == "back\n"
+
+
+def test_output_is_capped(tmp_path):
+    runner = PersistentShell(cwd=str(tmp_path), max_output_bytes=100)
+    try:
+        result = runner.run_sync("head -c 100000 /dev/zero | tr '\\0' a")
+    finally:
+        runner.terminate()
+    assert len(result.stdout) == 100
+    assert result.truncated and result.exit_code == 0
+
+
+@pytest.mark.asyncio
+async def test_run_streams_without_blocking_the_loop(shell):
+    chunks = []
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.05)
+
+    ticking = asyncio.create_task(ticker())
+    result = await shell.run(
+        "for i in 1 2 3; do echo line$i; sleep 0.1; done",
+        on_output=lambda stream, text: chunks.append((stream, text)),
+    )
+    await ticking
+
+    assert result.stdout == "line1\nline2\nline3\n"
+    assert len(chunks) >= 3 and all(stream == "stdout" for stream, _ in chunks)
+    assert len(ticks) == 5
+
+
+@pytest.mark.asyncio
+async def test_agent_execute_command_async(tmp_path):
+    agent = EnhancedNocturnalAgent()
+    agent.shell_session = PersistentShell(cwd=str(tmp_path))
+    try:
+        assert await agent.execute_command_async("run: echo hello; echo oops >&2") == "hello\noops"
+        assert await agent.execute_command_async("false") == "Command exited with status 1"
+        assert "timed out after 0.2s" in await agent.execute_command_async("sleep 5", timeout=0.2)
+        assert agent.execute_command("pwd") == str(tmp_path)
+    finally:
+        agent.shell_session.terminate()
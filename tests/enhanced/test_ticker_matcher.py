@@ -0,0 +1,63 @@
+import json
+
+from cite_agent import ticker_matcher
+from cite_agent.enhanced_ai_agent import EnhancedNocturnalAgent
+from cite_agent.ticker_matcher import CompanyNameMatcher, load_matcher
+
+
+MAPPING = {
+    "goldman": "GOLD",
+    "goldman sachs": "GS",
+    "meta": "META",
+    "target": "TGT",
+    "at&t": "T",
+    "bank of america": "BAC",
+    "america": "AMER",
+}
+
+
+def test_matches_whole_words_in_order_of_appearance():
+    matcher = CompanyNameMatcher(MAPPING)
+
+    assert matcher.find("Is AT&T cheaper than Meta?") == ["T", "META"]
+    assert matcher.find("metadata about targeting") == []
+    assert matcher.find("Meta, meta and META again") == ["META"]
+
+
+def test_longest_overlapping_name_wins():
+    matcher = CompanyNameMatcher(MAPPING)
+
+    assert matcher.find("Goldman Sachs and Bank of America") == ["GS", "BAC"]
+    assert matcher.find("goldman alone, then America") == ["GOLD", "AMER"]
+
+
+def test_automaton_is_cached_by_mapping_digest(tmp_path, monkeypatch):
+    cache_path = tmp_path / "company_tickers.matcher.json"
+    built = load_matcher(MAPPING, cache_path)
+    assert json.loads(cache_path.read_text())["digest"] == built.digest
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("automaton rebuilt despite a valid cache")
+
+    monkeypatch.setattr(CompanyNameMatcher, "__init__", no_rebuild)
+    cached = load_matcher(MAPPING, cache_path)
+    assert cached.find("goldman sachs") == ["GS"]
+
+    monkeypatch.undo()
+    changed = load_matcher({**MAPPING, "netflix": "NFLX"}, cache_path)
+    assert changed.find("Netflix") == ["NFLX"]
+    assert json.loads(cache_path.read_text())["digest"] == changed.digest
+
+
+def test_agent_loads_sec_ticker_file(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(ticker_matcher, "default_cache_path", lambda data_path: cache_dir / "matcher.json")
+    monkeypatch.setattr("cite_agent.enhanced_ai_agent.default_cache_path", ticker_matcher.default_cache_path)
+
+    agent = EnhancedNocturnalAgent()
+    agent._load_ticker_map()
+
+    assert agent.company_name_to_ticker["nvidia corp"] == "NVDA"
+    assert len(agent.company_name_to_ticker) > 1000
+    assert agent._extract_tickers_from_text("Compare Nvidia Corp with Goldman Sachs") == ["NVDA", "GS"]
+    assert (cache_dir / "matcher.json").exists()
@@ -0,0 +1,88 @@
+import json
+from datetime import datetime, timedelta
+
+from cite_agent.workflow import Paper, WorkflowManager
+
+
+def _paper(title, authors, year=2020, **extra):
+    return Paper(title=title, authors=authors, year=year, **extra)
+
+
+def test_library_search_tags_and_notes(tmp_path):
+    workflow = WorkflowManager(config_dir=tmp_path)
+    workflow.add_paper(_paper("Attention Is All You Need", ["Ashish Vaswani"], 2017, doi="10.5555/attention",
+                              added_date="2024-01-01T00:00:00", tags=["nlp"]))
+    workflow.add_paper(_paper("Deep Residual Learning", ["Kaiming He"], 2016,
+                              abstract="Residual networks ease training.", added_date="2024-02-01T00:00:00"))
+    workflow.add_paper(_paper("Transformers for Vision", ["Alexey Dosovitskiy"], 2021,
+                              added_date="2024-03-01T00:00:00", tags=["vision", "nlp"]))
+
+    assert [p.title for p in workflow.list_papers()] == [
+        "Transformers for Vision", "Deep Residual Learning", "Attention Is All You Need",
+    ]
+    assert [p.title for p in workflow.list_papers(tag="nlp")] == ["Transformers for Vision", "Attention Is All You Need"]
+    assert workflow.count_papers(tag="vision") == 1
+
+    assert [p.title for p in workflow.search_library("transform")] == ["Transformers for Vision"]
+    assert [p.title for p in workflow.search_library("vaswani")] == ["Attention Is All You Need"]
+    assert [p.title for p in workflow.search_library("residual networks")] == ["Deep Residual Learning"]
+    assert workflow.search_library('"; DROP TABLE papers; --') == []
+
+    paper_id = workflow.list_papers(tag="vision")[0].paper_id
+    assert workflow.add_note_to_paper(paper_id, "Compare with ConvNeXt")
+    assert workflow.tag_paper(paper_id, ["to-read", "nlp"])
+    assert [p.paper_id for p in workflow.search_library("convnext")] == [paper_id]
+    assert workflow.get_paper(paper_id).tags == ["vision", "nlp", "to-read"]
+    assert workflow.count_papers(tag="to-read") == 1 and workflow.count_papers() == 3
+    workflow.close()
+
+
+def test_history_is_newest_first_and_bounded(tmp_path):
+    workflow = WorkflowManager(config_dir=tmp_path)
+    for index in range(5):
+        workflow.save_query_result(f"query {index}", "answer", {"tools_used": ["archive_api"]})
+
+    history = workflow.get_history(limit=3)
+    assert [entry["query"] for entry in history] == ["query 4", "query 3", "query 2"]
+    assert history[0]["metadata"] == {"tools_used": ["archive_api"]}
+    workflow.close()
+
+
+def test_json_library_is_migrated_once(tmp_path):
+    library = tmp_path / "library"
+    history = tmp_path / "history"
+    library.mkdir()
+    history.mkdir()
+    legacy = _paper("Legacy Paper", ["Ada Lovelace"], 1843, paper_id="legacy", tags=["history"])
+    (library / "legacy.json").write_text(json.dumps(legacy.__dict__))
+    recent = (datetime.now() - timedelta(days=1)).isoformat()
+    (history / "old.jsonl").write_text(json.dumps({"timestamp": recent, "query": "old query", "response": "r"}) + "\n")
+
+    workflow = WorkflowManager(config_dir=tmp_path)
+    assert workflow.get_paper("legacy").title == "Legacy Paper"
+    assert [entry["query"] for entry in workflow.get_history()] == ["old query"]
+    workflow.close()
+
+    # Files left behind are not imported a second time
+    reopened = WorkflowManager(config_dir=tmp_path)
+    assert reopened.count_papers() == 1 and len(reopened.get_history()) == 1
+    reopened.close()
+
+
+def test_exports_stream_from_queries(tmp_path):
+    workflow = WorkflowManager(config_dir=tmp_path)
+    workflow.add_papers(
+        _paper(f"Paper {index}", [f"Author {index}"], 2000 + index, tags=["even"] if index % 2 == 0 else [])
+        for index in range(6)
+    )
+
+    assert workflow.export_to_bibtex(append=False, tag="even")
+    bibtex = workflow.bibtex_file.read_text()
+    assert bibtex.count("@article{") == 3 and "Paper 1" not in bibtex
+
+    output = tmp_path / "export.md"
+    assert workflow.export_to_markdown(output_file=output, query="paper")
+    markdown = output.read_text()
+    assert "Total papers: 6" in markdown
+    assert markdown.count("## Abstract") == 0 and markdown.count("# Paper") == 6
+    workflow.close()